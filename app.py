@@ -1,14 +1,63 @@
 import streamlit as st
-import google.generativeai as genai
 from datetime import datetime, timedelta
 import pandas as pd
 import json
 import os
 import re
-import markdown # For HTML export
 from gtts import gTTS # For Text-to-Speech
 import io # For Text-to-Speech
 import random
+import time # For the developer profiler
+import cProfile
+import pstats
+import marshal
+from contextlib import contextmanager, nullcontext
+import hashlib # For the content-addressed blob store
+import hmac # For signing the user id in the page URL
+import sys
+import threading # For the process-wide session memory registry
+import uuid
+import logging # For model routing decisions
+import secrets # For local password generation
+import string
+from collections import Counter
+import difflib # For the section refinement diff view
+try:
+    import pronouncing # Optional: CMU pronouncing dictionary for the local Rhyme Finder
+except ImportError:
+    pronouncing = None
+
+from note_core import ( # UI-free core shared with the batch CLI
+    API_KEY_POOL, AUTO_MODEL, HEDGE_BUDGET, HEDGE_PERCENTILE, KEY_POOL_SENTINEL, KEY_REQUESTS_PER_MINUTE, MODEL_PROFILES,
+    ROUTING_TIER_LABELS, add_questions_to_bank, build_note_prompt, export_notes, fill_question_bank, generate_ai_tools,
+    generate_content, generate_follow_up_questions, generate_spaced_repetition_text, generate_study_pack, get_model_stats,
+    get_single_flight_registry, key_pool_report, load_prompt_templates, new_spaced_repetition_card, note_content_hash,
+    parse_spaced_repetition_cards, quiz_questions_to_text, routing_logger, sample_bank_questions, stream_content
+)
+from note_core import cancel_job, enqueue_job, get_storage, start_job_workers, wait_for_job # Storage backends and job queue
+from note_core import ( # Analytics aggregates maintained on write
+    average_ease, build_analytics, cards_due_today, due_forecast, new_analytics, notes_last_days, quiz_averages,
+    record_card_added, record_card_reviewed, record_note, record_quiz_score
+)
+from note_core import join_markdown_sections, refine_note_sections, suggest_sections_to_refine # Section refinement
+from note_core import get_note_document # Parsed note model shared by statistics, TTS, refinement and exports
+from note_core import run_deep_research # Parallel multi-step research
+from note_core import RESEARCH_CONTEXT_TOKENS, build_research_context, new_research_memory, remember_research_turn # Bounded follow-up context
+from note_core import enhance_paragraphs, join_enhanced_paragraphs # Paragraph-parallel, cached writing enhancement
+from note_core import confirm_segment, translate_with_memory, translation_memory_stats # Sentence-level translation memory
+from note_core import CASSETTE_DIR, CASSETTE_MODE, list_cassettes # Recorded Gemini traffic for offline runs
+from note_core import ( # Reuse of responses to near-duplicate requests
+    SEMANTIC_CACHE_THRESHOLD, get_semantic_cache_stats, lookup_semantic_cache, record_semantic_rejection, store_semantic_response
+)
+from note_core import is_note_ref, load_note, note_store_stats, put_note, release_notes, retain_note # Compressed, deduplicated note bodies
+from note_core import build_deck_index, card_at, count_due, deck_page, index_card, reindex_card # Sorted indexes for paging the deck
+
+if not routing_logger.handlers: # The logger outlives reruns, so attach the handler only once
+    routing_logger.addHandler(logging.StreamHandler())
+    routing_logger.setLevel(logging.INFO)
+
+# Wall-clock start of this rerun (Streamlit re-executes the whole script on every interaction)
+RERUN_START = time.perf_counter()
 
 # App title and configuration
 st.set_page_config(page_title="AI Note Maker", page_icon="📝", layout="wide")
@@ -54,7 +103,7 @@ if 'history' not in st.session_state:
 if 'favorites' not in st.session_state:
     st.session_state.favorites = []
 if 'api_key' not in st.session_state:
-    st.session_state.api_key = ""
+    st.session_state.api_key = KEY_POOL_SENTINEL if API_KEY_POOL else ""
 if 'custom_templates' not in st.session_state:
     st.session_state.custom_templates = {}
 if 'user_knowledge_level' not in st.session_state:
@@ -63,6 +112,8 @@ if 'spaced_repetition' not in st.session_state:
     st.session_state.spaced_repetition = []
 if 'quiz_scores' not in st.session_state:
     st.session_state.quiz_scores = []
+if 'analytics' not in st.session_state:
+    st.session_state.analytics = new_analytics() # Aggregates kept up to date on write (note_core.analytics)
 if 'default_detail_level' not in st.session_state:
     st.session_state.default_detail_level = "Standard"
 if 'default_tone' not in st.session_state:
@@ -86,23 +137,420 @@ if 'study_tasks' not in st.session_state:
     st.session_state.study_tasks = []
 if 'selected_main_tab' not in st.session_state:
     st.session_state.selected_main_tab = "📝 Note Generation" # Default tab
+if 'prefetch_enabled' not in st.session_state:
+    st.session_state.prefetch_enabled = True
+if 'hedge_enabled' not in st.session_state:
+    st.session_state.hedge_enabled = False
+if 'semantic_cache_enabled' not in st.session_state:
+    st.session_state.semantic_cache_enabled = True
+if 'semantic_cache_hit' not in st.session_state:
+    st.session_state.semantic_cache_hit = None # Set when the current notes were reused from a similar request
+if 'prefetch_jobs' not in st.session_state:
+    st.session_state.prefetch_jobs = {} # "kind:content_hash" -> background job
+if 'prefetch_budget_used' not in st.session_state:
+    st.session_state.prefetch_budget_used = 0
+if 'local_tool_results' not in st.session_state:
+    st.session_state.local_tool_results = {} # Last result per Misc. tool, with where it came from
+if 'research_memory' not in st.session_state:
+    st.session_state.research_memory = new_research_memory() # Summary, recent turns and archived chunks of this research session
+# Developer profiler state
+if 'profiler_report' not in st.session_state:
+    st.session_state.profiler_report = None
+if 'active_cprofile' not in st.session_state:
+    st.session_state.active_cprofile = None
+st.session_state.profiler_sections = [] # Section timings are per rerun
+
+# --- Developer mode: per-rerun profiler ---
+# Enable with the NOTE_MAKER_PROFILE=1 environment variable or by opening the app with ?profile=1
+PROFILE_MODE = os.environ.get("NOTE_MAKER_PROFILE", "0") == "1" or st.query_params.get("profile") == "1"
+_open_checkpoint = {"name": None, "start": None}
+
+# Function to time a named section of the current rerun
+@contextmanager
+def section_timer(name):
+    if not PROFILE_MODE:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        st.session_state.profiler_sections.append({
+            "section": name,
+            "start_ms": (start - RERUN_START) * 1000,
+            "duration_ms": (end - start) * 1000
+        })
+
+# Function to close the running top-level section and open the next one (None just closes it)
+def profile_checkpoint(name):
+    if not PROFILE_MODE:
+        return
+    now = time.perf_counter()
+    if _open_checkpoint["name"] is not None:
+        st.session_state.profiler_sections.append({
+            "section": _open_checkpoint["name"],
+            "start_ms": (_open_checkpoint["start"] - RERUN_START) * 1000,
+            "duration_ms": (now - _open_checkpoint["start"]) * 1000
+        })
+    _open_checkpoint["name"] = name
+    _open_checkpoint["start"] = now
+
+# Function to stop a cProfile run and keep a summary plus the raw .prof data
+def finish_cprofile(profiler, interrupted=False):
+    profiler.disable()
+    stats = pstats.Stats(profiler)
+    functions = []
+    for (filename, lineno, funcname), (cc, nc, tt, ct, callers) in stats.stats.items():
+        functions.append({
+            "function": f"{funcname} ({os.path.basename(filename)}:{lineno})",
+            "calls": nc,
+            "own_ms": tt * 1000,
+            "cumulative_ms": ct * 1000
+        })
+    functions.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    st.session_state.profiler_report = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "interrupted": interrupted, # True when st.rerun() cut the profiled run short
+        "functions": functions[:50],
+        "prof": marshal.dumps(stats.stats) # Same layout as pstats.Stats.dump_stats()
+    }
+    st.session_state.active_cprofile = None
+
+# Function to convert section timings into a speedscope (https://www.speedscope.app) evented profile
+def sections_to_speedscope(sections, total_ms):
+    frames = []
+    frame_index = {}
+    events = []
+    stack = []
+    ordered = sorted(sections, key=lambda sec: (sec["start_ms"], -sec["duration_ms"]))
+    for sec in ordered:
+        start = sec["start_ms"]
+        while stack and stack[-1][1] <= start:
+            frame_id, end = stack.pop()
+            events.append({"type": "C", "frame": frame_id, "at": end})
+        if sec["section"] not in frame_index:
+            frame_index[sec["section"]] = len(frames)
+            frames.append({"name": sec["section"]})
+        end = start + sec["duration_ms"]
+        if stack:
+            end = min(end, stack[-1][1]) # Keep children inside their parent
+        events.append({"type": "O", "frame": frame_index[sec["section"]], "at": start})
+        stack.append((frame_index[sec["section"]], end))
+    while stack:
+        frame_id, end = stack.pop()
+        events.append({"type": "C", "frame": frame_id, "at": end})
+    return json.dumps({
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "evented",
+            "name": "AI Note Maker rerun",
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": max([total_ms] + [event["at"] for event in events]),
+            "events": events
+        }],
+        "exporter": "AI Note Maker profiler"
+    })
+
+# --- Session-state memory accounting and spill-to-disk for large outputs ---
+# Text values above this size are written to a content-addressed blob store and only a small
+# handle ({"__blob__": digest, "size": n}) is kept in session state. Handles are plain dicts
+# because classes defined in this script are re-created on every rerun.
+SPILL_THRESHOLD_BYTES = int(os.environ.get("NOTE_MAKER_SPILL_BYTES", 64 * 1024))
+BLOB_STORE_DIR = os.environ.get("NOTE_MAKER_BLOB_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".blob_store"))
+BLOB_MAX_AGE_SECONDS = float(os.environ.get("NOTE_MAKER_BLOB_MAX_AGE", 7 * 24 * 3600)) # Blobs unused for this long are deleted
+BLOB_PRUNE_INTERVAL_SECONDS = 3600
+SESSION_MEMORY_REFRESH_SECONDS = 30
+BLOB_MISSING_TEXT = "⚠️ This text is no longer available: it went unused for longer than the blob store keeps text."
+
+# Function to check whether a session-state value is a blob store handle
+def is_blob_handle(value):
+    return isinstance(value, dict) and "__blob__" in value
+
+# Function to write text to the blob store (identical text is stored once)
+def put_blob(text):
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    blob_path = os.path.join(BLOB_STORE_DIR, digest[:2], digest)
+    if os.path.exists(blob_path):
+        touch_blob(digest)
+    else:
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        tmp_path = f"{blob_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, blob_path) # Atomic, so concurrent sessions never see a partial blob
+    return {"__blob__": digest, "size": len(data)}
+
+# Function to mark a blob as in use, so pruning keeps it (its modification time is its last use)
+def touch_blob(digest):
+    try:
+        os.utime(os.path.join(BLOB_STORE_DIR, digest[:2], digest))
+    except OSError:
+        pass
+
+# Function to read a blob file; recently used blobs are shared by all sessions in the process
+@st.cache_data(max_entries=32, show_spinner=False)
+def read_blob(digest):
+    with open(os.path.join(BLOB_STORE_DIR, digest[:2], digest), "rb") as f:
+        return f.read().decode("utf-8")
+
+# Function to read a blob back, or a placeholder once pruning has deleted it (not cached, so a blob
+# written again with the same text is found)
+def load_blob(digest):
+    try:
+        return read_blob(digest)
+    except FileNotFoundError:
+        return BLOB_MISSING_TEXT
+
+# Function to keep a value in session state, spilling it to disk if it is a large string
+def spill_large_text(value):
+    if isinstance(value, str) and len(value) * 4 > SPILL_THRESHOLD_BYTES and len(value.encode("utf-8")) > SPILL_THRESHOLD_BYTES:
+        return put_blob(value)
+    return value
+
+# Function to get the text behind a session-state value (loads spilled blobs and note bodies lazily)
+def load_text(value):
+    if is_blob_handle(value):
+        touch_blob(value["__blob__"])
+        return load_blob(value["__blob__"])
+    if is_note_ref(value):
+        return load_note(value["__note__"])
+    return value
+
+# Function to release the note bodies of entries dropped from history or favorites (if the note store is
+# unavailable, the bodies just stay stored)
+def release_entry_notes(items):
+    try:
+        release_notes([item["output"] for item in items])
+    except Exception as e:
+        routing_logger.warning("Note store unavailable, keeping released note bodies: %s", e)
+
+# Function to estimate the deep in-memory size of an object in bytes
+def deep_sizeof(obj, seen=None):
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+# Function to count the handles and note references (and the bytes they stand for) in a value
+def count_blob_handles(obj):
+    if is_blob_handle(obj) or is_note_ref(obj):
+        return 1, obj["size"]
+    handles, spilled = 0, 0
+    children = obj.values() if isinstance(obj, dict) else obj if isinstance(obj, (list, tuple)) else []
+    for child in children:
+        child_handles, child_spilled = count_blob_handles(child)
+        handles += child_handles
+        spilled += child_spilled
+    return handles, spilled
+
+# Process-wide time of the last blob store pruning
+@st.cache_resource
+def get_blob_prune_state():
+    return {"lock": threading.Lock(), "last_run": 0.0}
+
+# Function to delete blobs no session has used for BLOB_MAX_AGE_SECONDS (at most once per interval per
+# process). Blobs are shared by content, so one is only safe to delete once nobody touches it any more;
+# saved user data holds the text itself, so a returning user's large values are spilled again.
+def prune_blob_store():
+    prune_state = get_blob_prune_state()
+    now = time.time()
+    with prune_state["lock"]:
+        if now - prune_state["last_run"] < BLOB_PRUNE_INTERVAL_SECONDS:
+            return 0
+        prune_state["last_run"] = now
+    removed = 0
+    if not os.path.isdir(BLOB_STORE_DIR):
+        return removed
+    for shard in os.scandir(BLOB_STORE_DIR):
+        if not shard.is_dir():
+            continue
+        for blob in os.scandir(shard.path):
+            try:
+                if now - blob.stat().st_mtime > BLOB_MAX_AGE_SECONDS:
+                    os.remove(blob.path)
+                    removed += 1
+            except OSError:
+                pass # Removed by another process meanwhile
+    return removed
+
+if 'session_uid' not in st.session_state:
+    st.session_state.session_uid = uuid.uuid4().hex[:12]
+    prune_blob_store() # New sessions are a cheap, regular trigger
+
+# Function to report the deep size of every session-state key
+def session_memory_report():
+    rows = []
+    for key in list(st.session_state.keys()):
+        value = st.session_state[key]
+        handles, spilled = count_blob_handles(value)
+        rows.append({"key": key, "bytes": deep_sizeof(value), "spilled_handles": handles, "spilled_bytes": spilled})
+    rows.sort(key=lambda row: row["bytes"], reverse=True)
+    return rows
+
+# Process-wide registry of per-session totals, so one session can see the whole server's picture
+# (only profiled sessions report, since measuring walks the whole session state)
+@st.cache_resource
+def get_session_memory_registry():
+    return {"lock": threading.Lock(), "sessions": {}}
+
+# Function to refresh this session's entry in the registry (throttled, and stale sessions are dropped);
+# returns a snapshot of every session's entry
+def update_session_memory_registry(force=False):
+    registry = get_session_memory_registry()
+    now = time.time()
+    with registry["lock"]:
+        entry = registry["sessions"].get(st.session_state.session_uid)
+    if force or not entry or now - entry["updated"] >= SESSION_MEMORY_REFRESH_SECONDS:
+        rows = session_memory_report() # Measured outside the lock: it walks this session's whole state
+        with registry["lock"]:
+            registry["sessions"][st.session_state.session_uid] = {
+                "bytes": sum(row["bytes"] for row in rows),
+                "spilled_bytes": sum(row["spilled_bytes"] for row in rows),
+                "keys": len(rows),
+                "updated": now
+            }
+    with registry["lock"]:
+        for uid, info in list(registry["sessions"].items()):
+            if now - info["updated"] > 3600:
+                del registry["sessions"][uid]
+        return dict(registry["sessions"])
+
+# --- Per-user data in the configured storage backend ---
+# History, favorites and the flashcard deck are saved per user (note_core.storage), so they
+# survive restarts and follow the user to whichever replica serves the next request. The user id
+# is kept in the page URL (?uid=<id>.<signature>), so a bookmarked link restores the same data.
+# The signature is an HMAC with a server secret, so ids can't be made up or altered; a link
+# without a valid one starts a new user. Anyone holding the link can open the data, like a
+# password. Spilled blobs are saved as their text, since the blob store is local to each host.
+USER_DATA_KEYS = ["history", "favorites", "spaced_repetition", "quiz_scores", "analytics"]
+UID_SECRET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".note_data", "uid_secret")
+
+# Function to load the secret that signs user ids (NOTE_MAKER_UID_SECRET, else one saved on first use)
+@st.cache_resource
+def get_uid_secret():
+    if os.environ.get("NOTE_MAKER_UID_SECRET"):
+        return os.environ["NOTE_MAKER_UID_SECRET"].encode("utf-8")
+    os.makedirs(os.path.dirname(UID_SECRET_PATH), exist_ok=True)
+    try:
+        fd = os.open(UID_SECRET_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError: # Another process (or an earlier run) made it
+        with open(UID_SECRET_PATH, "r", encoding="utf-8") as f:
+            return f.read().strip().encode("utf-8")
+    secret = secrets.token_hex(32)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(secret)
+    return secret.encode("utf-8")
+
+# Function to sign a user id for the page URL
+def sign_user_id(user_id):
+    signature = hmac.new(get_uid_secret(), user_id.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+    return f"{user_id}.{signature}"
+
+# Function to return the user id of a signed ?uid= value (None when unsigned or forged)
+def verify_user_id(uid_param):
+    match = re.fullmatch(r"([0-9a-f]{32})\.[0-9a-f]{32}", uid_param or "")
+    if not match or not hmac.compare_digest(sign_user_id(match.group(1)), uid_param):
+        return None
+    return match.group(1)
+
+if 'user_id' not in st.session_state:
+    st.session_state.user_id = verify_user_id(st.query_params.get("uid")) or uuid.uuid4().hex
+if verify_user_id(st.query_params.get("uid")) != st.session_state.user_id:
+    st.query_params["uid"] = sign_user_id(st.session_state.user_id)
+
+# Function to replace blob handles in a value with their text (or spill large strings back out)
+def map_user_data_text(value, text_fn):
+    if isinstance(value, dict) and not is_blob_handle(value):
+        return {k: map_user_data_text(v, text_fn) for k, v in value.items()}
+    if isinstance(value, list):
+        return [map_user_data_text(item, text_fn) for item in value]
+    return text_fn(value)
+
+# Function to load the user's saved data into session state (once per session)
+def load_user_data():
+    store = get_storage()["user_data"]
+    try:
+        loaded = set()
+        for key in USER_DATA_KEYS:
+            saved = store.load(key, st.session_state.user_id)
+            if saved is not None:
+                st.session_state[key] = map_user_data_text(saved, spill_large_text)
+                loaded.add(key)
+        if loaded and "analytics" not in loaded: # Saved before analytics existed
+            st.session_state.analytics = build_analytics(st.session_state.spaced_repetition, st.session_state.history, st.session_state.quiz_scores)
+    except Exception as e:
+        st.warning(f"Could not load your saved history and flashcards: {e}")
+    st.session_state.user_data_dirty = set()
+
+# Function to save the user data marked dirty (a key whose save fails stays dirty and is retried)
+def save_user_data():
+    store = get_storage()["user_data"]
+    for key in sorted(st.session_state.user_data_dirty):
+        try:
+            store.save(key, st.session_state.user_id, map_user_data_text(st.session_state[key], load_text))
+            st.session_state.user_data_dirty.discard(key)
+        except Exception as e:
+            st.warning(f"Could not save your {key.replace('_', ' ')}: {e}")
+
+# Function to record that user data was just written and save it at once (before any st.rerun() can cut the run short)
+def mark_user_data_dirty(*keys):
+    st.session_state.user_data_dirty.update(keys)
+    save_user_data()
+
+if 'user_data_dirty' not in st.session_state:
+    load_user_data()
+if 'deck_index' not in st.session_state:
+    st.session_state.deck_index = build_deck_index(st.session_state.spaced_repetition) # Kept in step with the deck on write
+
+if PROFILE_MODE:
+    # A profiled run that was cut short by st.rerun() never reached the footer, so close it here
+    if st.session_state.active_cprofile is not None:
+        finish_cprofile(st.session_state.active_cprofile, interrupted=True)
+    if st.session_state.pop('profile_next_rerun', False):
+        st.session_state.active_cprofile = cProfile.Profile()
+        st.session_state.active_cprofile.enable()
 
 # Main app header
 st.title("📝 AI Note Maker")
 st.markdown("Generate comprehensive, customized notes on any topic using AI")
 
 # Sidebar for API key and settings
-with st.sidebar:
+with st.sidebar, section_timer("Sidebar"):
     st.header("🔑 API Configuration")
-    saved_api_key = st.text_input("Enter your Gemini API Key", value=st.session_state.api_key, type="password")
-    if saved_api_key != st.session_state.api_key:
-        st.session_state.api_key = saved_api_key
+    shown_api_key = "" if st.session_state.api_key == KEY_POOL_SENTINEL else st.session_state.api_key
+    saved_api_key = st.text_input("Enter your Gemini API Key", value=shown_api_key, type="password",
+                                  help="Optional when the server has a key pool; your own key takes precedence." if API_KEY_POOL else None)
+    if saved_api_key != shown_api_key:
+        st.session_state.api_key = saved_api_key or (KEY_POOL_SENTINEL if API_KEY_POOL else "")
+    if st.session_state.api_key == KEY_POOL_SENTINEL:
+        st.caption(f"🔐 Using the server key pool ({len(API_KEY_POOL)} keys)")
     
     model_name = st.selectbox("Select AI Model",
-                             ["gemini-2.0-flash", "gemini-2.5-flash-preview-04-17", "gemini-2.5-pro-preview-03-25", "gemini-2.0-flash-lite", "gemini-2.0-pro-exp-02-05",
+                             [AUTO_MODEL, "gemini-2.0-flash", "gemini-2.5-flash-preview-04-17", "gemini-2.5-pro-preview-03-25", "gemini-2.0-flash-lite", "gemini-2.0-pro-exp-02-05",
                               "gemini-2.0-flash-thinking-exp-01-21", "gemini-1.5-pro",
                               "gemini-1.5-flash", "gemini-1.5-flash-8b"],
-                             index=0)
+                             index=1,
+                             help="Auto picks a model per request from the tool's complexity, detail level, input size and live latency/error stats.")
+    model_overrides = {}
+    if model_name == AUTO_MODEL:
+        with st.expander("🧭 Auto Routing Overrides"):
+            for tier, tier_label in enumerate(ROUTING_TIER_LABELS):
+                tier_model = st.selectbox(f"{tier_label} requests", ["Automatic"] + list(MODEL_PROFILES), key=f"model_override_{tier}")
+                if tier_model != "Automatic":
+                    model_overrides[tier] = tier_model
     
     st.header("⚙️ User Preferences")
     pref_detail_level = st.selectbox(
@@ -132,6 +580,24 @@ with st.sidebar:
         st.session_state.default_language_style = pref_language_style
         st.rerun()
 
+    st.session_state.prefetch_enabled = st.toggle(
+        "⚡ Prefetch likely next steps",
+        value=st.session_state.prefetch_enabled,
+        help="After generating notes or research, prepare the quiz, flashcards and follow-up questions in the background."
+    )
+    st.session_state.hedge_enabled = st.toggle(
+        "🏁 Hedge slow requests",
+        value=st.session_state.hedge_enabled,
+        help=f"If a request has no first token after the p{HEDGE_PERCENTILE:g} of observed latency, send a duplicate and keep whichever answers first."
+    )
+    st.session_state.semantic_cache_enabled = st.toggle(
+        "♻️ Reuse notes for similar topics",
+        value=st.session_state.semantic_cache_enabled,
+        help=f"Serve notes generated earlier for a topic at least {SEMANTIC_CACHE_THRESHOLD:.0%} similar, with the same format and settings. You can always regenerate."
+    )
+    # Session generation settings, passed explicitly so background threads don't touch session state
+    generation_options = {"model_overrides": model_overrides, "hedge": st.session_state.hedge_enabled}
+
     # Theme settings
     st.header("🎨 Theme")
     theme_options = ["Light", "Dark", "Blue", "Green"]
@@ -142,7 +608,9 @@ with st.sidebar:
     
     with tab1:
         if st.button("Clear History"):
+            release_entry_notes(st.session_state.history)
             st.session_state.history = []
+            mark_user_data_dirty("history")
             st.success("History cleared!")
         
         # Display compact history
@@ -157,7 +625,9 @@ with st.sidebar:
                 st.caption(f"{i+1}. {item['topic']} ({item['tool']})")
             
             if st.button("Clear Favorites"):
+                release_entry_notes(st.session_state.favorites)
                 st.session_state.favorites = []
+                mark_user_data_dirty("favorites")
                 st.success("Favorites cleared!")
     
     with tab3:
@@ -168,14 +638,12 @@ with st.sidebar:
                 st.caption(f"{topic}: {level}/5")
         
         st.caption("Upcoming Flashcards:")
-        due_cards = [card for card in st.session_state.spaced_repetition 
-                    if card['next_review'] <= datetime.now()]
-        st.caption(f"{len(due_cards)} cards due for review")
+        st.caption(f"{cards_due_today(st.session_state.analytics)} cards due for review today")
         
         st.caption("Quiz Performance:")
-        if st.session_state.quiz_scores:
-            avg_score = sum(score['score'] for score in st.session_state.quiz_scores) / len(st.session_state.quiz_scores)
-            st.caption(f"Average Score: {avg_score:.1f}%")
+        avg_score, recent_avg_score = quiz_averages(st.session_state.analytics)
+        if avg_score is not None:
+            st.caption(f"Average Score: {avg_score:.1f}% (last {len(st.session_state.analytics['quiz_recent'])}: {recent_avg_score:.1f}%)")
 
         st.markdown("---")
         st.subheader("🚀 Topic Exploration")
@@ -205,21 +673,11 @@ with st.sidebar:
 
         st.markdown("---")
         st.subheader("📈 Advanced Analytics")
-        notes_this_week = 0
-        one_week_ago = datetime.now() - timedelta(days=7)
-        for item in st.session_state.history:
-            try:
-                item_timestamp = datetime.strptime(item['timestamp'], "%Y-%m-%d %H:%M:%S")
-                if item_timestamp > one_week_ago:
-                    notes_this_week += 1
-            except ValueError:
-                pass # Ignore items with unexpected timestamp format
-        st.metric("Notes Generated (Last 7 Days)", notes_this_week)
+        st.metric("Notes Generated (Last 7 Days)", notes_last_days(st.session_state.analytics))
 
-        if st.session_state.history:
-            from collections import Counter
-            tool_counts = Counter(item['tool'] for item in st.session_state.history)
-            most_common_tool, most_common_count = tool_counts.most_common(1)[0] if tool_counts else ("N/A", 0)
+        most_common_tool = st.session_state.analytics["top_tool"]
+        if most_common_tool:
+            most_common_count = st.session_state.analytics["notes_by_tool"][most_common_tool]
             st.metric("Most Used Note Format", f"{most_common_tool} ({most_common_count} times)")
         
         focus_areas = [topic for topic, level in st.session_state.user_knowledge_level.items() if level < 3]
@@ -232,484 +690,730 @@ with st.sidebar:
     st.markdown("AI Note Maker helps you create detailed notes on any topic using Google's Gemini AI.")
     st.markdown("v3.0 - Smart Learning Features")
 
-# Function to generate list of AI tools
-def generate_ai_tools():
-    tools = [
-        "Bullet Points",
-        "Cornell Notes",
-        
-        "Mind Map Structure",
-        "Flashcards",
-        "Summary Notes",
-        "Detailed Explanation",
-        "Question & Answer Format",
-        "Key Concepts & Definitions",
-        "Timeline Format",
-        "Comparative Analysis",
-        "Exam Preparation",
-        "Deep research",
-        "Case Study Analysis",
-        "Custom Template"
-    ]
-    
-    categories = {
-        "Note Formats": ["Bullet Points", "Cornell Notes","Mind Map Structure", "Summary Notes", "Detailed Explanation"],
-        "Study Aids": ["Flashcards", "Question & Answer Format", "Key Concepts & Definitions", "Exam Preparation"],
-        "Specialized": ["Timeline Format", "Comparative Analysis", "Deep research", "Case Study Analysis"],
-        "Custom": ["Custom Template"]
-    }
-    
-    return tools, categories
-
 # Get all tools and categories
 ai_tools, tool_categories = generate_ai_tools()
 
-# Function to load prompt templates
-@st.cache_data
-def load_prompt_templates():
-    templates = {
-        "Bullet Points": "Create comprehensive bullet point notes on: {prompt}. Format with clear hierarchical structure (main points and sub-points) using bullet symbols. Make notes concise yet complete, covering all important aspects. Use appropriate spacing for readability.",
-        
-        "Cornell Notes": "Create Cornell-style notes on: {prompt}. Structure with three sections: 1) Right column (main notes area): detailed content with clear paragraphs and hierarchical organization, 2) Left column (cue column): key questions, terms, and concepts that align with the main notes, 3) Bottom section: concise summary of the entire topic. Use proper formatting and spacing.",
-        
-        "Comprehensive Quiz": "Generate a comprehensive quiz on: {prompt}. Include a mix of multiple choice questions (MCQs), short answer, and true/false questions with a total of 30 questions. Ensure a range of difficulty levels. For MCQs, provide four options with one correct answer clearly marked. Group questions by subtopics if applicable. Include an answer key at the end.",
-    
-        
-        "Mind Map Structure": "Create a text-based mind map structure on: {prompt}. Format with the core concept in the center, main branches using level 1 headings, sub-branches using level 2 headings, and leaf nodes using bullet points. Use indentation to show relationships between concepts. Include all important relationships and hierarchies.",
-        
-        "Flashcards": "Create a set of flashcards on: {prompt}. Format with 'Q:' for questions and 'A:' for answers, separating each flashcard with a divider line. Include comprehensive coverage of key facts, definitions, concepts, and their applications. Number each flashcard.",
-        
-        "Summary Notes": "Create concise summary notes on: {prompt}. Include only the most essential information, key concepts, and critical takeaways. Format with clear headings and short paragraphs. Ensure comprehensive coverage while maintaining brevity (maximum 1/3 the length of detailed notes).",
-        
-        "Detailed Explanation": "Create detailed explanatory notes on: {prompt}. Include thorough explanations of concepts, supporting evidence, examples, and applications. Structure with clear headings, subheadings, and logical flow. Use appropriate technical language while ensuring clarity.",
-        
-        "Question & Answer Format": "Create comprehensive Q&A format notes on: {prompt}. Format with clear questions followed by detailed answers. Cover all important aspects of the topic with questions ranging from basic understanding to advanced application. Group related questions together under appropriate headings.",
-        
-        "Key Concepts & Definitions": "Create a glossary of key concepts and definitions for: {prompt}. Format each entry with the term in bold followed by a comprehensive definition. Include examples where helpful. Organize alphabetically or by related concept groups with clear headings.",
-        
-        "Timeline Format": "Create chronological timeline notes on: {prompt}. Format with clear date/period indicators followed by detailed descriptions of events, developments, or phases. Include significant milestones, causes, and effects. Use appropriate headings for major eras or transitions.",
-        
-        "Comparative Analysis": "Create comparative analysis notes on: {prompt}. Structure with clear categories for comparison in the left column and entities being compared across the top. Include detailed points of comparison with similarities and differences clearly marked. Conclude with synthesis of key insights from the comparison.",
-        
-        "Exam Preparation": "Create comprehensive exam preparation notes on: {prompt}. Include key definitions, formulas, concepts, potential exam questions, and model answers. Format with clear sections for different question types and difficulty levels. Highlight common pitfalls and strategies for tackling complex problems.",
-        
-        "Deep research": """
-You are a high-level research assistant writing in-depth academic responses. 
-Structure the output as a formal article (~8000 tokens) with:
-1. Executive Summary  
-2. Introduction  
-3. History & Evolution  
-4. Concepts & Frameworks  
-5. Current State  
-6. Challenges  
-7. Applications  
-8. Comparisons  
-9. Future Outlook  
-10. Conclusion  
-11. References (Optional)
-
-Query:
-\"\"\"{user_prompt}\"\"\"
-""",
-
-        "Case Study Analysis": """
-You are a high-level research assistant writing comprehensive academic case study analyses. 
-Structure the response as a formal case study (~8000 tokens) with:
-1. Executive Summary  
-2. Introduction & Background  
-3. History & Context  
-4. Key Issues  
-5. Stakeholder Analysis  
-6. Root Cause Analysis  
-7. Strategic Alternatives  
-8. Recommendation  
-9. Implementation Plan  
-10. Challenges & Risk Mitigation  
-11. Conclusion  
-12. References (Optional)
-
-Query:
-\"\"\"{user_prompt}\"\"\"
-"""
-
-       }
-    
-    # New templates for enhanced features
-    templates.update({
-        "Auto-Summary": "Provide a concise 3-paragraph summary of the following notes, highlighting only the most critical concepts and takeaways: {content}",
-        
-        "Refinement": "Refine the following notes on '{topic}' to make them {refinement_type}. Maintain the original structure but improve the content based on the refinement request: {content}",
-        
-        "Adaptive Content": "Create {detail_level} notes on {prompt} specifically tailored for someone with a knowledge level of {knowledge_level}/5 in this subject. Adjust complexity, depth, and examples accordingly.",
+# Function to generate content with AI (show_spinner=False makes it safe to call from background threads)
+def generate_ai_content(prompt, api_key, model_name, temperature, detail_level, style_params, show_spinner=True, response_mime_type=None, tool_name=None):
+    with st.spinner("🔮 AI is working its magic...") if show_spinner else nullcontext():
+        return generate_content(prompt, api_key, model_name, temperature, detail_level, style_params,
+                                response_mime_type=response_mime_type, tool_name=tool_name, **generation_options)
 
-        "Citation Generation": "Generate a citation in {style} format for the following source material. If it's a text snippet, try to identify key bibliographic information first. Source: {source_details}",
-
-        "Spaced Repetition Cards": "Based on the following notes, create 5-10 spaced repetition flashcards covering the most important concepts that would be suitable for long-term memorization. Each flashcard should have a 'Q:' for the question and an 'A:' for the answer. Separate each flashcard with three hyphens ('---'). Content: {content}",
-        
-        "Quiz Generation": "Create a 5-question quiz with multiple-choice answers based on the following notes. Include 4 options per question with only one correct answer. Format with the question followed by options labeled A, B, C, D, and mark the correct answer at the end: {content}",
-
-        "Research Assistant Query": "Provide a detailed and well-structured answer to the following research query: '{query}'. Structure the output as {output_format}. Draw upon general knowledge and provide explanations, examples, and context where appropriate. Aim for a comprehensive yet understandable response.",
-        "Research Follow-up Questions": "Based on the following research findings, suggest 3-5 insightful follow-up questions that a student might want to explore next: {research_findings}",
-        "Writing Enhancer - Rephrase": "Rephrase the following text to improve its clarity, conciseness, and flow, while retaining the original meaning. If a target tone is specified as '{target_tone}', adapt the rephrased text to that tone. Original text: '{text_to_rephrase}'",
-        "Writing Enhancer - Expand": "Expand on the following point or idea, providing more detail, examples, or supporting arguments. Point to expand: '{text_to_expand}'",
-        "Writing Enhancer - Summarize": "Provide a concise summary of the following text, capturing the main points. Text to summarize: '{text_to_summarize}'",
-        "Writing Enhancer - Clarity Check": "Review the following text for clarity and conciseness. Identify areas that could be improved and suggest specific revisions. Text for review: '{text_for_review}'"
-    })
-    # Templates for Misc. Features
-    templates["Quick Fact Finder"] = "Provide a concise definition or key fact for the term: '{term}'."
-    templates["Synonym Antonym Finder"] = "For the word '{word}', provide a list of 3-5 synonyms and 3-5 antonyms."
-    templates["Simple Translator"] = "Translate the following text to {target_language}. Text: '{text_to_translate}'"
-    templates["Idea Generator"] = "Generate 3-5 creative ideas related to the theme or problem: '{theme_or_problem}'."
-    templates["Code Explainer"] = "Explain the following code snippet in simple terms, outlining its main purpose and functionality. Code: \n```\n{code_snippet}\n```"
-
-    # Templates for 20 New Misc. Features
-    templates["Email Subject Generator"] = "Generate 5 creative and effective email subject lines for an email with the following core message or topic: '{email_topic}'."
-    templates["Headline Analyzer"] = "Analyze the following headline and provide feedback on its effectiveness (clarity, engagement, SEO potential if applicable). Suggest 3 alternative headlines. Headline: '{headline_text}'."
-    templates["Secure Password Idea Generator"] = "Suggest 3 ideas for creating a secure password based on the following criteria (do not generate the password itself, just the method or pattern): Length at least {length} characters, must include {char_types_count} types of characters (uppercase, lowercase, numbers, symbols)."
-    templates["Meeting Agenda Creator"] = "Create a basic meeting agenda for a meeting about '{meeting_topic}'. Include sections for: Attendees (list: {attendees}), Objectives, Discussion Points (3-5), Action Items, and Next Steps."
-    templates["Pros and Cons Lister"] = "List the potential pros and cons for the following topic or decision: '{decision_topic}'."
-    templates["ELI5 Explainer"] = "Explain the following complex topic as if you were explaining it to a 5-year-old: '{complex_topic}'."
-    templates["Text Mood Analyzer"] = "Analyze the overall mood or tone of the following text. Identify the dominant emotion(s) conveyed. Text: '{text_for_mood_analysis}'."
-    templates["Keyword Extractor"] = "Extract the 5-7 most important keywords or key phrases from the following text: '{text_for_keywords}'."
-    templates["Hashtag Generator"] = "Generate 5-7 relevant and trending hashtags for a social media post about: '{post_topic_or_text}'."
-    templates["Story Idea Kicker"] = "Provide 3 unique story prompts or starting ideas based on the following genre or theme: '{story_genre_theme}'."
-    templates["Historical Event Summarizer"] = "Provide a brief (3-5 sentences) summary of the historical event: '{event_name}'."
-    templates["Book Plot Summarizer"] = "Provide a concise plot summary (avoiding major spoilers if possible) for the book titled: '{book_title}'. If you don't know it, say so."
-    templates["Recipe Idea Generator"] = "Suggest a recipe idea using the following main ingredients: '{ingredients_list}'. Briefly outline the cooking steps."
-    templates["Learning Path Suggester"] = "Suggest a high-level learning path (3-5 key stages or topics) for someone wanting to learn about: '{skill_or_topic_to_learn}'."
-    templates["Debate Topic Generator"] = "Generate 3 interesting and debatable topics suitable for a student debate."
-    templates["Short Poem Generator"] = "Write a short, 4-8 line poem about: '{poem_theme_keywords}'."
-    templates["Joke Teller"] = "Tell me a family-friendly joke. If you know one about {joke_topic}, tell that, otherwise a general one."
-    templates["Character Name Generator"] = "Suggest 5 unique character names suitable for a story in the {character_genre_theme} genre/setting."
-    templates["Random Quote Generator"] = "Provide an inspirational or thought-provoking quote. If possible, relate it to the theme of '{quote_theme}'."
-    templates["Fictional World Idea Generator"] = "Generate a core concept or unique feature for a fictional world in the {world_genre} genre."
-    
-    # Keeping some useful misc templates from previous additions
-    templates["Code Comment Generator"] = "Generate helpful comments for the following code snippet. Explain what each major part does. Code:\n```\n{code_to_comment}\n```"
-    templates["Analogy Generator"] = "Create a simple analogy to explain the concept: '{concept_for_analogy}'. Make it easy to understand."
-    templates["Ethical Dilemma Generator"] = "Pose an interesting ethical dilemma related to the topic: '{dilemma_topic}'. Provide a brief scenario."
-    templates["SWOT Analysis Generator"] = "Generate a basic SWOT (Strengths, Weaknesses, Opportunities, Threats) analysis for the following idea or topic: '{swot_topic}'."
-    templates["Acronym Explainer"] = "Explain what the acronym '{acronym_to_explain}' stands for and briefly describe its meaning or context."
-
-    # Adding 20 NEW serious, student-focused templates to reach 35 total in Misc tab
-    templates["Essay Outline Generator"] = "Generate a structured outline for an essay on the topic: '{essay_topic}'. Include sections for Introduction, Body Paragraphs (suggesting 3-5 main points), and Conclusion."
-    templates["Study Plan Creator (Daily/Weekly)"] = "Create a simple {timeframe} study plan for the topic '{study_topic}'. Suggest key areas to focus on and allocate time slots." # timeframe: 'daily' or 'weekly'
-    templates["Concept Mapping (Text-based)"] = "Generate a text-based concept map structure for the topic: '{concept_map_topic}'. Start with the central concept and branch out to related sub-concepts and details using indentation and bullet points."
-    templates["Research Question Refiner"] = "Refine the following initial research question to make it more focused, specific, and researchable: '{initial_research_question}'."
-    templates["Abstract Generator"] = "Write a concise abstract (approx. 150-250 words) for a paper or study on the topic: '{abstract_topic}'. Include brief mention of purpose, methods (if applicable), key findings, and conclusion."
-    templates["Literature Review Outline Generator"] = "Generate a structured outline for a literature review on the topic: '{lit_review_topic}'. Include sections for Introduction, Thematic Analysis (suggesting key themes), Discussion, and Conclusion."
-    templates["Problem Solving Steps Generator"] = "Outline the general steps involved in solving a problem related to: '{problem_domain}'. Provide a structured approach."
-    templates["Critical Thinking Prompt Generator"] = "Generate 3-5 critical thinking questions or prompts related to the topic: '{critical_thinking_topic}'."
-    templates["Study Group Discussion Questions"] = "Generate 5-7 discussion questions suitable for a study group focusing on the topic: '{study_group_topic}'."
-    templates["Exam Question Predictor"] = "Based on the topic '{exam_topic}', suggest 3-5 potential exam questions (e.g., essay, short answer) that might be asked."
-    templates["Academic Terminology Explainer"] = "Explain the academic term '{academic_term}' in detail, providing its definition, context, and usage examples."
-    templates["Historical Context Generator"] = "Provide the key historical context surrounding the event or person: '{historical_subject}'. Briefly explain the relevant time period, major influences, and immediate aftermath."
-    templates["Scientific Process Outline"] = "Outline the typical steps of the scientific process as applied to studying: '{scientific_topic}'."
-    templates["Mathematical Concept Explainer"] = "Explain the mathematical concept '{math_concept}' in clear terms, including its definition, key properties, and a simple example."
-    templates["Grammar/Style Checker (Basic)"] = "Review the following text for basic grammar errors, awkward phrasing, and suggestions for improving clarity and conciseness. Provide specific suggestions for improvement. Text: '{text_to_check}'."
-    templates["Paraphrasing Tool (Academic)"] = "Paraphrase the following text in an academic style, ensuring the original meaning is retained but the wording is significantly different. Original text: '{text_to_paraphrase}'."
-    templates["Counter-Argument Generator"] = "For the argument '{main_argument}', generate 2-3 potential counter-arguments or opposing viewpoints."
-    templates["Hypothesis Generator"] = "Based on the topic or observation '{observation_or_topic}', suggest 1-2 testable hypotheses for a study or experiment."
-    templates["Data Interpretation Helper"] = "Given the following simple data description or observation: '{data_description}', provide a brief interpretation or suggest what it might imply."
-    templates["Learning Objective Generator"] = "Generate 3-5 clear and measurable learning objectives for a lesson or study session on the topic: '{learning_topic}'."
-
-    # Adding 10 NEW advanced, serious, student/professional-focused templates (41-50)
-    templates["Argumentative Essay Component Generator"] = "For an argumentative essay on the topic: '{essay_topic}', generate a strong {component_type} (e.g., Thesis Statement, Counter-Argument, Rebuttal, Supporting Point with evidence). Be specific and well-reasoned."
-    templates["Research Methodology Suggester"] = "For a research study in the field of '{field_of_study}' addressing the research question/problem: '{research_question}', suggest 2-3 appropriate research methodologies. Briefly explain the suitability and limitations of each."
-    templates["Data Analysis Plan Outline"] = "Outline a detailed data analysis plan for a study with the primary objective: '{research_objective}', expecting to work with {data_type} data (e.g., quantitative survey data, qualitative interview transcripts, mixed-methods). Include key steps from data preparation/cleaning, descriptive analysis, inferential analysis (if applicable), to interpretation and reporting."
-    templates["Grant Proposal Snippet Generator"] = "Draft a compelling and concise snippet for the '{target_section}' section (e.g., Problem Statement, Project Objectives, Expected Outcomes, Broader Impacts) of a grant proposal for a project focused on: '{project_idea}'. Aim for clarity, impact, and alignment with typical grant requirements."
-    templates["Peer Review Feedback Generator (Constructive)"] = "Provide constructive and actionable peer review feedback on the following academic text snippet, focusing specifically on '{focus_area}' (e.g., clarity of argument, methodological rigor, literature engagement, contribution to knowledge). Offer 3-4 specific suggestions for improvement. Text: '{text_for_review}'"
-    templates["Presentation Script Outline Generator"] = "Create a structured and engaging outline for a {length} (e.g., 15-minute, 30-minute, 1-hour) academic or professional presentation on the topic: '{presentation_topic}'. The target audience is '{target_audience}'. Include sections for Introduction (hook, agenda), Key Talking Points (with sub-points and suggested visuals/examples), and Conclusion (summary, call to action, Q&A)."
-    templates["Technical Document Explainer (Advanced)"] = "Explain the following complex technical document snippet in terms understandable for a '{explanation_level}' (e.g., non-technical manager, junior engineer in a different field, subject matter expert needing a refresher). Focus on its core technical meaning, operational implications, and potential challenges or benefits. Snippet: '{technical_snippet}'"
-    templates["Case Study Creator (from scenario)"] = "Based on the following detailed scenario or problem description, structure a comprehensive case study. Identify the core problem/challenge, relevant background and context, key stakeholders and their perspectives, critical decisions or events, and formulate 3-5 insightful discussion questions for analysis. Scenario: '{scenario_description}'"
-    templates["Syllabus Component Generator (Advanced)"] = "For a university-level course titled '{course_title}', draft a detailed and pedagogically sound '{component_type}' section of a syllabus (e.g., Detailed Weekly Schedule with Readings, Comprehensive Assessment Strategy with Rubric Criteria, Policy on Academic Integrity with Examples, Inclusive Learning Environment Statement). Ensure it is clear, comprehensive, and aligns with best practices in higher education."
-    templates["Ethical Review Considerations Lister (Research)"] = "For a research project proposal focused on '{research_proposal_idea}', identify and elaborate on 4-6 key ethical considerations that would need to be thoroughly addressed in an Institutional Review Board (IRB) or ethics committee application. For each consideration, explain why it's relevant and suggest how it might be mitigated or managed."
-    return templates
-
-# Function to generate content with AI
-def generate_ai_content(prompt, api_key, model_name, temperature, detail_level, style_params):
+# Function to generate content with AI, writing the text to the page as it streams in; returns the full text
+# (errors are returned as "Error: ..." text, like generate_ai_content)
+def stream_ai_content_to_page(prompt, api_key, model_name, temperature, detail_level, style_params, tool_name=None):
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(model_name)
-        
-        with st.spinner("🔮 AI is working its magic..."):
-            # Adjust max tokens based on detail level
-            max_tokens = {
-                "Brief": 2048,
-                "Standard": 4096, 
-                "Comprehensive": 8192,
-                "Expert": 8192
-            }
-            
-            # Apply style adjustments to prompt
-            style_prefix = f"Using {style_params['tone']} tone and {style_params['language_style']} language style, "
-            enhanced_prompt = style_prefix + prompt
-            
-            generation_config = {
-                "temperature": temperature,
-                "top_p": 0.95,
-                "top_k": 40,
-                "max_output_tokens": max_tokens[detail_level]
-            }
-            
-            response = model.generate_content(enhanced_prompt, generation_config=generation_config)
-            return response.text
+        return st.write_stream(stream_content(prompt, api_key, model_name, temperature, detail_level, style_params,
+                                              tool_name=tool_name, **generation_options))
     except Exception as e:
         return f"Error: {str(e)}"
 
+# --- Local fast-path tool engine ---
+# Misc. tools listed in LOCAL_TOOL_HANDLERS are answered by a local algorithm first (no network,
+# no API cost). A handler returns None when it can't answer, which falls through to the AI.
+# Users can still escalate a local answer with "Enhance with AI".
+STOPWORDS = set("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each etc few for from further had has have
+having he her here hers herself him himself his how however i if in into is it its itself just like may
+me might more most must my myself no nor not now of off on once only or other our ours ourselves out over
+own same she should so some such than that the their theirs them themselves then there these they this
+those through to too under until up upon us very via was we were what when where which while who whom
+why will with within without would you your yours yourself yourselves
+""".split())
+
+COMMON_ACRONYMS = {
+    "AI": ("Artificial Intelligence", "the field of building computer systems that perform tasks normally requiring human intelligence."),
+    "API": ("Application Programming Interface", "a defined contract that lets one piece of software request services or data from another."),
+    "ASAP": ("As Soon As Possible", "an informal request for urgency."),
+    "ATM": ("Automated Teller Machine", "a machine that lets bank customers withdraw cash and make transactions without a teller."),
+    "CEO": ("Chief Executive Officer", "the highest-ranking executive responsible for an organization's overall direction."),
+    "CPU": ("Central Processing Unit", "the main processor that executes a computer's instructions."),
+    "CSS": ("Cascading Style Sheets", "the language used to describe the presentation of web pages."),
+    "DIY": ("Do It Yourself", "building or repairing things yourself rather than hiring a professional."),
+    "DNA": ("Deoxyribonucleic Acid", "the molecule that carries the genetic instructions of living organisms."),
+    "DNS": ("Domain Name System", "the internet's directory that translates domain names into IP addresses."),
+    "ETA": ("Estimated Time of Arrival", "the expected time something or someone will arrive."),
+    "EU": ("European Union", "a political and economic union of European member states."),
+    "FAQ": ("Frequently Asked Questions", "a list of common questions with their answers."),
+    "FYI": ("For Your Information", "an informal way of sharing information that may be useful."),
+    "GDP": ("Gross Domestic Product", "the total market value of goods and services produced in a country in a given period."),
+    "GPA": ("Grade Point Average", "a numerical summary of a student's academic performance."),
+    "GPS": ("Global Positioning System", "a satellite-based system for determining location and time."),
+    "GPU": ("Graphics Processing Unit", "a processor specialised for parallel computation, originally for rendering graphics."),
+    "HTML": ("HyperText Markup Language", "the standard markup language for structuring web pages."),
+    "HTTP": ("HyperText Transfer Protocol", "the protocol used to transfer web pages and data on the web."),
+    "HTTPS": ("HyperText Transfer Protocol Secure", "HTTP encrypted with TLS for secure communication."),
+    "IOT": ("Internet of Things", "the network of everyday physical devices connected to the internet."),
+    "IP": ("Internet Protocol", "the protocol that addresses and routes packets across networks (also: Intellectual Property)."),
+    "JSON": ("JavaScript Object Notation", "a lightweight text format for structured data."),
+    "KPI": ("Key Performance Indicator", "a measurable value that shows how effectively objectives are being achieved."),
+    "LASER": ("Light Amplification by Stimulated Emission of Radiation", "a device that emits a narrow, coherent beam of light."),
+    "LLM": ("Large Language Model", "a neural network trained on large text corpora to understand and generate language."),
+    "MBA": ("Master of Business Administration", "a graduate degree in business management."),
+    "ML": ("Machine Learning", "a branch of AI where systems learn patterns from data rather than explicit rules."),
+    "NASA": ("National Aeronautics and Space Administration", "the United States government agency responsible for the civilian space program and aerospace research."),
+    "NATO": ("North Atlantic Treaty Organization", "a military alliance of North American and European countries."),
+    "NLP": ("Natural Language Processing", "the field of AI concerned with understanding and generating human language."),
+    "OS": ("Operating System", "the software that manages computer hardware and provides services to programs."),
+    "PDF": ("Portable Document Format", "a file format that preserves document layout across devices."),
+    "PHD": ("Doctor of Philosophy", "the highest academic degree awarded for original research."),
+    "PIN": ("Personal Identification Number", "a numeric code used to authenticate a user."),
+    "RADAR": ("Radio Detection and Ranging", "a system that uses radio waves to detect objects and measure their distance and speed."),
+    "RAM": ("Random Access Memory", "a computer's fast, temporary working memory."),
+    "RNA": ("Ribonucleic Acid", "a molecule that carries genetic information and helps synthesize proteins."),
+    "ROI": ("Return on Investment", "a ratio comparing the gain from an investment to its cost."),
+    "SAAS": ("Software as a Service", "software delivered over the internet on a subscription basis."),
+    "SCUBA": ("Self-Contained Underwater Breathing Apparatus", "equipment that lets divers breathe underwater."),
+    "SQL": ("Structured Query Language", "the standard language for querying and managing relational databases."),
+    "STEM": ("Science, Technology, Engineering and Mathematics", "the group of academic disciplines in these four fields."),
+    "TCP": ("Transmission Control Protocol", "a protocol that provides reliable, ordered delivery of data over IP networks."),
+    "UI": ("User Interface", "the visual and interactive parts of software that users work with."),
+    "UN": ("United Nations", "an international organization that promotes peace and cooperation among countries."),
+    "UNESCO": ("United Nations Educational, Scientific and Cultural Organization", "the UN agency for education, science and culture."),
+    "URL": ("Uniform Resource Locator", "the address of a resource on the web."),
+    "USB": ("Universal Serial Bus", "a standard for connecting and powering peripheral devices."),
+    "UX": ("User Experience", "how a person feels and performs when using a product."),
+    "VPN": ("Virtual Private Network", "an encrypted connection that extends a private network over the internet."),
+    "WHO": ("World Health Organization", "the UN agency responsible for international public health."),
+    "XML": ("Extensible Markup Language", "a markup language for encoding structured documents and data."),
+}
+
+# Function to extract ranked key phrases with RAKE (Rapid Automatic Keyword Extraction)
+def extract_keyphrases(text, max_phrases=7):
+    phrases = []
+    for fragment in re.split(r"[.!?,;:()\[\]{}\"“”‘’\n\r\t|/]+", text.lower()):
+        current = []
+        for word in re.findall(r"[a-z0-9][a-z0-9+'-]*", fragment):
+            if word in STOPWORDS or (len(word) < 3 and not word.isdigit()):
+                if current:
+                    phrases.append(current)
+                current = []
+            else:
+                current.append(word)
+        if current:
+            phrases.append(current)
+
+    frequency, degree = Counter(), Counter()
+    for phrase in phrases:
+        for word in phrase:
+            frequency[word] += 1
+            degree[word] += len(phrase)
+
+    scores = {}
+    for phrase in phrases:
+        if len(phrase) > 4: # Very long runs are rarely useful key phrases
+            continue
+        scores[" ".join(phrase)] = sum(degree[word] / frequency[word] for word in phrase)
+    ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+    return [phrase for phrase, score in ranked[:max_phrases]]
+
+# Local fast path: Keyword Extractor
+def local_keyword_extractor(text_for_keywords):
+    keyphrases = extract_keyphrases(text_for_keywords)
+    if len(keyphrases) < 3: # Too little text for a useful local answer
+        return None
+    return "\n".join(f"- {phrase}" for phrase in keyphrases)
+
+# Local fast path: Hashtag Generator (keyword-based)
+def local_hashtags(post_topic_or_text):
+    keyphrases = extract_keyphrases(post_topic_or_text, max_phrases=15)
+    # Hashtags read best as one or two words, so long phrases contribute their words individually
+    candidates = [phrase for phrase in keyphrases if len(phrase.split()) <= 2]
+    candidates += [word for phrase in keyphrases if len(phrase.split()) > 2 for word in phrase.split()]
+    hashtags = []
+    for phrase in candidates:
+        tag = "#" + "".join(word.capitalize() for word in re.findall(r"[a-z0-9]+", phrase))
+        if len(tag) > 2 and tag not in hashtags:
+            hashtags.append(tag)
+    if not hashtags:
+        return None
+    return " ".join(hashtags[:7])
+
+# Local fast path: Secure Password Idea Generator (cryptographically random, never sent anywhere)
+def local_password_ideas(length, char_types_count):
+    pools = [string.ascii_lowercase, string.ascii_uppercase, string.digits, "!@#$%^&*-_=+?"][:int(char_types_count)]
+    alphabet = "".join(pools)
+    suggestions = []
+    for _ in range(3):
+        chars = [secrets.choice(pool) for pool in pools] # At least one of every required type
+        chars += [secrets.choice(alphabet) for _ in range(int(length) - len(chars))]
+        secrets.SystemRandom().shuffle(chars)
+        suggestions.append("".join(chars))
+    type_names = ["lowercase letters", "uppercase letters", "numbers", "symbols"][:int(char_types_count)]
+    lines = [f"Random {length}-character examples using {', '.join(type_names)}:"]
+    lines += [f"- `{suggestion}`" for suggestion in suggestions]
+    lines += [
+        "",
+        "Ways to build your own:",
+        f"- **Random generator:** let a password manager create a {length}+ character password like the ones above and store it for you.",
+        "- **Passphrase:** join 4-6 unrelated random words with symbols or numbers between them (e.g. word-7-word-!-word).",
+        "- **Never reuse:** use a different password for every account and enable two-factor authentication where possible."
+    ]
+    return "\n".join(lines)
+
+# Local fast path: Acronym Explainer for common acronyms
+def local_acronym(acronym_to_explain):
+    key = re.sub(r"[^A-Za-z0-9]", "", acronym_to_explain).upper()
+    if key not in COMMON_ACRONYMS:
+        return None
+    expansion, meaning = COMMON_ACRONYMS[key]
+    return f"**{key}** stands for **{expansion}**: {meaning}"
+
+# Local fast path: Rhyme Finder (needs the optional `pronouncing` package)
+def local_rhymes(word_for_rhyme):
+    if pronouncing is None:
+        return None
+    rhymes = sorted(set(pronouncing.rhymes(word_for_rhyme.strip().lower())))
+    if not rhymes:
+        return None
+    return ", ".join(rhymes[:30])
+
+LOCAL_TOOL_HANDLERS = {
+    "Keyword Extractor": local_keyword_extractor,
+    "Hashtag Generator": local_hashtags,
+    "Secure Password Idea Generator": local_password_ideas,
+    "Acronym Explainer": local_acronym,
+    "Rhyme Finder": local_rhymes,
+}
+
+# Function to run a tool's local implementation, if it has one (None means "ask the AI")
+def run_local_tool(tool_name, format_args):
+    handler = LOCAL_TOOL_HANDLERS.get(tool_name)
+    if handler is None:
+        return None
+    try:
+        return handler(**format_args)
+    except Exception:
+        return None
+
+# Function to run a Misc. tool local-first, escalating to the AI when needed (or when use_ai=True)
+def run_tool(tool_name, format_args, temperature, detail_level, style_params, use_ai=False):
+    output = None if use_ai else run_local_tool(tool_name, format_args)
+    source = "local"
+    if output is None:
+        if not st.session_state.api_key:
+            st.error("API key required.")
+            return None
+        prompt = templates[tool_name].format(**format_args)
+        output = generate_ai_content(prompt, st.session_state.api_key, model_name, temperature, detail_level, style_params, tool_name=tool_name)
+        source = "ai"
+    st.session_state.local_tool_results[tool_name] = {
+        "args": format_args, "output": output, "source": source,
+        "ai_params": (temperature, detail_level, style_params)
+    }
+    return output
+
+# Function to display a tool's last result, with an "Enhance with AI" escalation for local results
+def show_tool_result(tool_name, heading=None):
+    result = st.session_state.local_tool_results.get(tool_name)
+    if not result:
+        return
+    if heading:
+        st.markdown(heading)
+    st.markdown(result["output"])
+    if result["source"] == "local":
+        st.caption("⚡ Computed locally (no API call)")
+        if st.button("✨ Enhance with AI", key=f"enhance_with_ai_{tool_name}"):
+            temperature, detail_level, style_params = result["ai_params"]
+            run_tool(tool_name, result["args"], temperature, detail_level, style_params, use_ai=True)
+            st.rerun()
+
+# --- Local citation engine ---
+# Structured sources (BibTeX, RIS, CSL-JSON, "key: value" metadata and simple "Author, Title, Year"
+# lines) are parsed into CSL-like records and formatted locally. Only snippets that can't be
+# parsed are sent to the AI, all together in one request.
+CITATION_STYLES = ["APA", "MLA", "Chicago", "Harvard"]
+NAME_PARTICLES = {"van", "von", "de", "der", "den", "del", "della", "di", "da", "du", "la", "le", "bin", "al"}
+BIBTEX_TYPES = {"article": "article", "book": "book", "inbook": "chapter", "incollection": "chapter",
+                "inproceedings": "chapter", "conference": "chapter", "online": "webpage", "webpage": "webpage"}
+RIS_TYPES = {"JOUR": "article", "JFULL": "article", "MGZN": "article", "NEWS": "article", "BOOK": "book",
+             "CHAP": "chapter", "CONF": "chapter", "CPAPER": "chapter", "ELEC": "webpage", "WEB": "webpage"}
+METADATA_KEYS = {
+    "author": "authors", "authors": "authors", "title": "title", "year": "year", "date": "year",
+    "published": "year", "journal": "container", "container-title": "container", "container": "container",
+    "booktitle": "container", "website": "container", "volume": "volume", "issue": "issue", "number": "issue",
+    "pages": "pages", "page": "pages", "publisher": "publisher", "doi": "doi", "url": "url", "type": "type"
+}
+
+# Function to split one author name into family and given parts
+def parse_person_name(name):
+    name = re.sub(r"\s+", " ", name).strip().strip(",")
+    if not name:
+        return None
+    if "," in name:
+        family, given = [part.strip() for part in name.split(",", 1)]
+        return {"family": family, "given": given}
+    parts = name.split(" ")
+    if len(parts) == 1:
+        return {"family": parts[0], "given": ""}
+    if re.fullmatch(r"(?:[A-Z]\.?){1,3}", parts[-1]): # "Smith JR" style: initials come last
+        return {"family": " ".join(parts[:-1]), "given": parts[-1]}
+    split_at = len(parts) - 1
+    while split_at > 1 and parts[split_at - 1].lower() in NAME_PARTICLES:
+        split_at -= 1
+    return {"family": " ".join(parts[split_at:]), "given": " ".join(parts[:split_at])}
+
+# Function to split an author list ("A and B", "A; B", "A & B") into names
+def parse_author_list(text):
+    names = re.split(r"\s+and\s+|\s*;\s*|\s+&\s+", text.strip())
+    return [person for person in (parse_person_name(name) for name in names) if person]
+
+# Function to clean a field value (BibTeX braces, extra whitespace)
+def clean_citation_field(value):
+    return re.sub(r"\s+", " ", str(value).replace("{", "").replace("}", "")).strip()
+
+# Function to build a citation record from loosely named fields
+def make_citation_record(fields, default_type="misc"):
+    record = {"type": default_type, "authors": []}
+    for key, value in fields.items():
+        target = METADATA_KEYS.get(key.strip().lower())
+        if not target or not value:
+            continue
+        if target == "authors":
+            record["authors"] += value if isinstance(value, list) else parse_author_list(clean_citation_field(value))
+        elif target == "year":
+            year_match = re.search(r"\b(1[5-9]\d\d|20\d\d)\b", str(value))
+            if year_match:
+                record["year"] = year_match.group(1)
+        else:
+            record[target] = clean_citation_field(value)
+    if record["type"] == "misc":
+        if record.get("container") and (record.get("volume") or record.get("doi")):
+            record["type"] = "article"
+        elif record.get("publisher"):
+            record["type"] = "book"
+        elif record.get("url"):
+            record["type"] = "webpage"
+    return record if record.get("title") else None
+
+# Function to parse the "name = {value}" fields of one BibTeX entry
+def parse_bibtex_fields(text):
+    fields = {}
+    i = 0
+    while i < len(text):
+        match = re.compile(r"\s*,?\s*([\w-]+)\s*=\s*").match(text, i)
+        if not match:
+            break
+        name, i = match.group(1).lower(), match.end()
+        if i < len(text) and text[i] in "{\"":
+            closing = "}" if text[i] == "{" else "\""
+            depth, start = 1, i + 1
+            i += 1
+            while i < len(text) and depth:
+                if text[i] == "{" and closing == "}":
+                    depth += 1
+                elif text[i] == closing and (closing == "}" or text[i - 1] != "\\\\"):
+                    depth -= 1
+                i += 1
+            fields[name] = text[start:i - 1]
+        else:
+            bare = re.compile(r"[^,\s]+").match(text, i)
+            if not bare:
+                break
+            fields[name] = bare.group(0)
+            i = bare.end()
+    return fields
+
+# Function to find BibTeX entries; returns (start, end, record) spans
+def parse_bibtex_entries(text):
+    entries = []
+    for match in re.finditer(r"@(\w+)\s*\{", text):
+        entry_type = match.group(1).lower()
+        depth, i = 1, match.end()
+        while i < len(text) and depth:
+            if text[i] == "{":
+                depth += 1
+            elif text[i] == "}":
+                depth -= 1
+            i += 1
+        if entry_type in ("comment", "preamble", "string"):
+            continue
+        fields = parse_bibtex_fields(text[match.end():i - 1].partition(",")[2])
+        if "journaltitle" in fields:
+            fields["journal"] = fields.pop("journaltitle")
+        if "author" in fields:
+            fields["author"] = parse_author_list(clean_citation_field(fields["author"]))
+        record = make_citation_record(fields, BIBTEX_TYPES.get(entry_type, "misc"))
+        entries.append((match.start(), i, record))
+    return entries
+
+# Function to find RIS records; returns (start, end, record) spans
+def parse_ris_entries(text):
+    entries = []
+    for match in re.finditer(r"^TY  - .*?^ER  -[^\n]*", text, re.MULTILINE | re.DOTALL):
+        fields, authors, start_page, end_page, ris_type = {}, [], "", "", "misc"
+        for tag, value in re.findall(r"^([A-Z][A-Z0-9])  - ?(.*)$", match.group(0), re.MULTILINE):
+            value = value.strip()
+            if tag == "TY":
+                ris_type = RIS_TYPES.get(value, "misc")
+            elif tag in ("AU", "A1", "A2") and value:
+                authors.append(parse_person_name(value))
+            elif tag in ("TI", "T1") and "title" not in fields:
+                fields["title"] = value
+            elif tag in ("PY", "Y1", "DA") and "year" not in fields:
+                fields["year"] = value
+            elif tag in ("JO", "JF", "T2", "BT") and "journal" not in fields:
+                fields["journal"] = value
+            elif tag == "SP":
+                start_page = value
+            elif tag == "EP":
+                end_page = value
+            else:
+                ris_fields = {"VL": "volume", "IS": "issue", "PB": "publisher", "DO": "doi", "UR": "url"}
+                if tag in ris_fields:
+                    fields[ris_fields[tag]] = value
+        fields["author"] = [author for author in authors if author]
+        if start_page:
+            fields["pages"] = f"{start_page}-{end_page}" if end_page else start_page
+        entries.append((match.start(), match.end(), make_citation_record(fields, ris_type)))
+    return entries
+
+# Function to read CSL-JSON (e.g. from DOI content negotiation) into records
+def parse_csl_json(text):
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    items = data if isinstance(data, list) else [data]
+    records = []
+    for item in items:
+        if not isinstance(item, dict):
+            return None
+        fields = {key: item.get(key) for key in ("title", "container-title", "volume", "issue", "page", "publisher", "DOI", "URL")}
+        fields = {key.lower(): (value[0] if isinstance(value, list) and value else value) for key, value in fields.items()}
+        date_parts = (item.get("issued") or {}).get("date-parts") or [[None]]
+        fields["year"] = str(date_parts[0][0] or "")
+        fields["author"] = [{"family": a.get("family", a.get("literal", "")), "given": a.get("given", "")} for a in item.get("author", [])]
+        csl_type = item.get("type", "")
+        record_type = "article" if "article" in csl_type else "book" if csl_type == "book" else "chapter" if "chapter" in csl_type or "paper-conference" in csl_type else "misc"
+        records.append(make_citation_record(fields, record_type))
+    return records
+
+# Function to parse a "Author, Title, Year" line
+def parse_simple_citation_line(line):
+    parts = [part.strip() for part in line.strip().rstrip(".").split(",")]
+    if len(parts) < 3:
+        return None
+    year_match = re.fullmatch(r"\(?(1[5-9]\d\d|20\d\d)\)?", parts[-1])
+    if not year_match:
+        return None
+    title = ", ".join(parts[1:-1]).strip("\"'“”")
+    authors = parse_author_list(parts[0])
+    if not title or not authors:
+        return None
+    return {"type": "misc", "authors": authors, "title": title, "year": year_match.group(1)}
+
+# Function to parse a pasted source list; returns (records, unparsed snippets)
+def parse_citation_sources(text):
+    records, unparsed, spans = [], [], []
+    for start, end, record in parse_bibtex_entries(text) + parse_ris_entries(text):
+        spans.append((start, end))
+        if record:
+            records.append(record)
+        else:
+            unparsed.append(text[start:end].strip())
+    remaining = text
+    for start, end in sorted(spans, reverse=True):
+        remaining = remaining[:start] + "\n\n" + remaining[end:]
+
+    if remaining.strip().startswith(("{", "[")):
+        csl_records = parse_csl_json(remaining.strip())
+        if csl_records is not None:
+            return records + [record for record in csl_records if record], unparsed
+
+    for block in re.split(r"\n\s*\n", remaining):
+        lines = [line.strip() for line in block.splitlines() if line.strip()]
+        key_values = [re.match(r"^([A-Za-z][\w -]*?)\s*:\s*(.+)$", line) for line in lines]
+        if len(lines) >= 2 and all(key_values) and any(m.group(1).strip().lower() == "title" for m in key_values):
+            fields = {}
+            for m in key_values:
+                key = m.group(1).strip().lower()
+                if key in ("author", "authors") and key in fields:
+                    fields[key] += " and " + m.group(2) # One author per line
+                else:
+                    fields[key] = m.group(2)
+            record = make_citation_record(fields)
+            if record:
+                records.append(record)
+            else:
+                unparsed.append(block.strip())
+            continue
+        for line in lines:
+            record = parse_simple_citation_line(line)
+            if record:
+                records.append(record)
+            else:
+                unparsed.append(line)
+    return records, unparsed
+
+# Function to turn given names into initials ("John Ronald" -> "J. R.", "Jean-Paul" -> "J.-P.")
+def name_initials(given):
+    initials = []
+    for part in re.split(r"[\s.]+", given):
+        if part:
+            initials.append("-".join(piece[0].upper() + "." for piece in part.split("-") if piece))
+    return " ".join(initials)
+
+# Function to add a closing period unless the text already ends with punctuation
+def end_sentence(text):
+    text = text.strip()
+    return text if not text or text[-1] in ".?!" else text + "."
+
+# Function to format the author list of a record for a citation style
+def format_citation_authors(authors, style):
+    if not authors:
+        return ""
+    full_names = [f"{a['given']} {a['family']}".strip() for a in authors]
+    inverted_first = f"{authors[0]['family']}, {authors[0]['given']}".strip(", ")
+    if style == "APA":
+        names = [f"{a['family']}, {name_initials(a['given'])}".strip(", ") for a in authors]
+        if len(names) == 1:
+            return names[0]
+        if len(names) <= 20:
+            return ", ".join(names[:-1]) + ", & " + names[-1]
+        return ", ".join(names[:19]) + ", . . . " + names[-1]
+    if style == "Harvard":
+        names = [f"{a['family']}, {name_initials(a['given']).replace(' ', '')}".strip(", ") for a in authors]
+        if len(names) == 1:
+            return names[0]
+        if len(names) <= 3:
+            return ", ".join(names[:-1]) + " and " + names[-1]
+        return names[0] + " et al."
+    if style == "MLA":
+        if len(authors) == 1:
+            return inverted_first
+        if len(authors) == 2:
+            return f"{inverted_first}, and {full_names[1]}"
+        return f"{inverted_first}, et al."
+    # Chicago (notes-bibliography)
+    if len(authors) == 1:
+        return inverted_first
+    if len(authors) > 10:
+        return ", ".join([inverted_first] + full_names[1:7]) + ", et al."
+    return ", ".join([inverted_first] + full_names[1:-1]) + ", and " + full_names[-1]
+
+# Function to format one record as a citation (markdown italics unless as_markdown=False)
+def format_citation(record, style, as_markdown=True):
+    italic = (lambda text: f"*{text}*") if as_markdown else (lambda text: text)
+    authors = format_citation_authors(record.get("authors", []), style)
+    title = record["title"].rstrip(".")
+    year = record.get("year", "")
+    container = record.get("container", "")
+    volume, issue = record.get("volume", ""), record.get("issue", "")
+    pages = record.get("pages", "").replace("--", "–").replace("-", "–")
+    publisher = record.get("publisher", "")
+    doi = re.sub(r"^(https?://(dx\.)?doi\.org/|doi:\s*)", "", record.get("doi", ""), flags=re.IGNORECASE)
+    link = f"https://doi.org/{doi}" if doi else record.get("url", "")
+    is_container_item = record.get("type") in ("article", "chapter") and container
+    parts = []
+
+    if style == "APA":
+        styled_title = end_sentence(title) if is_container_item else end_sentence(italic(title))
+        if authors:
+            parts += [end_sentence(authors) + f" ({year or 'n.d.'}).", styled_title]
+        else: # With no author the title moves into the author position
+            parts.append(f"{styled_title} ({year or 'n.d.'}).")
+        if is_container_item:
+            source = italic(container)
+            if volume:
+                source += ", " + italic(volume) + (f"({issue})" if issue else "")
+            if pages:
+                source += f", {pages}"
+            parts.append(end_sentence(source))
+        elif publisher:
+            parts.append(end_sentence(publisher))
+    elif style == "MLA":
+        if authors:
+            parts.append(end_sentence(authors))
+        if is_container_item:
+            parts.append(f"\"{end_sentence(title)}\"")
+            source = [italic(container)]
+            source += [f"vol. {volume}"] if volume else []
+            source += [f"no. {issue}"] if issue else []
+            source += [year] if year else []
+            source += [f"pp. {pages}"] if pages else []
+            parts.append(end_sentence(", ".join(source)))
+        else:
+            parts.append(end_sentence(italic(title)))
+            parts.append(end_sentence(", ".join(item for item in (publisher, year) if item)))
+    elif style == "Chicago":
+        if authors:
+            parts.append(end_sentence(authors))
+        if is_container_item:
+            parts.append(f"\"{end_sentence(title)}\"")
+            source = italic(container) + (f" {volume}" if volume else "") + (f", no. {issue}" if issue else "")
+            source += f" ({year})" if year else ""
+            source += f": {pages}" if pages else ""
+            parts.append(end_sentence(source))
+        else:
+            parts.append(end_sentence(italic(title)))
+            parts.append(end_sentence(", ".join(item for item in (publisher, year) if item)))
+    else: # Harvard
+        parts.append(f"{authors or italic(title)} ({year or 'n.d.'})")
+        if is_container_item:
+            source = f"'{title}', {italic(container)}"
+            if volume:
+                source += f", {volume}" + (f"({issue})" if issue else "")
+            if pages:
+                source += f", pp. {pages}"
+            parts.append(end_sentence(source))
+        else:
+            if authors:
+                parts.append(end_sentence(italic(title)))
+            if publisher:
+                parts.append(end_sentence(publisher))
+
+    if link:
+        parts.append(link if style != "Harvard" else f"doi:{doi}" if doi else f"Available at: {link}")
+    return re.sub(r"\s+", " ", " ".join(part for part in parts if part.strip(" ."))).strip()
+
+# Function to format a whole bibliography; returns (markdown citations, plain-text citations, unparsed snippets)
+def format_bibliography(text, style):
+    records, unparsed = parse_citation_sources(text)
+    pairs = [(format_citation(record, style), format_citation(record, style, as_markdown=False)) for record in records]
+    pairs.sort(key=lambda pair: pair[1].lstrip("\"'").lower()) # Alphabetical, like every style here
+    return [pair[0] for pair in pairs], [pair[1] for pair in pairs], unparsed
+
 # Function to save content to history
 def save_to_history(tool_name, topic, output, favorite=False):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    item = {"timestamp": timestamp, "tool": tool_name, "topic": topic, "output": output, "favorite": favorite}
+    output = load_text(output) # Callers may pass a spilled handle or note reference
+    # The body goes to the note store; the latest note for the same topic and tool is the delta base
+    base_ref = next((h["output"] for h in st.session_state.history if h["tool"] == tool_name and h["topic"] == topic), None)
+    try:
+        output_ref = put_note(output, base_ref)
+        if favorite:
+            retain_note(output_ref) # The favorites entry holds the body too
+    except Exception as e:
+        routing_logger.warning("Note store unavailable, keeping the note in the session: %s", e)
+        output_ref = spill_large_text(output)
+    item = {"timestamp": timestamp, "tool": tool_name, "topic": topic, "output": output_ref, "favorite": favorite}
     
     st.session_state.history.insert(0, item)
-    if len(st.session_state.history) > 30:
+    record_note(st.session_state.analytics, tool_name)
+    if len(st.session_state.history) > 30: # Trimmed entries release their note bodies
+        release_entry_notes(st.session_state.history[30:])
         st.session_state.history = st.session_state.history[:30]
     
     if favorite:
         st.session_state.favorites.insert(0, item)
         if len(st.session_state.favorites) > 20:
+            release_entry_notes(st.session_state.favorites[20:])
             st.session_state.favorites = st.session_state.favorites[:20]
+    mark_user_data_dirty("history", "analytics", *(["favorites"] if favorite else []))
+
+# New function to create spaced repetition cards (cards_text lets a prefetched response be reused)
+def create_spaced_repetition(content, topic, api_key, model_name, cards_text=None):
+    if cards_text is None:
+        cards_text = generate_spaced_repetition_text(content, api_key, model_name, **generation_options)
+    cards = [new_spaced_repetition_card(topic, question, answer) for question, answer in parse_spaced_repetition_cards(cards_text)]
+    add_spaced_repetition_cards(cards)
+    return len(cards)
 
-# Function to export notes
-def export_notes(content, format="txt"):
-    if format == "txt":
-        return content
-    elif format == "md":
-        # The content from Gemini is often already markdown-like.
-        return content
-    elif format == "csv":
-        lines = content.split('\n')
-        csv_output_lines = []
-        for line in lines:
-            # Remove common markdown list/block prefixes
-            cleaned_line = re.sub(r'^\s*[-*#>]+\s*', '', line).strip()
-            if cleaned_line: # Only process non-empty lines
-                # Escape double quotes
-                cleaned_line_csv = cleaned_line.replace('"', '""')
-                # Enclose in double quotes if it contains a comma, a double quote, or needs it
-                if ',' in cleaned_line_csv or '"' in cleaned_line_csv or ' ' in cleaned_line_csv or '\n' in cleaned_line_csv:
-                    csv_output_lines.append(f'"{cleaned_line_csv}"')
-                else:
-                    csv_output_lines.append(cleaned_line_csv)
-        return '\n'.join(csv_output_lines)
-    elif format == "html":
-        # Convert markdown content to HTML
-        html_body = markdown.markdown(content, extensions=['fenced_code', 'tables', 'extra'])
-        html_full = f"""
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Notes</title>
-    <style>
-        body {{ font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif, "Apple Color Emoji", "Segoe UI Emoji"; line-height: 1.6; padding: 20px; max-width: 800px; margin: auto; color: #333; }}
-        h1, h2, h3, h4, h5, h6 {{ color: #1a1a1a; margin-top: 1.5em; margin-bottom: 0.5em; }}
-        p {{ margin-bottom: 1em; }}
-        ul, ol {{ padding-left: 20px; margin-bottom: 1em; }}
-        li {{ margin-bottom: 0.25em; }}
-        code {{ background-color: #f0f0f0; padding: 0.2em 0.4em; margin: 0; font-size: 85%; border-radius: 3px; font-family: "SFMono-Regular", Consolas, "Liberation Mono", Menlo, Courier, monospace;}}
-        pre {{ background-color: #f0f0f0; padding: 10px; border-radius: 5px; overflow-x: auto; }}
-        pre code {{ background-color: transparent; padding: 0; margin: 0; font-size: inherit; border-radius: 0; }}
-        table {{ border-collapse: collapse; width: 100%; margin-bottom: 1em; border: 1px solid #ddd; }}
-        th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-        th {{ background-color: #f9f9f9; }}
-        blockquote {{ border-left: 4px solid #ccc; padding-left: 10px; color: #555; margin-left: 0; margin-right: 0; font-style: italic;}}
-    </style>
-</head>
-<body>
-{html_body}
-</body>
-</html>
-"""
-        return html_full
-    else:
-        return content
-
-# New function for AI-powered summarization
-def summarize_notes(content, api_key, model_name):
-    templates = load_prompt_templates()
-    prompt = templates["Auto-Summary"].format(content=content)
-    
-    summary = generate_ai_content(
-        prompt, 
-        api_key, 
-        model_name, 
-        temperature=0.3, 
-        detail_level="Brief",
-        style_params={"tone": "Concise", "language_style": "Standard"}
-    )
-    
-    return summary
-
-# New function for adaptive refinement
-def refine_notes(content, topic, refinement_type, api_key, model_name):
-    templates = load_prompt_templates()
-    prompt = templates["Refinement"].format(
-        content=content,
-        topic=topic,
-        refinement_type=refinement_type
-    )
-    
-    refined = generate_ai_content(
-        prompt, 
-        api_key, 
-        model_name, 
-        temperature=0.5, 
-        detail_level="Standard",
-        style_params={"tone": "Academic", "language_style": "Standard"}
-    )
-    
-    return refined
-
-
-# Function for deep search
-def deep_search_notes(query, content, api_key, model_name):
-    prompt = f"Given the following notes content, perform a deep semantic search for '{query}'. Return the most relevant sections that answer or relate to this query, along with brief explanations of why they're relevant:\n\n{content}"
-    
-    results = generate_ai_content(
-        prompt, 
-        api_key, 
-        model_name, 
-        temperature=0.3, 
-        detail_level="Standard",
-        style_params={"tone": "Analytical", "language_style": "Concise"}
-    )
-    
-    return results
-
-
-# New function for generating quiz from notes
-def generate_quiz(content, api_key, model_name):
-    templates = load_prompt_templates()
-    prompt = f"Create a 20 -question quiz with multiple-choice answers based on the following notes. " \
-             f"Include 4 options per question with only one correct answer. " \
-             f"Format with the question followed by options labeled A, B, C, D, and mark the correct answer at the end:\n\n{content}"
-    
-    quiz = generate_ai_content(
-        prompt, 
-        api_key, 
-        model_name, 
-        temperature=0.7, 
-        detail_level="Standard",
-        style_params={"tone": "Enthusiastic", "language_style": "Conversational"}
-    )
-    
-    return quiz
-
-# New function to create spaced repetition cards
-def create_spaced_repetition(content, topic, api_key, model_name):
-    templates = load_prompt_templates()
-    prompt = templates["Spaced Repetition Cards"].format(content=content)
-    
-    cards_text = generate_ai_content(
-        prompt, 
-        api_key, 
-        model_name, 
-        temperature=0.5, 
-        detail_level="Standard",
-        style_params={"tone": "Academic", "language_style": "Concise"}
-    )
-    
-    # Process raw text into cards
-    cards = []
-    raw_cards = cards_text.split("---")
-    
-    for card_text in raw_cards:
-        if "Q:" in card_text and "A:" in card_text:
-            question_match = re.search(r"Q:(.*?)A:", card_text, re.DOTALL)
-            answer_match = re.search(r"A:(.*)", card_text, re.DOTALL)
-
-            if question_match and answer_match:
-                question = question_match.group(1).strip()
-                answer = answer_match.group(1).strip()
-            
-                # Create card with spaced repetition metadata
-                card = {
-                    "topic": topic,
-                    "question": question,
-                    "answer": answer,
-                    "created": datetime.now(),
-                    "next_review": datetime.now() + timedelta(days=1),
-                    "ease_factor": 2.5,
-                    "interval": 1,
-                    "repetitions": 0
-                }
-                
-                cards.append(card)
-            # else: # Optional: Log or notify if a card-like segment couldn't be parsed
-                # st.caption(f"Could not fully parse a card segment: {card_text[:50]}...")
-    
-    # Add to session state
+# Function to add cards to the deck in session state
+def add_spaced_repetition_cards(cards):
     if cards: # Only append if cards were successfully parsed
         for card_item in cards: # Use a different variable name to avoid conflict with 'card' from outer scope if any
             st.session_state.spaced_repetition.append(card_item)
-        st.session_state.spaced_repetition.sort(key=lambda x: x['next_review']) # Keep them sorted
-    
-    return len(cards)
+            record_card_added(st.session_state.analytics, card_item)
+            index_card(st.session_state.deck_index, card_item) # The index keeps them sorted
+        mark_user_data_dirty("spaced_repetition", "analytics")
+
+# Function to get quiz questions for notes from the bank, generating only the shortfall
+def get_quiz_questions(content, topic, api_key, model_name, num_questions=20):
+    take_prefetched("quiz", content) # Let a running prefetch finish instead of generating twice
+    fill_question_bank(content, topic, api_key, model_name, num_questions, **generation_options)
+    return sample_bank_questions(note_content_hash(content), topic, num_questions)
+
+# Function to fan a study pack out into history, the flashcard deck and the question bank/quiz
+def apply_study_pack(pack, content, topic):
+    save_to_history("Auto-Summary", topic, pack["summary"])
+    if pack["key_concepts"]:
+        concepts_md = "\n".join(f"- **{c['term'].strip()}**: {c['definition'].strip()}" for c in pack["key_concepts"])
+        save_to_history("Key Concepts & Definitions", topic, concepts_md)
+    add_spaced_repetition_cards([new_spaced_repetition_card(topic, c["question"].strip(), c["answer"].strip()) for c in pack["flashcards"]])
+    add_questions_to_bank(note_content_hash(content), topic, pack["quiz"])
+    st.session_state.parsed_quiz_questions = [
+        {"question": q["question"].strip(), "options": {k: q["options"][k].strip() for k in "ABCD"}, "correct": q["correct"]}
+        for q in pack["quiz"]
+    ]
 
-# New function to process quiz answers and calculate score
-def grade_quiz(quiz_text, user_answers):
-    # Extract correct answers from quiz text
-    correct_answers = []
-    questions = quiz_text.split("\n\n")
-    
-    for q in questions:
-        if "Correct answer:" in q:
-            correct = re.search(r"Correct answer: ([A-D])", q).group(1)
-            correct_answers.append(correct)
-    
-    # Calculate score
-    if len(correct_answers) != len(user_answers):
-        return 0
-    
-    score = sum(1 for correct, user in zip(correct_answers, user_answers) if correct == user)
-    percentage = (score / len(correct_answers)) * 100
-    
-    # Record score in history
-    st.session_state.quiz_scores.append({
-        "timestamp": datetime.now(),
-        "score": percentage,
-        "total_questions": len(correct_answers)
-    })
-    
-    return percentage
-# Main content area
-
-# --- Helper function for Interactive Quiz ---
-def parse_quiz_text(quiz_text):
-    questions = []
-    # Regex to find question, options, and correct answer
-    # This regex assumes a fairly consistent format like:
-    # 1. Question text?
-    # A. Option A
-    # B. Option B
-    # C. Option C
-    # D. Option D
-    # Correct answer: B
-    pattern = re.compile(
-        r"(\d+\.\s*.*?)\n"  # Question (e.g., "1. What is...")
-        r"A\.\s*(.*?)\n"    # Option A
-        r"B\.\s*(.*?)\n"    # Option B
-        r"C\.\s*(.*?)\n"    # Option C
-        r"D\s*[:.]\s*(.*?)\n"  # Option D (allowing for slight variations like "D." or "D:")
-        r"Correct answer:\s*([A-D])", # Correct answer
-        re.DOTALL | re.IGNORECASE
-    )
-    matches = pattern.findall(quiz_text)
-    for match in matches:
-        questions.append({
-            "question": match[0].strip(),
-            "options": {"A": match[1].strip(), "B": match[2].strip(), "C": match[3].strip(), "D": match[4].strip()},
-            "correct": match[5].strip().upper()
-        })
-    return questions
+# --- Speculative prefetch of likely next steps ---
+# After notes or research are generated, the quiz, SR cards and follow-up questions are
+# generated in the background through the job queue (note_core.jobs), so the button the user
+# clicks next can read a finished result. With the shared storage backend any replica's workers
+# may run a job. Jobs belong to the tab that started them: leaving that tab cancels anything not
+# finished yet, and each session has a budget of speculative calls.
+PREFETCH_WORKERS = 2 # Per process, shared by all sessions, which keeps speculative work low-priority
+PREFETCH_BUDGET_PER_SESSION = int(os.environ.get("NOTE_MAKER_PREFETCH_BUDGET", 12))
+PREFETCH_WAIT_SECONDS = 120 # Longest a click waits for a queued or running prefetch
+
+@st.cache_resource
+def get_job_workers():
+    return start_job_workers(PREFETCH_WORKERS)
+
+# Function to queue a prefetch job unless it is already queued or the session's budget is spent
+def start_prefetch(kind, content, handler_name, *args, **kwargs):
+    key = f"{kind}:{note_content_hash(content)}"
+    if key in st.session_state.prefetch_jobs or st.session_state.prefetch_budget_used >= PREFETCH_BUDGET_PER_SESSION:
+        return
+    get_job_workers()
+    st.session_state.prefetch_jobs[key] = {
+        "job_id": enqueue_job(handler_name, *args, **kwargs),
+        "tab": st.session_state.selected_main_tab,
+        "settled": False # Finished jobs are kept for when the user returns to their tab
+    }
+    st.session_state.prefetch_budget_used += 1
+
+# Function to take a prefetched result, waiting for it if it is still running (None if unavailable)
+def take_prefetched(kind, content):
+    job = st.session_state.prefetch_jobs.pop(f"{kind}:{note_content_hash(content)}", None)
+    if job is None:
+        return None
+    result = wait_for_job(job["job_id"], PREFETCH_WAIT_SECONDS)
+    if isinstance(result, str) and result.startswith("Error:"):
+        return None
+    return result
+
+# Function to cancel unfinished prefetch jobs that were started from another tab
+def cancel_stale_prefetch_jobs(current_tab):
+    jobs = get_storage()["jobs"]
+    for key, job in list(st.session_state.prefetch_jobs.items()):
+        if job["tab"] == current_tab or job["settled"]:
+            continue
+        state = jobs.status(job["job_id"])
+        if state is not None and state["status"] == "done":
+            job["settled"] = True
+        else:
+            cancel_job(job["job_id"]) # A running call is left to finish and its result ignored
+            st.session_state.prefetch_jobs.pop(key)
+
+# Function to prefetch what usually follows new notes or research findings
+# (follow-ups are generated from the bounded research context rather than the full findings)
+def prefetch_next_steps(content, topic, api_key, model_name, follow_up_context=None):
+    if not st.session_state.prefetch_enabled or not api_key or content.startswith("Error:"):
+        return
+    start_prefetch("quiz", content, "fill_question_bank", content, topic, api_key=api_key, model_name=model_name, num_questions=20, **generation_options)
+    if follow_up_context:
+        start_prefetch("follow_ups", follow_up_context, "generate_follow_up_questions", follow_up_context, api_key=api_key, model_name=model_name, **generation_options)
+    else:
+        start_prefetch("sr_cards", content, "generate_spaced_repetition_text", content, api_key=api_key, model_name=model_name, **generation_options)
+
+# Function to add finished research to the session memory and prefetch its next steps
+def remember_research_output(query, output):
+    if output.startswith("Error:"):
+        return
+    remember_research_turn(st.session_state.research_memory, query, output, st.session_state.api_key, model_name, **generation_options)
+    follow_up_context = build_research_context(st.session_state.research_memory, query)
+    prefetch_next_steps(output, query, st.session_state.api_key, model_name, follow_up_context=follow_up_context)
 
-templates = load_prompt_templates()
+with section_timer("Template load"):
+    templates = load_prompt_templates()
 
 
 # --- Interactive Quiz Display Logic ---
+profile_checkpoint("Interactive quiz")
 if st.session_state.get('interactive_quiz_active', False) and st.session_state.parsed_quiz_questions:
     st.header("📝 Interactive Quiz")
     questions = st.session_state.parsed_quiz_questions
@@ -742,6 +1446,10 @@ if st.session_state.get('interactive_quiz_active', False) and st.session_state.p
         st.subheader("🎉 Quiz Completed!")
         score_percentage = (st.session_state.quiz_score / len(questions)) * 100 if questions else 0
         st.metric("Your Score", f"{st.session_state.quiz_score}/{len(questions)} ({score_percentage:.2f}%)")
+        if questions:
+            st.session_state.quiz_scores.append({"score": score_percentage, "questions": len(questions), "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+            record_quiz_score(st.session_state.analytics, score_percentage)
+            mark_user_data_dirty("quiz_scores", "analytics")
         st.session_state.interactive_quiz_active = False # Reset for next time
         # Optionally, show correct answers vs user answers here
         if st.button("Back to Notes"):
@@ -759,6 +1467,8 @@ st.session_state.selected_main_tab = st.radio(
     horizontal=True,
     key="main_tab_selector_radio" # Changed key to avoid conflict if old one lingers
 )
+profile_checkpoint(f"Tab: {st.session_state.selected_main_tab}")
+cancel_stale_prefetch_jobs(st.session_state.selected_main_tab)
 
 
 if st.session_state.selected_main_tab == "📝 Note Generation": # Note Generation (existing main layout)
@@ -814,16 +1524,11 @@ if st.session_state.selected_main_tab == "📝 Note Generation": # Note Generati
             style_params_ng = {"tone": tone_ng, "language_style": language_style_ng}
 
     if topic_ng: # Process only if topic is entered in this tab
-        if note_type_ng == "Custom Template" and 'custom_template_ng' in locals():
-            base_prompt_ng = custom_template_ng.format(prompt=topic_ng, detail_level=detail_level_ng, education_level=education_level_ng)
-        else:
-            if topic_ng in st.session_state.user_knowledge_level:
-                knowledge_level_val = st.session_state.user_knowledge_level[topic_ng]
-                base_prompt_ng = templates["Adaptive Content"].format(prompt=topic_ng, detail_level=detail_level_ng, knowledge_level=knowledge_level_val)
-            else:
-                base_prompt_ng = templates[note_type_ng].format(prompt=topic_ng)
-        
-        final_prompt_ng = f"{base_prompt_ng}\n\nAdditional parameters:\n- Detail level: {detail_level_ng}\n- Education level: {education_level_ng}"
+        final_prompt_ng = build_note_prompt(
+            topic_ng, note_type_ng, detail_level_ng, education_level_ng,
+            knowledge_level=st.session_state.user_knowledge_level.get(topic_ng),
+            custom_template=custom_template_ng if note_type_ng == "Custom Template" and 'custom_template_ng' in locals() else None
+        )
         
         st.markdown("---")
         
@@ -839,20 +1544,54 @@ if st.session_state.selected_main_tab == "📝 Note Generation": # Note Generati
                 if 'temperature_ng' not in locals():
                     temperature_ng = 0.7 # Default if expander not opened
 
-                output_ng = generate_ai_content(final_prompt_ng, st.session_state.api_key, model_name, temperature_ng, detail_level_ng, style_params_ng)
+                # Near-duplicate topics ("photosynthesis", "explain photosynthesis") with the same settings reuse earlier notes
+                note_scope_ng = {"tool": note_type_ng, "detail_level": detail_level_ng, "education_level": education_level_ng, "temperature": temperature_ng,
+                                 "style": style_params_ng, "knowledge_level": st.session_state.user_knowledge_level.get(topic_ng), "model": model_name}
+                semantic_cache_usable = note_type_ng != "Custom Template"
+                semantic_hit = None
+                if semantic_cache_usable and st.session_state.semantic_cache_enabled:
+                    semantic_hit = lookup_semantic_cache(note_scope_ng, {"topic": topic_ng})
+                if semantic_hit:
+                    output_ng = semantic_hit["text"]
+                else:
+                    output_ng = stream_ai_content_to_page(final_prompt_ng, st.session_state.api_key, model_name, temperature_ng, detail_level_ng, style_params_ng, tool_name=note_type_ng)
+                    if semantic_cache_usable:
+                        store_semantic_response(note_scope_ng, {"topic": topic_ng}, output_ng)
+                st.session_state.semantic_cache_hit = semantic_hit
+                st.session_state.last_note_request = {"prompt": final_prompt_ng, "topic": topic_ng, "tool": note_type_ng, "scope": note_scope_ng,
+                                                      "temperature": temperature_ng, "detail_level": detail_level_ng, "style": style_params_ng}
                 save_to_history(note_type_ng, topic_ng, output_ng)
-                st.session_state.output = output_ng # Store for display in this tab
+                st.session_state.output = spill_large_text(output_ng) # Store for display in this tab
+                prefetch_next_steps(output_ng, topic_ng, st.session_state.api_key, model_name)
                 st.rerun() # Rerun to ensure output display section is updated
 
     # Display of currently generated notes (moved inside main_tabs[0])
     if 'output' in st.session_state and st.session_state.output and not st.session_state.interactive_quiz_active:
         # Use the topic that generated the current output, if available from history or a temp session var
         current_topic_display = st.session_state.history[0]['topic'] if st.session_state.history else "Generated Notes"
+        current_document = get_note_document(load_text(st.session_state.output)) # Parsed once per note, cached across reruns
         st.header(f"📄 Notes on: {current_topic_display}")
         
+        semantic_hit = st.session_state.semantic_cache_hit
+        if semantic_hit:
+            hit_col1, hit_col2 = st.columns([4, 1])
+            hit_col1.info(f"♻️ Reused notes from an earlier request for '{semantic_hit['matched']}' ({semantic_hit['similarity']:.0%} similar).")
+            if hit_col2.button("🔄 Regenerate", key="semantic_regenerate_btn"):
+                record_semantic_rejection(semantic_hit)
+                note_request = st.session_state.last_note_request
+                output_ng = stream_ai_content_to_page(note_request["prompt"], st.session_state.api_key, model_name, note_request["temperature"],
+                                                      note_request["detail_level"], note_request["style"], tool_name=note_request["tool"])
+                store_semantic_response(note_request["scope"], {"topic": note_request["topic"]}, output_ng)
+                save_to_history(note_request["tool"], note_request["topic"], output_ng)
+                st.session_state.output = spill_large_text(output_ng)
+                st.session_state.semantic_cache_hit = None
+                prefetch_next_steps(output_ng, note_request["topic"], st.session_state.api_key, model_name)
+                st.rerun()
+
         output_display_tabs = st.tabs(["View Notes", "Export Options"])
         with output_display_tabs[0]: # View Notes for current output
-            st.markdown(st.session_state.output)
+            with section_timer("Render: notes markdown"):
+                st.markdown(load_text(st.session_state.output))
             if st.button("⭐ Add to Favorites", key="fav_current_output"):
                 save_to_history(st.session_state.history[0]['tool'], current_topic_display, st.session_state.output, favorite=True)
                 st.success("Added to favorites!")
@@ -860,11 +1599,13 @@ if st.session_state.selected_main_tab == "📝 Note Generation": # Note Generati
             if st.button("➕ Create SR Cards from these Notes", key="sr_cards_current_output"):
                 if st.session_state.output and st.session_state.api_key:
                     with st.spinner("AI is creating spaced repetition flashcards..."):
+                        current_notes = load_text(st.session_state.output)
                         num_created = create_spaced_repetition(
-                            st.session_state.output, # The content of the current notes
+                            current_notes, # The content of the current notes
                             current_topic_display,   # The topic of the current notes
                             st.session_state.api_key,
-                            model_name                 # AI model selected in the sidebar
+                            model_name,                # AI model selected in the sidebar
+                            cards_text=take_prefetched("sr_cards", current_notes)
                         )
                     if num_created > 0:
                         st.success(f"{num_created} flashcards added! You can now find them in the '🧠 Spaced Repetition' tab.")
@@ -875,12 +1616,103 @@ if st.session_state.selected_main_tab == "📝 Note Generation": # Note Generati
                     st.error("API key is required to generate SR cards.")
                 else:
                     st.warning("No notes available to create flashcards from.")
+            if current_document["qa_pairs"] and st.button(f"➕ Add the {len(current_document['qa_pairs'])} Q&A pairs in these Notes as SR Cards", key="sr_cards_qa_pairs"):
+                add_spaced_repetition_cards([new_spaced_repetition_card(current_topic_display, q, a) for q, a in current_document["qa_pairs"]])
+                st.success(f"{len(current_document['qa_pairs'])} flashcards added without an AI call.")
+
+            if st.button("📦 Create Study Pack", key="study_pack_current_output", help="Summary, key concepts, flashcards and a quiz from a single AI request"):
+                if not st.session_state.api_key:
+                    st.error("API key is required to create a study pack.")
+                else:
+                    current_notes = load_text(st.session_state.output)
+                    try:
+                        with st.spinner("AI is building your study pack..."):
+                            study_pack = generate_study_pack(current_notes, st.session_state.api_key, model_name, **generation_options)
+                        apply_study_pack(study_pack, current_notes, current_topic_display)
+                        study_pack["source_hash"] = note_content_hash(current_notes)
+                        st.session_state.study_pack = study_pack
+                    except ValueError as e:
+                        st.error(str(e))
+            study_pack = st.session_state.get('study_pack')
+            if study_pack and study_pack["source_hash"] == note_content_hash(load_text(st.session_state.output)):
+                st.success(f"Study pack ready: summary and {len(study_pack['key_concepts'])} key concepts saved to history, "
+                           f"{len(study_pack['flashcards'])} flashcards added, {len(study_pack['quiz'])} quiz questions ready.")
+                if study_pack["dropped"]:
+                    st.caption(f"{len(study_pack['dropped'])} item(s) skipped because they did not match the expected structure.")
+                with st.expander("📦 Study Pack Summary & Key Concepts"):
+                    st.markdown(study_pack["summary"])
+                    st.markdown("\n".join(f"- **{c['term']}**: {c['definition']}" for c in study_pack["key_concepts"]))
+                if study_pack["quiz"] and st.button("🚀 Start Study Pack Quiz", key="study_pack_quiz_start"):
+                    st.session_state.parsed_quiz_questions = [
+                        {"question": q["question"].strip(), "options": {k: q["options"][k].strip() for k in "ABCD"}, "correct": q["correct"]}
+                        for q in study_pack["quiz"]
+                    ]
+                    st.session_state.interactive_quiz_active = True
+                    st.session_state.current_interactive_question_idx = 0
+                    st.session_state.user_quiz_answers = {}
+                    st.session_state.quiz_score = 0
+                    st.rerun()
+
+            with st.expander("✏️ Refine Sections"):
+                current_notes = current_document["text"]
+                note_sections = current_document["sections"]
+                section_labels = [f"{i + 1}. {'#' * s['level']} {s['heading'] or '(introduction)'}" for i, s in enumerate(note_sections)]
+                selected_sections = st.multiselect(
+                    "Sections to refine", range(len(note_sections)), default=suggest_sections_to_refine(note_sections),
+                    format_func=lambda i: section_labels[i], key=f"refine_sections_{current_document['digest']}",
+                    help="Pre-selected: the sections with the longest sentences. Only these are sent to the AI."
+                )
+                refinement_type_input = st.selectbox("Make them", ["clearer", "more concise", "more detailed", "simpler for beginners", "more rigorous"], key="refinement_type")
+                if st.button("✏️ Refine Selected Sections", key="refine_sections_btn", disabled=not selected_sections):
+                    if not st.session_state.api_key:
+                        st.error("API key is required to refine notes.")
+                    else:
+                        with st.spinner(f"AI is refining {len(selected_sections)} section(s)..."):
+                            refined_sections, refine_errors = refine_note_sections(
+                                note_sections, selected_sections, current_topic_display, refinement_type_input,
+                                st.session_state.api_key, model_name, **generation_options
+                            )
+                        st.session_state.section_refinement = {
+                            "source_hash": current_document["digest"], "sections": refined_sections,
+                            "changed": [i for i in selected_sections if i not in refine_errors], "errors": refine_errors
+                        }
+                refinement = st.session_state.get('section_refinement')
+                if refinement and refinement["source_hash"] == current_document["digest"]:
+                    for index, error in refinement["errors"].items():
+                        st.warning(f"Section {section_labels[index]} was left unchanged: {error}")
+                    for index in refinement["changed"]:
+                        section_diff = difflib.unified_diff(note_sections[index]["text"].splitlines(), refinement["sections"][index]["text"].splitlines(),
+                                                            "original", "refined", lineterm="")
+                        st.markdown(f"**{section_labels[index]}**")
+                        st.code("\n".join(section_diff) or "(no changes)", language="diff")
+                    apply_col, discard_col = st.columns(2)
+                    if apply_col.button("✅ Apply Refinements", key="apply_refinement_btn", disabled=not refinement["changed"]):
+                        refined_notes = join_markdown_sections(refinement["sections"])
+                        save_to_history(st.session_state.history[0]['tool'] if st.session_state.history else "Refinement", current_topic_display, refined_notes)
+                        st.session_state.output = spill_large_text(refined_notes)
+                        del st.session_state.section_refinement
+                        st.rerun()
+                    if discard_col.button("🗑️ Discard", key="discard_refinement_btn"):
+                        del st.session_state.section_refinement
+                        st.rerun()
+
+            if st.button("🎮 Quick Quiz", key="quiz_current_output"):
+                with st.spinner("Preparing your quiz..."):
+                    st.session_state.parsed_quiz_questions = get_quiz_questions(load_text(st.session_state.output), current_topic_display, st.session_state.api_key, model_name)
+                if st.session_state.parsed_quiz_questions:
+                    st.session_state.interactive_quiz_active = True
+                    st.session_state.current_interactive_question_idx = 0
+                    st.session_state.user_quiz_answers = {}
+                    st.session_state.quiz_score = 0
+                    st.rerun()
+                else:
+                    st.warning("Could not build a quiz for these notes." if st.session_state.api_key else "API key required to generate quiz questions.")
 
             if st.button("🎧 Listen to Notes", key="tts_current_output"):
                 if st.session_state.output:
                     try:
                         with st.spinner("Synthesizing audio... 🔊"):
-                            tts = gTTS(text=st.session_state.output, lang='en')
+                            tts = gTTS(text=current_document["plain_text"], lang='en') # Without markdown symbols or code blocks
                             audio_fp = io.BytesIO()
                             tts.write_to_fp(audio_fp)
                             audio_fp.seek(0)
@@ -901,7 +1733,7 @@ if st.session_state.selected_main_tab == "📝 Note Generation": # Note Generati
             format_extension = format_extension_map.get(export_format_selected, "txt")
             mime_type = mime_type_map.get(format_extension, "text/plain")
             
-            export_content = export_notes(st.session_state.output, format_extension)
+            export_content = export_notes(current_document["text"], format_extension)
             st.download_button(
                 label=f"Download as .{format_extension}",
                 data=export_content,
@@ -912,14 +1744,16 @@ if st.session_state.selected_main_tab == "📝 Note Generation": # Note Generati
             st.markdown("---")
             st.subheader("📋 Copy to Clipboard")
             st.caption("Use the copy icon in the top right of the code box below to copy the raw notes.")
-            st.code(st.session_state.output, language="markdown")
+            st.code(current_document["text"], language="markdown")
             st.markdown("---")
             st.subheader("📊 Note Statistics")
-            word_count = len(st.session_state.output.split())
-            char_count = len(st.session_state.output)
-            stat_col1, stat_col2 = st.columns(2)
-            stat_col1.metric(label="Word Count", value=word_count)
-            stat_col2.metric(label="Character Count", value=char_count)
+            note_stats = current_document["stats"]
+            stat_col1, stat_col2, stat_col3 = st.columns(3)
+            stat_col1.metric(label="Word Count", value=note_stats["words"])
+            stat_col2.metric(label="Character Count", value=note_stats["characters"])
+            stat_col3.metric(label="Reading Time", value=f"{max(1, round(note_stats['reading_minutes']))} min")
+            st.caption(f"{note_stats['headings']} headings · {note_stats['list_items']} list items · {note_stats['code_blocks']} code blocks · "
+                       f"{note_stats['tables']} tables · {len(current_document['qa_pairs'])} Q&A pairs")
 
 if st.session_state.selected_main_tab == "🔬 Research Assistant":
     st.header("🔬 Research Assistant")
@@ -928,6 +1762,8 @@ if st.session_state.selected_main_tab == "🔬 Research Assistant":
     research_query = st.text_area("Enter your research query or sub-topic:", height=100, key="research_query_input")
     output_format_options = ["Detailed Report", "Bulleted Key Points", "Q&A Format", "Pros and Cons List"]
     research_output_format = st.selectbox("Desired Output Format:", output_format_options, key="research_output_format_select")
+    deep_research_mode = st.toggle("🧭 Deep mode", key="deep_research_mode",
+                                   help="Plan sub-questions, answer them in parallel, then write one report citing which answers each section uses. Answers are reused by later queries.")
     
     if st.button("🔍 Conduct Research", key="conduct_research_btn"):
         if not st.session_state.api_key:
@@ -936,13 +1772,45 @@ if st.session_state.selected_main_tab == "🔬 Research Assistant":
             st.warning("Please enter a research query.")
         elif not research_output_format:
             st.warning("Please select an output format.")
+        elif deep_research_mode:
+            research_context = build_research_context(st.session_state.research_memory, research_query)
+            with st.status("Planning sub-questions...", expanded=True) as research_status:
+                sub_question_slots = []
+                # Function to show the pipeline's progress as each step finishes
+                def show_research_progress(event, data):
+                    if event == "planned":
+                        research_status.update(label=f"Researching {len(data)} sub-questions in parallel...")
+                        for index, sub_question in enumerate(data):
+                            sub_question_slots.append(st.empty())
+                            sub_question_slots[index].markdown(f"⏳ **S{index + 1}.** {sub_question}")
+                    elif event == "answered":
+                        index, finding = data
+                        outcome = "❌" if finding["error"] else "✅"
+                        detail = "cached" if finding["cached"] else finding["error"] or f"{finding['seconds']}s"
+                        sub_question_slots[index].markdown(f"{outcome} **S{index + 1}.** {finding['question']} _({detail})_")
+                        sub_question_slots[index] = None
+                        if all(slot is None for slot in sub_question_slots):
+                            research_status.update(label="Writing the report from the answers...")
+                deep_research = run_deep_research(research_query, research_output_format, st.session_state.api_key, model_name,
+                                                  on_progress=show_research_progress, context=research_context, **generation_options)
+                research_failed = deep_research["report"].startswith("Error:")
+                research_status.update(label="Research failed" if research_failed else "Research complete!", state="error" if research_failed else "complete")
+            research_output = deep_research["report"]
+            st.session_state.research_findings = deep_research["findings"]
+            st.session_state.research_assistant_output = spill_large_text(research_output)
+            st.session_state.current_research_query = research_query
+            remember_research_output(research_query, research_output)
         else:
+            st.session_state.research_findings = []
             with st.spinner("AI is conducting in-depth research..."):
                 # Use a specific prompt for research assistance
                 research_prompt = templates["Research Assistant Query"].format(
                     query=research_query, 
                     output_format=research_output_format
                 )
+                research_context = build_research_context(st.session_state.research_memory, research_query)
+                if research_context: # Follow-up: bounded context of the session instead of every earlier answer
+                    research_prompt += f"\n\nEarlier in this research session (build on it rather than repeat it):\n{research_context}"
                 
                 # You might want to use different parameters for research, e.g., more comprehensive
                 research_output = generate_ai_content(
@@ -951,17 +1819,28 @@ if st.session_state.selected_main_tab == "🔬 Research Assistant":
                     model_name, # Use the globally selected model
                     temperature=0.5, # Slightly more creative/exploratory for research
                     detail_level="Comprehensive", # Aim for more detail
-                    style_params={"tone": "Academic", "language_style": "Elaborate"} # Suitable for research
+                    style_params={"tone": "Academic", "language_style": "Elaborate"}, # Suitable for research
+                    tool_name="Research Assistant Query"
                 )
             
-            st.session_state.research_assistant_output = research_output # Store the output
+            st.session_state.research_assistant_output = spill_large_text(research_output) # Store the output
             st.session_state.current_research_query = research_query # Save for potential history saving
+            remember_research_output(research_query, research_output)
             st.success("Research complete!")
 
     if 'research_assistant_output' in st.session_state and st.session_state.research_assistant_output:
         st.markdown("---")
         st.subheader("💡 Research Findings")
-        st.markdown(st.session_state.research_assistant_output)
+        with section_timer("Render: research markdown"):
+            st.markdown(load_text(st.session_state.research_assistant_output))
+        for index, finding in enumerate(st.session_state.get('research_findings') or []):
+            if finding["answer"]:
+                with st.expander(f"[S{index + 1}] {finding['question']}" + (" (cached)" if finding["cached"] else "")):
+                    st.markdown(finding["answer"])
+        research_memory = st.session_state.research_memory
+        if research_memory["turn_count"]:
+            st.caption(f"🧠 Research memory: {research_memory['turn_count']} queries, {len(research_memory['turns'])} kept in full, "
+                       f"{len(research_memory['chunks'])} archived passages. Follow-ups use at most ~{RESEARCH_CONTEXT_TOKENS} tokens of context.")
         
         res_col1, res_col2, res_col3 = st.columns(3)
         with res_col1:
@@ -978,19 +1857,24 @@ if st.session_state.selected_main_tab == "🔬 Research Assistant":
         with res_col2:
             if st.button("❓ Suggest Follow-up Questions", key="suggest_follow_up_btn"):
                 with st.spinner("AI is thinking of next steps..."):
-                    follow_up_prompt = templates["Research Follow-up Questions"].format(research_findings=st.session_state.research_assistant_output)
-                    follow_up_questions = generate_ai_content(follow_up_prompt, st.session_state.api_key, model_name, 0.7, "Brief", {"tone": "Inquisitive", "language_style": "Concise"})
-                    st.session_state.follow_up_questions_output = follow_up_questions
+                    research_context = build_research_context(st.session_state.research_memory, st.session_state.get('current_research_query', ""))
+                    research_context = research_context or load_text(st.session_state.research_assistant_output)
+                    follow_up_questions = take_prefetched("follow_ups", research_context)
+                    if follow_up_questions is None:
+                        follow_up_questions = generate_follow_up_questions(research_context, st.session_state.api_key, model_name, **generation_options)
+                    st.session_state.follow_up_questions_output = spill_large_text(follow_up_questions)
         with res_col3:
             if st.button("Clear Research Findings", key="clear_research_btn"):
                 st.session_state.research_assistant_output = ""
                 st.session_state.follow_up_questions_output = "" # Clear follow-ups too
+                st.session_state.research_findings = []
+                st.session_state.research_memory = new_research_memory() # Start a new research session
                 st.rerun()
 
     if 'follow_up_questions_output' in st.session_state and st.session_state.follow_up_questions_output:
         st.markdown("---")
         st.subheader("🤔 Potential Follow-up Questions:")
-        st.markdown(st.session_state.follow_up_questions_output)
+        st.markdown(load_text(st.session_state.follow_up_questions_output))
 
 if st.session_state.selected_main_tab == "🎯 Study Hub":
     st.header("🎯 Study Hub")
@@ -1057,14 +1941,31 @@ if st.session_state.selected_main_tab == "🎯 Study Hub":
 
     with study_hub_tabs[1]: # Citation Helper
         st.subheader("📜 Citation Generator")
-        citation_text = st.text_area("Paste text or source details for citation:")
-        citation_style = st.selectbox("Select Citation Style", ["APA", "MLA", "Chicago", "Harvard"])
+        citation_text = st.text_area("Paste a source or a whole bibliography:", height=200)
+        st.caption("BibTeX, RIS, CSL-JSON, 'key: value' metadata (title:, author:, year:, journal:, doi: ...) and 'Author, Title, Year' lines are formatted instantly on this device. Anything else is sent to the AI.")
+        citation_style = st.selectbox("Select Citation Style", CITATION_STYLES)
         if st.button("📜 Generate Citation"):
             if citation_text:
-                with st.spinner("AI is crafting your citation..."):
-                    citation_prompt = templates["Citation Generation"].format(style=citation_style, source_details=citation_text)
-                    generated_citation = generate_ai_content(citation_prompt, st.session_state.api_key, model_name, 0.2, "Brief", {"tone": "Formal", "language_style": "Concise"})
-                    st.markdown("**Generated Citation:**")
+                citations, plain_citations, unparsed_sources = format_bibliography(citation_text, citation_style)
+                if unparsed_sources and not st.session_state.api_key:
+                    st.warning(f"{len(unparsed_sources)} unstructured source(s) need the AI. Enter your API key in the sidebar to format them.")
+                elif unparsed_sources:
+                    with st.spinner(f"AI is formatting {len(unparsed_sources)} unstructured source(s)..."):
+                        if len(unparsed_sources) == 1:
+                            citation_tool = "Citation Generation"
+                            citation_prompt = templates[citation_tool].format(style=citation_style, source_details=unparsed_sources[0])
+                        else:
+                            citation_tool = "Citation Generation (Batch)"
+                            source_list = "\n".join(f"{n}. {source}" for n, source in enumerate(unparsed_sources, 1))
+                            citation_prompt = templates[citation_tool].format(style=citation_style, source_list=source_list)
+                        generated_citation = generate_ai_content(citation_prompt, st.session_state.api_key, model_name, 0.2, "Brief", {"tone": "Formal", "language_style": "Concise"}, tool_name=citation_tool)
+                if citations:
+                    st.markdown(f"**Formatted Bibliography ({len(citations)} source(s), {citation_style}):**")
+                    for citation in citations:
+                        st.markdown(citation)
+                    st.code("\n".join(plain_citations), language="text")
+                if unparsed_sources and st.session_state.api_key:
+                    st.markdown("**AI-Generated Citation(s) for Unstructured Sources:**")
                     st.code(generated_citation, language="text")
             else:
                 st.warning("Please provide text/details for citation.")
@@ -1095,57 +1996,54 @@ if st.session_state.selected_main_tab == "✍️ Writing Enhancer":
         elif enhancement_type == "Select an option...":
             st.warning("Please select an enhancement type.")
         else:
-            with st.spinner("AI is refining your text..."):
-                prompt_format_args = {}
-                if enhancement_type == "Rephrase Text":
-                    prompt_template_key = "Writing Enhancer - Rephrase"
-                    prompt_format_args = {"text_to_rephrase": text_to_enhance, "target_tone": target_tone_enhancer if target_tone_enhancer != "Default (Original)" else "the original tone"}
-                elif enhancement_type == "Expand on Idea":
-                    prompt_template_key = "Writing Enhancer - Expand"
-                    prompt_format_args = {"text_to_expand": text_to_enhance}
-                elif enhancement_type == "Summarize Text":
-                    prompt_template_key = "Writing Enhancer - Summarize"
-                    prompt_format_args = {"text_to_summarize": text_to_enhance}
-                elif enhancement_type == "Check Clarity & Conciseness":
-                    prompt_template_key = "Writing Enhancer - Clarity Check"
-                    prompt_format_args = {"text_for_review": text_to_enhance}
-                
-                enhancer_prompt = "Invalid enhancement type selected." # Default
-                if 'prompt_template_key' in locals(): # Check if a valid type was selected
-                    enhancer_prompt = templates[prompt_template_key].format(**prompt_format_args)
-                
-                enhanced_output = generate_ai_content(
-                    enhancer_prompt,
-                    st.session_state.api_key,
-                    model_name,
-                    temperature=0.6, # Balanced creativity
-                    detail_level="Standard", 
-                    style_params={"tone": "Formal", "language_style": "Standard"} # General purpose
-                )
-            st.session_state.writing_enhancer_output = enhanced_output
-            st.success("Text enhancement complete!")
+            target_tone = target_tone_enhancer if target_tone_enhancer != "Default (Original)" else "the original tone"
+            enhancer_results = []
+            with st.status("AI is refining your text...", expanded=True) as enhancer_status:
+                # Paragraphs are enhanced in parallel and shown in order; unchanged ones come from the cache
+                for index, total, result in enhance_paragraphs(text_to_enhance, enhancement_type, target_tone, st.session_state.api_key,
+                                                               model_name, **generation_options):
+                    enhancer_results.append(result)
+                    detail = "cached" if result["cached"] else result["error"] or f"{result['seconds']}s"
+                    st.markdown(f"{'❌' if result['error'] else '✅'} Paragraph {index + 1}/{total} _({detail})_")
+                cached_count = sum(result["cached"] for result in enhancer_results)
+                enhancer_status.update(label=f"Text enhancement complete! ({cached_count}/{len(enhancer_results)} paragraphs unchanged and reused)",
+                                       state="error" if all(result["error"] for result in enhancer_results) else "complete", expanded=False)
+            st.session_state.writing_enhancer_results = enhancer_results
+            st.session_state.writing_enhancer_output = spill_large_text(join_enhanced_paragraphs(enhancer_results))
 
     if 'writing_enhancer_output' in st.session_state and st.session_state.writing_enhancer_output:
         st.markdown("---")
         st.subheader("✒️ Enhanced Text")
-        st.markdown(st.session_state.writing_enhancer_output)
+        with section_timer("Render: enhanced text markdown"):
+            st.markdown(load_text(st.session_state.writing_enhancer_output))
+        enhancer_results = st.session_state.get('writing_enhancer_results') or []
+        if any(result["diff"] or result["error"] for result in enhancer_results):
+            st.subheader("🔍 Changes by Paragraph")
+            for index, result in enumerate(enhancer_results):
+                label = f"Paragraph {index + 1}" + (" (cached)" if result["cached"] else "") + (" - failed, original kept" if result["error"] else "")
+                with st.expander(label):
+                    if result["error"]:
+                        st.error(result["error"])
+                    st.markdown(result["diff"] or result["original"])
+
+FLASHCARD_PAGE_SIZES = [10, 25, 50]
+HISTORY_PAGE_SIZE = 10
 
 # NEW: Display due flashcards for spaced repetition
 if st.session_state.selected_main_tab == "🧠 Spaced Repetition":
     st.header("🧠 Spaced Repetition Flashcards")
-    due_cards = [card for card in st.session_state.spaced_repetition 
-                if card['next_review'] <= datetime.now()]
+    due_count = count_due(st.session_state.deck_index, datetime.now())
     
-    if due_cards:
+    if due_count:
         st.markdown("---")
-        st.header(f"📆 Flashcards Due for Review ({len(due_cards)})")
+        st.header(f"📆 Flashcards Due for Review ({due_count})")
 
         # Show one card at a time
         if 'current_card_index' not in st.session_state:
             st.session_state.current_card_index = 0
         
-        if st.session_state.current_card_index < len(due_cards):
-            card = due_cards[st.session_state.current_card_index]
+        if st.session_state.current_card_index < due_count:
+            card = card_at(st.session_state.deck_index, "next_review", st.session_state.current_card_index)
 
             # Styled Flashcard
             question_html = f"""
@@ -1166,6 +2064,7 @@ if st.session_state.selected_main_tab == "🧠 Spaced Repetition":
                 
             with col1:
                 if st.button("😕 Hard"):
+                    card_before = dict(card)
                     # Update card using SuperMemo SM-2 algorithm
                     if card['repetitions'] == 0:
                         card['interval'] = 1
@@ -1175,11 +2074,15 @@ if st.session_state.selected_main_tab == "🧠 Spaced Repetition":
                     
                     card['repetitions'] = 0
                     card['next_review'] = datetime.now() + timedelta(days=card['interval'])
+                    record_card_reviewed(st.session_state.analytics, card_before, card)
+                    reindex_card(st.session_state.deck_index, card_before, card)
+                    mark_user_data_dirty("spaced_repetition", "analytics")
                     st.session_state.current_card_index += 1
                     st.rerun()
             
             with col2:
                 if st.button("🙂 Okay"):
+                    card_before = dict(card)
                     # Update card using SuperMemo SM-2 algorithm
                     if card['repetitions'] == 0:
                         card['interval'] = 1
@@ -1188,11 +2091,15 @@ if st.session_state.selected_main_tab == "🧠 Spaced Repetition":
                     
                     card['repetitions'] += 1
                     card['next_review'] = datetime.now() + timedelta(days=card['interval'])
+                    record_card_reviewed(st.session_state.analytics, card_before, card)
+                    reindex_card(st.session_state.deck_index, card_before, card)
+                    mark_user_data_dirty("spaced_repetition", "analytics")
                     st.session_state.current_card_index += 1
                     st.rerun()
             
             with col3:
                 if st.button("😀 Easy"):
+                    card_before = dict(card)
                     # Update card using SuperMemo SM-2 algorithm
                     if card['repetitions'] == 0:
                         card['interval'] = 2
@@ -1202,6 +2109,9 @@ if st.session_state.selected_main_tab == "🧠 Spaced Repetition":
                     
                     card['repetitions'] += 1
                     card['next_review'] = datetime.now() + timedelta(days=card['interval'])
+                    record_card_reviewed(st.session_state.analytics, card_before, card)
+                    reindex_card(st.session_state.deck_index, card_before, card)
+                    mark_user_data_dirty("spaced_repetition", "analytics")
                     st.session_state.current_card_index += 1
                     st.rerun()
             
@@ -1218,21 +2128,18 @@ if st.session_state.selected_main_tab == "🧠 Spaced Repetition":
         st.markdown("---")
         st.subheader("📈 Flashcard Statistics")
         total_cards = len(st.session_state.spaced_repetition)
-        # due_today is already calculated as due_cards
+        # due_today is already calculated as due_count
         st.metric(label="Total Flashcards", value=total_cards)
-        st.metric(label="Cards Due Today", value=len(due_cards))
+        st.metric(label="Cards Due Today", value=due_count)
         
         # Cards by topic
         if total_cards > 0:
             st.markdown("**Cards by Topic:**")
-            from collections import Counter
-            topic_counts = Counter(card['topic'] for card in st.session_state.spaced_repetition)
-            for topic, count in topic_counts.items():
+            for topic, count in st.session_state.analytics["topic_counts"].items():
                 st.write(f"- {topic}: {count} card(s)")
             
             # Average ease factor
-            avg_ease = sum(card['ease_factor'] for card in st.session_state.spaced_repetition) / total_cards
-            st.metric(label="Average Ease Factor", value=f"{avg_ease:.2f}")
+            st.metric(label="Average Ease Factor", value=f"{average_ease(st.session_state.analytics):.2f}")
     else:
         st.info("No flashcards created yet to show statistics.")
 
@@ -1241,21 +2148,42 @@ if st.session_state.selected_main_tab == "🧠 Spaced Repetition":
     if st.session_state.spaced_repetition:
         # Search/filter option (optional enhancement)
         search_term = st.text_input("Search all flashcards (by question or topic):", key="search_all_flashcards")
-        
-        filtered_cards_all = [
-            card for card in st.session_state.spaced_repetition
-            if not search_term or search_term.lower() in card['question'].lower() or search_term.lower() in card['topic'].lower()
-        ]
-
-        if not filtered_cards_all:
-            st.caption("No flashcards match your search term.")
+        sort_labels = {"Next review": "next_review", "Topic": "topic", "Ease": "ease"}
+        page_col1, page_col2, page_col3 = st.columns(3)
+        sort_label = page_col1.selectbox("Sort by", list(sort_labels), key="flashcards_sort_by")
+        descending = page_col2.toggle("Descending", key="flashcards_descending")
+        page_size = page_col3.selectbox("Cards per page", FLASHCARD_PAGE_SIZES, key="flashcards_page_size")
+
+        # Pages are read from the sorted deck index by cursor; earlier cursors are kept for "Previous"
+        view = (search_term, sort_label, descending, page_size)
+        if st.session_state.get('flashcards_view') != view:
+            st.session_state.flashcards_view = view
+            st.session_state.flashcards_cursors = [None]
+        search_lower = search_term.lower()
+        match = (lambda c: search_lower in c['question'].lower() or search_lower in c['topic'].lower()) if search_term else None
+        page_cards, next_cursor = deck_page(st.session_state.deck_index, sort_labels[sort_label], st.session_state.flashcards_cursors[-1],
+                                            page_size, descending, match)
+        page_number = len(st.session_state.flashcards_cursors)
+
+        if not page_cards:
+            st.caption("No flashcards match your search term." if page_number == 1 else "No more flashcards.")
         else:
-            st.caption(f"Showing {len(filtered_cards_all)} of {len(st.session_state.spaced_repetition)} total flashcards.")
-            for idx, card_item in enumerate(filtered_cards_all):
+            first_shown = (page_number - 1) * page_size + 1
+            shown_of = "matching cards" if search_term else f"of {len(st.session_state.spaced_repetition)} total flashcards"
+            st.caption(f"Showing {first_shown}–{first_shown + len(page_cards) - 1} {shown_of} (page {page_number}).")
+            for card_item in page_cards:
                 with st.expander(f"**{card_item['topic']}**: {card_item['question'][:60]}... (Next review: {card_item['next_review'].strftime('%Y-%m-%d')})"):
                     st.markdown(f"**Q:** {card_item['question']}")
                     st.markdown(f"**A:** {card_item['answer']}")
                     st.caption(f"Created: {card_item['created'].strftime('%Y-%m-%d')}, Interval: {card_item['interval']} days, Ease: {card_item['ease_factor']:.2f}, Reps: {card_item['repetitions']}")
+
+        nav_col1, nav_col2 = st.columns(2)
+        if nav_col1.button("◀ Previous", key="flashcards_prev", disabled=page_number == 1):
+            st.session_state.flashcards_cursors.pop()
+            st.rerun()
+        if nav_col2.button("Next ▶", key="flashcards_next", disabled=next_cursor is None):
+            st.session_state.flashcards_cursors.append(next_cursor)
+            st.rerun()
     else:
         st.info("You haven't created any flashcards yet.")
 
@@ -1264,9 +2192,14 @@ if st.session_state.selected_main_tab == "📊 Analytics & History":
     
     st.subheader("📜 Recent Notes")
     if st.session_state.history:
-        for i, item in enumerate(st.session_state.history[:10]): # Show top 10 recent
+        # Only the current page of history is rendered (each item loads its text and builds a download)
+        history_pages = (len(st.session_state.history) - 1) // HISTORY_PAGE_SIZE + 1
+        history_page = min(st.session_state.get('history_page', 0), history_pages - 1)
+        page_start = history_page * HISTORY_PAGE_SIZE
+        for i, item in enumerate(st.session_state.history[page_start:page_start + HISTORY_PAGE_SIZE], start=page_start):
             with st.expander(f"**{item['topic']}** ({item['tool']}) - {item['timestamp']} {'⭐' if item.get('favorite', False) else ''}"):
-                st.markdown(item['output'][:500] + "..." if len(item['output']) > 500 else item['output']) # Preview
+                item_output = load_text(item['output'])
+                st.markdown(item_output[:500] + "..." if len(item_output) > 500 else item_output) # Preview
                 
                 hist_cols = st.columns(3)
                 with hist_cols[0]:
@@ -1278,7 +2211,7 @@ if st.session_state.selected_main_tab == "📊 Analytics & History":
                 with hist_cols[1]:
                      # Add option to re-export
                     format_extension_hist = "txt" # Default or make selectable
-                    export_content_hist = export_notes(item['output'], format_extension_hist)
+                    export_content_hist = export_notes(item_output, format_extension_hist)
                     st.download_button(
                         label="Download",
                         data=export_content_hist,
@@ -1288,29 +2221,66 @@ if st.session_state.selected_main_tab == "📊 Analytics & History":
                     )
                 with hist_cols[2]:
                     if st.button("🎮 Quick Quiz", key=f"quiz_hist_{i}"):
-                        quiz_hist = generate_quiz(item['output'], st.session_state.api_key, model_name)
+                        with st.spinner("Preparing your quiz..."):
+                            st.session_state.parsed_quiz_questions = get_quiz_questions(item_output, item['topic'], st.session_state.api_key, model_name)
+                        st.session_state.quiz_history_timestamp = item['timestamp'] # Which history item the quiz belongs to
+                        if not st.session_state.parsed_quiz_questions:
+                            st.warning("Could not build a quiz for this note." if st.session_state.api_key else "API key required to generate new quiz questions.")
+                    if st.session_state.get('quiz_history_timestamp') == item['timestamp'] and st.session_state.parsed_quiz_questions:
                         st.markdown("### Quiz from History Item")
-                        st.markdown(quiz_hist)
-                        parsed_questions_hist = parse_quiz_text(quiz_hist)
-                        if parsed_questions_hist:
-                            st.session_state.parsed_quiz_questions = parsed_questions_hist
-                            if st.button("🚀 Start Interactive Quiz", key=f"interactive_quiz_hist_start_{i}"):
-                                st.session_state.interactive_quiz_active = True
-                                st.session_state.current_interactive_question_idx = 0
-                                st.session_state.user_quiz_answers = {}
-                                st.session_state.quiz_score = 0
-                                st.rerun()
-                        else:
-                            st.warning("Could not parse quiz for interactive mode.")
+                        st.markdown(quiz_questions_to_text(st.session_state.parsed_quiz_questions))
+                        if st.button("🚀 Start Interactive Quiz", key=f"interactive_quiz_hist_start_{i}"):
+                            st.session_state.interactive_quiz_active = True
+                            st.session_state.current_interactive_question_idx = 0
+                            st.session_state.user_quiz_answers = {}
+                            st.session_state.quiz_score = 0
+                            st.rerun()
+        if history_pages > 1:
+            hist_nav_col1, hist_nav_col2, hist_nav_col3 = st.columns([1, 2, 1])
+            if hist_nav_col1.button("◀ Newer", key="history_prev", disabled=history_page == 0):
+                st.session_state.history_page = history_page - 1
+                st.rerun()
+            hist_nav_col2.caption(f"Page {history_page + 1} of {history_pages}")
+            if hist_nav_col3.button("Older ▶", key="history_next", disabled=history_page == history_pages - 1):
+                st.session_state.history_page = history_page + 1
+                st.rerun()
     else:
         st.info("No recent notes in history.")
 
     st.markdown("---")
     st.subheader("📈 Advanced Analytics")
-    # ... (Your existing advanced analytics code for notes_this_week, most_common_tool, focus_areas can go here) ...
-    # This part was in the sidebar before, ensure it's moved here if desired in this tab.
-    # For brevity, I'm omitting the direct copy-paste of that analytics block, but it should be placed here.
-    st.caption("Advanced analytics will be displayed here.")
+    analytics = st.session_state.analytics # Maintained on write, so nothing here scans the library
+    avg_score, recent_avg_score = quiz_averages(analytics)
+    stat_col1, stat_col2, stat_col3, stat_col4 = st.columns(4)
+    stat_col1.metric("Notes Generated", analytics["notes_total"], help=f"{notes_last_days(analytics)} in the last 7 days")
+    stat_col2.metric("Flashcards", analytics["cards"])
+    stat_col3.metric("Due Today", cards_due_today(analytics))
+    stat_col4.metric("Quiz Average", "N/A" if avg_score is None else f"{avg_score:.1f}%",
+                     delta=None if avg_score is None else f"{recent_avg_score - avg_score:+.1f} pts (last {len(analytics['quiz_recent'])})")
+
+    chart_col1, chart_col2 = st.columns(2)
+    with chart_col1:
+        st.markdown("**Notes per Tool per Week**")
+        if analytics["notes_by_week"]:
+            st.bar_chart(pd.DataFrame.from_dict(analytics["notes_by_week"], orient="index").fillna(0).sort_index())
+        else:
+            st.caption("No notes generated yet.")
+        st.markdown("**Cards by Topic**")
+        if analytics["topic_counts"]:
+            st.bar_chart(pd.Series(analytics["topic_counts"], name="cards"))
+        else:
+            st.caption("No flashcards yet.")
+    with chart_col2:
+        st.markdown("**Flashcards Due (Next 14 Days)**")
+        st.bar_chart(pd.DataFrame(due_forecast(analytics)).set_index("day"))
+        st.markdown("**Ease Factor Distribution**")
+        if analytics["ease_histogram"]:
+            st.bar_chart(pd.Series(analytics["ease_histogram"], name="cards").sort_index())
+        else:
+            st.caption("No flashcards yet.")
+    if analytics["quiz_recent"]:
+        st.markdown(f"**Recent Quiz Scores** (rolling average {recent_avg_score:.1f}%)")
+        st.line_chart(pd.Series(analytics["quiz_recent"], name="score %"))
 
 if st.session_state.selected_main_tab == "🛠️ Misc. Features":
     st.header("🛠️ Additional & Miscellaneous Features")
@@ -1325,7 +2295,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Searching for facts..."):
                     prompt = templates["Quick Fact Finder"].format(term=fact_term)
-                    fact_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.3, "Brief", {"tone": "Informative", "language_style": "Concise"})
+                    fact_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.3, "Brief", {"tone": "Informative", "language_style": "Concise"}, tool_name="Quick Fact Finder")
                     st.markdown(fact_output)
 
     # --- 2. Synonym/Antonym Finder ---
@@ -1337,7 +2307,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Finding words..."):
                     prompt = templates["Synonym Antonym Finder"].format(word=syn_ant_word)
-                    syn_ant_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Brief", {"tone": "Neutral", "language_style": "Standard"})
+                    syn_ant_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Brief", {"tone": "Neutral", "language_style": "Standard"}, tool_name="Synonym Antonym Finder")
                     st.markdown(syn_ant_output)
 
     # --- 3. Simple Translator ---
@@ -1353,10 +2323,35 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             elif not selected_language: st.warning("Please select a target language.")
             else:
                 with st.spinner(f"Translating to {selected_language}..."):
-                    prompt = templates["Simple Translator"].format(text_to_translate=text_to_translate, target_language=selected_language)
-                    translation_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Standard", {"tone": "Neutral", "language_style": "Standard"})
-                    st.markdown(f"**Translation ({selected_language}):**")
-                    st.markdown(translation_output)
+                    # Sentences already in the translation memory are reused; only the rest are translated
+                    translation_result = translate_with_memory(text_to_translate, selected_language, st.session_state.api_key, model_name, **generation_options)
+                    if translation_result["error"]: # Fall back to translating the whole text in one go
+                        prompt = templates["Simple Translator"].format(text_to_translate=text_to_translate, target_language=selected_language)
+                        translation_result = {"translation": generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Standard", {"tone": "Neutral", "language_style": "Standard"}, show_spinner=False, tool_name="Simple Translator"),
+                                              "segments": [], "error": None}
+                    st.session_state.translation_result = {**translation_result, "language": selected_language}
+
+        translation_result = st.session_state.get('translation_result')
+        if translation_result:
+            st.markdown(f"**Translation ({translation_result['language']}):**")
+            st.markdown(translation_result["translation"])
+            segments = translation_result["segments"]
+            if segments:
+                reused = sum(segment["match"] == "exact" for segment in segments)
+                referenced = sum(segment["reference"] is not None for segment in segments)
+                st.caption(f"♻️ {reused} of {len(segments)} sentences from the translation memory, {len(segments) - reused} translated "
+                           f"({referenced} with a similar earlier sentence as reference).")
+                with st.expander("✅ Review and confirm sentences"):
+                    st.caption("Confirmed sentences are reused as they are in later translations and are never overwritten.")
+                    edited_segments = st.data_editor(
+                        pd.DataFrame([{"Source": segment["source"], "Translation": segment["target"], "From memory": segment["match"] == "exact"}
+                                      for segment in segments]),
+                        disabled=["Source", "From memory"], hide_index=True, key="translation_segments_editor"
+                    )
+                    if st.button("Confirm sentences", key="confirm_translation_btn"):
+                        for row in edited_segments.itertuples(index=False):
+                            confirm_segment(translation_result["language"], row.Source, row.Translation)
+                        st.success(f"{len(edited_segments)} sentences confirmed in the translation memory.")
 
     # --- 4. Idea Generator ---
     with st.expander("💡 Idea Generator"):
@@ -1367,7 +2362,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Brainstorming ideas..."):
                     prompt = templates["Idea Generator"].format(theme_or_problem=idea_theme)
-                    ideas_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Brief", {"tone": "Creative", "language_style": "Concise"})
+                    ideas_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Brief", {"tone": "Creative", "language_style": "Concise"}, tool_name="Idea Generator")
                     st.markdown("**Generated Ideas:**")
                     st.markdown(ideas_output)
 
@@ -1380,7 +2375,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("AI is analyzing the code..."):
                     prompt = templates["Code Explainer"].format(code_snippet=code_snippet_input)
-                    explanation_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.3, "Standard", {"tone": "Informative", "language_style": "Simple"})
+                    explanation_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.3, "Standard", {"tone": "Informative", "language_style": "Simple"}, tool_name="Code Explainer")
                     st.markdown("**Code Explanation:**")
                     st.markdown(explanation_output)
 
@@ -1393,7 +2388,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Crafting subject lines..."):
                     prompt = templates["Email Subject Generator"].format(email_topic=email_topic_input)
-                    subjects_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Brief", {"tone": "Persuasive", "language_style": "Concise"})
+                    subjects_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Brief", {"tone": "Persuasive", "language_style": "Concise"}, tool_name="Email Subject Generator")
                     st.markdown("**Suggested Subject Lines:**")
                     st.markdown(subjects_output)
 
@@ -1406,7 +2401,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Analyzing headlines..."):
                     prompt = templates["Headline Analyzer"].format(headline_text=headline_text_input)
-                    headline_analysis_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Critical", "language_style": "Standard"})
+                    headline_analysis_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Critical", "language_style": "Standard"}, tool_name="Headline Analyzer")
                     st.markdown("**Headline Analysis & Suggestions:**")
                     st.markdown(headline_analysis_output)
 
@@ -1414,15 +2409,10 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
     with st.expander("🔑 Secure Password Idea Generator (Conceptual)"):
         pw_length = st.number_input("Minimum password length:", min_value=8, max_value=32, value=12, key="pw_idea_length")
         pw_char_types = st.number_input("Number of character types (e.g., uppercase, lowercase, number, symbol):", min_value=2, max_value=4, value=3, key="pw_idea_char_types")
-        st.caption("⚠️ This tool provides *ideas* for password creation methods, not actual passwords. Always use unique, strong passwords.")
+        st.caption("⚠️ Example passwords are generated locally with Python's `secrets` module and are never sent to the AI. Always use unique, strong passwords.")
         if st.button("Generate Password Ideas", key="pw_idea_btn"):
-            if not st.session_state.api_key: st.error("API key required.")
-            else:
-                with st.spinner("Generating password concepts..."):
-                    prompt = templates["Secure Password Idea Generator"].format(length=pw_length, char_types_count=pw_char_types)
-                    pw_ideas_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Brief", {"tone": "Informative", "language_style": "Concise"})
-                    st.markdown("**Password Creation Ideas:**")
-                    st.markdown(pw_ideas_output)
+            run_tool("Secure Password Idea Generator", {"length": pw_length, "char_types_count": pw_char_types}, 0.7, "Brief", {"tone": "Informative", "language_style": "Concise"})
+        show_tool_result("Secure Password Idea Generator", "**Password Creation Ideas:**")
 
     # --- 9. Meeting Agenda Creator ---
     with st.expander("🗓️ Meeting Agenda Creator"):
@@ -1434,7 +2424,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Drafting agenda..."):
                     prompt = templates["Meeting Agenda Creator"].format(meeting_topic=meeting_topic_agenda, attendees=meeting_attendees_agenda)
-                    agenda_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Formal", "language_style": "Structured"})
+                    agenda_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Formal", "language_style": "Structured"}, tool_name="Meeting Agenda Creator")
                     st.markdown("**Generated Meeting Agenda:**")
                     st.markdown(agenda_output)
 
@@ -1447,7 +2437,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Weighing options..."):
                     prompt = templates["Pros and Cons Lister"].format(decision_topic=pro_con_topic)
-                    pro_con_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Neutral", "language_style": "Balanced"})
+                    pro_con_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Neutral", "language_style": "Balanced"}, tool_name="Pros and Cons Lister")
                     st.markdown(pro_con_output)
 
     # --- 11. ELI5 (Explain Like I'm 5) ---
@@ -1459,7 +2449,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Simplifying..."):
                     prompt = templates["ELI5 Explainer"].format(complex_topic=eli5_topic)
-                    eli5_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Simple", "language_style": "Conversational"})
+                    eli5_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Simple", "language_style": "Conversational"}, tool_name="ELI5 Explainer")
                     st.markdown(eli5_output)
 
     # --- 12. Text Mood Analyzer ---
@@ -1471,34 +2461,26 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Sensing the vibe..."):
                     prompt = templates["Text Mood Analyzer"].format(text_for_mood_analysis=mood_text)
-                    mood_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Brief", {"tone": "Analytical", "language_style": "Concise"})
+                    mood_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Brief", {"tone": "Analytical", "language_style": "Concise"}, tool_name="Text Mood Analyzer")
                     st.markdown(mood_output)
 
     # --- 13. Keyword Extractor ---
     with st.expander("🔑 Keyword Extractor"):
         keyword_text = st.text_area("Text to extract keywords from:", height=150, key="keyword_text_input")
         if st.button("Extract Keywords", key="keyword_btn"):
-            if not st.session_state.api_key: st.error("API key required.")
-            elif not keyword_text: st.warning("Please enter text.")
+            if not keyword_text: st.warning("Please enter text.")
             else:
-                with st.spinner("Identifying key terms..."):
-                    prompt = templates["Keyword Extractor"].format(text_for_keywords=keyword_text)
-                    keywords_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.3, "Brief", {"tone": "Analytical", "language_style": "List"})
-                    st.markdown("**Extracted Keywords:**")
-                    st.markdown(keywords_output)
+                run_tool("Keyword Extractor", {"text_for_keywords": keyword_text}, 0.3, "Brief", {"tone": "Analytical", "language_style": "List"})
+        show_tool_result("Keyword Extractor", "**Extracted Keywords:**")
 
     # --- 14. Hashtag Generator ---
     with st.expander("#️⃣ Hashtag Generator"):
         hashtag_topic = st.text_input("Topic or text for hashtag generation:", key="hashtag_topic_input")
         if st.button("Generate Hashtags", key="hashtag_btn"):
-            if not st.session_state.api_key: st.error("API key required.")
-            elif not hashtag_topic: st.warning("Please enter a topic.")
+            if not hashtag_topic: st.warning("Please enter a topic.")
             else:
-                with st.spinner("Finding relevant hashtags..."):
-                    prompt = templates["Hashtag Generator"].format(post_topic_or_text=hashtag_topic)
-                    hashtags_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Brief", {"tone": "Trendy", "language_style": "Concise"})
-                    st.markdown("**Suggested Hashtags:**")
-                    st.markdown(hashtags_output)
+                run_tool("Hashtag Generator", {"post_topic_or_text": hashtag_topic}, 0.7, "Brief", {"tone": "Trendy", "language_style": "Concise"})
+        show_tool_result("Hashtag Generator", "**Suggested Hashtags:**")
 
     # --- 15. Story Idea Kicker ---
     with st.expander("📖 Story Idea Kicker"):
@@ -1509,7 +2491,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Brewing up narratives..."):
                     prompt = templates["Story Idea Kicker"].format(story_genre_theme=story_genre)
-                    story_ideas_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Standard", {"tone": "Creative", "language_style": "Descriptive"})
+                    story_ideas_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Standard", {"tone": "Creative", "language_style": "Descriptive"}, tool_name="Story Idea Kicker")
                     st.markdown("**Story Prompts/Ideas:**")
                     st.markdown(story_ideas_output)
 
@@ -1522,7 +2504,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Consulting the annals of history..."):
                     prompt = templates["Historical Event Summarizer"].format(event_name=event_name_input)
-                    event_summary_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Brief", {"tone": "Informative", "language_style": "Concise"})
+                    event_summary_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Brief", {"tone": "Informative", "language_style": "Concise"}, tool_name="Historical Event Summarizer")
                     st.markdown(event_summary_output)
 
     # --- 17. Book Plot Summarizer ---
@@ -1534,7 +2516,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Flipping through pages..."):
                     prompt = templates["Book Plot Summarizer"].format(book_title=book_title_input)
-                    book_summary_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Narrative", "language_style": "Engaging"})
+                    book_summary_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Narrative", "language_style": "Engaging"}, tool_name="Book Plot Summarizer")
                     st.markdown(book_summary_output)
 
     # --- 18. Recipe Idea Generator ---
@@ -1546,7 +2528,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Cooking up ideas..."):
                     prompt = templates["Recipe Idea Generator"].format(ingredients_list=ingredients_input)
-                    recipe_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Standard", {"tone": "Helpful", "language_style": "Instructional"})
+                    recipe_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Standard", {"tone": "Helpful", "language_style": "Instructional"}, tool_name="Recipe Idea Generator")
                     st.markdown(recipe_output)
 
     # --- 19. Learning Path Suggester ---
@@ -1558,7 +2540,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Charting your course..."):
                     prompt = templates["Learning Path Suggester"].format(skill_or_topic_to_learn=learn_topic_input)
-                    path_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Guidance", "language_style": "Structured"})
+                    path_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Guidance", "language_style": "Structured"}, tool_name="Learning Path Suggester")
                     st.markdown("**Suggested Learning Path:**")
                     st.markdown(path_output)
 
@@ -1569,7 +2551,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Finding controversial ideas..."):
                     prompt = templates["Debate Topic Generator"] # No specific input needed from user for this one
-                    debate_topics_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Brief", {"tone": "Provocative", "language_style": "Concise"})
+                    debate_topics_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Brief", {"tone": "Provocative", "language_style": "Concise"}, tool_name="Debate Topic Generator")
                     st.markdown("**Debate Topics:**")
                     st.markdown(debate_topics_output)
 
@@ -1582,7 +2564,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Summoning the muse..."):
                     prompt = templates["Short Poem Generator"].format(poem_theme_keywords=poem_theme_input)
-                    poem_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.9, "Brief", {"tone": "Artistic", "language_style": "Poetic"})
+                    poem_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.9, "Brief", {"tone": "Artistic", "language_style": "Poetic"}, tool_name="Short Poem Generator")
                     st.markdown(poem_output)
 
     # --- 22. Joke Teller ---
@@ -1593,7 +2575,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Thinking of a funny one..."):
                     prompt = templates["Joke Teller"].format(joke_topic=joke_topic_input if joke_topic_input else "anything")
-                    joke_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Brief", {"tone": "Humorous", "language_style": "Conversational"})
+                    joke_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Brief", {"tone": "Humorous", "language_style": "Conversational"}, tool_name="Joke Teller")
                     st.markdown(joke_output)
 
     # --- 23. Character Name Generator ---
@@ -1605,7 +2587,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Creating identities..."):
                     prompt = templates["Character Name Generator"].format(character_genre_theme=char_genre_input)
-                    names_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.9, "Brief", {"tone": "Creative", "language_style": "List"})
+                    names_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.9, "Brief", {"tone": "Creative", "language_style": "List"}, tool_name="Character Name Generator")
                     st.markdown("**Suggested Character Names:**")
                     st.markdown(names_output)
 
@@ -1617,7 +2599,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Finding wisdom..."):
                     prompt = templates["Random Quote Generator"].format(quote_theme=quote_theme_input if quote_theme_input else "any inspiring topic")
-                    quote_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Brief", {"tone": "Inspirational", "language_style": "Eloquent"})
+                    quote_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Brief", {"tone": "Inspirational", "language_style": "Eloquent"}, tool_name="Random Quote Generator")
                     st.markdown(quote_output)
 
     # --- 25. Fictional World Idea Generator ---
@@ -1629,7 +2611,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Building new realities..."):
                     prompt = templates["Fictional World Idea Generator"].format(world_genre=world_genre_input)
-                    world_idea_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Standard", {"tone": "Imaginative", "language_style": "Descriptive"})
+                    world_idea_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Standard", {"tone": "Imaginative", "language_style": "Descriptive"}, tool_name="Fictional World Idea Generator")
                     st.markdown("**Fictional World Concept:**")
                     st.markdown(world_idea_output)
 
@@ -1642,7 +2624,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("AI is commenting the code..."):
                     prompt = templates["Code Comment Generator"].format(code_to_comment=code_to_comment_input)
-                    comments_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Standard", {"tone": "Informative", "language_style": "Technical"})
+                    comments_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Standard", {"tone": "Informative", "language_style": "Technical"}, tool_name="Code Comment Generator")
                     st.markdown("**Generated Comments (and original code):**")
                     st.markdown(comments_output)
 
@@ -1655,7 +2637,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Thinking of a good comparison..."):
                     prompt = templates["Analogy Generator"].format(concept_for_analogy=analogy_concept_input)
-                    analogy_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Brief", {"tone": "Creative", "language_style": "Simplified"})
+                    analogy_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Brief", {"tone": "Creative", "language_style": "Simplified"}, tool_name="Analogy Generator")
                     st.markdown("**Generated Analogy:**")
                     st.markdown(analogy_output)
 
@@ -1668,7 +2650,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Pondering ethical quandaries..."):
                     prompt = templates["Ethical Dilemma Generator"].format(dilemma_topic=dilemma_topic_input)
-                    dilemma_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Standard", {"tone": "Thought-provoking", "language_style": "Narrative"})
+                    dilemma_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Standard", {"tone": "Thought-provoking", "language_style": "Narrative"}, tool_name="Ethical Dilemma Generator")
                     st.markdown("**Ethical Dilemma:**")
                     st.markdown(dilemma_output)
 
@@ -1681,7 +2663,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Analyzing strengths, weaknesses, opportunities, and threats..."):
                     prompt = templates["SWOT Analysis Generator"].format(swot_topic=swot_topic_input)
-                    swot_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Analytical", "language_style": "Structured"})
+                    swot_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Analytical", "language_style": "Structured"}, tool_name="SWOT Analysis Generator")
                     st.markdown("**Basic SWOT Analysis:**")
                     st.markdown(swot_output)
 
@@ -1689,14 +2671,10 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
     with st.expander("ℹ️ Acronym Explainer"):
         acronym_input = st.text_input("Enter acronym to explain (e.g., NASA, HTML):", key="acronym_input")
         if st.button("Explain Acronym", key="acronym_btn_misc"):
-            if not st.session_state.api_key: st.error("API key required.")
-            elif not product_features_input: st.warning("Please list some product features.")
+            if not acronym_input: st.warning("Please enter an acronym.")
             else:
-                with st.spinner("Crafting a catchy description..."):
-                    prompt = templates["Product Description Snippet Generator"].format(product_features=product_features_input)
-                    desc_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Brief", {"tone": "Persuasive", "language_style": "Engaging"})
-                    st.markdown("**Product Description Snippet:**")
-                    st.markdown(desc_output)
+                run_tool("Acronym Explainer", {"acronym_to_explain": acronym_input}, 0.3, "Brief", {"tone": "Informative", "language_style": "Concise"})
+        show_tool_result("Acronym Explainer")
 
     # --- 21. Essay Outline Generator ---
     with st.expander("📄 Essay Outline Generator"):
@@ -1707,7 +2685,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Brainstorming blog topics..."):
                     prompt = templates["Blog Post Idea Generator"].format(blog_niche=blog_niche_input)
-                    blog_ideas_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Brief", {"tone": "Creative", "language_style": "Catchy"})
+                    blog_ideas_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Brief", {"tone": "Creative", "language_style": "Catchy"}, tool_name="Blog Post Idea Generator")
                     st.markdown("**Blog Post Ideas/Titles:**")
                     st.markdown(blog_ideas_output)
 
@@ -1717,26 +2695,34 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
         study_timeframe_input = st.selectbox("Plan for:", ["daily", "weekly"], key="study_plan_timeframe_select")
         if st.button("Create Study Plan", key="study_plan_btn"):
             if not st.session_state.api_key: st.error("API key required.")
-            elif not acronym_input: st.warning("Please enter an acronym.")
+            elif not study_topic_input: st.warning("Please enter a topic.")
             else:
-                with st.spinner("Looking up acronym..."):
-                    prompt = templates["Acronym Explainer"].format(acronym_to_explain=acronym_input)
-                    acronym_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.3, "Brief", {"tone": "Informative", "language_style": "Concise"})
-                    st.markdown(acronym_output)
+                with st.spinner("Planning your study time..."):
+                    prompt = templates["Study Plan Creator (Daily/Weekly)"].format(timeframe=study_timeframe_input, study_topic=study_topic_input)
+                    study_plan_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Helpful", "language_style": "Structured"}, tool_name="Study Plan Creator (Daily/Weekly)")
+                    st.markdown(study_plan_output)
 
     # --- 33. Rhyme Finder ---
+    with st.expander("🎵 Rhyme Finder"):
+        rhyme_word_input = st.text_input("Enter a word to find rhymes for:", key="rhyme_word_input")
+        if st.button("Find Rhymes", key="rhyme_finder_btn"):
+            if not rhyme_word_input: st.warning("Please enter a word.")
+            else:
+                run_tool("Rhyme Finder", {"word_for_rhyme": rhyme_word_input}, 0.6, "Brief", {"tone": "Playful", "language_style": "List"})
+        show_tool_result("Rhyme Finder", f"**Words that rhyme with '{rhyme_word_input}':**")
+
     # --- 23. Concept Mapping (Text-based) ---
     with st.expander("🗺️ Concept Mapping (Text-based)"):
         concept_map_topic_input = st.text_input("Topic for concept map:", key="concept_map_topic_input")
         if st.button("Generate Concept Map Structure", key="concept_map_btn"):
             if not st.session_state.api_key: st.error("API key required.")
-            elif not rhyme_word_input: st.warning("Please enter a word.")
+            elif not concept_map_topic_input: st.warning("Please enter a topic.")
             else:
-                with st.spinner("Searching for rhymes..."):
-                    prompt = templates["Rhyme Finder"].format(word_for_rhyme=rhyme_word_input)
-                    rhymes_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Brief", {"tone": "Playful", "language_style": "List"})
-                    st.markdown(f"**Words that rhyme with '{rhyme_word_input}':**")
-                    st.markdown(rhymes_output)
+                with st.spinner("Mapping concepts..."):
+                    prompt = templates["Concept Mapping (Text-based)"].format(concept_map_topic=concept_map_topic_input)
+                    concept_map_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Academic", "language_style": "Structured"}, tool_name="Concept Mapping (Text-based)")
+                    st.markdown("**Concept Map Structure:**")
+                    st.markdown(concept_map_output)
 
     # --- 24. Research Question Refiner ---
     with st.expander("🔬 Research Question Refiner"):
@@ -1747,7 +2733,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Branding in progress..."):
                     prompt = templates["Business Name Idea Generator"].format(business_concept=business_concept_input)
-                    biz_names_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.9, "Brief", {"tone": "Creative", "language_style": "Catchy"})
+                    biz_names_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.9, "Brief", {"tone": "Creative", "language_style": "Catchy"}, tool_name="Business Name Idea Generator")
                     st.markdown("**Suggested Business Names:**")
                     st.markdown(biz_names_output)
 
@@ -1759,7 +2745,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Planning your sweat session..."):
                     prompt = templates["Workout Idea Generator"].format(workout_focus_or_equipment=workout_focus_input if workout_focus_input else "general fitness")
-                    workout_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Encouraging", "language_style": "Instructional"})
+                    workout_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Encouraging", "language_style": "Instructional"}, tool_name="Workout Idea Generator")
                     st.markdown("**Simple Workout Idea (15-20 mins):**")
                     st.markdown(workout_output)
 
@@ -1772,7 +2758,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Brainstorming gift ideas..."):
                     prompt = templates["Gift Idea Suggester"].format(recipient_interests=recipient_interests_input)
-                    gift_ideas_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Standard", {"tone": "Helpful", "language_style": "Descriptive"})
+                    gift_ideas_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Standard", {"tone": "Helpful", "language_style": "Descriptive"}, tool_name="Gift Idea Suggester")
                     st.markdown("**Gift Suggestions:**")
                     st.markdown(gift_ideas_output)
 
@@ -1785,7 +2771,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Planning your mini-adventure..."):
                     prompt = templates["Travel Itinerary Snippet"].format(destination_city=destination_city_input)
-                    itinerary_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Informative", "language_style": "Organized"})
+                    itinerary_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Informative", "language_style": "Organized"}, tool_name="Travel Itinerary Snippet")
                     st.markdown(f"**1-Day Itinerary Snippet for {destination_city_input}:**")
                     st.markdown(itinerary_output)
 
@@ -1798,7 +2784,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Breaking the ice..."):
                     prompt = templates["Ice Breaker Question Generator"].format(group_setting=group_setting_input)
-                    ice_breakers_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Brief", {"tone": "Fun", "language_style": "Conversational"})
+                    ice_breakers_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.8, "Brief", {"tone": "Fun", "language_style": "Conversational"}, tool_name="Ice Breaker Question Generator")
                     st.markdown("**Ice Breaker Questions:**")
                     st.markdown(ice_breakers_output)
 
@@ -1811,7 +2797,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Crafting positive vibes..."):
                     prompt = templates["Personalized Affirmation Generator"].format(personal_goal=personal_goal_input)
-                    affirmations_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Brief", {"tone": "Empowering", "language_style": "Positive"})
+                    affirmations_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Brief", {"tone": "Empowering", "language_style": "Positive"}, tool_name="Personalized Affirmation Generator")
                     st.markdown("**Your Personalized Affirmations:**")
                     st.markdown(affirmations_output)
 
@@ -1824,7 +2810,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Fabricating a tall tale..."):
                     prompt = templates["Excuse Generator (Humorous)"].format(event_or_situation=event_situation_input)
-                    excuse_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.9, "Brief", {"tone": "Humorous", "language_style": "Exaggerated"})
+                    excuse_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.9, "Brief", {"tone": "Humorous", "language_style": "Exaggerated"}, tool_name="Excuse Generator (Humorous)")
                     st.markdown("**Your Hilariously Unbelievable Excuse:**")
                     st.markdown(excuse_output)
 
@@ -1837,7 +2823,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Defining term..."):
                     prompt = templates["Academic Terminology Explainer"].format(academic_term=academic_term_input)
-                    term_explanation_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Standard", {"tone": "Academic", "language_style": "Detailed"})
+                    term_explanation_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Standard", {"tone": "Academic", "language_style": "Detailed"}, tool_name="Academic Terminology Explainer")
                     st.markdown(term_explanation_output)
 
     # --- 32. Historical Context Generator ---
@@ -1849,7 +2835,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Setting the scene..."):
                     prompt = templates["Historical Context Generator"].format(historical_subject=historical_subject_input)
-                    historical_context_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Informative", "language_style": "Narrative"})
+                    historical_context_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Informative", "language_style": "Narrative"}, tool_name="Historical Context Generator")
                     st.markdown(historical_context_output)
 
     # --- 33. Scientific Process Outline ---
@@ -1861,7 +2847,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Mapping the scientific method..."):
                     prompt = templates["Scientific Process Outline"].format(scientific_topic=scientific_topic_input)
-                    scientific_outline_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Standard", {"tone": "Technical", "language_style": "Structured"})
+                    scientific_outline_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Standard", {"tone": "Technical", "language_style": "Structured"}, tool_name="Scientific Process Outline")
                     st.markdown("**Scientific Process Outline:**")
                     st.markdown(scientific_outline_output)
 
@@ -1874,7 +2860,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Breaking down the math..."):
                     prompt = templates["Mathematical Concept Explainer"].format(math_concept=math_concept_input)
-                    math_explanation_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Informative", "language_style": "Simple"})
+                    math_explanation_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Informative", "language_style": "Simple"}, tool_name="Mathematical Concept Explainer")
                     st.markdown(math_explanation_output)
 
     # --- 35. Grammar/Style Checker (Basic) ---
@@ -1886,7 +2872,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Reviewing text..."):
                     prompt = templates["Grammar/Style Checker (Basic)"].format(text_to_check=text_to_check_input)
-                    grammar_check_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Standard", {"tone": "Helpful", "language_style": "Corrective"})
+                    grammar_check_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Standard", {"tone": "Helpful", "language_style": "Corrective"}, tool_name="Grammar/Style Checker (Basic)")
                     st.markdown("**Review & Suggestions:**")
                     st.markdown(grammar_check_output)
 
@@ -1899,7 +2885,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Paraphrasing..."):
                     prompt = templates["Paraphrasing Tool (Academic)"].format(text_to_paraphrase=text_to_paraphrase_input)
-                    paraphrase_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Academic", "language_style": "Formal"})
+                    paraphrase_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Academic", "language_style": "Formal"}, tool_name="Paraphrasing Tool (Academic)")
                     st.markdown("**Paraphrased Text:**")
                     st.markdown(paraphrase_output)
 
@@ -1912,7 +2898,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Considering opposing views..."):
                     prompt = templates["Counter-Argument Generator"].format(main_argument=main_argument_input)
-                    counter_arguments_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Standard", {"tone": "Analytical", "language_style": "Structured"})
+                    counter_arguments_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.7, "Standard", {"tone": "Analytical", "language_style": "Structured"}, tool_name="Counter-Argument Generator")
                     st.markdown("**Potential Counter-Arguments:**")
                     st.markdown(counter_arguments_output)
 
@@ -1925,7 +2911,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Formulating hypotheses..."):
                     prompt = templates["Hypothesis Generator"].format(observation_or_topic=observation_or_topic_input)
-                    hypothesis_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Brief", {"tone": "Scientific", "language_style": "Concise"})
+                    hypothesis_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Brief", {"tone": "Scientific", "language_style": "Concise"}, tool_name="Hypothesis Generator")
                     st.markdown("**Suggested Hypothesis/Hypotheses:**")
                     st.markdown(hypothesis_output)
 
@@ -1938,7 +2924,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Interpreting data..."):
                     prompt = templates["Data Interpretation Helper"].format(data_description=data_description_input)
-                    data_interpretation_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Analytical", "language_style": "Informative"})
+                    data_interpretation_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Analytical", "language_style": "Informative"}, tool_name="Data Interpretation Helper")
                     st.markdown("**Data Interpretation:**")
                     st.markdown(data_interpretation_output)
 
@@ -1951,7 +2937,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Defining objectives..."):
                     prompt = templates["Learning Objective Generator"].format(learning_topic=learning_topic_input)
-                    learning_objectives_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Brief", {"tone": "Educational", "language_style": "Structured"})
+                    learning_objectives_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Brief", {"tone": "Educational", "language_style": "Structured"}, tool_name="Learning Objective Generator")
                     st.markdown("**Suggested Learning Objectives:**")
                     st.markdown(learning_objectives_output)
 
@@ -1965,7 +2951,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner(f"Generating {component_type_arg.lower()}..."):
                     prompt = templates["Argumentative Essay Component Generator"].format(essay_topic=essay_topic_arg_input, component_type=component_type_arg)
-                    essay_comp_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Academic", "language_style": "Persuasive"})
+                    essay_comp_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Academic", "language_style": "Persuasive"}, tool_name="Argumentative Essay Component Generator")
                     st.markdown(f"**Generated {component_type_arg}:**")
                     st.markdown(essay_comp_output)
 
@@ -1979,7 +2965,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Suggesting research methodologies..."):
                     prompt = templates["Research Methodology Suggester"].format(research_question=research_question_meth_input, field_of_study=field_of_study_meth_input)
-                    methodology_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Comprehensive", {"tone": "Academic", "language_style": "Analytical"})
+                    methodology_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Comprehensive", {"tone": "Academic", "language_style": "Analytical"}, tool_name="Research Methodology Suggester")
                     st.markdown("**Suggested Research Methodologies:**")
                     st.markdown(methodology_output)
 
@@ -1993,7 +2979,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Outlining data analysis plan..."):
                     prompt = templates["Data Analysis Plan Outline"].format(research_objective=research_objective_da_input, data_type=data_type_da_input)
-                    da_plan_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Comprehensive", {"tone": "Technical", "language_style": "Structured"})
+                    da_plan_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Comprehensive", {"tone": "Technical", "language_style": "Structured"}, tool_name="Data Analysis Plan Outline")
                     st.markdown("**Data Analysis Plan Outline:**")
                     st.markdown(da_plan_output)
 
@@ -2007,7 +2993,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner(f"Drafting snippet for {target_section_grant_select}..."):
                     prompt = templates["Grant Proposal Snippet Generator"].format(project_idea=project_idea_grant_input, target_section=target_section_grant_select)
-                    grant_snippet_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Persuasive", "language_style": "Formal"})
+                    grant_snippet_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Persuasive", "language_style": "Formal"}, tool_name="Grant Proposal Snippet Generator")
                     st.markdown(f"**Generated Snippet for {target_section_grant_select}:**")
                     st.markdown(grant_snippet_output)
 
@@ -2021,7 +3007,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Generating constructive feedback..."):
                     prompt = templates["Peer Review Feedback Generator (Constructive)"].format(text_for_review=text_for_review_pr_input, focus_area=focus_area_pr_input)
-                    pr_feedback_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Constructive", "language_style": "Academic"})
+                    pr_feedback_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Standard", {"tone": "Constructive", "language_style": "Academic"}, tool_name="Peer Review Feedback Generator (Constructive)")
                     st.markdown("**Constructive Peer Review Feedback:**")
                     st.markdown(pr_feedback_output)
 
@@ -2036,7 +3022,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Structuring your presentation..."):
                     prompt = templates["Presentation Script Outline Generator"].format(presentation_topic=presentation_topic_pres_input, target_audience=target_audience_pres_input, length=presentation_length_pres_input)
-                    pres_outline_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Comprehensive", {"tone": "Engaging", "language_style": "Structured"})
+                    pres_outline_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Comprehensive", {"tone": "Engaging", "language_style": "Structured"}, tool_name="Presentation Script Outline Generator")
                     st.markdown("**Presentation Outline:**")
                     st.markdown(pres_outline_output)
 
@@ -2050,7 +3036,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Deciphering technical jargon..."):
                     prompt = templates["Technical Document Explainer (Advanced)"].format(technical_snippet=technical_snippet_tech_input, explanation_level=explanation_level_tech_select)
-                    tech_explain_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Standard", {"tone": "Informative", "language_style": "Simplified"})
+                    tech_explain_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.4, "Standard", {"tone": "Informative", "language_style": "Simplified"}, tool_name="Technical Document Explainer (Advanced)")
                     st.markdown(f"**Explanation for {explanation_level_tech_select}:**")
                     st.markdown(tech_explain_output)
 
@@ -2063,7 +3049,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Structuring case study..."):
                     prompt = templates["Case Study Creator (from scenario)"].format(scenario_description=scenario_desc_case_input)
-                    case_study_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Comprehensive", {"tone": "Analytical", "language_style": "Formal"})
+                    case_study_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Comprehensive", {"tone": "Analytical", "language_style": "Formal"}, tool_name="Case Study Creator (from scenario)")
                     st.markdown("**Case Study Structure & Discussion Points:**")
                     st.markdown(case_study_output)
 
@@ -2077,7 +3063,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner(f"Drafting '{component_type_syllabus_select}'..."):
                     prompt = templates["Syllabus Component Generator (Advanced)"].format(course_title=course_title_syllabus_input, component_type=component_type_syllabus_select)
-                    syllabus_comp_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Comprehensive", {"tone": "Academic", "language_style": "Formal"})
+                    syllabus_comp_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.5, "Comprehensive", {"tone": "Academic", "language_style": "Formal"}, tool_name="Syllabus Component Generator (Advanced)")
                     st.markdown(f"**Drafted Syllabus Component: {component_type_syllabus_select}**")
                     st.markdown(syllabus_comp_output)
 
@@ -2090,7 +3076,7 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
             else:
                 with st.spinner("Identifying ethical considerations..."):
                     prompt = templates["Ethical Review Considerations Lister (Research)"].format(research_proposal_idea=research_proposal_ethics_input)
-                    ethics_list_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Analytical", "language_style": "Formal"})
+                    ethics_list_output = generate_ai_content(prompt, st.session_state.api_key, model_name, 0.6, "Standard", {"tone": "Analytical", "language_style": "Formal"}, tool_name="Ethical Review Considerations Lister (Research)")
                     st.markdown("**Key Ethical Considerations for Review:**")
                     st.markdown(ethics_list_output)
 
@@ -2099,5 +3085,121 @@ if st.session_state.selected_main_tab == "🛠️ Misc. Features":
     st.caption("More tools will be added here!")
 
 # Footer
+profile_checkpoint("Footer")
 st.markdown("---")
 st.markdown("Made with ❤️ using Streamlit and Gemini AI")
+profile_checkpoint(None)
+
+save_user_data() # Retries saves that failed when the data was written
+
+# --- Developer profiler panel (rendered last so it can report on this whole rerun) ---
+if PROFILE_MODE:
+    if st.session_state.active_cprofile is not None:
+        finish_cprofile(st.session_state.active_cprofile)
+    rerun_total_ms = (time.perf_counter() - RERUN_START) * 1000
+    memory_rows = session_memory_report()
+    with st.sidebar:
+        with st.expander("🧪 Developer Profiler", expanded=True):
+            st.metric("Rerun Time", f"{rerun_total_ms:.1f} ms")
+            sections_df = pd.DataFrame(st.session_state.profiler_sections)
+            if not sections_df.empty:
+                sections_df = sections_df.sort_values("duration_ms", ascending=False)
+                st.dataframe(sections_df, hide_index=True, use_container_width=True) # Click a column header to sort
+                st.download_button(
+                    "Download speedscope profile",
+                    data=sections_to_speedscope(st.session_state.profiler_sections, rerun_total_ms),
+                    file_name=f"rerun_{datetime.now().strftime('%Y%m%d_%H%M%S')}.speedscope.json",
+                    mime="application/json",
+                    key="download_speedscope_btn"
+                )
+
+            if st.button("Profile next rerun (cProfile)", key="profile_next_rerun_btn"):
+                st.session_state.profile_next_rerun = True
+                st.rerun()
+
+            report = st.session_state.profiler_report
+            if report:
+                st.caption(f"cProfile run at {report['timestamp']}" + (" (cut short by st.rerun)" if report['interrupted'] else ""))
+                st.dataframe(pd.DataFrame(report["functions"]), hide_index=True, use_container_width=True)
+                st.download_button(
+                    "Download .prof",
+                    data=report["prof"],
+                    file_name=f"rerun_{report['timestamp'].replace(' ', '_').replace(':', '')}.prof",
+                    mime="application/octet-stream",
+                    key="download_prof_btn"
+                )
+
+        with st.expander("🧮 Session Memory", expanded=False):
+            session_total = sum(row["bytes"] for row in memory_rows)
+            spilled_total = sum(row["spilled_bytes"] for row in memory_rows)
+            mem_col1, mem_col2 = st.columns(2)
+            mem_col1.metric("This Session", f"{session_total / 1024:.1f} KB")
+            mem_col2.metric("Spilled to Disk", f"{spilled_total / 1024:.1f} KB")
+            st.dataframe(pd.DataFrame(memory_rows), hide_index=True, use_container_width=True)
+            st.caption(f"Values over {SPILL_THRESHOLD_BYTES // 1024} KB are kept in {BLOB_STORE_DIR}")
+            notes_stats = note_store_stats()
+            st.caption(f"Note store: {notes_stats['notes']} bodies ({notes_stats['deltas']} as deltas), "
+                       f"{notes_stats['raw_bytes'] / 1024:.1f} KB of text in {notes_stats['stored_bytes'] / 1024:.1f} KB")
+            tm_stats = translation_memory_stats()
+            st.caption(f"Translation memory: {tm_stats['segments']} sentences in {tm_stats['languages']} languages "
+                       f"({tm_stats['confirmed']} confirmed)")
+            registry = update_session_memory_registry(force=True)
+            sessions_df = pd.DataFrame([
+                {"session": uid, "bytes": info["bytes"], "spilled_bytes": info["spilled_bytes"], "keys": info["keys"],
+                 "updated": datetime.fromtimestamp(info["updated"]).strftime("%H:%M:%S")}
+                for uid, info in registry.items()
+            ])
+            st.markdown(f"**Profiled Sessions: {len(registry)}** ({sessions_df['bytes'].sum() / 1024:.1f} KB total)")
+            st.dataframe(sessions_df.sort_values("bytes", ascending=False), hide_index=True, use_container_width=True)
+
+        with st.expander("🛫 Shared AI Requests", expanded=False):
+            flight_registry = get_single_flight_registry()
+            flight_stats = flight_registry["stats"]
+            flight_col1, flight_col2, flight_col3, flight_col4 = st.columns(4)
+            flight_col1.metric("API Calls", flight_stats["calls"])
+            flight_col2.metric("Coalesced", flight_stats["coalesced"])
+            flight_col3.metric("In Flight", len(flight_registry["flights"]))
+            flight_col4.metric("Cancelled", flight_stats["cancelled"])
+            st.caption("Identical requests made at the same time on the same API key (or the server key pool) share a single API call.")
+            hedge_stats = get_model_stats()["hedge"]
+            hedge_col1, hedge_col2, hedge_col3 = st.columns(3)
+            hedge_col1.metric("Hedge-Eligible Calls", hedge_stats["calls"])
+            hedge_col2.metric("Hedges Fired", hedge_stats["fired"], help=f"Capped at {HEDGE_BUDGET:.0%} of eligible calls")
+            hedge_col3.metric("Hedges Won", hedge_stats["won"])
+            st.caption(f"Storage backend: {get_storage()['backend']} · user id {st.session_state.user_id[:8]}…")
+            if CASSETTE_MODE != "off":
+                st.caption(f"📼 Cassette mode: {CASSETTE_MODE} ({len(list_cassettes())} cassettes in {CASSETTE_DIR})")
+
+        with st.expander("♻️ Semantic Cache", expanded=False):
+            semantic_stats = get_semantic_cache_stats()
+            format_share = lambda value: "–" if value is None else f"{value:.0%}"
+            sem_col1, sem_col2, sem_col3, sem_col4 = st.columns(4)
+            sem_col1.metric("Hit Rate", format_share(semantic_stats["hit_rate"]), help=f"{semantic_stats['hits']} of {semantic_stats['lookups']} lookups")
+            sem_col2.metric("Avg Hit Similarity", format_share(semantic_stats["average_hit_similarity"]),
+                            help=f"Lowest: {format_share(semantic_stats['lowest_hit_similarity'])}")
+            sem_col3.metric("Kept (not regenerated)", format_share(semantic_stats["acceptance_rate"]), help=f"{semantic_stats['rejected']} hits regenerated")
+            sem_col4.metric("Indexed Requests", semantic_stats["entries"])
+            st.caption(f"Threshold {semantic_stats['threshold']:.0%} (NOTE_MAKER_SEMANTIC_CACHE_THRESHOLD). Average similarity of regenerated hits: "
+                       f"{format_share(semantic_stats['average_rejected_similarity'])}; if it is close to the threshold, raise the threshold.")
+
+        if API_KEY_POOL:
+            with st.expander("🔐 API Key Pool", expanded=False):
+                st.dataframe(pd.DataFrame(key_pool_report()), hide_index=True, use_container_width=True)
+                st.caption(f"Each key is budgeted at {KEY_REQUESTS_PER_MINUTE} requests per minute.")
+
+        with st.expander("🧭 Model Routing", expanded=False):
+            model_stats = get_model_stats()
+            with model_stats["lock"]:
+                model_rows = [
+                    {"model": name, "calls": entry["calls"], "errors": entry["errors"], "error_rate": round(entry["error_rate"], 2),
+                     "latency_ms": None if entry["latency_ms"] is None else round(entry["latency_ms"])}
+                    for name, entry in model_stats["models"].items()
+                ]
+                decision_rows = list(model_stats["decisions"])[::-1]
+            if model_rows:
+                st.dataframe(pd.DataFrame(model_rows), hide_index=True, use_container_width=True)
+            if decision_rows:
+                st.markdown("**Recent Routing Decisions**")
+                st.dataframe(pd.DataFrame(decision_rows), hide_index=True, use_container_width=True)
+            else:
+                st.caption(f"Select \"{AUTO_MODEL}\" as the AI model to route each request automatically.")
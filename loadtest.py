@@ -0,0 +1,339 @@
+# Load test for the Streamlit app: N simulated sessions run realistic flows at the same time against a
+# fake or replayed Gemini backend, for a capacity number and a regression gate.
+#
+#   python loadtest.py --sessions 1,2,4,8 --duration 60
+#   python loadtest.py --sessions 8 --backend replay --target-p95-ms 1500 --gate
+#
+# Each session is a Streamlit AppTest (its own session state and script reruns) driven from its own
+# thread inside this process, so this process plays the server: its CPU and RSS are what one app
+# instance would use. One unmeasured pass through the flows warms the process up first. A session loops over: generate notes, export them, take the quick quiz, turn the
+# notes into flashcards and review them, and visit the other main tabs, pausing for a random think time
+# between interactions. Every interaction is one measured rerun; an exception raised by the app or a
+# widget the flow expected but didn't find counts as an error. For every N the report gives rerun
+# latency percentiles, throughput, CPU, peak RSS and the error rate. The capacity is the largest N that
+# stays within --target-p95-ms and --max-error-rate; with --gate the exit code is 1 when the largest N
+# doesn't.
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+TOPICS = [
+    "Photosynthesis", "Cellular respiration", "Mitosis and meiosis", "The French Revolution", "World War I causes",
+    "Newton's laws of motion", "Supply and demand", "The water cycle", "Plate tectonics", "DNA replication",
+    "Pythagorean theorem", "Ohm's law", "The Cold War", "Machine learning basics", "The human heart",
+]
+TABS = ["🔬 Research Assistant", "🎯 Study Hub", "✍️ Writing Enhancer", "📊 Analytics & History", "🛠️ Misc. Features"]
+EXPORT_FORMATS = ["Text (.txt)", "Markdown (.md)", "CSV (.csv)", "HTML (.html)"]
+QUIZ_QUESTIONS_ANSWERED = 5
+CARDS_REVIEWED = 3
+RSS_SAMPLE_SECONDS = 0.5
+
+# --- Fake Gemini backend ---
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+class FakeGenerativeModel:
+    # Stands in for genai.GenerativeModel: answers in the formats the app parses (notes, numbered quiz
+    # questions, Q:/A: flashcards), streamed in chunks over the configured latency.
+    latency_ms = 300
+    note_words = 600
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._client = None
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        rng = random.Random(hash(prompt))
+        if "quiz" in prompt.lower():
+            text = "\n\n".join(f"{i}. Which statement about concept {i} is correct?\nA. Option one\nB. Option two\nC. Option three\n"
+                               f"D. Option four\nCorrect answer: {rng.choice('ABCD')}" for i in range(1, 11))
+        elif "'Q:'" in prompt or "flashcard" in prompt.lower():
+            text = "\n---\n".join(f"Q: What is key idea {i}?\nA: Key idea {i} explained in one sentence." for i in range(1, 8))
+        else:
+            words = "the process converts energy into stored chemical form through several linked stages".split()
+            sections = []
+            for section in range(1, 6):
+                bullets = "\n".join("- " + " ".join(rng.choice(words) for _ in range(self.note_words // 30)) for _ in range(6))
+                sections.append(f"## Section {section}\n\n{bullets}\n\n**Q: Review question {section}?**\n**A: Short answer {section}.**")
+            text = "# Notes\n\n" + "\n\n".join(sections)
+        pieces = [text[i:i + 400] for i in range(0, len(text), 400)]
+        def chunks():
+            time.sleep(self.latency_ms / 1000 * 0.6) # Time to first token
+            for piece in pieces:
+                time.sleep(self.latency_ms / 1000 * 0.4 / len(pieces))
+                yield FakeChunk(piece)
+        return chunks()
+
+# Function to point the generation layer at the fake or the recorded backend (no network either way)
+def install_backend(backend, latency_ms, note_words):
+    from note_core import cassettes, generation
+    if backend == "replay":
+        cassettes.CASSETTE_MODE = "replay"
+        return
+    FakeGenerativeModel.latency_ms = latency_ms
+    FakeGenerativeModel.note_words = note_words
+    generation.genai.GenerativeModel = FakeGenerativeModel
+    generation.get_generative_client = lambda api_key: None
+
+# Function to make AppTest safe to run from several threads and closer to a real server. Each AppTest run
+# installs a mock Runtime and turns the global.appTest option on, then clears both when it ends, which
+# breaks every other session's run still in flight; it also compiles the script again, and compiling
+# in several threads at once can crash Python 3.11's parser. Here the option stays on, the last runtime
+# stays installed and one script cache is shared for the whole test, so all sessions share one runtime
+# and one compiled script, like the sessions of a real server.
+def share_app_test_globals():
+    from streamlit import config
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+    config.set_option("global.appTest", True) # Runs restore the value they found, which is now True
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    shared = {"runtime": None}
+    def instance(cls):
+        if cls._instance is not None:
+            shared["runtime"] = cls._instance
+        if shared["runtime"] is None:
+            raise RuntimeError("Runtime hasn't been created!")
+        return shared["runtime"]
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or shared["runtime"] is not None)
+
+# --- Simulated session ---
+# Function to find a widget by key or label (raises LookupError when the flow can't go on)
+def find_widget(widgets, key=None, label=None):
+    for widget in widgets:
+        if (key is not None and widget.key == key) or (label is not None and widget.label == label):
+            return widget
+    raise LookupError(f"Widget not found: {key or label}")
+
+class SimulatedSession:
+    def __init__(self, index, app_test, args, results, stop_event):
+        self.name = f"session-{index}"
+        self.app_test = app_test
+        self.at = None
+        self.args = args
+        self.results = results
+        self.stop_event = stop_event
+        self.rng = random.Random(args.seed + index)
+
+    # Function to run one interaction as a measured rerun; returns False once the test is over
+    def step(self, name, interact=None):
+        if self.stop_event.is_set():
+            return False
+        started = time.perf_counter()
+        error = None
+        try:
+            if interact is not None:
+                interact(self.at)
+            self.at.run()
+            if self.at.exception:
+                error = str(self.at.exception[0].message)[:200]
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:200]
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self.results["lock"]:
+            self.results["steps"].append({"step": name, "ms": elapsed_ms, "error": error})
+        if error:
+            raise RuntimeError(error)
+        time.sleep(self.rng.uniform(0, self.args.think_ms) / 1000)
+        return True
+
+    def switch_tab(self, tab):
+        return self.step(f"tab:{tab}", lambda at: find_widget(at.radio, key="main_tab_selector_radio").set_value(tab))
+
+    def generate_notes(self):
+        topic = self.rng.choice(TOPICS)
+        return (self.switch_tab("📝 Note Generation")
+                and self.step("enter topic", lambda at: find_widget(at.text_area, key="topic_ng_input").input(topic))
+                and self.step("generate notes", lambda at: find_widget(at.button, key="generate_notes_ng_btn").click()))
+
+    def export_notes(self):
+        export_format = self.rng.choice(EXPORT_FORMATS)
+        return self.step("export", lambda at: find_widget(at.selectbox, key="export_select_current").set_value(export_format))
+
+    def take_quiz(self):
+        if not self.step("start quiz", lambda at: find_widget(at.button, key="quiz_current_output").click()):
+            return False
+        for index in range(QUIZ_QUESTIONS_ANSWERED):
+            if not any(radio.key == f"quiz_q_{index}" for radio in self.at.radio):
+                break # Quiz finished
+            def answer(at, index=index):
+                radio = find_widget(at.radio, key=f"quiz_q_{index}")
+                radio.set_value(self.rng.choice(radio.options))
+                find_widget(at.button, key=f"next_q_{index}").click()
+            if not self.step("answer question", answer):
+                return False
+        def leave_quiz(at): # Back to the notes, as when the user moves on mid-quiz
+            at.session_state["interactive_quiz_active"] = False
+        return self.step("leave quiz", leave_quiz)
+
+    def review_flashcards(self):
+        if not self.step("create cards", lambda at: find_widget(at.button, key="sr_cards_current_output").click()):
+            return False
+        def make_cards_due(at): # New cards are due tomorrow; review them as if the user came back a day later
+            from note_core import record_card_reviewed, reindex_card
+            for card in at.session_state["spaced_repetition"]:
+                before = dict(card)
+                card["next_review"] = before["next_review"] - timedelta(days=1)
+                reindex_card(at.session_state["deck_index"], before, card)
+                record_card_reviewed(at.session_state["analytics"], before, card)
+        if not (self.step("cards come due", make_cards_due) and self.switch_tab("🧠 Spaced Repetition")):
+            return False
+        for _ in range(CARDS_REVIEWED):
+            labels = [button.label for button in self.at.button if button.label in ("😕 Hard", "🙂 Okay", "😀 Easy")]
+            if not labels:
+                break # No cards due
+            rating = self.rng.choice(labels)
+            if not self.step("review card", lambda at: find_widget(at.button, label=rating).click()):
+                return False
+        return True
+
+    # Function to go through every flow once in a fresh session; returns False once the test is over
+    def run_flows(self):
+        self.at = self.app_test.from_file(APP_PATH, default_timeout=self.args.timeout)
+        if not (self.step("open app")
+                and self.step("enter API key", lambda at: find_widget(at.text_input, label="Enter your Gemini API Key").input("load-test-key"))):
+            return False
+        for flow in (self.generate_notes, self.export_notes, self.take_quiz, self.review_flashcards):
+            if not flow():
+                return False
+        return all(self.switch_tab(tab) for tab in self.rng.sample(TABS, 2))
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                if not self.run_flows():
+                    return
+            except RuntimeError:
+                continue # The failed step is recorded; start over with a new session
+
+# --- Measurement ---
+# Function to read this process's current RSS in MB (peak RSS where /proc isn't available)
+def current_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+# Function to get the p-th percentile of sorted values (nearest rank)
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))]
+
+# Function to run one load level and summarize it
+def run_level(sessions, app_test, args):
+    results = {"steps": [], "lock": threading.Lock()}
+    stop_event = threading.Event()
+    peak_rss = [current_rss_mb()]
+    def sample_rss():
+        while not stop_event.wait(RSS_SAMPLE_SECONDS):
+            peak_rss[0] = max(peak_rss[0], current_rss_mb())
+    simulated = [SimulatedSession(index, app_test, args, results, stop_event) for index in range(sessions)]
+    threads = [threading.Thread(target=session.run, name=session.name, daemon=True) for session in simulated]
+    threads.append(threading.Thread(target=sample_rss, daemon=True))
+    usage_before, started = resource.getrusage(resource.RUSAGE_SELF), time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop_event.set()
+    for thread in threads:
+        thread.join(args.timeout)
+    wall_seconds = time.perf_counter() - started
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    steps = results["steps"]
+    latencies = sorted(step["ms"] for step in steps)
+    errors = [step for step in steps if step["error"]]
+    by_step = {}
+    for step in steps:
+        by_step.setdefault(step["step"] if not step["step"].startswith("tab:") else "switch tab", []).append(step["ms"])
+    return {
+        "sessions": sessions, "reruns": len(steps), "reruns_per_second": len(steps) / wall_seconds,
+        "p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95), "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else None,
+        "error_rate": len(errors) / len(steps) if steps else 1.0, "errors": sorted({error["error"] for error in errors})[:5],
+        "cpu_percent": 100 * cpu_seconds / wall_seconds, "peak_rss_mb": peak_rss[0],
+        "p95_ms_by_step": {name: percentile(sorted(values), 95) for name, values in sorted(by_step.items())},
+    }
+
+# Function to print one line of the report
+def print_level(level):
+    fmt = lambda value: "-" if value is None else f"{value:.0f}"
+    print(f"{level['sessions']:>8} {level['reruns']:>7} {level['reruns_per_second']:>8.1f} {fmt(level['p50_ms']):>8} {fmt(level['p95_ms']):>8} "
+          f"{fmt(level['p99_ms']):>8} {level['error_rate']:>7.1%} {level['cpu_percent']:>6.0f}% {level['peak_rss_mb']:>8.0f}")
+    for error in level["errors"]:
+        print(f"{'':>8} ! {error}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent sessions of the Streamlit app and report its capacity.")
+    parser.add_argument("--sessions", default="1,2,4,8", help="Comma-separated numbers of simultaneous sessions to run, in order")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds each load level runs")
+    parser.add_argument("--think-ms", type=float, default=1000, help="Maximum random pause between a session's interactions")
+    parser.add_argument("--backend", default="fake", choices=["fake", "replay"],
+                        help="fake: canned responses; replay: cassettes recorded with NOTE_MAKER_CASSETTE_MODE=record")
+    parser.add_argument("--fake-latency-ms", type=float, default=300, help="Response time of the fake backend")
+    parser.add_argument("--fake-note-words", type=int, default=600, help="Approximate length of the fake backend's notes")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds a single rerun may take before it fails")
+    parser.add_argument("--target-p95-ms", type=float, default=1000, help="Rerun p95 a load level must stay within to count towards capacity")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--gate", action="store_true", help="Exit with status 1 if the largest load level misses the targets")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Keep the run's data out of the app's own storage (set before note_core reads its configuration)
+    data_dir = tempfile.mkdtemp(prefix="note_maker_loadtest_")
+    os.environ.setdefault("NOTE_MAKER_STORAGE_PATH", os.path.join(data_dir, "storage.sqlite3"))
+    os.environ.setdefault("NOTE_MAKER_QUESTION_BANK", os.path.join(data_dir, "question_bank.sqlite3"))
+    os.environ.setdefault("NOTE_MAKER_BLOB_DIR", os.path.join(data_dir, "blobs"))
+    os.environ.setdefault("NOTE_MAKER_UID_SECRET", "load-test") # Don't create the app's own signing secret
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        sys.exit("The load test needs streamlit >= 1.28 (streamlit.testing.v1.AppTest)")
+    install_backend(args.backend, args.fake_latency_ms, args.fake_note_words)
+    share_app_test_globals()
+    # One unmeasured pass first, so the script is compiled and lazy imports happen in one thread
+    try:
+        SimulatedSession(-1, AppTest, args, {"steps": [], "lock": threading.Lock()}, threading.Event()).run_flows()
+    except RuntimeError as error:
+        print(f"Warm-up failed: {error}")
+
+    levels = []
+    print(f"{'sessions':>8} {'reruns':>7} {'reruns/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'CPU':>7} {'RSS MB':>8}")
+    for sessions in [int(value) for value in args.sessions.split(",") if value.strip()]:
+        levels.append(run_level(sessions, AppTest, args))
+        print_level(levels[-1])
+    within_target = [level for level in levels
+                     if level["p95_ms"] is not None and level["p95_ms"] <= args.target_p95_ms and level["error_rate"] <= args.max_error_rate]
+    capacity = max((level["sessions"] for level in within_target), default=0)
+    print(f"\nCapacity: {capacity} simultaneous sessions within p95 <= {args.target_p95_ms:.0f} ms and errors <= {args.max_error_rate:.1%}")
+    if levels:
+        print("p95 by step at the largest load level: " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in levels[-1]["p95_ms_by_step"].items()))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "levels": levels, "capacity": capacity}, f, indent=2)
+    if args.gate and levels and levels[-1] not in within_target:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# UI-free core of the AI Note Maker: generation (with record/replay cassettes), prompt templates,
+# study material, deep research, the writing enhancer, the translation memory, the semantic response
+# cache, the question bank, the note document model, export, learning analytics, flashcard deck
+# indexes, the note body store, and the storage backends and job queue shared by app replicas. Used by
+# the Streamlit app (app.py) and the batch CLI (python -m note_core.cli).
+from .generation import (
+    API_KEY_POOL,
+    AUTO_MODEL,
+    HEDGE_BUDGET,
+    HEDGE_PERCENTILE,
+    KEY_POOL_SENTINEL,
+    KEY_REQUESTS_PER_MINUTE,
+    MODEL_PROFILES,
+    ROUTING_TIER_LABELS,
+    generate_content,
+    get_model_stats,
+    get_single_flight_registry,
+    key_pool_report,
+    routing_logger,
+    stream_content,
+)
+from .templates import build_note_prompt, generate_ai_tools, load_prompt_templates
+from .study import (
+    deep_search_notes,
+    generate_follow_up_questions,
+    generate_quiz,
+    generate_spaced_repetition_text,
+    generate_study_pack,
+    grade_quiz,
+    new_spaced_repetition_card,
+    parse_quiz_text,
+    parse_spaced_repetition_cards,
+    parse_study_pack,
+    quiz_questions_to_text,
+    refine_note_sections,
+    refine_notes,
+    suggest_sections_to_refine,
+    summarize_notes,
+    validate_json_schema,
+)
+from .question_bank import (
+    add_questions_to_bank,
+    count_bank_questions,
+    fill_question_bank,
+    note_content_hash,
+    sample_bank_questions,
+)
+from .document import (
+    chunk_document,
+    get_note_document,
+    join_markdown_sections,
+    search_document,
+    split_markdown_sections,
+)
+from .export import export_notes
+from .research import (
+    RESEARCH_CONTEXT_TOKENS, answer_sub_question, build_research_context, new_research_memory, plan_sub_questions,
+    remember_research_turn, run_deep_research
+)
+from .writing import enhance_paragraphs, join_enhanced_paragraphs, paragraph_diff, split_paragraphs
+from .translation_memory import confirm_segment, lookup_segment, translate_with_memory, translation_memory_stats
+from .cassettes import CASSETTE_DIR, CASSETTE_MODE, list_cassettes, load_cassette
+from .semantic_cache import (
+    SEMANTIC_CACHE_THRESHOLD, get_semantic_cache_stats, lookup_semantic_cache, record_semantic_rejection, store_semantic_response
+)
+from .analytics import (
+    average_ease,
+    build_analytics,
+    cards_due_today,
+    due_forecast,
+    new_analytics,
+    notes_last_days,
+    quiz_averages,
+    record_card_added,
+    record_card_reviewed,
+    record_note,
+    record_quiz_score,
+)
+from .deck_index import (
+    build_deck_index,
+    card_at,
+    count_due,
+    deck_page,
+    index_card,
+    reindex_card,
+    unindex_card,
+)
+from .note_store import is_note_ref, load_note, note_store_stats, put_note, release_notes, retain_note
+from .storage import QUESTION_BANK_PATH, STORAGE_BACKEND, dumps_json, get_storage, loads_json
+from .jobs import JOB_HANDLERS, cancel_job, enqueue_job, start_job_workers, wait_for_job
@@ -0,0 +1,138 @@
+# Learning analytics maintained on write. The aggregates are updated in O(1) whenever a note is saved,
+# a flashcard is added or reviewed, or a quiz is finished, so reading them never scans the history or
+# the deck. They are a plain JSON-friendly dict (string keys only), saved with the user's other data.
+from datetime import datetime, timedelta
+
+EASE_BUCKET_WIDTH = 0.1
+FORECAST_DAYS = 14
+NOTE_DAYS_KEPT = 7 # Daily note counts older than this are dropped (weekly counts are kept)
+NOTE_WEEKS_KEPT = 26
+QUIZ_WINDOW = 10 # Quizzes in the rolling average
+HISTORY_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Function to create empty aggregates
+def new_analytics():
+    return {
+        "cards": 0, "topic_counts": {}, "ease_sum": 0.0, "ease_histogram": {},
+        "due_by_day": {}, "overdue": 0, "overdue_before": None, # Days before overdue_before are folded into overdue
+        "notes_total": 0, "notes_by_tool": {}, "top_tool": None, "notes_by_day": {}, "notes_by_week": {},
+        "quiz_count": 0, "quiz_total": 0.0, "quiz_best": None, "quiz_recent": [], "quiz_recent_sum": 0.0
+    }
+
+# Function to add delta to a count, dropping the key when it reaches zero
+def increment(counts, key, delta=1):
+    counts[key] = counts.get(key, 0) + delta
+    if counts[key] <= 0:
+        del counts[key]
+
+# Function to name the histogram bucket of an ease factor
+def ease_bucket(ease_factor):
+    return f"{round(ease_factor / EASE_BUCKET_WIDTH) * EASE_BUCKET_WIDTH:.1f}"
+
+# Function to name the ISO week of a datetime, e.g. "2024-W07"
+def week_key(moment):
+    year, week, _ = moment.isocalendar()
+    return f"{year}-W{week:02d}"
+
+# Function to add (sign=1) or remove (sign=-1) one card's contribution
+def apply_card(analytics, card, sign):
+    analytics["cards"] += sign
+    increment(analytics["topic_counts"], card["topic"], sign)
+    analytics["ease_sum"] += sign * card["ease_factor"]
+    increment(analytics["ease_histogram"], ease_bucket(card["ease_factor"]), sign)
+    day = card["next_review"].date().isoformat()
+    if analytics["overdue_before"] and day < analytics["overdue_before"]:
+        analytics["overdue"] += sign
+    else:
+        increment(analytics["due_by_day"], day, sign)
+
+# Function to record a new flashcard
+def record_card_added(analytics, card):
+    apply_card(analytics, card, 1)
+
+# Function to record a review (before is a copy of the card taken before it was rescheduled)
+def record_card_reviewed(analytics, before, card):
+    apply_card(analytics, before, -1)
+    apply_card(analytics, card, 1)
+
+# Function to record a saved note
+def record_note(analytics, tool_name, moment=None):
+    moment = moment or datetime.now()
+    analytics["notes_total"] += 1
+    increment(analytics["notes_by_tool"], tool_name)
+    top = analytics["top_tool"]
+    if top is None or analytics["notes_by_tool"][tool_name] > analytics["notes_by_tool"].get(top, 0):
+        analytics["top_tool"] = tool_name
+    day, week = moment.date().isoformat(), week_key(moment)
+    if day not in analytics["notes_by_day"]: # A new day or week is the only time old buckets need pruning
+        cutoff = (moment - timedelta(days=NOTE_DAYS_KEPT)).date().isoformat()
+        analytics["notes_by_day"] = {d: n for d, n in analytics["notes_by_day"].items() if d > cutoff}
+    if week not in analytics["notes_by_week"]:
+        analytics["notes_by_week"] = dict(sorted(analytics["notes_by_week"].items())[-(NOTE_WEEKS_KEPT - 1):])
+    increment(analytics["notes_by_day"], day)
+    increment(analytics["notes_by_week"].setdefault(week, {}), tool_name)
+
+# Function to record a finished quiz (score in percent)
+def record_quiz_score(analytics, score):
+    analytics["quiz_count"] += 1
+    analytics["quiz_total"] += score
+    analytics["quiz_best"] = score if analytics["quiz_best"] is None else max(analytics["quiz_best"], score)
+    analytics["quiz_recent"].append(score)
+    analytics["quiz_recent_sum"] += score
+    if len(analytics["quiz_recent"]) > QUIZ_WINDOW:
+        analytics["quiz_recent_sum"] -= analytics["quiz_recent"].pop(0)
+
+# Function to fold days that have passed into the overdue count (each day is folded once)
+def roll_due_days(analytics, now=None):
+    today = (now or datetime.now()).date().isoformat()
+    if analytics["overdue_before"] == today:
+        return today
+    for day in [d for d in analytics["due_by_day"] if d < today]:
+        analytics["overdue"] += analytics["due_by_day"].pop(day)
+    analytics["overdue_before"] = today
+    return today
+
+# Function to count the cards due by the end of today
+def cards_due_today(analytics, now=None):
+    today = roll_due_days(analytics, now)
+    return analytics["overdue"] + analytics["due_by_day"].get(today, 0)
+
+# Function to forecast the cards due on each of the coming days (today includes overdue cards)
+def due_forecast(analytics, days=FORECAST_DAYS, now=None):
+    now = now or datetime.now()
+    roll_due_days(analytics, now)
+    forecast = []
+    for offset in range(days):
+        day = (now + timedelta(days=offset)).date().isoformat()
+        forecast.append({"day": day, "cards": analytics["due_by_day"].get(day, 0) + (analytics["overdue"] if offset == 0 else 0)})
+    return forecast
+
+# Function to get the average ease factor of the deck (None for an empty deck)
+def average_ease(analytics):
+    return analytics["ease_sum"] / analytics["cards"] if analytics["cards"] else None
+
+# Function to count the notes saved in the last NOTE_DAYS_KEPT days
+def notes_last_days(analytics, now=None):
+    cutoff = ((now or datetime.now()) - timedelta(days=NOTE_DAYS_KEPT)).date().isoformat()
+    return sum(n for day, n in analytics["notes_by_day"].items() if day > cutoff)
+
+# Function to get the overall and rolling (last QUIZ_WINDOW) average quiz scores
+def quiz_averages(analytics):
+    if not analytics["quiz_count"]:
+        return None, None
+    return analytics["quiz_total"] / analytics["quiz_count"], analytics["quiz_recent_sum"] / len(analytics["quiz_recent"])
+
+# Function to build aggregates from scratch, e.g. for data saved before analytics existed
+def build_analytics(cards, history, quiz_scores):
+    analytics = new_analytics()
+    for card in cards:
+        record_card_added(analytics, card)
+    for item in reversed(history): # Oldest first, like they were saved
+        try:
+            moment = datetime.strptime(item["timestamp"], HISTORY_TIMESTAMP_FORMAT)
+        except (KeyError, ValueError):
+            continue # Ignore items with unexpected timestamp format
+        record_note(analytics, item["tool"], moment)
+    for entry in quiz_scores:
+        record_quiz_score(analytics, entry["score"])
+    return analytics
@@ -0,0 +1,114 @@
+# Record/replay cassettes for Gemini traffic, for offline benchmarks and regression runs on real output.
+# NOTE_MAKER_CASSETTE_MODE=record saves each completed streaming call to a JSON cassette (prompt hash,
+# generation config, model, every chunk with its arrival time, usage metadata), with API keys scrubbed.
+# NOTE_MAKER_CASSETTE_MODE=replay serves calls from those cassettes without network access or an API key,
+# pacing the chunks with the recorded timings scaled by NOTE_MAKER_CASSETTE_TIME_SCALE (0 = no delays).
+# A cassette is looked up by the prompt and config only, so replays work whichever model routing picks.
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+
+CASSETTE_MODE = os.environ.get("NOTE_MAKER_CASSETTE_MODE", "off") # off, record or replay
+CASSETTE_DIR = os.environ.get("NOTE_MAKER_CASSETTE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".note_data", "cassettes"))
+CASSETTE_TIME_SCALE = float(os.environ.get("NOTE_MAKER_CASSETTE_TIME_SCALE", 1.0))
+CASSETTE_VERSION = 1
+SECRET_PATTERNS = [
+    re.compile(r"AIza[0-9A-Za-z_\-]{35}"), # Google API keys
+    re.compile(r"(?i)((?:api[_-]?key|access[_-]?token|secret[_-]?key)[\"']?\s*[:=]\s*[\"']?)[^\s\"'&,]{8,}"), # key=..., "api_key": "..."
+]
+USAGE_FIELDS = ["prompt_token_count", "candidates_token_count", "total_token_count", "cached_content_token_count"]
+
+# Function to build the key of a request's cassette
+def cassette_key(prompt, generation_config):
+    payload = json.dumps({"prompt": prompt, "config": generation_config}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Function to get the path of a cassette
+def cassette_path(key, cassette_dir=None):
+    return os.path.join(cassette_dir or CASSETTE_DIR, f"{key}.json")
+
+# Function to remove API keys and other secrets from recorded text
+def scrub_secrets(text, secrets=()):
+    for secret in secrets:
+        if secret:
+            text = text.replace(secret, "[REDACTED]")
+    for pattern in SECRET_PATTERNS:
+        text = pattern.sub(lambda match: (match.group(1) if match.groups() else "") + "[REDACTED]", text)
+    return text
+
+# Function to read the usage metadata of a response chunk as a plain dict (None if it has none)
+def chunk_usage(chunk):
+    usage = getattr(chunk, "usage_metadata", None)
+    if not usage:
+        return None
+    return {field: getattr(usage, field) for field in USAGE_FIELDS if getattr(usage, field, None) is not None} or None
+
+# Function to pass a streaming response through while recording it; the cassette is written only once the
+# stream has completed (a failed or abandoned call is not recorded). started is when the request was sent.
+def record_cassette(chunks, model_name, prompt, generation_config, secrets=(), started=None):
+    started = time.perf_counter() if started is None else started
+    recorded, usage = [], None
+    for chunk in chunks:
+        recorded.append({"offset_ms": round((time.perf_counter() - started) * 1000, 1), "text": scrub_secrets(chunk.text, secrets)})
+        usage = chunk_usage(chunk) or usage
+        yield chunk
+    key = cassette_key(prompt, generation_config)
+    cassette = {
+        "version": CASSETTE_VERSION,
+        "key": key,
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        "model": model_name,
+        "prompt_sha256": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+        "prompt_chars": len(prompt),
+        "prompt": scrub_secrets(prompt, secrets),
+        "config": generation_config,
+        "chunks": recorded,
+        "first_token_ms": recorded[0]["offset_ms"] if recorded else None,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        "response_chars": sum(len(entry["text"]) for entry in recorded),
+        "usage": usage,
+    }
+    os.makedirs(CASSETTE_DIR, exist_ok=True)
+    # A temp file of its own per write: threads of one process may record the same request at once
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=CASSETTE_DIR, prefix=f"{key}.", suffix=".tmp", delete=False) as f:
+        json.dump(cassette, f, ensure_ascii=False, indent=1)
+    os.replace(f.name, cassette_path(key)) # Atomic, so a concurrent replay never reads half a file
+
+# Function to load a cassette (None if the request was never recorded)
+def load_cassette(key, cassette_dir=None):
+    try:
+        with open(cassette_path(key, cassette_dir), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+# Function to replay a recorded call, yielding its chunk texts with the recorded timings times time_scale
+def replay_cassette(prompt, generation_config, time_scale=None):
+    time_scale = CASSETTE_TIME_SCALE if time_scale is None else time_scale
+    cassette = load_cassette(cassette_key(prompt, generation_config))
+    if cassette is None:
+        raise LookupError(f"No cassette recorded for this request in {CASSETTE_DIR} (replay mode makes no API calls)")
+    started = time.perf_counter()
+    for entry in cassette["chunks"]:
+        delay = entry["offset_ms"] / 1000 * time_scale - (time.perf_counter() - started)
+        if delay > 0:
+            time.sleep(delay)
+        yield entry["text"]
+
+# Function to summarize the recorded cassettes, e.g. to pick realistic payloads for a benchmark
+def list_cassettes(cassette_dir=None):
+    cassette_dir = cassette_dir or CASSETTE_DIR
+    if not os.path.isdir(cassette_dir):
+        return []
+    summaries = []
+    for name in sorted(os.listdir(cassette_dir)):
+        if name.endswith(".json"):
+            cassette = load_cassette(name[:-len(".json")], cassette_dir)
+            summary = {key: cassette.get(key) for key in ("key", "recorded_at", "model", "prompt_chars", "response_chars", "first_token_ms", "total_ms")}
+            summary["chunks"] = len(cassette["chunks"])
+            summaries.append(summary)
+    return summaries
@@ -0,0 +1,170 @@
+# Batch note generation from a CSV or JSONL file of topics, without the web UI.
+#
+#   python -m note_core.cli topics.csv -o notes.jsonl --with summary,quiz,cards --concurrency 8
+#
+# Each input row needs a "topic"; "id", "note_type", "detail_level" and "education_level" are optional
+# per-row overrides. One JSON line is appended to the output per row as soon as it finishes, so an
+# interrupted run is resumed by running the same command again: rows already written with status
+# "ok" are skipped and failed rows are retried.
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from .export import export_notes
+from .generation import API_KEY_POOL, AUTO_MODEL, KEY_POOL_SENTINEL, generate_content
+from .question_bank import add_questions_to_bank, note_content_hash
+from .study import generate_quiz, generate_spaced_repetition_text, parse_quiz_text, parse_spaced_repetition_cards, summarize_notes
+from .templates import build_note_prompt, generate_ai_tools
+
+DETAIL_LEVELS = ["Brief", "Standard", "Comprehensive", "Expert"]
+EXTRAS = ["summary", "quiz", "cards"]
+EXPORT_FORMATS = ["md", "txt", "html", "csv"]
+
+# Function to read topic rows from a CSV (with a header row) or JSONL file
+def read_topic_rows(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    return [row for row in rows if str(row.get("topic") or "").strip()]
+
+# Function to give a row a stable id, so a rerun recognises rows that are already done
+def row_id(row, args):
+    if str(row.get("id") or "").strip():
+        return str(row["id"]).strip()
+    key = "|".join([row["topic"].strip(), row.get("note_type") or args.note_type, row.get("detail_level") or args.detail_level,
+                    row.get("education_level") or args.education_level])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+# Function to collect the ids already written successfully to the output file
+def completed_ids(output_path):
+    done = set()
+    if os.path.exists(output_path):
+        with open(output_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # A line cut short by an interrupted run
+                if record.get("status") == "ok":
+                    done.add(record["id"])
+    return done
+
+# Function to generate the notes (and requested extras) for one row; never raises
+def process_row(row, args, options):
+    started = time.perf_counter()
+    note_type = row.get("note_type") or args.note_type
+    detail_level = row.get("detail_level") or args.detail_level
+    education_level = row.get("education_level") or args.education_level
+    topic = row["topic"].strip()
+    record = {
+        "id": row["id"], "topic": topic, "note_type": note_type, "detail_level": detail_level,
+        "education_level": education_level, "model": args.model, "status": "ok", "error": None
+    }
+    try:
+        prompt = build_note_prompt(topic, note_type, detail_level, education_level)
+        notes = generate_content(prompt, args.api_key, args.model, args.temperature, detail_level,
+                                 {"tone": args.tone, "language_style": args.language_style}, tool_name=note_type, **options)
+        if notes.startswith("Error:"):
+            raise RuntimeError(notes[len("Error:"):].strip())
+        record["notes"] = notes
+        if "summary" in args.extras:
+            record["summary"] = summarize_notes(notes, args.api_key, args.model, **options)
+        if "quiz" in args.extras:
+            questions = parse_quiz_text(generate_quiz(notes, args.api_key, args.model, num_questions=args.quiz_questions, **options))
+            record["quiz"] = questions
+            if args.bank and questions:
+                add_questions_to_bank(note_content_hash(notes), topic, questions)
+        if "cards" in args.extras:
+            cards_text = generate_spaced_repetition_text(notes, args.api_key, args.model, **options)
+            record["flashcards"] = [{"question": q, "answer": a} for q, a in parse_spaced_repetition_cards(cards_text)]
+        if args.export_dir:
+            export_path = os.path.join(args.export_dir, f"{record['id']}.{args.export_format}")
+            with open(export_path, "w", encoding="utf-8") as f:
+                f.write(export_notes(notes, args.export_format))
+            record["export_path"] = export_path
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+    record["created"] = datetime.now().isoformat(timespec="seconds")
+    record["elapsed_s"] = round(time.perf_counter() - started, 2)
+    return record
+
+# Function to parse the command line
+def parse_args(argv=None):
+    note_formats, _ = generate_ai_tools()
+    parser = argparse.ArgumentParser(prog="python -m note_core.cli", description="Generate notes for a CSV/JSONL file of topics.")
+    parser.add_argument("input", help="CSV (with a 'topic' column) or JSONL file of topics")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file results are appended to (also used to resume)")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY", ""),
+                        help="Gemini API key (default: $GEMINI_API_KEY, else the $GEMINI_API_KEYS pool)")
+    parser.add_argument("--model", default="gemini-2.0-flash", help=f"Model name, or '{AUTO_MODEL}' for automatic routing")
+    parser.add_argument("--note-type", default="Bullet Points", choices=[t for t in note_formats if t != "Custom Template"])
+    parser.add_argument("--detail-level", default="Standard", choices=DETAIL_LEVELS)
+    parser.add_argument("--education-level", default="Undergraduate")
+    parser.add_argument("--tone", default="Formal")
+    parser.add_argument("--language-style", default="Standard")
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--with", dest="extras", default="", help=f"Comma-separated extras to generate per topic: {', '.join(EXTRAS)}")
+    parser.add_argument("--quiz-questions", type=int, default=20)
+    parser.add_argument("--bank", action="store_true", help="Also store generated quiz questions in the app's question bank")
+    parser.add_argument("--export-dir", help="Also write each note to this directory")
+    parser.add_argument("--export-format", default="md", choices=EXPORT_FORMATS)
+    parser.add_argument("--concurrency", type=int, default=4, help="Topics processed in parallel")
+    parser.add_argument("--hedge", action="store_true", help="Hedge slow requests with a duplicate call")
+    parser.add_argument("--limit", type=int, help="Process at most this many pending topics")
+    args = parser.parse_args(argv)
+    args.extras = {extra.strip() for extra in args.extras.split(",") if extra.strip()}
+    unknown = args.extras - set(EXTRAS)
+    if unknown:
+        parser.error(f"unknown --with value(s): {', '.join(sorted(unknown))}")
+    if not args.api_key:
+        if not API_KEY_POOL:
+            parser.error("no API key: pass --api-key or set GEMINI_API_KEY or GEMINI_API_KEYS")
+        args.api_key = KEY_POOL_SENTINEL
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    rows = read_topic_rows(args.input)
+    for row in rows:
+        row["id"] = row_id(row, args)
+    done = completed_ids(args.output)
+    pending = list({row["id"]: row for row in rows if row["id"] not in done}.values()) # Duplicate rows run once
+    if args.limit is not None:
+        pending = pending[:args.limit]
+    already_done = len({row["id"] for row in rows} & done)
+    print(f"{len(rows)} topics, {already_done} already done, {len(pending)} to generate", file=sys.stderr)
+    if args.export_dir:
+        os.makedirs(args.export_dir, exist_ok=True)
+    options = {"hedge": args.hedge}
+    failures = 0
+    executor = ThreadPoolExecutor(max_workers=max(1, args.concurrency))
+    try:
+        with open(args.output, "a", encoding="utf-8") as out:
+            futures = [executor.submit(process_row, row, args, options) for row in pending]
+            for finished, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                failures += record["status"] != "ok"
+                out.write(json.dumps(record, ensure_ascii=False) + "\n") # Results are written from this thread only
+                out.flush()
+                print(f"[{finished}/{len(pending)}] {record['status']:<5} {record['topic'][:60]} ({record['elapsed_s']}s)"
+                      + (f" - {record['error']}" if record["error"] else ""), file=sys.stderr)
+    except KeyboardInterrupt:
+        print("Interrupted; finished topics are saved (topics still running are discarded). Run the same command again to resume.", file=sys.stderr)
+        executor.shutdown(wait=False, cancel_futures=True)
+        return 130
+    executor.shutdown()
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
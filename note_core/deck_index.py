@@ -0,0 +1,75 @@
+# Sorted indexes over the flashcard deck for paginated views. Each index is a list of (sort key, card id)
+# entries kept sorted with bisect as cards are added or rescheduled. A page is read from a cursor (the
+# last entry of the previous page) in O(log n + page size), so a page costs the same whatever the deck
+# size, and only the cards on that page are touched.
+import bisect
+import uuid
+
+SORT_KEYS = {
+    "next_review": lambda card: (card["next_review"],),
+    "topic": lambda card: (card["topic"].casefold(), card["question"].casefold()),
+    "ease": lambda card: (card["ease_factor"], card["next_review"]),
+}
+MAX_ID = "\U0010ffff" # Sorts after every card id, for bisecting past all entries with a given key
+
+# Function to create an empty index
+def new_deck_index():
+    return {"cards": {}, "indexes": {field: [] for field in SORT_KEYS}}
+
+# Function to add a card to the index (cards saved before ids existed get one here)
+def index_card(deck_index, card):
+    card_id = card.setdefault("id", uuid.uuid4().hex)
+    deck_index["cards"][card_id] = card
+    for field, key_fn in SORT_KEYS.items():
+        bisect.insort(deck_index["indexes"][field], (key_fn(card), card_id))
+
+# Function to remove a card; before is the card as it was indexed (a copy, if it has changed since)
+def unindex_card(deck_index, before):
+    for field, key_fn in SORT_KEYS.items():
+        entries = deck_index["indexes"][field]
+        position = bisect.bisect_left(entries, (key_fn(before), before["id"]))
+        if position < len(entries) and entries[position][1] == before["id"]:
+            entries.pop(position)
+    deck_index["cards"].pop(before["id"], None)
+
+# Function to move a card after it was rescheduled (before is a copy taken before the change)
+def reindex_card(deck_index, before, card):
+    unindex_card(deck_index, before)
+    index_card(deck_index, card)
+
+# Function to build an index over a whole deck
+def build_deck_index(cards):
+    deck_index = new_deck_index()
+    for card in cards:
+        index_card(deck_index, card)
+    return deck_index
+
+# Function to count the cards whose next review is at or before the given time
+def count_due(deck_index, now):
+    return bisect.bisect_right(deck_index["indexes"]["next_review"], ((now,), MAX_ID))
+
+# Function to get the card at a position of a sort order (None past the end)
+def card_at(deck_index, sort_by, position):
+    entries = deck_index["indexes"][sort_by]
+    return deck_index["cards"][entries[position][1]] if 0 <= position < len(entries) else None
+
+# Function to read one page after a cursor; returns (cards, cursor of the next page or None at the end).
+# match filters cards (e.g. a search term); pages then scan ahead only until they are full.
+def deck_page(deck_index, sort_by, cursor=None, page_size=20, descending=False, match=None):
+    entries = deck_index["indexes"][sort_by]
+    if descending:
+        position = len(entries) - 1 if cursor is None else bisect.bisect_left(entries, cursor) - 1
+        step, in_range = -1, lambda p: p >= 0
+    else:
+        position = 0 if cursor is None else bisect.bisect_right(entries, cursor)
+        step, in_range = 1, lambda p: p < len(entries)
+    page = []
+    while in_range(position) and len(page) < page_size:
+        card = deck_index["cards"][entries[position][1]]
+        if match is None or match(card):
+            page.append(card)
+            cursor = entries[position]
+        position += step
+    if not page or not in_range(position):
+        return page, None
+    return page, cursor
@@ -0,0 +1,187 @@
+# Structured document model of a note. Each note is parsed once into blocks (headings, paragraphs,
+# list items, code blocks, tables, quotes), sections and Q/A pairs, plus its statistics and plain text.
+# Documents are cached by content digest and shared by every consumer (exports, statistics, TTS,
+# section refinement, chunking and search), and expensive renderings such as the HTML export are
+# computed once per document.
+import hashlib
+import re
+import threading
+from collections import Counter, OrderedDict
+
+NOTE_DOCUMENT_CACHE_SIZE = 32 # Parsed documents kept per process
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+FENCE_PATTERN = re.compile(r"^\s*(```|~~~)\s*([\w+-]*)")
+LIST_ITEM_PATTERN = re.compile(r"^(\s*)([-*+]|\d+[.)])\s+(.*)$")
+QUESTION_PATTERN = re.compile(r"^\s*(?:\*\*)?Q(?:uestion)?\s*\d*\s*[:.](?:\*\*)?\s*(.*)$", re.IGNORECASE)
+ANSWER_PATTERN = re.compile(r"^\s*(?:\*\*)?A(?:nswer)?\s*\d*\s*[:.](?:\*\*)?\s*(.*)$", re.IGNORECASE)
+WORDS_PER_MINUTE = 200
+
+_documents = OrderedDict()
+_documents_lock = threading.Lock()
+
+# Function to strip inline markdown (emphasis, code, links, images) from a line of text
+def strip_inline_markdown(text):
+    text = re.sub(r"!?\[([^\]]*)\]\([^)]*\)", r"\1", text)
+    text = re.sub(r"(\*\*|__|\*|_|`)(.+?)\1", r"\2", text)
+    return text.strip()
+
+# Function to split markdown into sections at its headings (text before the first heading is a level-0 section)
+def split_markdown_sections(text):
+    sections = [{"heading": "", "level": 0, "text": ""}]
+    in_fence = False
+    for line in text.splitlines(keepends=True):
+        if FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_PATTERN.match(line)
+        if match:
+            sections.append({"heading": match.group(2), "level": len(match.group(1)), "text": line})
+        else:
+            sections[-1]["text"] += line
+    if not sections[0]["text"] and len(sections) > 1:
+        sections.pop(0)
+    return sections
+
+# Function to join sections back into one document
+def join_markdown_sections(sections):
+    return "".join(section["text"] for section in sections)
+
+# Function to parse markdown into a flat list of blocks
+def parse_blocks(text):
+    blocks, paragraph, table, fence = [], [], [], None
+    def flush():
+        if paragraph:
+            blocks.append({"type": "paragraph", "text": " ".join(line.strip() for line in paragraph)})
+            paragraph.clear()
+        if table:
+            rows = [[cell.strip() for cell in row.strip().strip("|").split("|")] for row in table]
+            blocks.append({"type": "table", "rows": [row for row in rows if not all(re.fullmatch(r":?-+:?", c) for c in row if c)]})
+            table.clear()
+    for line in text.splitlines():
+        fence_match = FENCE_PATTERN.match(line)
+        if fence is not None:
+            if fence_match:
+                blocks.append(fence)
+                fence = None
+            else:
+                fence["text"] += line + "\n"
+            continue
+        if fence_match:
+            flush()
+            fence = {"type": "code", "language": fence_match.group(2), "text": ""}
+            continue
+        if line.lstrip().startswith("|"):
+            if paragraph:
+                flush()
+            table.append(line)
+            continue
+        if table:
+            flush()
+        heading = HEADING_PATTERN.match(line)
+        list_item = LIST_ITEM_PATTERN.match(line)
+        if not line.strip():
+            flush()
+        elif heading:
+            flush()
+            blocks.append({"type": "heading", "level": len(heading.group(1)), "text": heading.group(2)})
+        elif list_item:
+            flush()
+            blocks.append({"type": "list_item", "ordered": list_item.group(2)[0].isdigit(), "depth": len(list_item.group(1).expandtabs(4)) // 2,
+                           "text": list_item.group(3)})
+        elif line.lstrip().startswith(">"):
+            flush()
+            blocks.append({"type": "quote", "text": line.lstrip()[1:].strip()})
+        else:
+            paragraph.append(line)
+    flush()
+    if fence is not None: # Unclosed fence: keep what was there
+        blocks.append(fence)
+    return blocks
+
+# Function to collect question/answer pairs written as "Q: ... A: ..." lines
+def extract_qa_pairs(text):
+    pairs, question = [], None
+    for line in text.splitlines():
+        question_match, answer_match = QUESTION_PATTERN.match(line), ANSWER_PATTERN.match(line)
+        if question_match:
+            question = question_match.group(1).strip()
+        elif answer_match and question:
+            pairs.append((strip_inline_markdown(question), strip_inline_markdown(answer_match.group(1))))
+            question = None
+    return pairs
+
+# Function to parse a note into its document model
+def parse_note(text):
+    blocks = parse_blocks(text)
+    spoken = []
+    for block in blocks:
+        if block["type"] == "table":
+            spoken.extend(", ".join(strip_inline_markdown(cell) for cell in row if cell) for row in block["rows"])
+        elif block["type"] != "code":
+            spoken.append(strip_inline_markdown(block["text"]))
+    block_counts = {}
+    for block in blocks:
+        block_counts[block["type"]] = block_counts.get(block["type"], 0) + 1
+    words = len(text.split())
+    return {
+        "digest": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        "text": text,
+        "blocks": blocks,
+        "sections": split_markdown_sections(text),
+        "qa_pairs": extract_qa_pairs(text),
+        "plain_text": "\n".join(line for line in spoken if line),
+        "stats": {
+            "words": words, "characters": len(text), "headings": block_counts.get("heading", 0),
+            "list_items": block_counts.get("list_item", 0), "code_blocks": block_counts.get("code", 0),
+            "tables": block_counts.get("table", 0), "reading_minutes": words / WORDS_PER_MINUTE
+        },
+        "derived": {} # Renderings computed on first use, e.g. exports
+    }
+
+# Function to get the cached document model of a note, parsing it on first use
+def get_note_document(text):
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    with _documents_lock:
+        document = _documents.get(digest)
+        if document is not None:
+            _documents.move_to_end(digest)
+            return document
+    document = parse_note(text)
+    with _documents_lock:
+        _documents[digest] = document
+        while len(_documents) > NOTE_DOCUMENT_CACHE_SIZE:
+            _documents.popitem(last=False)
+    return document
+
+# Function to get a rendering of a document, building it once (concurrent first uses may both build it)
+def document_derived(document, name, build_fn):
+    if name not in document["derived"]:
+        document["derived"][name] = build_fn(document)
+    return document["derived"][name]
+
+# Function to split a document into chunks of whole sections (long sections are split at blank lines)
+def chunk_document(document, max_chars=4000):
+    pieces = []
+    for section in document["sections"]:
+        if len(section["text"]) <= max_chars:
+            pieces.append(section["text"])
+        else:
+            pieces.extend(part + "\n\n" for part in re.split(r"\n\s*\n", section["text"]) if part.strip())
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+# Function to pick the chunks of a document that contain the query's words most often
+def search_document(document, query, max_chars=4000, limit=3):
+    terms = {term for term in re.findall(r"\w+", query.lower()) if len(term) > 2}
+    scored = []
+    for position, chunk in enumerate(chunk_document(document, max_chars)):
+        chunk_words = Counter(re.findall(r"\w+", chunk.lower()))
+        scored.append((-sum(chunk_words[term] for term in terms), position, chunk))
+    best = sorted(sorted(scored)[:limit], key=lambda entry: entry[1]) # Best chunks, in document order
+    return [chunk for _, _, chunk in best]
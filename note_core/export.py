@@ -0,0 +1,116 @@
+# Export of generated notes to text, Markdown, CSV and standalone HTML. CSV and HTML are built from the
+# blocks of the note's cached document model (document.py), so the note is parsed once and each format
+# is rendered once per note.
+import csv
+import html
+import io
+import re
+
+from .document import document_derived, get_note_document, strip_inline_markdown
+
+# Function to export notes
+def export_notes(content, format="txt"):
+    if format in ("csv", "html"):
+        return document_derived(get_note_document(content), f"export_{format}", lambda document: render_export(document, format))
+    return content # Text and Markdown exports are the note itself
+
+# Function to get the plain text of a block (tables as one " | "-separated line per row)
+def block_text(block):
+    if block["type"] == "table":
+        return "\n".join(" | ".join(strip_inline_markdown(cell) for cell in row) for row in block["rows"])
+    if block["type"] == "code":
+        return block["text"].rstrip("\n")
+    return strip_inline_markdown(block["text"])
+
+# Function to render inline markdown (code spans, links, images, emphasis) of escaped text as HTML
+def render_inline(text):
+    parts = re.split(r"(`[^`]+`)", text)
+    for i, part in enumerate(parts):
+        if i % 2: # Code span
+            parts[i] = f"<code>{html.escape(part[1:-1])}</code>"
+            continue
+        part = html.escape(part)
+        part = re.sub(r"!\[([^\]]*)\]\(([^)\s]*)\)", r'<img src="\2" alt="\1">', part)
+        part = re.sub(r"\[([^\]]*)\]\(([^)\s]*)\)", r'<a href="\2">\1</a>', part)
+        part = re.sub(r"(\*\*|__)(?=\S)(.+?)(?<=\S)\1", r"<strong>\2</strong>", part)
+        parts[i] = re.sub(r"(?<!\w)(\*|_)(?=\S)(.+?)(?<=\S)\1(?!\w)", r"<em>\2</em>", part) # Not inside words like snake_case_names
+    return "".join(parts)
+
+# Function to render document blocks as HTML (list items are nested by depth)
+def render_html_blocks(blocks):
+    parts, open_lists = [], [] # (tag, depth) of each open list, innermost last
+    for block in blocks:
+        if block["type"] == "list_item":
+            tag = "ol" if block["ordered"] else "ul"
+            while open_lists and (open_lists[-1][1] > block["depth"] or open_lists[-1][1] == block["depth"] and open_lists[-1][0] != tag):
+                parts.append(f"</li></{open_lists.pop()[0]}>")
+            if open_lists and open_lists[-1][1] == block["depth"]:
+                parts.append("</li>")
+            else:
+                parts.append(f"<{tag}>")
+                open_lists.append((tag, block["depth"]))
+            parts.append(f"<li>{render_inline(block['text'])}")
+            continue
+        while open_lists:
+            parts.append(f"</li></{open_lists.pop()[0]}>")
+        if block["type"] == "heading":
+            parts.append(f"<h{block['level']}>{render_inline(block['text'])}</h{block['level']}>")
+        elif block["type"] == "paragraph":
+            parts.append(f"<p>{render_inline(block['text'])}</p>")
+        elif block["type"] == "quote":
+            parts.append(f"<blockquote><p>{render_inline(block['text'])}</p></blockquote>")
+        elif block["type"] == "code":
+            language = f' class="language-{html.escape(block["language"])}"' if block["language"] else ""
+            parts.append(f"<pre><code{language}>{html.escape(block['text'])}</code></pre>")
+        elif block["type"] == "table" and block["rows"]:
+            header, *rows = block["rows"]
+            cells = lambda row, tag: "".join(f"<{tag}>{render_inline(cell)}</{tag}>" for cell in row)
+            body = "".join(f"<tr>{cells(row, 'td')}</tr>" for row in rows)
+            parts.append(f"<table><thead><tr>{cells(header, 'th')}</tr></thead><tbody>{body}</tbody></table>")
+    while open_lists:
+        parts.append(f"</li></{open_lists.pop()[0]}>")
+    return "\n".join(parts)
+
+# Function to render a CSV or HTML export of a document
+def render_export(document, format):
+    if format == "csv":
+        # One row per block: its type, its level (heading level or list depth) and its plain text
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator="\n")
+        writer.writerow(["type", "level", "text"])
+        for block in document["blocks"]:
+            level = block["level"] if block["type"] == "heading" else block["depth"] if block["type"] == "list_item" else ""
+            writer.writerow([block["type"], level, block_text(block)])
+        return output.getvalue()
+    elif format == "html":
+        html_body = render_html_blocks(document["blocks"])
+        html_full = f"""
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Notes</title>
+    <style>
+        body {{ font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif, "Apple Color Emoji", "Segoe UI Emoji"; line-height: 1.6; padding: 20px; max-width: 800px; margin: auto; color: #333; }}
+        h1, h2, h3, h4, h5, h6 {{ color: #1a1a1a; margin-top: 1.5em; margin-bottom: 0.5em; }}
+        p {{ margin-bottom: 1em; }}
+        ul, ol {{ padding-left: 20px; margin-bottom: 1em; }}
+        li {{ margin-bottom: 0.25em; }}
+        code {{ background-color: #f0f0f0; padding: 0.2em 0.4em; margin: 0; font-size: 85%; border-radius: 3px; font-family: "SFMono-Regular", Consolas, "Liberation Mono", Menlo, Courier, monospace;}}
+        pre {{ background-color: #f0f0f0; padding: 10px; border-radius: 5px; overflow-x: auto; }}
+        pre code {{ background-color: transparent; padding: 0; margin: 0; font-size: inherit; border-radius: 0; }}
+        table {{ border-collapse: collapse; width: 100%; margin-bottom: 1em; border: 1px solid #ddd; }}
+        th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+        th {{ background-color: #f9f9f9; }}
+        blockquote {{ border-left: 4px solid #ccc; padding-left: 10px; color: #555; margin-left: 0; margin-right: 0; font-style: italic;}}
+    </style>
+</head>
+<body>
+{html_body}
+</body>
+</html>
+"""
+        return html_full
+    else:
+        return document["text"]
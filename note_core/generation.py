@@ -0,0 +1,574 @@
+# Gemini generation layer shared by the Streamlit app and the batch CLI: model routing, the API key
+# pool, hedged requests, single-flight coalescing and record/replay cassettes. Process-wide state lives
+# in module globals.
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import google.generativeai as genai
+import google.ai.generativelanguage as glm # For per-key clients in the API key pool
+
+from . import cassettes
+from .storage import get_storage
+
+# Constants for automatic model routing (cost is relative, latency_ms is the prior before live stats exist;
+# preview/experimental models are only used through an override)
+AUTO_MODEL = "Auto"
+ROUTING_TIER_LABELS = ["Light", "Standard", "Heavy"]
+MODEL_PROFILES = {
+    "gemini-2.0-flash-lite": {"tier": 0, "cost": 1, "latency_ms": 900},
+    "gemini-1.5-flash-8b": {"tier": 0, "cost": 1, "latency_ms": 1000},
+    "gemini-2.0-flash": {"tier": 1, "cost": 2, "latency_ms": 1500},
+    "gemini-1.5-flash": {"tier": 1, "cost": 2, "latency_ms": 1800},
+    "gemini-2.5-flash-preview-04-17": {"tier": 1, "cost": 3, "latency_ms": 3000, "auto": False},
+    "gemini-2.0-flash-thinking-exp-01-21": {"tier": 2, "cost": 4, "latency_ms": 6000, "auto": False},
+    "gemini-1.5-pro": {"tier": 2, "cost": 8, "latency_ms": 8000},
+    "gemini-2.5-pro-preview-03-25": {"tier": 2, "cost": 10, "latency_ms": 12000, "auto": False},
+    "gemini-2.0-pro-exp-02-05": {"tier": 2, "cost": 10, "latency_ms": 10000, "auto": False},
+}
+TOOL_COMPLEXITY = { # Tier per tool; tools not listed are Standard
+    **dict.fromkeys([
+        "Joke Teller", "Synonym Antonym Finder", "Quick Fact Finder", "Random Quote Generator", "Short Poem Generator",
+        "Character Name Generator", "Business Name Idea Generator", "Email Subject Generator", "Ice Breaker Question Generator",
+        "Personalized Affirmation Generator", "Excuse Generator (Humorous)", "Hashtag Generator", "Keyword Extractor",
+        "Acronym Explainer", "Rhyme Finder", "Secure Password Idea Generator", "Debate Topic Generator", "Blog Post Idea Generator",
+        "Idea Generator", "Text Mood Analyzer", "Analogy Generator", "Research Follow-up Questions", "Citation Generation",
+        "Citation Generation (Batch)", "Auto-Summary", "Research Plan",
+        "Research Memory Summary"
+    ], 0),
+    **dict.fromkeys([
+        "Research Assistant Query", "Literature Review Outline Generator", "Grant Proposal Snippet Generator",
+        "Technical Document Explainer (Advanced)", "Syllabus Component Generator (Advanced)", "Study Pack",
+        "Research Methodology Suggester", "Case Study Creator (from scenario)", "Research Synthesis"
+    ], 2),
+}
+DETAIL_TIER_SHIFT = {"Brief": -1, "Standard": 0, "Comprehensive": 0, "Expert": 1}
+LARGE_INPUT_TOKENS = 6000 # Inputs estimated above this never go to a Light model
+ROUTING_LOG_SIZE = 200
+
+# Constants for hedged requests
+HEDGE_PERCENTILE = float(os.environ.get("NOTE_MAKER_HEDGE_PERCENTILE", 95)) # Hedge once the first token is later than this
+HEDGE_BUDGET = float(os.environ.get("NOTE_MAKER_HEDGE_BUDGET", 0.05)) # Maximum share of calls that may be hedged
+HEDGE_MIN_SAMPLES = 20 # Below this, the model's prior latency is used instead of the percentile
+HEDGE_BUDGET_SEED = 1 # Hedges allowed on top of the budget, so hedging works before enough calls have been made
+
+# Constants for the server-side API key pool (GEMINI_API_KEYS is a comma-separated list)
+API_KEY_POOL = [key.strip() for key in os.environ.get("GEMINI_API_KEYS", "").split(",") if key.strip()]
+KEY_POOL_SENTINEL = "__key_pool__" # Stored as the session's api_key when it uses the pool
+KEY_REQUESTS_PER_MINUTE = int(os.environ.get("NOTE_MAKER_KEY_RPM", 15)) # Quota of each pooled key
+KEY_COOLDOWN_SECONDS = float(os.environ.get("NOTE_MAKER_KEY_COOLDOWN", 30)) # First cool-down after a 429; doubles on repeats
+
+# Seconds a finished response is served from the shared response cache (0 turns the cache off)
+RESPONSE_CACHE_TTL = float(os.environ.get("NOTE_MAKER_RESPONSE_CACHE_TTL", 0))
+KEY_MAX_COOLDOWN_SECONDS = 300
+GENERATIVE_CLIENT_CACHE_SIZE = 64 # Per-key clients kept (least recently used dropped first)
+
+# Constants for single-flight request coalescing
+SINGLE_FLIGHT_WORKERS = 8
+
+# --- Automatic model routing ---
+# With "Auto" selected, each call is routed to the cheapest healthy model of the tier its tool,
+# detail level and input size call for. Latency and error rates are tracked per model for every
+# call (routed or not) and every routing decision is logged.
+routing_logger = logging.getLogger("note_maker.routing")
+
+_model_stats = {
+    "lock": threading.Lock(), "models": {}, "decisions": deque(maxlen=ROUTING_LOG_SIZE),
+    "first_token_ms": {}, # model -> recent time-to-first-token samples
+    "hedge": {"calls": 0, "fired": 0, "won": 0}
+}
+
+# Function to get the process-wide model statistics
+def get_model_stats():
+    return _model_stats
+
+# Function to record the outcome of one call in the per-model exponentially weighted stats
+def record_model_call(model_name, latency_ms, failed):
+    stats = get_model_stats()
+    with stats["lock"]:
+        entry = stats["models"].setdefault(model_name, {"calls": 0, "errors": 0, "latency_ms": None, "error_rate": 0.0})
+        entry["calls"] += 1
+        entry["errors"] += int(failed)
+        entry["error_rate"] = 0.7 * entry["error_rate"] + 0.3 * float(failed)
+        if not failed:
+            entry["latency_ms"] = latency_ms if entry["latency_ms"] is None else 0.7 * entry["latency_ms"] + 0.3 * latency_ms
+
+# Function to record how long a model took to produce its first chunk
+def record_first_token(model_name, latency_ms):
+    stats = get_model_stats()
+    with stats["lock"]:
+        stats["first_token_ms"].setdefault(model_name, deque(maxlen=200)).append(latency_ms)
+
+# Function to pick the routing tier of a request
+def routing_tier(tool_name, detail_level, prompt):
+    tier = TOOL_COMPLEXITY.get(tool_name, 1) + DETAIL_TIER_SHIFT.get(detail_level, 0)
+    if len(prompt) // 4 > LARGE_INPUT_TOKENS: # Roughly 4 characters per token
+        tier = max(tier, 1)
+    return min(max(tier, 0), len(ROUTING_TIER_LABELS) - 1)
+
+# Function to score a model for routing: relative cost plus observed latency, penalised by recent errors
+def model_route_score(model_name, entry):
+    profile = MODEL_PROFILES[model_name]
+    latency_ms = profile["latency_ms"] if not entry or entry["latency_ms"] is None else entry["latency_ms"]
+    error_rate = entry["error_rate"] if entry else 0.0
+    return (profile["cost"] + latency_ms / 1000) * (1 + 4 * error_rate)
+
+# Function to route a request to a concrete model (overrides map a tier to a fixed model; tiers may be
+# string keys when the overrides went through JSON, e.g. in a queued job)
+def route_model(tool_name, detail_level, prompt, overrides=None):
+    tier = routing_tier(tool_name, detail_level, prompt)
+    stats = get_model_stats()
+    override = (overrides or {}).get(tier) or (overrides or {}).get(str(tier))
+    if override:
+        chosen, reason = override, "override"
+    else:
+        with stats["lock"]:
+            entries = {name: dict(entry) for name, entry in stats["models"].items()}
+        routable = [name for name, profile in MODEL_PROFILES.items() if profile.get("auto", True)]
+        candidates = [name for name in routable if MODEL_PROFILES[name]["tier"] == tier]
+        healthy = [name for name in candidates if not (entries.get(name, {}).get("calls", 0) >= 3 and entries[name]["error_rate"] > 0.5)]
+        if not healthy: # Every model of this tier is failing: borrow from the other tiers
+            healthy = [name for name in routable if name not in candidates]
+        chosen = min(healthy, key=lambda name: model_route_score(name, entries.get(name)))
+        reason = f"score {model_route_score(chosen, entries.get(chosen)):.2f}" + ("" if chosen in candidates else " (tier unhealthy)")
+    decision = {
+        "time": datetime.now().strftime("%H:%M:%S"), "tool": tool_name or "-", "detail_level": detail_level,
+        "input_tokens": len(prompt) // 4, "tier": ROUTING_TIER_LABELS[tier], "model": chosen, "reason": reason
+    }
+    stats["decisions"].append(decision)
+    routing_logger.info("Routed %s (%s, ~%d tokens) to %s as %s: %s", decision["tool"], detail_level,
+                        decision["input_tokens"], chosen, decision["tier"], reason)
+    return chosen
+
+# --- API key pool ---
+# With GEMINI_API_KEYS set, sessions without their own key draw a key per request from a shared pool:
+# the key with the most quota left this minute wins, and a key answering 429 (or rejecting us) is
+# taken out of rotation for a cool-down that doubles on repeat failures.
+_key_pool = {
+    "lock": threading.Lock(),
+    "keys": {key: {"label": f"…{key[-4:]}", "recent": deque(), "calls": 0, "errors": 0, "rate_limited": 0,
+                   "strikes": 0, "cooldown_until": 0.0} for key in API_KEY_POOL}
+}
+_generative_clients = OrderedDict() # sha256 of the key -> client, so raw keys aren't kept as dict keys
+
+# Function to get the process-wide key pool
+def get_key_pool():
+    return _key_pool
+
+# Function to get the client a model uses for a key (recently used clients are reused), so concurrent
+# requests can use different keys
+def get_generative_client(api_key):
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    with _key_pool["lock"]:
+        client = _generative_clients.get(key_hash)
+        if client is not None:
+            _generative_clients.move_to_end(key_hash)
+            return client
+    client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+    with _key_pool["lock"]:
+        _generative_clients[key_hash] = client
+        while len(_generative_clients) > GENERATIVE_CLIENT_CACHE_SIZE:
+            _generative_clients.popitem(last=False)
+    return client
+
+# Function to check whether an error is a rate-limit / quota error
+def is_rate_limit_error(error):
+    return getattr(error, "code", None) == 429 or type(error).__name__ == "ResourceExhausted" or "429" in str(error)
+
+# Function to pick the pooled key with the most quota left (cooling-down keys only when nothing else is left)
+def acquire_pool_key():
+    pool = get_key_pool()
+    now = time.time()
+    with pool["lock"]:
+        for entry in pool["keys"].values():
+            while entry["recent"] and now - entry["recent"][0] > 60:
+                entry["recent"].popleft()
+        available = [key for key, entry in pool["keys"].items() if entry["cooldown_until"] <= now]
+        if available:
+            key = max(available, key=lambda k: (KEY_REQUESTS_PER_MINUTE - len(pool["keys"][k]["recent"]),
+                                                -pool["keys"][k]["rate_limited"], -pool["keys"][k]["calls"]))
+        else:
+            key = min(pool["keys"], key=lambda k: pool["keys"][k]["cooldown_until"])
+        entry = pool["keys"][key]
+        entry["recent"].append(now)
+        entry["calls"] += 1
+        return key
+
+# Function to report the outcome of a request made with a pooled key
+def release_pool_key(key, error=None):
+    pool = get_key_pool()
+    with pool["lock"]:
+        entry = pool["keys"][key]
+        if error is None:
+            entry["strikes"] = 0
+            return
+        entry["errors"] += 1
+        if is_rate_limit_error(error):
+            entry["rate_limited"] += 1
+            entry["strikes"] += 1
+            cooldown = min(KEY_COOLDOWN_SECONDS * 2 ** (entry["strikes"] - 1), KEY_MAX_COOLDOWN_SECONDS)
+        elif getattr(error, "code", None) in (401, 403) or "API key" in str(error): # Invalid or revoked key
+            cooldown = KEY_MAX_COOLDOWN_SECONDS
+        else:
+            return
+        entry["cooldown_until"] = time.time() + cooldown
+        routing_logger.warning("API key %s cooling down for %.0fs: %s", entry["label"], cooldown, error)
+
+# Function to summarise per-key usage for the developer panel
+def key_pool_report():
+    pool = get_key_pool()
+    now = time.time()
+    with pool["lock"]:
+        return [
+            {"key": entry["label"], "calls": entry["calls"], "errors": entry["errors"], "rate_limited": entry["rate_limited"],
+             "last_minute": sum(1 for t in entry["recent"] if now - t <= 60),
+             "status": f"cooling down ({entry['cooldown_until'] - now:.0f}s)" if entry["cooldown_until"] > now else "healthy"}
+            for entry in pool["keys"].values()
+        ]
+
+# --- Hedged requests ---
+# Opt-in: when a streaming call has produced no chunk after the configured percentile of the model's
+# observed time-to-first-token, a duplicate is sent (to a healthy sibling model when there is one) and
+# whichever streams first wins; the other's API call is aborted at once, even while it is still waiting
+# for its first chunk. A budget caps the share of calls hedged.
+_hedge_executor = ThreadPoolExecutor(max_workers=2 * SINGLE_FLIGHT_WORKERS, thread_name_prefix="hedge")
+
+# Function to work out how long to wait for a first chunk before hedging
+def hedge_delay_seconds(model_name):
+    stats = get_model_stats()
+    with stats["lock"]:
+        samples = sorted(stats["first_token_ms"].get(model_name, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return 2 * MODEL_PROFILES.get(model_name, {}).get("latency_ms", 3000) / 1000
+    return samples[min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE / 100))] / 1000
+
+# Function to pick the model a hedge is sent to: the best healthy sibling in the same tier, else the same model
+def hedge_model_for(model_name):
+    profile = MODEL_PROFILES.get(model_name)
+    if not profile:
+        return model_name
+    stats = get_model_stats()
+    with stats["lock"]:
+        entries = {name: dict(entry) for name, entry in stats["models"].items()}
+    siblings = [
+        name for name, sibling in MODEL_PROFILES.items()
+        if name != model_name and sibling["tier"] == profile["tier"] and sibling.get("auto", True)
+        and entries.get(name, {}).get("error_rate", 0.0) <= 0.5
+    ]
+    return min(siblings, key=lambda name: model_route_score(name, entries.get(name))) if siblings else model_name
+
+# Function to reserve a hedge within the budget: at most HEDGE_BUDGET of the hedge-eligible calls so far,
+# plus HEDGE_BUDGET_SEED (without the seed, a 5% budget would allow no hedge before the 20th call)
+def try_reserve_hedge():
+    stats = get_model_stats()
+    with stats["lock"]:
+        hedge = stats["hedge"]
+        if hedge["fired"] + 1 > HEDGE_BUDGET * hedge["calls"] + HEDGE_BUDGET_SEED:
+            return False
+        hedge["fired"] += 1
+        return True
+
+# Function to create the cancellation state of one attempt
+def new_attempt():
+    return {"cancelled": threading.Event(), "lock": threading.Lock(), "cancel_call": None}
+
+# Function to register how to abort an attempt's API call (aborted at once if the attempt is already cancelled)
+def register_attempt_call(attempt, cancel_call):
+    with attempt["lock"]:
+        attempt["cancel_call"] = cancel_call
+        cancelled = attempt["cancelled"].is_set()
+    if cancelled:
+        cancel_call()
+
+# Function to cancel an attempt: its pump stops forwarding chunks and its API call is aborted
+def cancel_attempt(attempt):
+    with attempt["lock"]:
+        attempt["cancelled"].set()
+        cancel_call = attempt["cancel_call"]
+    if cancel_call is not None:
+        try:
+            cancel_call()
+        except Exception as e:
+            routing_logger.warning("Could not abort a hedged attempt: %s", e)
+
+class CancellableClient:
+    # Wraps a generative client so an attempt's streaming call can be aborted from another thread: the
+    # SDK blocks inside generate_content until the first chunk, so the call handle is taken from here.
+    def __init__(self, client, attempt):
+        self.client = client
+        self.attempt = attempt
+
+    def stream_generate_content(self, *args, **kwargs):
+        call = self.client.stream_generate_content(*args, **kwargs)
+        register_attempt_call(self.attempt, call.cancel)
+        return call
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+# Function to pump one attempt's chunks into a shared queue until it ends or is cancelled
+def pump_attempt(tag, model_name, stream_fn, out_queue, attempt):
+    try:
+        for chunk in stream_fn(model_name, attempt):
+            if attempt["cancelled"].is_set():
+                return
+            out_queue.put((tag, "chunk", chunk))
+        out_queue.put((tag, "done", None))
+    except Exception as e:
+        if not attempt["cancelled"].is_set(): # An aborted call's error is expected
+            out_queue.put((tag, "error", e))
+
+# Function to stream a call, hedging it with a duplicate when the first chunk is late
+def hedged_stream(model_name, stream_fn):
+    stats = get_model_stats()
+    with stats["lock"]:
+        stats["hedge"]["calls"] += 1
+    out_queue = queue.Queue()
+    executor = _hedge_executor
+    attempts = {"primary": new_attempt()}
+    executor.submit(pump_attempt, "primary", model_name, stream_fn, out_queue, attempts["primary"])
+    winner = None
+    errors = {}
+    try:
+        delay = hedge_delay_seconds(model_name)
+        try:
+            event = out_queue.get(timeout=delay)
+        except queue.Empty:
+            event = None
+            if try_reserve_hedge():
+                hedge_model = hedge_model_for(model_name)
+                routing_logger.info("Hedging %s with %s after %.1fs without a first token", model_name, hedge_model, delay)
+                attempts["hedge"] = new_attempt()
+                executor.submit(pump_attempt, "hedge", hedge_model, stream_fn, out_queue, attempts["hedge"])
+        while True:
+            tag, kind, payload = out_queue.get() if event is None else event
+            event = None
+            if winner is None and kind != "error": # The first attempt to stream (or finish) wins
+                winner = tag
+                for other, attempt in attempts.items():
+                    if other != tag:
+                        cancel_attempt(attempt)
+                if tag == "hedge":
+                    with stats["lock"]:
+                        stats["hedge"]["won"] += 1
+            if winner is None:
+                errors[tag] = payload
+                if len(errors) == len(attempts): # Every attempt failed
+                    raise errors["primary"]
+                continue
+            if tag != winner:
+                continue
+            if kind == "chunk":
+                yield payload
+            elif kind == "error":
+                raise payload
+            else:
+                return
+    finally:
+        for attempt in attempts.values():
+            cancel_attempt(attempt)
+
+# --- Single-flight request coalescing ---
+# Identical concurrent requests (same model, prompt and generation config) from any session attach to
+# one in-flight streaming call and all receive its chunks, so a classroom clicking the same template at
+# once costs one API call. The call runs on a shared worker; when every waiter has left, it is stopped.
+_single_flight_registry = {
+    "lock": threading.Lock(),
+    "flights": {}, # key -> flight dict
+    "executor": ThreadPoolExecutor(max_workers=SINGLE_FLIGHT_WORKERS, thread_name_prefix="single-flight"),
+    "stats": {"calls": 0, "coalesced": 0, "cancelled": 0, "errors": 0}
+}
+
+# Function to get the process-wide single-flight registry
+def get_single_flight_registry():
+    return _single_flight_registry
+
+# Function to name whose key a request runs on: the pool is shared, a user's key is known by its hash
+def api_key_identity(api_key):
+    if api_key == KEY_POOL_SENTINEL:
+        return KEY_POOL_SENTINEL
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+# Function to build the coalescing (and response cache) key of a request. Requests on different user
+# keys never share a flight or a cached response, so an invalid key can't borrow a valid key's answer
+# and one key's auth or quota error never reaches the callers of another.
+def single_flight_key(model_name, prompt, generation_config, api_key=KEY_POOL_SENTINEL):
+    payload = json.dumps({"model": model_name, "prompt": prompt, "config": generation_config, "key": api_key_identity(api_key)}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Function to read a response from the shared cache; a storage outage only costs the cache hit
+def get_cached_response(key):
+    if RESPONSE_CACHE_TTL <= 0:
+        return None
+    try:
+        return get_storage()["cache"].get(key)
+    except Exception as e:
+        routing_logger.warning("Response cache read failed: %s", e)
+        return None
+
+# Function to store a finished response in the shared cache
+def store_cached_response(key, text):
+    if RESPONSE_CACHE_TTL <= 0 or not text:
+        return
+    try:
+        get_storage()["cache"].set(key, text, ttl=RESPONSE_CACHE_TTL)
+    except Exception as e:
+        routing_logger.warning("Response cache write failed: %s", e)
+
+# Function to run a flight's streaming call on a worker, fanning chunks out to every waiter
+def run_flight(registry, key, flight, stream_fn):
+    try:
+        for chunk in stream_fn():
+            with flight["cond"]:
+                if flight["waiters"] == 0: # Everyone left: stop consuming the upstream stream
+                    flight["cancelled"] = True
+                    registry["stats"]["cancelled"] += 1
+                    break
+                flight["chunks"].append(chunk)
+                flight["cond"].notify_all()
+    except Exception as e:
+        flight["error"] = e
+        registry["stats"]["errors"] += 1
+    finally:
+        with registry["lock"]:
+            if registry["flights"].get(key) is flight:
+                del registry["flights"][key]
+        with flight["cond"]:
+            flight["done"] = True
+            flight["cond"].notify_all()
+
+# Function to attach to the in-flight call for a key, starting one if there is none
+def join_flight(key, stream_fn):
+    registry = get_single_flight_registry()
+    with registry["lock"]:
+        flight = registry["flights"].get(key)
+        if flight is not None:
+            with flight["cond"]:
+                if not flight["cancelled"]:
+                    flight["waiters"] += 1
+                    registry["stats"]["coalesced"] += 1
+                    return flight
+        flight = {"cond": threading.Condition(), "chunks": [], "waiters": 1, "done": False, "cancelled": False, "error": None}
+        registry["flights"][key] = flight
+        registry["stats"]["calls"] += 1
+    registry["executor"].submit(run_flight, registry, key, flight, stream_fn)
+    return flight
+
+# Function to iterate over a flight's chunks as they arrive; closing the iterator detaches the waiter
+def iter_flight_chunks(flight):
+    index = 0
+    try:
+        while True:
+            with flight["cond"]:
+                while index >= len(flight["chunks"]) and not flight["done"]:
+                    flight["cond"].wait()
+                new_chunks = flight["chunks"][index:]
+                done = flight["done"]
+            for chunk in new_chunks:
+                index += 1
+                yield chunk
+            if done:
+                if flight["error"] is not None:
+                    raise flight["error"]
+                if flight["cancelled"]:
+                    raise RuntimeError("The shared request was cancelled")
+                return
+    finally:
+        with flight["cond"]:
+            flight["waiters"] -= 1
+
+# Function to stream AI content through the single-flight layer (and the hedging policy when enabled)
+def stream_ai_content(prompt, api_key, model_name, generation_config, hedge=False):
+    def stream_model(attempt_model, attempt=None):
+        if cassettes.CASSETTE_MODE == "replay": # Recorded responses: no network and no API key
+            started = time.perf_counter()
+            for index, text in enumerate(cassettes.replay_cassette(prompt, generation_config)):
+                if index == 0:
+                    record_first_token(attempt_model, (time.perf_counter() - started) * 1000)
+                yield text
+            return
+        attempt_key = acquire_pool_key() if api_key == KEY_POOL_SENTINEL else api_key
+        model = genai.GenerativeModel(attempt_model)
+        # Per-key client instead of the process-wide genai.configure(). _client is private SDK state, so
+        # requirements.txt pins google-generativeai to 0.8.x (the final, unmaintained series), which reads it
+        # in GenerativeModel.generate_content.
+        client = get_generative_client(attempt_key)
+        model._client = client if attempt is None else CancellableClient(client, attempt) # A hedged attempt can be aborted
+        started = time.perf_counter()
+        try:
+            chunks = model.generate_content(prompt, generation_config=generation_config, stream=True)
+            if cassettes.CASSETTE_MODE == "record":
+                chunks = cassettes.record_cassette(chunks, attempt_model, prompt, generation_config, secrets=[attempt_key], started=started)
+            for index, chunk in enumerate(chunks):
+                if index == 0:
+                    record_first_token(attempt_model, (time.perf_counter() - started) * 1000)
+                yield chunk.text
+        except Exception as e:
+            if api_key == KEY_POOL_SENTINEL:
+                release_pool_key(attempt_key, e)
+            raise
+        if api_key == KEY_POOL_SENTINEL:
+            release_pool_key(attempt_key)
+    def leader_stream(): # Runs once per flight, so coalesced waiters don't inflate the model stats
+        started = time.perf_counter()
+        try:
+            yield from (hedged_stream(model_name, stream_model) if hedge else stream_model(model_name))
+        except Exception:
+            record_model_call(model_name, (time.perf_counter() - started) * 1000, failed=True)
+            raise
+        record_model_call(model_name, (time.perf_counter() - started) * 1000, failed=False)
+    return iter_flight_chunks(join_flight(single_flight_key(model_name, prompt, generation_config, api_key), leader_stream))
+
+# Function to stream generated content as text chunks, through the response cache and the single-flight
+# layer; errors are raised (generate_content turns them into "Error: ..." text)
+def stream_content(prompt, api_key, model_name, temperature, detail_level, style_params, response_mime_type=None, tool_name=None,
+                   model_overrides=None, hedge=False):
+    if model_name == AUTO_MODEL:
+        model_name = route_model(tool_name, detail_level, prompt, model_overrides)
+    # Adjust max tokens based on detail level
+    max_tokens = {
+        "Brief": 2048,
+        "Standard": 4096, 
+        "Comprehensive": 8192,
+        "Expert": 8192
+    }
+    
+    # Apply style adjustments to prompt
+    style_prefix = f"Using {style_params['tone']} tone and {style_params['language_style']} language style, "
+    enhanced_prompt = style_prefix + prompt
+    
+    generation_config = {
+        "temperature": temperature,
+        "top_p": 0.95,
+        "top_k": 40,
+        "max_output_tokens": max_tokens[detail_level]
+    }
+    if response_mime_type: # e.g. "application/json" for structured output
+        generation_config["response_mime_type"] = response_mime_type
+    
+    cache_key = single_flight_key(model_name, enhanced_prompt, generation_config, api_key)
+    cached = get_cached_response(cache_key)
+    if cached is not None:
+        yield cached
+        return
+    chunks = []
+    for chunk in stream_ai_content(enhanced_prompt, api_key, model_name, generation_config, hedge=hedge):
+        chunks.append(chunk)
+        yield chunk
+    store_cached_response(cache_key, "".join(chunks))
+
+# Function to generate content with AI; errors are returned as "Error: ..." text, like every caller expects
+def generate_content(prompt, api_key, model_name, temperature, detail_level, style_params, response_mime_type=None, tool_name=None,
+                     model_overrides=None, hedge=False):
+    try:
+        return "".join(stream_content(prompt, api_key, model_name, temperature, detail_level, style_params, response_mime_type=response_mime_type,
+                                      tool_name=tool_name, model_overrides=model_overrides, hedge=hedge))
+    except Exception as e:
+        return f"Error: {str(e)}"
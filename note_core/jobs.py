@@ -0,0 +1,105 @@
+# Background jobs run through the configured JobQueue (see storage.py), so with the shared backend a
+# job queued by one app replica can be run by any replica and its result read by the one that queued
+# it. Jobs name a handler in JOB_HANDLERS and carry JSON-serializable arguments. A user's API key is
+# never written to the queue: it stays in this process's memory, keyed by job id, and the job is owned
+# by this process so only its workers claim it. Jobs on the server key pool can run anywhere.
+import logging
+import threading
+import time
+import uuid
+
+from .generation import KEY_POOL_SENTINEL
+from .question_bank import fill_question_bank
+from .storage import JOB_LEASE_SECONDS, JOB_POLL_SECONDS, get_storage
+from .study import generate_follow_up_questions, generate_spaced_repetition_text
+
+JOB_HANDLERS = {
+    "fill_question_bank": fill_question_bank,
+    "generate_follow_up_questions": generate_follow_up_questions,
+    "generate_spaced_repetition_text": generate_spaced_repetition_text,
+}
+jobs_logger = logging.getLogger("note_maker.jobs")
+JOB_OWNER = uuid.uuid4().hex # This process, as the owner of the jobs that need a key only it holds
+JOB_SECRET_KEY = "__job_secret__" # Stands in for the API key in the payload of an owned job
+_job_secrets = {"lock": threading.Lock(), "keys": {}} # job id -> (api key, time queued)
+
+# Function to queue a job; returns its id. The handler's API key is passed as api_key=... and is kept
+# out of the payload.
+def enqueue_job(handler_name, *args, api_key=None, **kwargs):
+    if handler_name not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job handler: {handler_name}")
+    payload = {"args": list(args), "kwargs": kwargs}
+    if api_key is None or api_key == KEY_POOL_SENTINEL: # Nothing secret: any replica may run it
+        if api_key is not None:
+            payload["api_key"] = api_key
+        return get_storage()["jobs"].enqueue(handler_name, payload)
+    payload["api_key"] = JOB_SECRET_KEY
+    now = time.time()
+    with _job_secrets["lock"]: # Held until the key is stored, so a worker can't claim the job first
+        for job_id, (_, queued) in list(_job_secrets["keys"].items()): # Jobs never claimed (cancelled, or failed elsewhere)
+            if now - queued > JOB_LEASE_SECONDS:
+                del _job_secrets["keys"][job_id]
+        job_id = get_storage()["jobs"].enqueue(handler_name, payload, owner=JOB_OWNER)
+        _job_secrets["keys"][job_id] = (api_key, now)
+    return job_id
+
+# Function to get the arguments a claimed job's handler is called with, taking its API key from memory
+def job_arguments(job):
+    kwargs = dict(job["payload"]["kwargs"])
+    if "api_key" in job["payload"]:
+        api_key = job["payload"]["api_key"]
+        if api_key == JOB_SECRET_KEY:
+            with _job_secrets["lock"]:
+                api_key, _ = _job_secrets["keys"].pop(job["id"], (None, None))
+            if api_key is None:
+                raise RuntimeError("The API key for this job is no longer available")
+        kwargs["api_key"] = api_key
+    return job["payload"]["args"], kwargs
+
+# Function to cancel a job and forget its API key
+def cancel_job(job_id):
+    with _job_secrets["lock"]:
+        _job_secrets["keys"].pop(job_id, None)
+    get_storage()["jobs"].cancel(job_id)
+
+# Function to run jobs from the queue until stop_event is set
+def run_job_worker(stop_event):
+    job_queue = get_storage()["jobs"]
+    while not stop_event.is_set():
+        try:
+            job = job_queue.claim(timeout=1.0, owner=JOB_OWNER)
+        except Exception:
+            jobs_logger.exception("Could not claim a job")
+            time.sleep(1.0)
+            continue
+        if job is None:
+            continue
+        try:
+            args, kwargs = job_arguments(job)
+            result = JOB_HANDLERS[job["kind"]](*args, **kwargs)
+            job_queue.finish(job["id"], result=result)
+        except Exception as e:
+            jobs_logger.warning("Job %s (%s) failed: %s", job["id"], job["kind"], e)
+            job_queue.finish(job["id"], error=str(e) or type(e).__name__)
+
+# Function to start worker threads for this process; returns (threads, stop_event)
+def start_job_workers(count):
+    stop_event = threading.Event()
+    threads = [threading.Thread(target=run_job_worker, args=(stop_event,), name=f"note-job-{n}", daemon=True) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, stop_event
+
+# Function to wait for a job's result; returns None if it failed, was cancelled or isn't done in time
+def wait_for_job(job_id, timeout):
+    deadline = time.time() + timeout
+    job_queue = get_storage()["jobs"]
+    while True:
+        state = job_queue.status(job_id)
+        if state is None or state["status"] in ("failed", "cancelled"):
+            return None
+        if state["status"] == "done":
+            return state["result"]
+        if time.time() >= deadline:
+            return None
+        time.sleep(JOB_POLL_SECONDS)
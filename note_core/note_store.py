@@ -0,0 +1,82 @@
+# Content-addressed store for generated note bodies. History and favorites keep only a small reference
+# ({"__note__": digest, "size": n}); identical bodies are stored once, zlib-compressed, and a body that
+# closely resembles an earlier version (same topic and tool) is stored as a line delta against it.
+# Bodies live in the configured storage backend, so references stay valid on every replica. Each body
+# counts its holders (every list entry keeping its reference, and every delta built on it) and is
+# deleted when the last one releases it, so trimmed history doesn't keep its bodies forever.
+import difflib
+import hashlib
+import json
+import zlib
+from functools import lru_cache
+
+from .storage import get_storage
+
+NOTE_DELTA_MAX_CHAIN = 8 # Longest chain of deltas a read may have to apply
+NOTE_DELTA_MIN_SAVING = 0.8 # A delta is kept only if it is under 80% of the compressed full body
+ZLIB_LEVEL = 6
+
+# Function to check whether a value is a note body reference
+def is_note_ref(value):
+    return isinstance(value, dict) and "__note__" in value
+
+# Function to describe text as line operations against a base: [start, end] copies base lines, strings are new text
+def encode_delta(base_text, text):
+    base_lines, lines = base_text.splitlines(keepends=True), text.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, base_lines, lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif tag in ("replace", "insert"):
+            ops.append("".join(lines[j1:j2]))
+    return ops
+
+# Function to rebuild text from a base and its delta
+def apply_delta(base_text, ops):
+    base_lines = base_text.splitlines(keepends=True)
+    return "".join("".join(base_lines[op[0]:op[1]]) if isinstance(op, list) else op for op in ops)
+
+# Function to store a note body (optionally as a delta against base_ref) and return its reference; the
+# caller becomes a holder of the body and drops it with release_notes
+def put_note(text, base_ref=None):
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    store = get_storage()["notes"]
+    if not store.retain(digest):
+        record = {"base": None, "depth": 0, "size": len(data), "data": zlib.compress(data, ZLIB_LEVEL)}
+        base = store.get(base_ref["__note__"]) if is_note_ref(base_ref) and base_ref["__note__"] != digest else None
+        if base is not None and base["depth"] < NOTE_DELTA_MAX_CHAIN:
+            ops = encode_delta(load_note(base_ref["__note__"]), text)
+            delta = zlib.compress(json.dumps(ops, separators=(",", ":")).encode("utf-8"), ZLIB_LEVEL)
+            if len(delta) < len(record["data"]) * NOTE_DELTA_MIN_SAVING:
+                record.update(base=base_ref["__note__"], depth=base["depth"] + 1, data=delta)
+        store.put(digest, record)
+    return {"__note__": digest, "size": len(data)}
+
+# Function to add a holder to a stored note body (e.g. a second list keeping the same reference)
+def retain_note(ref):
+    if is_note_ref(ref):
+        get_storage()["notes"].retain(ref["__note__"])
+
+# Function to drop one holder of each referenced note body; a body left without holders is deleted
+# (and its delta base loses a holder in turn). Other values are ignored.
+def release_notes(refs):
+    store = get_storage()["notes"]
+    for ref in refs:
+        if is_note_ref(ref):
+            store.release(ref["__note__"])
+
+# Function to read a note body back (bodies never change, so recent ones are cached per process)
+@lru_cache(maxsize=64)
+def load_note(digest):
+    record = get_storage()["notes"].get(digest)
+    if record is None:
+        raise KeyError(f"Note body {digest} is missing from the note store")
+    payload = zlib.decompress(record["data"]).decode("utf-8")
+    if record["base"] is None:
+        return payload
+    return apply_delta(load_note(record["base"]), json.loads(payload))
+
+# Function to report how much the note store holds and saves
+def note_store_stats():
+    return get_storage()["notes"].stats()
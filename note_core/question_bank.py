@@ -0,0 +1,45 @@
+# Question bank: parsed quiz questions are kept in the configured storage backend (see storage.py),
+# keyed by a hash of the source notes and by topic, and deduplicated by a hash of the normalized
+# question text. Quizzes are sampled from the bank and only the shortfall is generated, so a repeat
+# quiz on the same notes needs no API call.
+import hashlib
+import re
+
+from .storage import get_storage
+from .study import generate_quiz, parse_quiz_text
+
+# Function to hash note content (used as the question bank's source key)
+def note_content_hash(content):
+    return hashlib.sha256(content.strip().encode("utf-8")).hexdigest()
+
+# Function to normalize question text for deduplication
+def normalize_question_text(question):
+    text = re.sub(r"^\s*(q(uestion)?\s*)?\d+\s*[.):]\s*", "", question.strip(), flags=re.IGNORECASE)
+    text = re.sub(r"[^\w\s]", "", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+# Function to add parsed questions to the bank; returns how many were new
+def add_questions_to_bank(source_hash, topic, questions):
+    rows = []
+    for q in questions:
+        question_text = re.sub(r"^\s*\d+\s*[.)]\s*", "", q["question"]).strip()
+        question_hash = hashlib.sha1(normalize_question_text(question_text).encode("utf-8")).hexdigest()
+        rows.append({"question_hash": question_hash, "question": question_text, "options": q["options"], "correct": q["correct"]})
+    return get_storage()["questions"].add(source_hash, topic.strip().lower(), rows)
+
+# Function to draw questions for a quiz, least-served first; other notes on the same topic fill any gap
+def sample_bank_questions(source_hash, topic, num_questions):
+    return get_storage()["questions"].sample(source_hash, (topic or "").strip().lower(), num_questions)
+
+# Function to count the questions banked for some notes
+def count_bank_questions(source_hash):
+    return get_storage()["questions"].count(source_hash)
+
+# Function to top up the bank for some notes so it holds at least num_questions questions
+def fill_question_bank(content, topic, api_key, model_name, num_questions=20, **options):
+    source_hash = note_content_hash(content)
+    shortfall = num_questions - count_bank_questions(source_hash)
+    if shortfall > 0 and api_key:
+        quiz_text = generate_quiz(content, api_key, model_name, num_questions=shortfall, **options)
+        return add_questions_to_bank(source_hash, topic, parse_quiz_text(quiz_text))
+    return 0
@@ -0,0 +1,192 @@
+# Deep research pipeline: plan a query into sub-questions, answer them concurrently on a bounded pool,
+# then synthesize one report whose sections cite the findings they use ([S1], [S2], ...). Sub-question
+# answers are cached in the storage backend by question and model, so a follow-up query that plans an
+# overlapping sub-question reuses the earlier answer instead of paying for it again.
+#
+# A research session's memory keeps follow-up prompts at a constant size: the last few turns verbatim,
+# a running summary that older turns are folded into, and chunks of older answers retrieved by
+# relevance to the new query, all clipped to a fixed token budget.
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .document import chunk_document, get_note_document
+from .generation import generate_content
+from .storage import get_storage
+from .templates import load_prompt_templates
+
+RESEARCH_WORKERS = 4
+RESEARCH_MAX_SUB_QUESTIONS = 6
+RESEARCH_CACHE_TTL = float(os.environ.get("NOTE_MAKER_RESEARCH_CACHE_TTL", 7 * 24 * 3600)) # 0 turns the cache off
+RESEARCH_MEMORY_TURNS = 3 # Turns kept verbatim before being folded into the summary
+RESEARCH_CONTEXT_TOKENS = 3000 # Budget of the context built for a follow-up
+RESEARCH_SUMMARY_WORDS = 250
+RESEARCH_MEMORY_CHUNK_CHARS = 1200
+RESEARCH_MEMORY_MAX_CHUNKS = 100
+CHARS_PER_TOKEN = 4
+
+# Function to plan a query into sub-questions (falls back to the query itself if planning fails)
+def plan_sub_questions(query, api_key, model_name, max_questions=RESEARCH_MAX_SUB_QUESTIONS, context="", **options):
+    templates = load_prompt_templates()
+    prompt = templates["Research Plan"].format(query=query, max_questions=max_questions)
+    if context: # Follow-up: plan around what the session already covered
+        prompt += f"\n\nEarlier in this research session (plan sub-questions that build on it rather than repeat it):\n{context}"
+    response_text = generate_content(
+        prompt,
+        api_key,
+        model_name,
+        temperature=0.3,
+        detail_level="Brief",
+        style_params={"tone": "Analytical", "language_style": "Concise"},
+        response_mime_type="application/json",
+        tool_name="Research Plan",
+        **options
+    )
+    try:
+        planned = json.loads(response_text)["sub_questions"]
+    except (ValueError, KeyError, TypeError):
+        planned = []
+    sub_questions = []
+    for question in planned:
+        if isinstance(question, str) and question.strip() and question.strip() not in sub_questions:
+            sub_questions.append(question.strip())
+    return sub_questions[:max_questions] or [query]
+
+# Function to build the cache key of a sub-question answer
+def sub_question_cache_key(sub_question, model_name):
+    normalized = re.sub(r"\W+", " ", sub_question.lower()).strip()
+    return "research:" + hashlib.sha256(f"{model_name}|{normalized}".encode("utf-8")).hexdigest()
+
+# Function to answer one sub-question, from the cache when possible; never raises
+def answer_sub_question(query, sub_question, api_key, model_name, **options):
+    started = time.perf_counter()
+    cache_key = sub_question_cache_key(sub_question, model_name)
+    finding = {"question": sub_question, "answer": None, "cached": False, "error": None}
+    try:
+        if RESEARCH_CACHE_TTL > 0:
+            finding["answer"] = get_storage()["cache"].get(cache_key)
+            finding["cached"] = finding["answer"] is not None
+        if finding["answer"] is None:
+            templates = load_prompt_templates()
+            answer = generate_content(
+                templates["Research Sub-question"].format(query=query, sub_question=sub_question),
+                api_key,
+                model_name,
+                temperature=0.5,
+                detail_level="Standard",
+                style_params={"tone": "Academic", "language_style": "Standard"},
+                tool_name="Research Assistant Query",
+                **options
+            )
+            if answer.startswith("Error:"):
+                finding["error"] = answer
+            else:
+                finding["answer"] = answer
+                if RESEARCH_CACHE_TTL > 0:
+                    get_storage()["cache"].set(cache_key, answer, ttl=RESEARCH_CACHE_TTL)
+    except Exception as e:
+        finding["error"] = f"Error: {str(e)}"
+    finding["seconds"] = round(time.perf_counter() - started, 1)
+    return finding
+
+# Function to run the whole pipeline; on_progress(event, data) is called from the caller's thread
+# with "planned" (the sub-questions) and "answered" (index, finding) as each answer arrives
+def run_deep_research(query, output_format, api_key, model_name, on_progress=None, max_workers=RESEARCH_WORKERS, context="", **options):
+    notify = on_progress or (lambda event, data: None)
+    sub_questions = plan_sub_questions(query, api_key, model_name, context=context, **options)
+    notify("planned", sub_questions)
+    findings = [None] * len(sub_questions)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(answer_sub_question, query, sub_question, api_key, model_name, **options): index
+                   for index, sub_question in enumerate(sub_questions)}
+        for future in as_completed(futures):
+            index = futures[future]
+            findings[index] = future.result()
+            notify("answered", (index, findings[index]))
+    answered = [(index, finding) for index, finding in enumerate(findings) if finding["answer"]]
+    if not answered:
+        errors = "; ".join(finding["error"] for finding in findings if finding["error"])
+        return {"query": query, "findings": findings, "report": f"Error: no sub-question could be answered ({errors})"}
+    templates = load_prompt_templates()
+    findings_text = "\n\n".join(f"[S{index + 1}] {finding['question']}\n{finding['answer']}" for index, finding in answered)
+    report = generate_content(
+        templates["Research Synthesis"].format(query=query, output_format=output_format, findings=findings_text),
+        api_key,
+        model_name,
+        temperature=0.4,
+        detail_level="Comprehensive",
+        style_params={"tone": "Academic", "language_style": "Elaborate"},
+        tool_name="Research Synthesis",
+        **options
+    )
+    if not report.startswith("Error:"):
+        sources = "\n".join(f"- **[S{index + 1}]** {finding['question']}" for index, finding in answered)
+        report = f"{report.rstrip()}\n\n---\n**Sub-questions researched**\n{sources}\n"
+    return {"query": query, "findings": findings, "report": report}
+
+# --- Bounded session memory for follow-ups ---
+# Function to create an empty research session memory
+def new_research_memory():
+    return {"summary": "", "turns": [], "chunks": [], "turn_count": 0}
+
+# Function to shorten text to at most max_chars, at a word boundary
+def clip_text(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + " …"
+
+# Function to fold one turn into the running summary (keeps the old summary if the call fails)
+def summarize_research_turn(summary, turn, api_key, model_name, **options):
+    templates = load_prompt_templates()
+    updated = generate_content(
+        templates["Research Memory Summary"].format(
+            max_words=RESEARCH_SUMMARY_WORDS, summary=summary or "(empty)", query=turn["query"],
+            answer=clip_text(get_note_document(turn["answer"])["plain_text"], RESEARCH_CONTEXT_TOKENS * CHARS_PER_TOKEN)
+        ),
+        api_key,
+        model_name,
+        temperature=0.2,
+        detail_level="Brief",
+        style_params={"tone": "Analytical", "language_style": "Concise"},
+        tool_name="Research Memory Summary",
+        **options
+    )
+    if updated.startswith("Error:") or not updated.strip():
+        return clip_text(f"{summary}\n- Researched: {turn['query']}".strip(), RESEARCH_SUMMARY_WORDS * 8)
+    return clip_text(updated.strip(), RESEARCH_SUMMARY_WORDS * 8)
+
+# Function to add a finished turn; turns beyond RESEARCH_MEMORY_TURNS are archived as chunks and summarized
+def remember_research_turn(memory, query, answer, api_key, model_name, **options):
+    memory["turns"].append({"query": query, "answer": answer})
+    memory["turn_count"] += 1
+    while len(memory["turns"]) > RESEARCH_MEMORY_TURNS:
+        oldest = memory["turns"].pop(0)
+        memory["chunks"].extend(f"(From: {oldest['query']})\n{chunk.strip()}"
+                                for chunk in chunk_document(get_note_document(oldest["answer"]), RESEARCH_MEMORY_CHUNK_CHARS))
+        del memory["chunks"][:-RESEARCH_MEMORY_MAX_CHUNKS]
+        memory["summary"] = summarize_research_turn(memory["summary"], oldest, api_key, model_name, **options)
+
+# Function to build the context for a follow-up on query: summary, recent turns and relevant archived chunks,
+# together at most budget_tokens (a quarter for the summary, half for the turns, the rest for chunks)
+def build_research_context(memory, query, budget_tokens=RESEARCH_CONTEXT_TOKENS):
+    budget = budget_tokens * CHARS_PER_TOKEN
+    parts = []
+    if memory["summary"]:
+        parts.append("Summary of earlier research:\n" + clip_text(memory["summary"], budget // 4))
+    if memory["turns"]:
+        share = (budget // 2) // len(memory["turns"])
+        parts.extend(f"Earlier question: {turn['query']}\nFindings: {clip_text(get_note_document(turn['answer'])['plain_text'], share)}"
+                     for turn in memory["turns"])
+    remaining = budget - sum(len(part) + 2 for part in parts)
+    if memory["chunks"] and remaining > 0:
+        terms = {term for term in re.findall(r"\w+", query.lower()) if len(term) > 2}
+        ranked = sorted(memory["chunks"], key=lambda chunk: -sum(chunk.lower().count(term) for term in terms))
+        for chunk in ranked:
+            part = "Related earlier finding:\n" + chunk
+            if len(part) + 2 <= remaining: # Smaller, less relevant chunks may still fit
+                parts.append(part)
+                remaining -= len(part) + 2
+    return "\n\n".join(parts)
@@ -0,0 +1,180 @@
+# Semantic response cache for near-duplicate requests ("photosynthesis", "Explain the photosynthesis
+# process", "Newton's laws" and "newtons laws"). The user-supplied variables of a request are
+# normalized (case, possessives, stop words and generic request words) and embedded locally as a
+# hashed bag of words and character trigrams. Embeddings are kept in an inverted index per scope
+# (tool, detail level and the other settings that must match exactly), so a lookup only scores the
+# entries that share a feature with the request. The nearest entry at or above
+# SEMANTIC_CACHE_THRESHOLD (cosine similarity) whose numbers match the request's exactly is served, so
+# "World War 1" never gets the notes of "World War 2". Responses live in the shared response cache;
+# the index is per process and fills up again as requests are made.
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+from .storage import get_storage
+
+SEMANTIC_CACHE_TTL = float(os.environ.get("NOTE_MAKER_SEMANTIC_CACHE_TTL", 7 * 24 * 3600)) # 0 turns the cache off
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("NOTE_MAKER_SEMANTIC_CACHE_THRESHOLD", 0.9))
+SEMANTIC_INDEX_SIZE = 2000 # Entries kept per scope (oldest dropped first)
+SEMANTIC_FEATURE_BUCKETS = 1 << 20 # Hashed feature space
+TRIGRAM_WEIGHT = 0.5 # Relative weight of character trigrams against whole words
+# Stop words and generic request words: they phrase a request ("explain", "overview of", "process")
+# but don't change the topic the notes are about, which the tool and detail level already shape.
+SEMANTIC_FILLER_WORDS = set("""
+a an the of about on in to for please what whats which who is are was were how does do did can could
+tell me i my you your this that these those and
+explain explanation describe description define definition overview introduction intro basics basic
+process concept concepts notes note summary summarize guide understanding understand learn give
+""".split())
+
+_semantic_index = {
+    "scopes": {}, # scope key -> {"entries": OrderedDict(entry id -> entry), "postings": {feature: set(entry ids)}}
+    "stats": {"lookups": 0, "hits": 0, "misses": 0, "rejected": 0, "hit_similarity_sum": 0.0, "lowest_hit_similarity": None,
+              "rejected_similarity_sum": 0.0},
+    "lock": threading.Lock(),
+}
+
+# Function to reduce request text to the words that carry its meaning
+def normalize_request_text(text):
+    words = re.findall(r"\w+", re.sub(r"['’]s\b", "s", text.lower())) # "Newton's" and "Newtons" are one word
+    kept = [word for word in words if word not in SEMANTIC_FILLER_WORDS]
+    return " ".join(kept or words) # A request made only of filler words is kept as it is
+
+# Function to list the numbers in normalized request text (they must agree exactly for a hit)
+def request_numbers(normalized):
+    return sorted(re.findall(r"\d+", normalized))
+
+# Function to get the stable hashed id of a feature
+def feature_id(feature):
+    return zlib.crc32(feature.encode("utf-8")) % SEMANTIC_FEATURE_BUCKETS
+
+# Function to embed normalized text as a unit-length sparse vector {feature id: weight}
+def embed_text(normalized):
+    vector = {}
+    for word in normalized.split():
+        vector[feature_id("w:" + word)] = vector.get(feature_id("w:" + word), 0.0) + 1.0
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            trigram = feature_id("t:" + padded[i:i + 3])
+            vector[trigram] = vector.get(trigram, 0.0) + TRIGRAM_WEIGHT
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {feature: weight / norm for feature, weight in vector.items()} if norm else {}
+
+# Function to get the key of a scope (the settings that must match exactly)
+def semantic_scope_key(scope):
+    return json.dumps(scope, sort_keys=True, default=str)
+
+# Function to join a request's user-supplied variables into one text
+def request_text(variables):
+    return " ".join(str(variables[name]) for name in sorted(variables))
+
+# Function to build the response cache key of an entry
+def semantic_cache_key(scope_key, normalized):
+    return "semantic:" + hashlib.sha256(f"{scope_key}|{normalized}".encode("utf-8")).hexdigest()
+
+# Function to drop an entry from a scope's index (caller holds the lock)
+def remove_entry(scope_index, entry_id):
+    entry = scope_index["entries"].pop(entry_id)
+    for feature in entry["vector"]:
+        postings = scope_index["postings"][feature]
+        postings.discard(entry_id)
+        if not postings:
+            del scope_index["postings"][feature]
+
+# Function to find the most similar earlier request in scope; returns a hit
+# {"text", "similarity", "matched", "normalized", "cache_key"} or None
+def lookup_semantic_cache(scope, variables, threshold=None):
+    if SEMANTIC_CACHE_TTL <= 0:
+        return None
+    threshold = SEMANTIC_CACHE_THRESHOLD if threshold is None else threshold
+    normalized = normalize_request_text(request_text(variables))
+    vector = embed_text(normalized)
+    numbers = request_numbers(normalized)
+    stats = _semantic_index["stats"]
+    with _semantic_index["lock"]:
+        stats["lookups"] += 1
+        scope_index = _semantic_index["scopes"].get(semantic_scope_key(scope))
+        scores = {}
+        if scope_index is not None:
+            for feature, weight in vector.items(): # Dot products over shared features only
+                for entry_id in scope_index["postings"].get(feature, ()):
+                    scores[entry_id] = scores.get(entry_id, 0.0) + weight * scope_index["entries"][entry_id]["vector"][feature]
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    for entry_id, similarity in ranked:
+        if similarity < threshold:
+            break
+        with _semantic_index["lock"]:
+            entry = scope_index["entries"].get(entry_id)
+        if entry is None or entry["numbers"] != numbers: # "Python 2" and "Python 3" are different topics
+            continue
+        try:
+            text = get_storage()["cache"].get(entry["cache_key"])
+        except Exception:
+            text = None # A storage outage only costs the hit
+        if text is None: # Expired: forget the entry
+            with _semantic_index["lock"]:
+                if entry_id in scope_index["entries"]:
+                    remove_entry(scope_index, entry_id)
+            continue
+        similarity = min(similarity, 1.0)
+        with _semantic_index["lock"]:
+            stats["hits"] += 1
+            stats["hit_similarity_sum"] += similarity
+            lowest = stats["lowest_hit_similarity"]
+            stats["lowest_hit_similarity"] = similarity if lowest is None else min(lowest, similarity)
+        return {"text": text, "similarity": round(similarity, 3), "matched": entry["text"], "normalized": normalized,
+                "cache_key": entry["cache_key"]}
+    with _semantic_index["lock"]:
+        stats["misses"] += 1
+    return None
+
+# Function to store a fresh response so later similar requests can reuse it (error responses are not stored)
+def store_semantic_response(scope, variables, response):
+    if SEMANTIC_CACHE_TTL <= 0 or not response or response.startswith("Error:"):
+        return
+    scope_key = semantic_scope_key(scope)
+    text = request_text(variables)
+    normalized = normalize_request_text(text)
+    cache_key = semantic_cache_key(scope_key, normalized)
+    try:
+        get_storage()["cache"].set(cache_key, response, ttl=SEMANTIC_CACHE_TTL)
+    except Exception:
+        return
+    vector = embed_text(normalized)
+    with _semantic_index["lock"]:
+        scope_index = _semantic_index["scopes"].setdefault(scope_key, {"entries": OrderedDict(), "postings": {}})
+        if cache_key in scope_index["entries"]: # Same request again: its response was just replaced
+            scope_index["entries"].move_to_end(cache_key)
+            return
+        scope_index["entries"][cache_key] = {"text": text, "vector": vector, "numbers": request_numbers(normalized), "cache_key": cache_key}
+        for feature in vector:
+            scope_index["postings"].setdefault(feature, set()).add(cache_key)
+        while len(scope_index["entries"]) > SEMANTIC_INDEX_SIZE:
+            remove_entry(scope_index, next(iter(scope_index["entries"])))
+
+# Function to record that the user regenerated instead of keeping a served hit
+def record_semantic_rejection(hit):
+    with _semantic_index["lock"]:
+        _semantic_index["stats"]["rejected"] += 1
+        _semantic_index["stats"]["rejected_similarity_sum"] += hit["similarity"]
+
+# Function to report hit quality: hit rate, how similar served hits were, and how often users rejected them
+def get_semantic_cache_stats():
+    with _semantic_index["lock"]:
+        stats = dict(_semantic_index["stats"])
+        entries = sum(len(scope_index["entries"]) for scope_index in _semantic_index["scopes"].values())
+    hits = stats["hits"]
+    return {
+        "lookups": stats["lookups"], "hits": hits, "misses": stats["misses"], "rejected": stats["rejected"], "entries": entries,
+        "hit_rate": hits / stats["lookups"] if stats["lookups"] else None,
+        "average_hit_similarity": stats["hit_similarity_sum"] / hits if hits else None,
+        "lowest_hit_similarity": stats["lowest_hit_similarity"],
+        "acceptance_rate": 1 - stats["rejected"] / hits if hits else None,
+        "average_rejected_similarity": stats["rejected_similarity_sum"] / stats["rejected"] if stats["rejected"] else None, # Close to the threshold: raise it
+        "threshold": SEMANTIC_CACHE_THRESHOLD,
+    }
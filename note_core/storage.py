@@ -0,0 +1,666 @@
+# Storage backends for running several app replicas behind a load balancer. Six stores sit behind
+# small interfaces, each with a local implementation (SQLite, shared by processes on one host) and a
+# shared one (any Redis-compatible server):
+#   - ResponseCache: AI responses by request key, with a TTL
+#   - UserDataStore: JSON documents per (namespace, user), e.g. history and flashcards
+#   - NoteBodyStore: immutable note bodies by content digest, deleted once nothing holds them (see note_store.py)
+#   - TranslationMemory: translated segments per target language, with a word index for fuzzy lookups
+#     (see translation_memory.py)
+#   - QuestionBank: parsed quiz questions per source notes and topic, with how often each was served
+#     (see question_bank.py)
+#   - JobQueue: background jobs any replica can run, with results readable by every replica. A job may
+#     name an owner, and then only that process's workers claim it (see jobs.py: API keys never enter
+#     the queue). A job whose worker stops responding fails once its lease runs out.
+# NOTE_MAKER_STORAGE selects "local" (default) or "redis" (NOTE_MAKER_REDIS_URL). The URL "memory://"
+# uses MemoryRedis, an in-process stand-in for trying the shared code path without a server.
+import base64
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import redis # Optional: only needed for NOTE_MAKER_STORAGE=redis
+except ImportError:
+    redis = None
+
+STORAGE_BACKEND = os.environ.get("NOTE_MAKER_STORAGE", "local")
+REDIS_URL = os.environ.get("NOTE_MAKER_REDIS_URL", "redis://localhost:6379/0")
+STORAGE_PATH = os.environ.get("NOTE_MAKER_STORAGE_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".note_data", "storage.sqlite3"))
+QUESTION_BANK_PATH = os.environ.get("NOTE_MAKER_QUESTION_BANK", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".note_data", "question_bank.sqlite3"))
+REDIS_PREFIX = "note_maker"
+JOB_RESULT_TTL_SECONDS = 3600
+JOB_LEASE_SECONDS = 600 # A running job not finished by then is failed (its worker died); well above any generation call
+JOB_LEASE_ERROR = "The worker running this job stopped responding"
+JOB_POLL_SECONDS = 0.2
+
+# Function to serialize JSON documents that may contain datetimes (e.g. flashcard review dates)
+def dumps_json(value):
+    return json.dumps(value, default=lambda o: {"__datetime__": o.isoformat()} if isinstance(o, datetime) else str(o))
+
+# Function to parse JSON written by dumps_json
+def loads_json(text):
+    return json.loads(text, object_hook=lambda d: datetime.fromisoformat(d["__datetime__"]) if set(d) == {"__datetime__"} else d)
+
+# --- Local (SQLite) implementations ---
+# Each thread keeps one open connection per database, and the schema is created once per database
+# per process, so a cache read or a queue poll costs one query rather than a connect plus DDL.
+_local_connections = threading.local()
+_initialized_paths = set()
+_schema_lock = threading.Lock()
+
+# Function to create the local storage tables (once per database file and process)
+def init_local_storage(conn, path):
+    with _schema_lock:
+        if path in _initialized_paths:
+            return
+        conn.execute("PRAGMA journal_mode=WAL") # Readers don't block the writer across processes
+        conn.execute("CREATE TABLE IF NOT EXISTS response_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_expires ON response_cache (expires)") # Pruning reads only expired rows
+        conn.execute("CREATE TABLE IF NOT EXISTS user_data (namespace TEXT NOT NULL, user_id TEXT NOT NULL, value TEXT NOT NULL, updated REAL NOT NULL, PRIMARY KEY (namespace, user_id))")
+        conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL,
+            result TEXT, error TEXT, created REAL NOT NULL, updated REAL NOT NULL
+        )""")
+        if "owner" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}: # Added after the first release
+            conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created)")
+        conn.execute("CREATE TABLE IF NOT EXISTS note_bodies (digest TEXT PRIMARY KEY, base TEXT, depth INTEGER NOT NULL, size INTEGER NOT NULL, data BLOB NOT NULL, refs INTEGER)")
+        if "refs" not in {row[1] for row in conn.execute("PRAGMA table_info(note_bodies)")}: # Added later; older bodies keep NULL and are never deleted
+            conn.execute("ALTER TABLE note_bodies ADD COLUMN refs INTEGER")
+        conn.execute("""CREATE TABLE IF NOT EXISTS tm_segments (
+            language TEXT NOT NULL, digest TEXT NOT NULL, source TEXT NOT NULL, target TEXT NOT NULL,
+            confirmed INTEGER NOT NULL, updated REAL NOT NULL, PRIMARY KEY (language, digest)
+        )""")
+        conn.execute("CREATE TABLE IF NOT EXISTS tm_words (language TEXT NOT NULL, word TEXT NOT NULL, digest TEXT NOT NULL, PRIMARY KEY (language, word, digest))")
+        conn.execute("""CREATE TABLE IF NOT EXISTS questions (
+            source_hash TEXT NOT NULL, question_hash TEXT NOT NULL, topic TEXT NOT NULL, question TEXT NOT NULL,
+            options TEXT NOT NULL, correct TEXT NOT NULL, created TEXT NOT NULL, times_served INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (source_hash, question_hash)
+        )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_questions_topic ON questions (topic)")
+        _initialized_paths.add(path)
+
+# Function to get this thread's connection to the local storage database, creating its tables on first use
+def connect_local_storage(path=STORAGE_PATH):
+    connections = getattr(_local_connections, "by_path", None)
+    if connections is None:
+        connections = _local_connections.by_path = {}
+    conn = connections.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None) # Autocommit; writes that must be atomic use local_transaction
+        init_local_storage(conn, path)
+        connections[path] = conn
+    return conn
+
+# Function to run statements in one write transaction on this thread's connection (rolled back on error,
+# so the reused connection is never left inside a transaction)
+@contextmanager
+def local_transaction(path):
+    conn = connect_local_storage(path)
+    conn.execute("BEGIN IMMEDIATE") # Only one writer at a time, across processes
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+class SQLiteResponseCache:
+    def __init__(self, path=STORAGE_PATH):
+        self.path = path
+
+    def get(self, key):
+        conn = connect_local_storage(self.path)
+        row = conn.execute("SELECT value, expires FROM response_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return row[0]
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        conn = connect_local_storage(self.path)
+        conn.execute("INSERT OR REPLACE INTO response_cache (key, value, expires) VALUES (?, ?, ?)", (key, value, expires))
+        conn.execute("DELETE FROM response_cache WHERE expires < ?", (time.time(),))
+
+class SQLiteUserDataStore:
+    def __init__(self, path=STORAGE_PATH):
+        self.path = path
+
+    def load(self, namespace, user_id):
+        conn = connect_local_storage(self.path)
+        row = conn.execute("SELECT value FROM user_data WHERE namespace = ? AND user_id = ?", (namespace, user_id)).fetchone()
+        return None if row is None else loads_json(row[0])
+
+    def save(self, namespace, user_id, value):
+        conn = connect_local_storage(self.path)
+        conn.execute("INSERT OR REPLACE INTO user_data (namespace, user_id, value, updated) VALUES (?, ?, ?, ?)",
+                     (namespace, user_id, dumps_json(value), time.time()))
+
+class SQLiteNoteBodyStore:
+    def __init__(self, path=STORAGE_PATH):
+        self.path = path
+
+    def get(self, digest):
+        conn = connect_local_storage(self.path)
+        row = conn.execute("SELECT base, depth, size, data FROM note_bodies WHERE digest = ?", (digest,)).fetchone()
+        return None if row is None else {"base": row[0], "depth": row[1], "size": row[2], "data": bytes(row[3])}
+
+    def retain(self, digest):
+        conn = connect_local_storage(self.path)
+        return conn.execute("UPDATE note_bodies SET refs = refs + 1 WHERE digest = ?", (digest,)).rowcount > 0
+
+    def put(self, digest, record):
+        with local_transaction(self.path) as conn:
+            inserted = conn.execute("INSERT OR IGNORE INTO note_bodies (digest, base, depth, size, data, refs) VALUES (?, ?, ?, ?, ?, 1)",
+                                    (digest, record["base"], record["depth"], record["size"], record["data"])).rowcount
+            # A new delta holds its base; a body stored meanwhile by another writer gains this holder instead
+            conn.execute("UPDATE note_bodies SET refs = refs + 1 WHERE digest = ?", (record["base"] if inserted else digest,))
+
+    def release(self, digest):
+        with local_transaction(self.path) as conn:
+            while digest is not None:
+                conn.execute("UPDATE note_bodies SET refs = refs - 1 WHERE digest = ? AND refs > 0", (digest,))
+                row = conn.execute("SELECT base FROM note_bodies WHERE digest = ? AND refs = 0", (digest,)).fetchone()
+                if row is None:
+                    return
+                conn.execute("DELETE FROM note_bodies WHERE digest = ?", (digest,))
+                digest = row[0] # The deleted delta no longer holds its base
+
+    def stats(self):
+        conn = connect_local_storage(self.path)
+        row = conn.execute("SELECT COUNT(*), COUNT(base), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM note_bodies").fetchone()
+        return {"notes": row[0], "deltas": row[1], "raw_bytes": row[2], "stored_bytes": row[3]}
+
+class SQLiteTranslationMemory:
+    def __init__(self, path=STORAGE_PATH):
+        self.path = path
+
+    def get(self, language, digest):
+        conn = connect_local_storage(self.path)
+        row = conn.execute("SELECT source, target, confirmed FROM tm_segments WHERE language = ? AND digest = ?", (language, digest)).fetchone()
+        return None if row is None else {"source": row[0], "target": row[1], "confirmed": bool(row[2])}
+
+    def candidates(self, language, words, limit):
+        if not words:
+            return []
+        conn = connect_local_storage(self.path)
+        rows = conn.execute(f"""SELECT s.source, s.target, s.confirmed FROM tm_segments s JOIN (
+            SELECT digest, COUNT(*) AS shared FROM tm_words WHERE language = ? AND word IN ({", ".join("?" * len(words))})
+            GROUP BY digest ORDER BY shared DESC LIMIT ?
+        ) w ON s.digest = w.digest WHERE s.language = ? ORDER BY w.shared DESC""", (language, *words, limit, language)).fetchall()
+        return [{"source": row[0], "target": row[1], "confirmed": bool(row[2])} for row in rows]
+
+    def put(self, language, digest, source, target, words, confirmed=False):
+        with local_transaction(self.path) as conn:
+            existing = conn.execute("SELECT confirmed FROM tm_segments WHERE language = ? AND digest = ?", (language, digest)).fetchone()
+            if existing is None or confirmed or not existing[0]: # A machine translation never replaces a confirmed one
+                conn.execute("INSERT OR REPLACE INTO tm_segments (language, digest, source, target, confirmed, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                             (language, digest, source, target, int(confirmed), time.time()))
+                conn.executemany("INSERT OR IGNORE INTO tm_words (language, word, digest) VALUES (?, ?, ?)", [(language, word, digest) for word in words])
+
+    def stats(self):
+        conn = connect_local_storage(self.path)
+        row = conn.execute("SELECT COUNT(*), COALESCE(SUM(confirmed), 0), COUNT(DISTINCT language) FROM tm_segments").fetchone()
+        return {"segments": row[0], "confirmed": row[1], "languages": row[2]}
+
+class SQLiteQuestionBank:
+    # Kept in its own database file by default, so banks filled before the storage backends existed stay in use
+    def __init__(self, path=QUESTION_BANK_PATH):
+        self.path = path
+
+    def add(self, source_hash, topic, questions):
+        rows = [(source_hash, q["question_hash"], topic, q["question"], json.dumps(q["options"]), q["correct"], datetime.now().isoformat())
+                for q in questions]
+        with local_transaction(self.path) as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO questions (source_hash, question_hash, topic, question, options, correct, created) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            return conn.total_changes - before
+
+    def sample(self, source_hash, topic, num_questions):
+        with local_transaction(self.path) as conn:
+            rows = conn.execute(
+                "SELECT source_hash, question_hash, question, options, correct FROM questions WHERE source_hash = ? ORDER BY times_served, RANDOM() LIMIT ?",
+                (source_hash, num_questions)
+            ).fetchall()
+            if len(rows) < num_questions and topic:
+                seen = {row[1] for row in rows}
+                for row in conn.execute(
+                    "SELECT source_hash, question_hash, question, options, correct FROM questions WHERE topic = ? AND source_hash != ? ORDER BY times_served, RANDOM() LIMIT ?",
+                    (topic, source_hash, num_questions)
+                ).fetchall():
+                    if len(rows) >= num_questions:
+                        break
+                    if row[1] not in seen: # The same question may be banked under several notes
+                        seen.add(row[1])
+                        rows.append(row)
+            conn.executemany("UPDATE questions SET times_served = times_served + 1 WHERE source_hash = ? AND question_hash = ?", [(row[0], row[1]) for row in rows])
+        return [{"question": row[2], "options": json.loads(row[3]), "correct": row[4]} for row in rows]
+
+    def count(self, source_hash):
+        conn = connect_local_storage(self.path)
+        return conn.execute("SELECT COUNT(*) FROM questions WHERE source_hash = ?", (source_hash,)).fetchone()[0]
+
+class SQLiteJobQueue:
+    def __init__(self, path=STORAGE_PATH):
+        self.path = path
+
+    def enqueue(self, kind, payload, owner=None):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = connect_local_storage(self.path)
+        conn.execute("INSERT INTO jobs (id, kind, payload, status, created, updated, owner) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                     (job_id, kind, dumps_json(payload), now, now, owner))
+        return job_id
+
+    def claim(self, timeout=1.0, owner=None):
+        deadline = time.time() + timeout
+        while True:
+            with local_transaction(self.path) as conn: # Only one process at a time may claim
+                conn.execute("UPDATE jobs SET status = 'failed', error = ?, payload = '{}', updated = ? WHERE status = 'running' AND updated < ?",
+                             (JOB_LEASE_ERROR, time.time(), time.time() - JOB_LEASE_SECONDS))
+                row = conn.execute("SELECT id, kind, payload FROM jobs WHERE status = 'queued' AND (owner IS NULL OR owner = ?) ORDER BY created LIMIT 1",
+                                   (owner,)).fetchone()
+                if row:
+                    conn.execute("UPDATE jobs SET status = 'running', updated = ? WHERE id = ?", (time.time(), row[0]))
+            if row:
+                return {"id": row[0], "kind": row[1], "payload": loads_json(row[2])}
+            if time.time() >= deadline:
+                return None
+            time.sleep(JOB_POLL_SECONDS)
+
+    def finish(self, job_id, result=None, error=None):
+        conn = connect_local_storage(self.path)
+        conn.execute("UPDATE jobs SET status = ?, result = ?, error = ?, payload = '{}', updated = ? WHERE id = ? AND status = 'running'",
+                     ("failed" if error else "done", dumps_json(result), error, time.time(), job_id))
+        conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND updated < ?", (time.time() - JOB_RESULT_TTL_SECONDS,))
+
+    def cancel(self, job_id):
+        conn = connect_local_storage(self.path)
+        conn.execute("UPDATE jobs SET status = 'cancelled', payload = '{}', updated = ? WHERE id = ? AND status IN ('queued', 'running')", (time.time(), job_id))
+
+    def status(self, job_id):
+        conn = connect_local_storage(self.path)
+        row = conn.execute("SELECT status, result, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "result": None if row[1] is None else loads_json(row[1]), "error": row[2]}
+
+# --- Shared (Redis-compatible) implementations ---
+class RedisResponseCache:
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        return self.client.get(f"{REDIS_PREFIX}:cache:{key}")
+
+    def set(self, key, value, ttl=None):
+        self.client.set(f"{REDIS_PREFIX}:cache:{key}", value, ex=int(ttl) if ttl else None)
+
+class RedisUserDataStore:
+    def __init__(self, client):
+        self.client = client
+
+    def load(self, namespace, user_id):
+        value = self.client.get(f"{REDIS_PREFIX}:user:{namespace}:{user_id}")
+        return None if value is None else loads_json(value)
+
+    def save(self, namespace, user_id, value):
+        self.client.set(f"{REDIS_PREFIX}:user:{namespace}:{user_id}", dumps_json(value))
+
+class RedisNoteBodyStore:
+    # Bodies are base64 in a hash per digest (the client decodes responses as text), with a count of
+    # their holders in "refs"; running totals live in one stats hash. Bodies stored before holders were
+    # counted have no "refs" and are never deleted.
+    def __init__(self, client):
+        self.client = client
+        self.stats_key = f"{REDIS_PREFIX}:notes:stats"
+
+    def get(self, digest):
+        record = self.client.hgetall(f"{REDIS_PREFIX}:note:{digest}")
+        if not record or "size" not in record:
+            return None
+        return {"base": record.get("base") or None, "depth": int(record["depth"]), "size": int(record["size"]),
+                "data": base64.b64decode(record["data"])}
+
+    def retain(self, digest):
+        key = f"{REDIS_PREFIX}:note:{digest}"
+        if self.client.hget(key, "refs") is None:
+            return self.client.hget(key, "size") is not None
+        self.client.hincrby(key, "refs", 1)
+        return True
+
+    def put(self, digest, record):
+        key = f"{REDIS_PREFIX}:note:{digest}"
+        if self.client.hincrby(key, "refs", 1) > 1:
+            return # Stored meanwhile by another writer (bodies are immutable), which now has one more holder
+        self.client.hset(key, mapping={"data": base64.b64encode(record["data"]).decode("ascii"), "base": record["base"] or "",
+                                       "depth": record["depth"], "size": record["size"]})
+        if record["base"]:
+            self.retain(record["base"]) # A delta holds its base
+        self.update_stats(record, 1)
+
+    def release(self, digest):
+        while digest:
+            key = f"{REDIS_PREFIX}:note:{digest}"
+            if self.client.hget(key, "refs") is None or self.client.hincrby(key, "refs", -1) > 0:
+                return
+            record = self.get(digest)
+            self.client.delete(key)
+            if record is None:
+                return
+            self.update_stats(record, -1)
+            digest = record["base"] # The deleted delta no longer holds its base
+
+    def update_stats(self, record, sign):
+        self.client.hincrby(self.stats_key, "notes", sign)
+        self.client.hincrby(self.stats_key, "deltas", sign if record["base"] else 0)
+        self.client.hincrby(self.stats_key, "raw_bytes", sign * record["size"])
+        self.client.hincrby(self.stats_key, "stored_bytes", sign * len(record["data"]))
+
+    def stats(self):
+        totals = self.client.hgetall(self.stats_key)
+        return {field: int(totals.get(field, 0)) for field in ("notes", "deltas", "raw_bytes", "stored_bytes")}
+
+class RedisTranslationMemory:
+    # A hash per segment, a set of segment digests per indexed word, and one stats hash.
+    def __init__(self, client):
+        self.client = client
+        self.stats_key = f"{REDIS_PREFIX}:tm:stats"
+
+    def get(self, language, digest):
+        record = self.client.hgetall(f"{REDIS_PREFIX}:tm:{language}:{digest}")
+        if not record or "target" not in record:
+            return None
+        return {"source": record["source"], "target": record["target"], "confirmed": record.get("confirmed") == "1"}
+
+    def candidates(self, language, words, limit):
+        shared = Counter()
+        for word in words:
+            shared.update(self.client.smembers(f"{REDIS_PREFIX}:tm:{language}:word:{word}"))
+        records = (self.get(language, digest) for digest, _ in shared.most_common(limit))
+        return [record for record in records if record is not None]
+
+    def put(self, language, digest, source, target, words, confirmed=False):
+        key = f"{REDIS_PREFIX}:tm:{language}:{digest}"
+        existing = self.client.hget(key, "confirmed")
+        if existing == "1" and not confirmed: # A machine translation never replaces a confirmed one
+            return
+        self.client.hset(key, mapping={"source": source, "target": target, "confirmed": int(confirmed)})
+        for word in words:
+            self.client.sadd(f"{REDIS_PREFIX}:tm:{language}:word:{word}", digest)
+        if existing is None:
+            self.client.hincrby(self.stats_key, "segments", 1)
+            self.client.sadd(f"{REDIS_PREFIX}:tm:languages", language)
+        if confirmed and existing != "1":
+            self.client.hincrby(self.stats_key, "confirmed", 1)
+
+    def stats(self):
+        totals = self.client.hgetall(self.stats_key)
+        return {"segments": int(totals.get("segments", 0)), "confirmed": int(totals.get("confirmed", 0)),
+                "languages": len(self.client.smembers(f"{REDIS_PREFIX}:tm:languages"))}
+
+class RedisQuestionBank:
+    # A hash per banked question, with a set of question hashes per source and a set of
+    # "source:question" members per topic. A bank holds tens of questions per note, so sampling
+    # reads the candidates and orders them here.
+    def __init__(self, client):
+        self.client = client
+
+    def add(self, source_hash, topic, questions):
+        added = 0
+        for q in questions:
+            key = f"{REDIS_PREFIX}:qb:{source_hash}:{q['question_hash']}"
+            if not self.client.hsetnx(key, "question", q["question"]):
+                continue # Already banked for these notes
+            self.client.hset(key, mapping={"options": json.dumps(q["options"]), "correct": q["correct"], "topic": topic,
+                                           "created": datetime.now().isoformat(), "times_served": 0})
+            self.client.sadd(f"{REDIS_PREFIX}:qb:source:{source_hash}", q["question_hash"])
+            self.client.sadd(f"{REDIS_PREFIX}:qb:topic:{topic}", f"{source_hash}:{q['question_hash']}")
+            added += 1
+        return added
+
+    def candidates(self, members):
+        rows = []
+        for source_hash, question_hash in members:
+            record = self.client.hgetall(f"{REDIS_PREFIX}:qb:{source_hash}:{question_hash}")
+            if "correct" in record: # Skips a question still being written
+                rows.append((int(record["times_served"]), random.random(), source_hash, question_hash, record))
+        return sorted(rows, key=lambda row: row[:2])
+
+    def sample(self, source_hash, topic, num_questions):
+        rows = self.candidates((source_hash, question_hash) for question_hash in self.client.smembers(f"{REDIS_PREFIX}:qb:source:{source_hash}"))[:num_questions]
+        if len(rows) < num_questions and topic:
+            seen = {row[3] for row in rows}
+            members = (member.split(":", 1) for member in self.client.smembers(f"{REDIS_PREFIX}:qb:topic:{topic}"))
+            for row in self.candidates(member for member in members if member[0] != source_hash):
+                if len(rows) >= num_questions:
+                    break
+                if row[3] not in seen: # The same question may be banked under several notes
+                    seen.add(row[3])
+                    rows.append(row)
+        for row in rows:
+            self.client.hincrby(f"{REDIS_PREFIX}:qb:{row[2]}:{row[3]}", "times_served", 1)
+        return [{"question": row[4]["question"], "options": json.loads(row[4]["options"]), "correct": row[4]["correct"]} for row in rows]
+
+    def count(self, source_hash):
+        return len(self.client.smembers(f"{REDIS_PREFIX}:qb:source:{source_hash}"))
+
+class RedisJobQueue:
+    # Job ids wait in a list (owned jobs in their owner's list); a claimed id moves atomically to a
+    # "processing" list, and each job's state lives in a hash that expires an hour after the job
+    # finishes. Claims fail jobs whose lease ran out and drop ids of finished jobs from "processing".
+    def __init__(self, client):
+        self.client = client
+        self.queue_key = f"{REDIS_PREFIX}:jobs:queue"
+        self.processing_key = f"{REDIS_PREFIX}:jobs:processing"
+
+    def enqueue(self, kind, payload, owner=None):
+        job_id = uuid.uuid4().hex
+        self.client.hset(f"{REDIS_PREFIX}:job:{job_id}", mapping={"kind": kind, "payload": dumps_json(payload), "status": "queued"})
+        self.client.lpush(self.queue_key if owner is None else f"{self.queue_key}:{owner}", job_id)
+        return job_id
+
+    def reap_stale_jobs(self):
+        now = time.time()
+        for job_id in self.client.lrange(self.processing_key, 0, -1):
+            key = f"{REDIS_PREFIX}:job:{job_id}"
+            job = self.client.hgetall(key)
+            if job.get("status") == "running" and float(job.get("claimed", now)) >= now - JOB_LEASE_SECONDS:
+                continue
+            if job.get("status") == "running":
+                self.client.hset(key, mapping={"status": "failed", "error": JOB_LEASE_ERROR, "payload": "{}"})
+                self.client.expire(key, JOB_RESULT_TTL_SECONDS)
+            self.client.lrem(self.processing_key, 1, job_id)
+
+    def claim(self, timeout=1.0, owner=None):
+        deadline = time.time() + timeout
+        self.reap_stale_jobs()
+        while True:
+            job_id = self.client.rpoplpush(f"{self.queue_key}:{owner}", self.processing_key) if owner is not None else None
+            if job_id is None: # Owned jobs are checked again after at most a second
+                job_id = self.client.brpoplpush(self.queue_key, self.processing_key, timeout=max(1, int(deadline - time.time())))
+            if job_id is None:
+                return None
+            job = self.client.hgetall(f"{REDIS_PREFIX}:job:{job_id}")
+            if job and job.get("status") == "queued":
+                self.client.hset(f"{REDIS_PREFIX}:job:{job_id}", mapping={"status": "running", "claimed": time.time()})
+                return {"id": job_id, "kind": job["kind"], "payload": loads_json(job["payload"])}
+            self.client.lrem(self.processing_key, 1, job_id) # Cancelled while queued
+            if time.time() >= deadline:
+                return None
+
+    def finish(self, job_id, result=None, error=None):
+        key = f"{REDIS_PREFIX}:job:{job_id}"
+        if self.client.hget(key, "status") == "running":
+            self.client.hset(key, mapping={"status": "failed" if error else "done", "result": dumps_json(result), "error": error or "", "payload": "{}"})
+        self.client.expire(key, JOB_RESULT_TTL_SECONDS)
+        self.client.lrem(self.processing_key, 1, job_id)
+
+    def cancel(self, job_id):
+        key = f"{REDIS_PREFIX}:job:{job_id}"
+        if self.client.hget(key, "status") in ("queued", "running"):
+            self.client.hset(key, mapping={"status": "cancelled", "payload": "{}"})
+            self.client.expire(key, JOB_RESULT_TTL_SECONDS)
+
+    def status(self, job_id):
+        job = self.client.hgetall(f"{REDIS_PREFIX}:job:{job_id}")
+        if not job:
+            return None
+        return {"status": job["status"], "result": loads_json(job["result"]) if job.get("result") else None, "error": job.get("error") or None}
+
+class MemoryRedis:
+    # In-process stand-in for the subset of the Redis client API used above (decode_responses=True
+    # semantics). Lets the shared code path run in tests and single-process demos.
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.cond = threading.Condition()
+
+    def _live(self, name):
+        if name in self.expires and self.expires[name] <= time.time():
+            self.data.pop(name, None)
+            self.expires.pop(name, None)
+        return self.data.get(name)
+
+    def get(self, name):
+        with self.cond:
+            value = self._live(name)
+            return value if isinstance(value, str) else None
+
+    def set(self, name, value, ex=None):
+        with self.cond:
+            self.data[name] = str(value)
+            self.expires.pop(name, None)
+            if ex:
+                self.expires[name] = time.time() + ex
+            return True
+
+    def delete(self, *names):
+        with self.cond:
+            return sum(1 for name in names if self.data.pop(name, None) is not None)
+
+    def expire(self, name, seconds):
+        with self.cond:
+            if self._live(name) is None:
+                return False
+            self.expires[name] = time.time() + seconds
+            return True
+
+    def lpush(self, name, *values):
+        with self.cond:
+            items = self.data.setdefault(name, [])
+            for value in values:
+                items.insert(0, str(value))
+            self.cond.notify_all()
+            return len(items)
+
+    def brpoplpush(self, src, dst, timeout=0):
+        deadline = time.time() + timeout if timeout else None
+        with self.cond:
+            while not self._live(src):
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+            value = self.data[src].pop()
+            self.data.setdefault(dst, []).insert(0, value)
+            return value
+
+    def rpoplpush(self, src, dst):
+        with self.cond:
+            if not self._live(src):
+                return None
+            value = self.data[src].pop()
+            self.data.setdefault(dst, []).insert(0, value)
+            return value
+
+    def lrange(self, name, start, end):
+        with self.cond:
+            items = list(self._live(name) or [])
+            return items[start:] if end == -1 else items[start:end + 1]
+
+    def lrem(self, name, count, value):
+        with self.cond:
+            items = self._live(name) or []
+            removed = 0
+            while value in items and (count == 0 or removed < abs(count)):
+                items.remove(value)
+                removed += 1
+            return removed
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        with self.cond:
+            fields = self.data.setdefault(name, {})
+            if key is not None:
+                fields[key] = str(value)
+            for field, field_value in (mapping or {}).items():
+                fields[field] = str(field_value)
+            return True
+
+    def hsetnx(self, name, key, value):
+        with self.cond:
+            fields = self.data.setdefault(name, {})
+            if key in fields:
+                return False
+            fields[key] = str(value)
+            return True
+
+    def hincrby(self, name, key, amount=1):
+        with self.cond:
+            fields = self.data.setdefault(name, {})
+            fields[key] = str(int(fields.get(key, 0)) + amount)
+            return int(fields[key])
+
+    def sadd(self, name, *values):
+        with self.cond:
+            members = self.data.setdefault(name, set())
+            added = len(set(map(str, values)) - members)
+            members.update(map(str, values))
+            return added
+
+    def smembers(self, name):
+        with self.cond:
+            return set(self._live(name) or set())
+
+    def hget(self, name, key):
+        with self.cond:
+            return (self._live(name) or {}).get(key)
+
+    def hgetall(self, name):
+        with self.cond:
+            return dict(self._live(name) or {})
+
+_storage = None
+_storage_lock = threading.Lock()
+
+# Function to create the Redis client for the shared backend
+def connect_redis(url=REDIS_URL):
+    if url.startswith("memory://"):
+        return MemoryRedis()
+    if redis is None:
+        raise RuntimeError("NOTE_MAKER_STORAGE=redis needs the 'redis' package (pip install redis)")
+    return redis.Redis.from_url(url, decode_responses=True)
+
+# Function to get the process-wide stores for the configured backend
+def get_storage():
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if STORAGE_BACKEND == "redis":
+                client = connect_redis()
+                _storage = {"backend": "redis", "cache": RedisResponseCache(client), "user_data": RedisUserDataStore(client),
+                            "jobs": RedisJobQueue(client), "notes": RedisNoteBodyStore(client), "translations": RedisTranslationMemory(client),
+                            "questions": RedisQuestionBank(client)}
+            else:
+                _storage = {"backend": "local", "cache": SQLiteResponseCache(), "user_data": SQLiteUserDataStore(),
+                            "jobs": SQLiteJobQueue(), "notes": SQLiteNoteBodyStore(), "translations": SQLiteTranslationMemory(),
+                            "questions": SQLiteQuestionBank()}
+        return _storage
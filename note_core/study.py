@@ -0,0 +1,352 @@
+# Study material built from notes: summaries, refinement, quizzes, flashcards, follow-up questions and
+# single-request study packs. Extra keyword options are passed through to generate_content.
+import json
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from .document import get_note_document, search_document
+from .generation import generate_content
+from .templates import load_prompt_templates
+
+# New function for AI-powered summarization
+def summarize_notes(content, api_key, model_name, **options):
+    templates = load_prompt_templates()
+    prompt = templates["Auto-Summary"].format(content=content)
+    
+    summary = generate_content(
+        prompt, 
+        api_key, 
+        model_name, 
+        temperature=0.3, 
+        detail_level="Brief",
+        style_params={"tone": "Concise", "language_style": "Standard"},
+        tool_name="Auto-Summary",
+        **options
+    )
+    
+    return summary
+
+# New function for adaptive refinement
+def refine_notes(content, topic, refinement_type, api_key, model_name, **options):
+    templates = load_prompt_templates()
+    prompt = templates["Refinement"].format(
+        content=content,
+        topic=topic,
+        refinement_type=refinement_type
+    )
+    
+    refined = generate_content(
+        prompt, 
+        api_key, 
+        model_name, 
+        temperature=0.5, 
+        detail_level="Standard",
+        style_params={"tone": "Academic", "language_style": "Standard"},
+        tool_name="Refinement",
+        **options
+    )
+    
+    return refined
+
+
+# --- Section-level refinement ---
+# Instead of rewriting a whole note, the note is split at its markdown headings and only the chosen
+# sections are sent (with an outline of the rest for context), in parallel, then merged back in place.
+SECTION_REFINE_WORKERS = 4
+LONG_SENTENCE_WORDS = 25 # Sections averaging longer sentences than this are suggested for refinement
+
+# Function to suggest which sections would benefit most from refinement (long sentences first)
+def suggest_sections_to_refine(sections, limit=3):
+    scored = []
+    for index, section in enumerate(sections):
+        prose = re.sub(r"^#+.*$", "", re.sub(r"(```|~~~).*?\1", "", section["text"], flags=re.S), flags=re.M) # Drop code and headings
+        sentences = [s for s in re.split(r"(?<=[.!?])\s+", prose) if s.strip()]
+        if sentences:
+            average_words = sum(len(s.split()) for s in sentences) / len(sentences)
+            if average_words > LONG_SENTENCE_WORDS:
+                scored.append((average_words, index))
+    return sorted(index for _, index in sorted(scored, reverse=True)[:limit])
+
+# Function to refine one section; returns the original section if the call fails
+def refine_section(sections, index, topic, refinement_type, api_key, model_name, **options):
+    templates = load_prompt_templates()
+    section = sections[index]
+    headings = lambda i: (sections[i]["heading"] or "(introduction)") if 0 <= i < len(sections) else "(none)"
+    prompt = templates["Section Refinement"].format(
+        topic=topic,
+        refinement_type=refinement_type,
+        outline="; ".join(s["heading"] for s in sections if s["heading"]) or "(no headings)",
+        previous_heading=headings(index - 1),
+        next_heading=headings(index + 1),
+        section=section["text"].strip()
+    )
+    refined = generate_content(
+        prompt,
+        api_key,
+        model_name,
+        temperature=0.5,
+        detail_level="Standard",
+        style_params={"tone": "Academic", "language_style": "Standard"},
+        tool_name="Refinement",
+        **options
+    )
+    if refined.startswith("Error:") or not refined.strip():
+        return section["text"], refined or "Error: empty response"
+    refined = re.sub(r"^```(?:markdown|md)?\s*\n(.*?)\n```\s*$", r"\1", refined.strip(), flags=re.S) # Unwrap a fenced reply
+    first_line = section["text"].splitlines()[0] if section["level"] else None
+    if first_line and not refined.lstrip().startswith(first_line.strip()):
+        refined = f"{first_line.rstrip()}\n{refined}" # Keep the heading even if the model dropped it
+    trailing = section["text"][len(section["text"].rstrip()):] # Keep the original spacing between sections
+    return refined.rstrip() + trailing, None
+
+# Function to refine the chosen sections in parallel; returns (refined sections, {index: error})
+def refine_note_sections(sections, indices, topic, refinement_type, api_key, model_name, **options):
+    refined_sections = [dict(section) for section in sections]
+    errors = {}
+    with ThreadPoolExecutor(max_workers=SECTION_REFINE_WORKERS) as executor:
+        futures = {index: executor.submit(refine_section, sections, index, topic, refinement_type, api_key, model_name, **options)
+                   for index in indices}
+        for index, future in futures.items():
+            refined_sections[index]["text"], error = future.result()
+            if error:
+                errors[index] = error
+    return refined_sections, errors
+
+# Function for deep search
+DEEP_SEARCH_MAX_CHARS = 12000
+
+def deep_search_notes(query, content, api_key, model_name, **options):
+    document = get_note_document(content)
+    if len(content) > DEEP_SEARCH_MAX_CHARS: # Long notes: send only the chunks that mention the query most
+        content = "\n\n[...]\n\n".join(search_document(document, query, limit=DEEP_SEARCH_MAX_CHARS // 4000))
+    prompt = f"Given the following notes content, perform a deep semantic search for '{query}'. Return the most relevant sections that answer or relate to this query, along with brief explanations of why they're relevant:\n\n{content}"
+    
+    results = generate_content(
+        prompt, 
+        api_key, 
+        model_name, 
+        temperature=0.3, 
+        detail_level="Standard",
+        style_params={"tone": "Analytical", "language_style": "Concise"},
+        **options
+    )
+    
+    return results
+
+
+# New function for generating quiz from notes
+def generate_quiz(content, api_key, model_name, num_questions=20, **options):
+    prompt = f"Create a {num_questions}-question quiz with multiple-choice answers based on the following notes. " \
+             f"Include 4 options per question with only one correct answer. " \
+             f"Format every question exactly like this, with a blank line between questions:\n" \
+             f"1. Question text\nA. Option\nB. Option\nC. Option\nD. Option\nCorrect answer: B\n\n{content}"
+    
+    quiz = generate_content(
+        prompt, 
+        api_key, 
+        model_name, 
+        temperature=0.7, 
+        detail_level="Standard",
+        style_params={"tone": "Enthusiastic", "language_style": "Conversational"},
+        **options
+    )
+    
+    return quiz
+
+# Function to process quiz answers and calculate the score as a percentage
+def grade_quiz(quiz_text, user_answers):
+    # Extract correct answers from quiz text
+    correct_answers = []
+    questions = quiz_text.split("\n\n")
+    
+    for q in questions:
+        if "Correct answer:" in q:
+            correct = re.search(r"Correct answer: ([A-D])", q).group(1)
+            correct_answers.append(correct)
+    
+    # Calculate score
+    if len(correct_answers) != len(user_answers):
+        return 0
+    
+    score = sum(1 for correct, user in zip(correct_answers, user_answers) if correct == user)
+    return (score / len(correct_answers)) * 100
+
+# --- Helper function for Interactive Quiz ---
+def parse_quiz_text(quiz_text):
+    questions = []
+    # Regex to find question, options, and correct answer
+    # This regex assumes a fairly consistent format like:
+    # 1. Question text?
+    # A. Option A
+    # B. Option B
+    # C. Option C
+    # D. Option D
+    # Correct answer: B
+    pattern = re.compile(
+        r"(\d+\.\s*.*?)\n"  # Question (e.g., "1. What is...")
+        r"A\.\s*(.*?)\n"    # Option A
+        r"B\.\s*(.*?)\n"    # Option B
+        r"C\.\s*(.*?)\n"    # Option C
+        r"D\s*[:.]\s*(.*?)\n"  # Option D (allowing for slight variations like "D." or "D:")
+        r"Correct answer:\s*([A-D])", # Correct answer
+        re.DOTALL | re.IGNORECASE
+    )
+    matches = pattern.findall(quiz_text)
+    for match in matches:
+        questions.append({
+            "question": match[0].strip(),
+            "options": {"A": match[1].strip(), "B": match[2].strip(), "C": match[3].strip(), "D": match[4].strip()},
+            "correct": match[5].strip().upper()
+        })
+    return questions
+
+# Function to render quiz questions in the same text format the AI produces
+def quiz_questions_to_text(questions):
+    blocks = []
+    for n, q in enumerate(questions, 1):
+        options = "\n".join(f"{letter}. {q['options'][letter]}" for letter in "ABCD")
+        blocks.append(f"{n}. {q['question']}\n{options}\nCorrect answer: {q['correct']}")
+    return "\n\n".join(blocks)
+
+# New function to generate the raw text of spaced repetition cards for some notes
+def generate_spaced_repetition_text(content, api_key, model_name, **options):
+    templates = load_prompt_templates()
+    return generate_content(
+        templates["Spaced Repetition Cards"].format(content=content), 
+        api_key, 
+        model_name, 
+        temperature=0.5, 
+        detail_level="Standard",
+        style_params={"tone": "Academic", "language_style": "Concise"},
+        tool_name="Spaced Repetition Cards",
+        **options
+    )
+
+# Function to parse "Q: ... A: ..." cards separated by "---" into (question, answer) pairs
+def parse_spaced_repetition_cards(cards_text):
+    cards = []
+    for card_text in cards_text.split("---"):
+        if "Q:" in card_text and "A:" in card_text:
+            question_match = re.search(r"Q:(.*?)A:", card_text, re.DOTALL)
+            answer_match = re.search(r"A:(.*)", card_text, re.DOTALL)
+            if question_match and answer_match:
+                cards.append((question_match.group(1).strip(), answer_match.group(1).strip()))
+    return cards
+
+# Function to create a card with spaced repetition metadata
+def new_spaced_repetition_card(topic, question, answer):
+    return {
+        "id": uuid.uuid4().hex,
+        "topic": topic,
+        "question": question,
+        "answer": answer,
+        "created": datetime.now(),
+        "next_review": datetime.now() + timedelta(days=1),
+        "ease_factor": 2.5,
+        "interval": 1,
+        "repetitions": 0
+    }
+
+# New function to suggest follow-up questions for research findings
+def generate_follow_up_questions(research_findings, api_key, model_name, **options):
+    templates = load_prompt_templates()
+    follow_up_prompt = templates["Research Follow-up Questions"].format(research_findings=research_findings)
+    return generate_content(follow_up_prompt, api_key, model_name, 0.7, "Brief", {"tone": "Inquisitive", "language_style": "Concise"}, tool_name="Research Follow-up Questions", **options)
+
+# --- Study pack: summary, key concepts, flashcards and quiz from one structured request ---
+# JSON-Schema subset used to validate the model's response before anything is stored
+STUDY_PACK_QUIZ_ITEM_SCHEMA = {
+    "type": "object",
+    "required": ["question", "options", "correct"],
+    "properties": {
+        "question": {"type": "string", "minLength": 1},
+        "options": {
+            "type": "object",
+            "required": ["A", "B", "C", "D"],
+            "properties": {letter: {"type": "string", "minLength": 1} for letter in "ABCD"}
+        },
+        "correct": {"type": "string", "enum": ["A", "B", "C", "D"]}
+    }
+}
+STUDY_PACK_SCHEMA = {
+    "type": "object",
+    "required": ["summary", "key_concepts", "flashcards", "quiz"],
+    "properties": {
+        "summary": {"type": "string", "minLength": 1},
+        "key_concepts": {"type": "array", "items": {
+            "type": "object", "required": ["term", "definition"],
+            "properties": {"term": {"type": "string", "minLength": 1}, "definition": {"type": "string", "minLength": 1}}
+        }},
+        "flashcards": {"type": "array", "items": {
+            "type": "object", "required": ["question", "answer"],
+            "properties": {"question": {"type": "string", "minLength": 1}, "answer": {"type": "string", "minLength": 1}}
+        }},
+        "quiz": {"type": "array", "items": STUDY_PACK_QUIZ_ITEM_SCHEMA}
+    }
+}
+JSON_SCHEMA_TYPES = {"object": dict, "array": list, "string": str}
+
+# Function to validate a value against a (small) JSON-Schema subset; returns a list of errors
+def validate_json_schema(value, schema, path="$", check_items=True):
+    expected_type = JSON_SCHEMA_TYPES.get(schema.get("type"))
+    if expected_type and not isinstance(value, expected_type):
+        return [f"{path}: expected {schema['type']}"]
+    errors = []
+    if isinstance(value, str):
+        if len(value.strip()) < schema.get("minLength", 0):
+            errors.append(f"{path}: is empty")
+        if "enum" in schema and value.strip().upper() not in schema["enum"]:
+            errors.append(f"{path}: must be one of {', '.join(schema['enum'])}")
+    if isinstance(value, dict):
+        errors += [f"{path}.{key}: is required" for key in schema.get("required", []) if key not in value]
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in value:
+                errors += validate_json_schema(value[key], sub_schema, f"{path}.{key}", check_items)
+    if isinstance(value, list) and "items" in schema and check_items:
+        for index, item in enumerate(value):
+            errors += validate_json_schema(item, schema["items"], f"{path}[{index}]")
+    return errors
+
+# Function to parse and validate a study pack response; invalid list items are dropped and reported
+def parse_study_pack(response_text):
+    text = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", response_text.strip()) # Tolerate a fenced reply
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"The study pack was not valid JSON ({e})")
+    errors = validate_json_schema(data, STUDY_PACK_SCHEMA, check_items=False) # Items are checked one by one below
+    if errors:
+        raise ValueError("The study pack did not match the expected structure: " + "; ".join(errors))
+    pack = {"summary": data["summary"].strip(), "dropped": []}
+    for key in ("key_concepts", "flashcards", "quiz"):
+        pack[key] = []
+        for index, item in enumerate(data[key]):
+            item_errors = validate_json_schema(item, STUDY_PACK_SCHEMA["properties"][key]["items"], f"$.{key}[{index}]")
+            if item_errors:
+                pack["dropped"] += item_errors
+            else:
+                pack[key].append(item)
+    for q in pack["quiz"]:
+        q["correct"] = q["correct"].strip().upper()
+    return pack
+
+# New function to generate a study pack with one request
+def generate_study_pack(content, api_key, model_name, num_questions=20, **options):
+    templates = load_prompt_templates()
+    prompt = templates["Study Pack"].format(content=content, num_questions=num_questions)
+    response_text = generate_content(
+        prompt,
+        api_key,
+        model_name,
+        temperature=0.5,
+        detail_level="Comprehensive", # Room for every artifact in one response
+        style_params={"tone": "Academic", "language_style": "Concise"},
+        response_mime_type="application/json",
+        tool_name="Study Pack",
+        **options
+    )
+    if response_text.startswith("Error:"):
+        raise ValueError(response_text)
+    return parse_study_pack(response_text)
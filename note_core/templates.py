@@ -0,0 +1,219 @@
+# Note formats and prompt templates shared by the Streamlit app and the batch CLI.
+from functools import lru_cache
+
+# Function to generate list of AI tools
+def generate_ai_tools():
+    tools = [
+        "Bullet Points",
+        "Cornell Notes",
+        
+        "Mind Map Structure",
+        "Flashcards",
+        "Summary Notes",
+        "Detailed Explanation",
+        "Question & Answer Format",
+        "Key Concepts & Definitions",
+        "Timeline Format",
+        "Comparative Analysis",
+        "Exam Preparation",
+        "Deep research",
+        "Case Study Analysis",
+        "Custom Template"
+    ]
+    
+    categories = {
+        "Note Formats": ["Bullet Points", "Cornell Notes","Mind Map Structure", "Summary Notes", "Detailed Explanation"],
+        "Study Aids": ["Flashcards", "Question & Answer Format", "Key Concepts & Definitions", "Exam Preparation"],
+        "Specialized": ["Timeline Format", "Comparative Analysis", "Deep research", "Case Study Analysis"],
+        "Custom": ["Custom Template"]
+    }
+    
+    return tools, categories
+
+# Function to load prompt templates (built once per process)
+@lru_cache(maxsize=None)
+def load_prompt_templates():
+    templates = {
+        "Bullet Points": "Create comprehensive bullet point notes on: {prompt}. Format with clear hierarchical structure (main points and sub-points) using bullet symbols. Make notes concise yet complete, covering all important aspects. Use appropriate spacing for readability.",
+        
+        "Cornell Notes": "Create Cornell-style notes on: {prompt}. Structure with three sections: 1) Right column (main notes area): detailed content with clear paragraphs and hierarchical organization, 2) Left column (cue column): key questions, terms, and concepts that align with the main notes, 3) Bottom section: concise summary of the entire topic. Use proper formatting and spacing.",
+        
+        "Comprehensive Quiz": "Generate a comprehensive quiz on: {prompt}. Include a mix of multiple choice questions (MCQs), short answer, and true/false questions with a total of 30 questions. Ensure a range of difficulty levels. For MCQs, provide four options with one correct answer clearly marked. Group questions by subtopics if applicable. Include an answer key at the end.",
+    
+        
+        "Mind Map Structure": "Create a text-based mind map structure on: {prompt}. Format with the core concept in the center, main branches using level 1 headings, sub-branches using level 2 headings, and leaf nodes using bullet points. Use indentation to show relationships between concepts. Include all important relationships and hierarchies.",
+        
+        "Flashcards": "Create a set of flashcards on: {prompt}. Format with 'Q:' for questions and 'A:' for answers, separating each flashcard with a divider line. Include comprehensive coverage of key facts, definitions, concepts, and their applications. Number each flashcard.",
+        
+        "Summary Notes": "Create concise summary notes on: {prompt}. Include only the most essential information, key concepts, and critical takeaways. Format with clear headings and short paragraphs. Ensure comprehensive coverage while maintaining brevity (maximum 1/3 the length of detailed notes).",
+        
+        "Detailed Explanation": "Create detailed explanatory notes on: {prompt}. Include thorough explanations of concepts, supporting evidence, examples, and applications. Structure with clear headings, subheadings, and logical flow. Use appropriate technical language while ensuring clarity.",
+        
+        "Question & Answer Format": "Create comprehensive Q&A format notes on: {prompt}. Format with clear questions followed by detailed answers. Cover all important aspects of the topic with questions ranging from basic understanding to advanced application. Group related questions together under appropriate headings.",
+        
+        "Key Concepts & Definitions": "Create a glossary of key concepts and definitions for: {prompt}. Format each entry with the term in bold followed by a comprehensive definition. Include examples where helpful. Organize alphabetically or by related concept groups with clear headings.",
+        
+        "Timeline Format": "Create chronological timeline notes on: {prompt}. Format with clear date/period indicators followed by detailed descriptions of events, developments, or phases. Include significant milestones, causes, and effects. Use appropriate headings for major eras or transitions.",
+        
+        "Comparative Analysis": "Create comparative analysis notes on: {prompt}. Structure with clear categories for comparison in the left column and entities being compared across the top. Include detailed points of comparison with similarities and differences clearly marked. Conclude with synthesis of key insights from the comparison.",
+        
+        "Exam Preparation": "Create comprehensive exam preparation notes on: {prompt}. Include key definitions, formulas, concepts, potential exam questions, and model answers. Format with clear sections for different question types and difficulty levels. Highlight common pitfalls and strategies for tackling complex problems.",
+        
+        "Deep research": """
+You are a high-level research assistant writing in-depth academic responses. 
+Structure the output as a formal article (~8000 tokens) with:
+1. Executive Summary  
+2. Introduction  
+3. History & Evolution  
+4. Concepts & Frameworks  
+5. Current State  
+6. Challenges  
+7. Applications  
+8. Comparisons  
+9. Future Outlook  
+10. Conclusion  
+11. References (Optional)
+
+Query:
+\"\"\"{user_prompt}\"\"\"
+""",
+
+        "Case Study Analysis": """
+You are a high-level research assistant writing comprehensive academic case study analyses. 
+Structure the response as a formal case study (~8000 tokens) with:
+1. Executive Summary  
+2. Introduction & Background  
+3. History & Context  
+4. Key Issues  
+5. Stakeholder Analysis  
+6. Root Cause Analysis  
+7. Strategic Alternatives  
+8. Recommendation  
+9. Implementation Plan  
+10. Challenges & Risk Mitigation  
+11. Conclusion  
+12. References (Optional)
+
+Query:
+\"\"\"{user_prompt}\"\"\"
+"""
+
+       }
+    
+    # New templates for enhanced features
+    templates.update({
+        "Auto-Summary": "Provide a concise 3-paragraph summary of the following notes, highlighting only the most critical concepts and takeaways: {content}",
+        
+        "Refinement": "Refine the following notes on '{topic}' to make them {refinement_type}. Maintain the original structure but improve the content based on the refinement request: {content}",
+
+        "Section Refinement": "You are refining one section of longer notes on '{topic}'. Rewrite it to make it {refinement_type}. Keep its heading line exactly as it is, keep the markdown style, and return only the refined section with no commentary.\nOutline of the full notes, for context only: {outline}\nSection before it: {previous_heading}\nSection after it: {next_heading}\n\nSection to refine:\n{section}",
+        
+        "Adaptive Content": "Create {detail_level} notes on {prompt} specifically tailored for someone with a knowledge level of {knowledge_level}/5 in this subject. Adjust complexity, depth, and examples accordingly.",
+
+        "Citation Generation": "Generate a citation in {style} format for the following source material. If it's a text snippet, try to identify key bibliographic information first. Source: {source_details}",
+
+        "Citation Generation (Batch)": "Generate a {style} citation for each of the following numbered sources. If a source is a text snippet, identify its key bibliographic information first. Return only the citations, one per line, in the same order and without numbering. Sources:\n{source_list}",
+
+        "Spaced Repetition Cards": "Based on the following notes, create 5-10 spaced repetition flashcards covering the most important concepts that would be suitable for long-term memorization. Each flashcard should have a 'Q:' for the question and an 'A:' for the answer. Separate each flashcard with three hyphens ('---'). Content: {content}",
+        
+        "Study Pack": "Create a complete study pack for the following notes and return it as a single JSON object with exactly these keys: \"summary\" (a concise 3-paragraph summary of the most critical concepts, as a markdown string), \"key_concepts\" (5-10 objects with \"term\" and \"definition\"), \"flashcards\" (5-10 objects with \"question\" and \"answer\", suitable for long-term memorization) and \"quiz\" ({num_questions} multiple-choice objects with \"question\", \"options\" (an object with keys \"A\", \"B\", \"C\", \"D\") and \"correct\" (the letter of the only correct option)). Notes: {content}",
+
+        "Quiz Generation": "Create a 5-question quiz with multiple-choice answers based on the following notes. Include 4 options per question with only one correct answer. Format with the question followed by options labeled A, B, C, D, and mark the correct answer at the end: {content}",
+
+        "Research Assistant Query": "Provide a detailed and well-structured answer to the following research query: '{query}'. Structure the output as {output_format}. Draw upon general knowledge and provide explanations, examples, and context where appropriate. Aim for a comprehensive yet understandable response.",
+        "Research Follow-up Questions": "Based on the following research findings, suggest 3-5 insightful follow-up questions that a student might want to explore next: {research_findings}",
+
+        "Research Plan": "Break the following research query into {max_questions} or fewer focused sub-questions that can each be answered on their own and that together cover the query. Return a JSON object with one key, \"sub_questions\", holding a list of strings. Query: '{query}'",
+
+        "Research Sub-question": "As part of researching '{query}', answer this focused sub-question accurately and concisely, with key facts, explanations and examples. Use markdown but no top-level heading. Sub-question: {sub_question}",
+
+        "Research Memory Summary": "Update the running summary of a research session with the exchange below. Keep every key finding, name and number a later question may need, drop repetition, and stay under {max_words} words. Return only the updated summary.\nCurrent summary: {summary}\nQuestion: {query}\nAnswer: {answer}",
+
+        "Research Synthesis": "Write a well-structured research report answering '{query}', structured as {output_format}, using only the numbered findings below. Use markdown headings for sections, and end every section with a line 'Sources: ' listing the finding labels it draws on, e.g. 'Sources: [S1], [S3]'. Findings:\n{findings}",
+        "Writing Enhancer - Rephrase": "Rephrase the following text to improve its clarity, conciseness, and flow, while retaining the original meaning. If a target tone is specified as '{target_tone}', adapt the rephrased text to that tone. Original text: '{text_to_rephrase}'",
+        "Writing Enhancer - Expand": "Expand on the following point or idea, providing more detail, examples, or supporting arguments. Point to expand: '{text_to_expand}'",
+        "Writing Enhancer - Summarize": "Provide a concise summary of the following text, capturing the main points. Text to summarize: '{text_to_summarize}'",
+        "Writing Enhancer - Clarity Check": "Review the following text for clarity and conciseness. Identify areas that could be improved and suggest specific revisions. Text for review: '{text_for_review}'"
+    })
+    # Templates for Misc. Features
+    templates["Quick Fact Finder"] = "Provide a concise definition or key fact for the term: '{term}'."
+    templates["Synonym Antonym Finder"] = "For the word '{word}', provide a list of 3-5 synonyms and 3-5 antonyms."
+    templates["Simple Translator"] = "Translate the following text to {target_language}. Text: '{text_to_translate}'"
+    templates["Translation Memory Batch"] = "Translate each segment in the JSON list below into {target_language}. Keep each segment's meaning, tone and formatting, and reuse the wording of the reference translations from earlier work where they apply. Return JSON of the form {{\"translations\": [\"...\"]}} with exactly one translation per segment, in the same order.\nReference translations:\n{references}\nSegments: {segments}"
+    templates["Idea Generator"] = "Generate 3-5 creative ideas related to the theme or problem: '{theme_or_problem}'."
+    templates["Code Explainer"] = "Explain the following code snippet in simple terms, outlining its main purpose and functionality. Code: \n```\n{code_snippet}\n```"
+
+    # Templates for 20 New Misc. Features
+    templates["Email Subject Generator"] = "Generate 5 creative and effective email subject lines for an email with the following core message or topic: '{email_topic}'."
+    templates["Headline Analyzer"] = "Analyze the following headline and provide feedback on its effectiveness (clarity, engagement, SEO potential if applicable). Suggest 3 alternative headlines. Headline: '{headline_text}'."
+    templates["Secure Password Idea Generator"] = "Suggest 3 ideas for creating a secure password based on the following criteria (do not generate the password itself, just the method or pattern): Length at least {length} characters, must include {char_types_count} types of characters (uppercase, lowercase, numbers, symbols)."
+    templates["Meeting Agenda Creator"] = "Create a basic meeting agenda for a meeting about '{meeting_topic}'. Include sections for: Attendees (list: {attendees}), Objectives, Discussion Points (3-5), Action Items, and Next Steps."
+    templates["Pros and Cons Lister"] = "List the potential pros and cons for the following topic or decision: '{decision_topic}'."
+    templates["ELI5 Explainer"] = "Explain the following complex topic as if you were explaining it to a 5-year-old: '{complex_topic}'."
+    templates["Text Mood Analyzer"] = "Analyze the overall mood or tone of the following text. Identify the dominant emotion(s) conveyed. Text: '{text_for_mood_analysis}'."
+    templates["Keyword Extractor"] = "Extract the 5-7 most important keywords or key phrases from the following text: '{text_for_keywords}'."
+    templates["Hashtag Generator"] = "Generate 5-7 relevant and trending hashtags for a social media post about: '{post_topic_or_text}'."
+    templates["Story Idea Kicker"] = "Provide 3 unique story prompts or starting ideas based on the following genre or theme: '{story_genre_theme}'."
+    templates["Historical Event Summarizer"] = "Provide a brief (3-5 sentences) summary of the historical event: '{event_name}'."
+    templates["Book Plot Summarizer"] = "Provide a concise plot summary (avoiding major spoilers if possible) for the book titled: '{book_title}'. If you don't know it, say so."
+    templates["Recipe Idea Generator"] = "Suggest a recipe idea using the following main ingredients: '{ingredients_list}'. Briefly outline the cooking steps."
+    templates["Learning Path Suggester"] = "Suggest a high-level learning path (3-5 key stages or topics) for someone wanting to learn about: '{skill_or_topic_to_learn}'."
+    templates["Debate Topic Generator"] = "Generate 3 interesting and debatable topics suitable for a student debate."
+    templates["Short Poem Generator"] = "Write a short, 4-8 line poem about: '{poem_theme_keywords}'."
+    templates["Joke Teller"] = "Tell me a family-friendly joke. If you know one about {joke_topic}, tell that, otherwise a general one."
+    templates["Character Name Generator"] = "Suggest 5 unique character names suitable for a story in the {character_genre_theme} genre/setting."
+    templates["Random Quote Generator"] = "Provide an inspirational or thought-provoking quote. If possible, relate it to the theme of '{quote_theme}'."
+    templates["Fictional World Idea Generator"] = "Generate a core concept or unique feature for a fictional world in the {world_genre} genre."
+    
+    # Keeping some useful misc templates from previous additions
+    templates["Code Comment Generator"] = "Generate helpful comments for the following code snippet. Explain what each major part does. Code:\n```\n{code_to_comment}\n```"
+    templates["Analogy Generator"] = "Create a simple analogy to explain the concept: '{concept_for_analogy}'. Make it easy to understand."
+    templates["Ethical Dilemma Generator"] = "Pose an interesting ethical dilemma related to the topic: '{dilemma_topic}'. Provide a brief scenario."
+    templates["SWOT Analysis Generator"] = "Generate a basic SWOT (Strengths, Weaknesses, Opportunities, Threats) analysis for the following idea or topic: '{swot_topic}'."
+    templates["Acronym Explainer"] = "Explain what the acronym '{acronym_to_explain}' stands for and briefly describe its meaning or context."
+    templates["Rhyme Finder"] = "List 10-15 words that rhyme with '{word_for_rhyme}', grouped into perfect rhymes and near rhymes."
+
+    # Adding 20 NEW serious, student-focused templates to reach 35 total in Misc tab
+    templates["Essay Outline Generator"] = "Generate a structured outline for an essay on the topic: '{essay_topic}'. Include sections for Introduction, Body Paragraphs (suggesting 3-5 main points), and Conclusion."
+    templates["Study Plan Creator (Daily/Weekly)"] = "Create a simple {timeframe} study plan for the topic '{study_topic}'. Suggest key areas to focus on and allocate time slots." # timeframe: 'daily' or 'weekly'
+    templates["Concept Mapping (Text-based)"] = "Generate a text-based concept map structure for the topic: '{concept_map_topic}'. Start with the central concept and branch out to related sub-concepts and details using indentation and bullet points."
+    templates["Research Question Refiner"] = "Refine the following initial research question to make it more focused, specific, and researchable: '{initial_research_question}'."
+    templates["Abstract Generator"] = "Write a concise abstract (approx. 150-250 words) for a paper or study on the topic: '{abstract_topic}'. Include brief mention of purpose, methods (if applicable), key findings, and conclusion."
+    templates["Literature Review Outline Generator"] = "Generate a structured outline for a literature review on the topic: '{lit_review_topic}'. Include sections for Introduction, Thematic Analysis (suggesting key themes), Discussion, and Conclusion."
+    templates["Problem Solving Steps Generator"] = "Outline the general steps involved in solving a problem related to: '{problem_domain}'. Provide a structured approach."
+    templates["Critical Thinking Prompt Generator"] = "Generate 3-5 critical thinking questions or prompts related to the topic: '{critical_thinking_topic}'."
+    templates["Study Group Discussion Questions"] = "Generate 5-7 discussion questions suitable for a study group focusing on the topic: '{study_group_topic}'."
+    templates["Exam Question Predictor"] = "Based on the topic '{exam_topic}', suggest 3-5 potential exam questions (e.g., essay, short answer) that might be asked."
+    templates["Academic Terminology Explainer"] = "Explain the academic term '{academic_term}' in detail, providing its definition, context, and usage examples."
+    templates["Historical Context Generator"] = "Provide the key historical context surrounding the event or person: '{historical_subject}'. Briefly explain the relevant time period, major influences, and immediate aftermath."
+    templates["Scientific Process Outline"] = "Outline the typical steps of the scientific process as applied to studying: '{scientific_topic}'."
+    templates["Mathematical Concept Explainer"] = "Explain the mathematical concept '{math_concept}' in clear terms, including its definition, key properties, and a simple example."
+    templates["Grammar/Style Checker (Basic)"] = "Review the following text for basic grammar errors, awkward phrasing, and suggestions for improving clarity and conciseness. Provide specific suggestions for improvement. Text: '{text_to_check}'."
+    templates["Paraphrasing Tool (Academic)"] = "Paraphrase the following text in an academic style, ensuring the original meaning is retained but the wording is significantly different. Original text: '{text_to_paraphrase}'."
+    templates["Counter-Argument Generator"] = "For the argument '{main_argument}', generate 2-3 potential counter-arguments or opposing viewpoints."
+    templates["Hypothesis Generator"] = "Based on the topic or observation '{observation_or_topic}', suggest 1-2 testable hypotheses for a study or experiment."
+    templates["Data Interpretation Helper"] = "Given the following simple data description or observation: '{data_description}', provide a brief interpretation or suggest what it might imply."
+    templates["Learning Objective Generator"] = "Generate 3-5 clear and measurable learning objectives for a lesson or study session on the topic: '{learning_topic}'."
+
+    # Adding 10 NEW advanced, serious, student/professional-focused templates (41-50)
+    templates["Argumentative Essay Component Generator"] = "For an argumentative essay on the topic: '{essay_topic}', generate a strong {component_type} (e.g., Thesis Statement, Counter-Argument, Rebuttal, Supporting Point with evidence). Be specific and well-reasoned."
+    templates["Research Methodology Suggester"] = "For a research study in the field of '{field_of_study}' addressing the research question/problem: '{research_question}', suggest 2-3 appropriate research methodologies. Briefly explain the suitability and limitations of each."
+    templates["Data Analysis Plan Outline"] = "Outline a detailed data analysis plan for a study with the primary objective: '{research_objective}', expecting to work with {data_type} data (e.g., quantitative survey data, qualitative interview transcripts, mixed-methods). Include key steps from data preparation/cleaning, descriptive analysis, inferential analysis (if applicable), to interpretation and reporting."
+    templates["Grant Proposal Snippet Generator"] = "Draft a compelling and concise snippet for the '{target_section}' section (e.g., Problem Statement, Project Objectives, Expected Outcomes, Broader Impacts) of a grant proposal for a project focused on: '{project_idea}'. Aim for clarity, impact, and alignment with typical grant requirements."
+    templates["Peer Review Feedback Generator (Constructive)"] = "Provide constructive and actionable peer review feedback on the following academic text snippet, focusing specifically on '{focus_area}' (e.g., clarity of argument, methodological rigor, literature engagement, contribution to knowledge). Offer 3-4 specific suggestions for improvement. Text: '{text_for_review}'"
+    templates["Presentation Script Outline Generator"] = "Create a structured and engaging outline for a {length} (e.g., 15-minute, 30-minute, 1-hour) academic or professional presentation on the topic: '{presentation_topic}'. The target audience is '{target_audience}'. Include sections for Introduction (hook, agenda), Key Talking Points (with sub-points and suggested visuals/examples), and Conclusion (summary, call to action, Q&A)."
+    templates["Technical Document Explainer (Advanced)"] = "Explain the following complex technical document snippet in terms understandable for a '{explanation_level}' (e.g., non-technical manager, junior engineer in a different field, subject matter expert needing a refresher). Focus on its core technical meaning, operational implications, and potential challenges or benefits. Snippet: '{technical_snippet}'"
+    templates["Case Study Creator (from scenario)"] = "Based on the following detailed scenario or problem description, structure a comprehensive case study. Identify the core problem/challenge, relevant background and context, key stakeholders and their perspectives, critical decisions or events, and formulate 3-5 insightful discussion questions for analysis. Scenario: '{scenario_description}'"
+    templates["Syllabus Component Generator (Advanced)"] = "For a university-level course titled '{course_title}', draft a detailed and pedagogically sound '{component_type}' section of a syllabus (e.g., Detailed Weekly Schedule with Readings, Comprehensive Assessment Strategy with Rubric Criteria, Policy on Academic Integrity with Examples, Inclusive Learning Environment Statement). Ensure it is clear, comprehensive, and aligns with best practices in higher education."
+    templates["Ethical Review Considerations Lister (Research)"] = "For a research project proposal focused on '{research_proposal_idea}', identify and elaborate on 4-6 key ethical considerations that would need to be thoroughly addressed in an Institutional Review Board (IRB) or ethics committee application. For each consideration, explain why it's relevant and suggest how it might be mitigated or managed."
+    return templates
+
+# Function to build the note-generation prompt for a topic, as the Note Generation tab does
+def build_note_prompt(topic, note_type, detail_level, education_level, knowledge_level=None, custom_template=None):
+    if custom_template:
+        base_prompt = custom_template.format(prompt=topic, detail_level=detail_level, education_level=education_level)
+    elif knowledge_level is not None:
+        base_prompt = load_prompt_templates()["Adaptive Content"].format(prompt=topic, detail_level=detail_level, knowledge_level=knowledge_level)
+    else:
+        base_prompt = load_prompt_templates()[note_type].format(prompt=topic)
+    return f"{base_prompt}\n\nAdditional parameters:\n- Detail level: {detail_level}\n- Education level: {education_level}"
@@ -0,0 +1,133 @@
+# Segment-level translation memory for the Simple Translator. Text is split into sentences; each one is
+# looked up per target language, first exactly (by normalized digest) and then fuzzily (candidates that
+# share indexed words, scored by character trigram similarity). Exact matches are reused as they are,
+# and only the misses are translated, in one batched call that gets the fuzzy matches as references
+# for consistent wording. New translations are stored back, and segments the user confirms (possibly
+# after editing them) are marked so later machine translations never overwrite them.
+import hashlib
+import json
+import re
+
+from .generation import generate_content
+from .storage import get_storage
+from .templates import load_prompt_templates
+
+TM_FUZZY_THRESHOLD = 0.7 # Trigram similarity from which an earlier segment is given as a reference
+TM_CANDIDATES = 20 # Segments sharing the most words that are scored for a fuzzy match
+TM_MIN_WORD_LENGTH = 4 # Shorter words are not indexed (mostly function words)
+SEGMENT_SPLIT_PATTERN = re.compile(r"((?<=[.!?。！？])\s+|\n+)") # Capturing, so the separators are kept
+
+# Function to normalize a segment for exact matching (whitespace only: case and punctuation matter)
+def normalize_segment(text):
+    return " ".join(text.split())
+
+# Function to get the digest a segment is stored under
+def segment_digest(text):
+    return hashlib.sha256(normalize_segment(text).encode("utf-8")).hexdigest()
+
+# Function to list the words a segment is indexed under
+def segment_words(text):
+    return sorted({word for word in re.findall(r"\w+", text.lower()) if len(word) >= TM_MIN_WORD_LENGTH})
+
+# Function to get the character trigrams of a segment
+def segment_trigrams(text):
+    padded = f"  {normalize_segment(text).lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# Function to score how alike two segments are (Dice coefficient of their trigrams, 0 to 1)
+def segment_similarity(a, b):
+    grams_a, grams_b = segment_trigrams(a), segment_trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+# Function to split text into segments and separators: even positions are sentences, odd ones the
+# whitespace between them, so joining the list gives the text back
+def split_segments(text):
+    return SEGMENT_SPLIT_PATTERN.split(text)
+
+# Function to check whether a segment has anything to translate (numbers and symbols are kept as they are)
+def is_translatable(segment):
+    return re.search(r"[^\W\d_]", segment) is not None
+
+# Function to look a segment up: an exact match, else the best fuzzy match above TM_FUZZY_THRESHOLD, else None
+def lookup_segment(language, segment):
+    store = get_storage()["translations"]
+    record = store.get(language, segment_digest(segment))
+    if record is not None:
+        return {**record, "match": "exact", "score": 1.0}
+    best = None
+    for candidate in store.candidates(language, segment_words(segment), TM_CANDIDATES):
+        score = segment_similarity(segment, candidate["source"])
+        if score >= TM_FUZZY_THRESHOLD and (best is None or score > best["score"]):
+            best = {**candidate, "match": "fuzzy", "score": round(score, 2)}
+    return best
+
+# Function to translate the missing segments in one call; returns their translations, or None if the
+# response isn't one translation per segment
+def translate_segment_batch(sources, references, language, api_key, model_name, **options):
+    templates = load_prompt_templates()
+    reference_text = "\n".join(f"- {reference['source']} => {reference['target']}" for reference in references) or "(none)"
+    response_text = generate_content(
+        templates["Translation Memory Batch"].format(
+            target_language=language, references=reference_text, segments=json.dumps(sources, ensure_ascii=False)
+        ),
+        api_key,
+        model_name,
+        temperature=0.2,
+        detail_level="Standard",
+        style_params={"tone": "Neutral", "language_style": "Standard"},
+        response_mime_type="application/json",
+        tool_name="Simple Translator",
+        **options
+    )
+    try:
+        translations = json.loads(response_text)["translations"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(translations, list) or len(translations) != len(sources) or not all(isinstance(t, str) for t in translations):
+        return None
+    return [translation.strip() for translation in translations]
+
+# Function to translate text through the memory. Returns {"translation", "segments", "error"}; each
+# segment records its source, target and how it was found ("exact", "new", or "new" with a fuzzy reference)
+def translate_with_memory(text, language, api_key, model_name, **options):
+    parts = split_segments(text)
+    segments, misses, references = [], {}, {}
+    for position in range(0, len(parts), 2):
+        source = parts[position].strip()
+        if not is_translatable(source):
+            continue
+        found = lookup_segment(language, source)
+        segment = {"position": position, "source": source, "target": None, "match": "new", "reference": None}
+        if found is not None and found["match"] == "exact":
+            segment.update(target=found["target"], match="exact")
+        else:
+            misses.setdefault(segment_digest(source), source) # Repeats within the text are translated once
+            if found is not None:
+                segment["reference"] = found["score"]
+                references[segment_digest(found["source"])] = found
+        segments.append(segment)
+    if misses:
+        translations = translate_segment_batch(list(misses.values()), list(references.values()), language, api_key, model_name, **options)
+        if translations is None:
+            return {"translation": None, "segments": segments, "error": "Error: the batched translation could not be read"}
+        translated = dict(zip(misses, translations))
+        store = get_storage()["translations"]
+        for digest, source in misses.items():
+            store.put(language, digest, normalize_segment(source), translated[digest], segment_words(source))
+        for segment in segments:
+            if segment["target"] is None:
+                segment["target"] = translated[segment_digest(segment["source"])]
+    for segment in segments:
+        parts[segment["position"]] = parts[segment["position"]].replace(segment["source"], segment["target"], 1)
+    return {"translation": "".join(parts), "segments": segments, "error": None}
+
+# Function to store a segment translation the user has checked (and possibly corrected)
+def confirm_segment(language, source, target):
+    get_storage()["translations"].put(language, segment_digest(source), normalize_segment(source), target.strip(),
+                                      segment_words(source), confirmed=True)
+
+# Function to report how many segments the memory holds
+def translation_memory_stats():
+    return get_storage()["translations"].stats()
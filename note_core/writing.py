@@ -0,0 +1,101 @@
+# Paragraph-parallel Writing Enhancer. The text is split into paragraphs that are enhanced concurrently
+# on a bounded pool and returned in order as they finish. Each result is cached in the storage backend
+# by paragraph, enhancement type, target tone and model, so re-running after editing one paragraph only
+# pays for that paragraph.
+import difflib
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .generation import generate_content
+from .storage import get_storage
+from .templates import load_prompt_templates
+
+WRITING_ENHANCE_WORKERS = 4
+WRITING_CACHE_TTL = float(os.environ.get("NOTE_MAKER_WRITING_CACHE_TTL", 30 * 24 * 3600)) # 0 turns the cache off
+ENHANCEMENT_PROMPTS = { # Enhancement type -> (template, argument that receives the text)
+    "Rephrase Text": ("Writing Enhancer - Rephrase", "text_to_rephrase"),
+    "Expand on Idea": ("Writing Enhancer - Expand", "text_to_expand"),
+    "Summarize Text": ("Writing Enhancer - Summarize", "text_to_summarize"),
+    "Check Clarity & Conciseness": ("Writing Enhancer - Clarity Check", "text_for_review"),
+}
+WHOLE_TEXT_ENHANCEMENTS = {"Summarize Text"} # A summary covers the whole text, so it is not split
+REWRITING_ENHANCEMENTS = {"Rephrase Text", "Expand on Idea"} # Their output is a new version of the paragraph, worth a diff
+
+# Function to split text into paragraphs at blank lines
+def split_paragraphs(text):
+    return [paragraph.strip() for paragraph in re.split(r"\n\s*\n", text) if paragraph.strip()]
+
+# Function to build the cache key of one enhanced paragraph
+def paragraph_cache_key(paragraph, enhancement_type, target_tone, model_name):
+    return "writing:" + hashlib.sha256(f"{model_name}|{enhancement_type}|{target_tone}|{paragraph}".encode("utf-8")).hexdigest()
+
+# Function to show the word changes between a paragraph and its enhanced version (~~removed~~ **added**)
+def paragraph_diff(original, enhanced):
+    old_words, new_words = original.split(), enhanced.split()
+    parts = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_words, new_words, autojunk=False).get_opcodes():
+        if tag == "equal":
+            parts.append(" ".join(old_words[i1:i2]))
+            continue
+        if i2 > i1:
+            parts.append(f"~~{' '.join(old_words[i1:i2])}~~")
+        if j2 > j1:
+            parts.append(f"**{' '.join(new_words[j1:j2])}**")
+    return " ".join(parts)
+
+# Function to enhance one paragraph, from the cache when possible; never raises
+def enhance_paragraph(paragraph, enhancement_type, target_tone, api_key, model_name, **options):
+    started = time.perf_counter()
+    cache_key = paragraph_cache_key(paragraph, enhancement_type, target_tone, model_name)
+    result = {"original": paragraph, "enhanced": None, "cached": False, "error": None, "diff": None}
+    try:
+        if WRITING_CACHE_TTL > 0:
+            result["enhanced"] = get_storage()["cache"].get(cache_key)
+            result["cached"] = result["enhanced"] is not None
+        if result["enhanced"] is None:
+            template_name, text_argument = ENHANCEMENT_PROMPTS[enhancement_type]
+            format_args = {text_argument: paragraph}
+            if enhancement_type == "Rephrase Text":
+                format_args["target_tone"] = target_tone
+            prompt = load_prompt_templates()[template_name].format(**format_args)
+            if enhancement_type not in WHOLE_TEXT_ENHANCEMENTS:
+                prompt += "\n\nThis is one paragraph of a longer text. Return only the result for this paragraph, without any preamble."
+            enhanced = generate_content(
+                prompt,
+                api_key,
+                model_name,
+                temperature=0.6,
+                detail_level="Standard",
+                style_params={"tone": "Formal", "language_style": "Standard"},
+                tool_name=template_name,
+                **options
+            )
+            if enhanced.startswith("Error:"):
+                result["error"] = enhanced
+            else:
+                result["enhanced"] = enhanced.strip()
+                if WRITING_CACHE_TTL > 0:
+                    get_storage()["cache"].set(cache_key, result["enhanced"], ttl=WRITING_CACHE_TTL)
+    except Exception as e:
+        result["error"] = f"Error: {str(e)}"
+    if result["enhanced"] is not None and enhancement_type in REWRITING_ENHANCEMENTS:
+        result["diff"] = paragraph_diff(paragraph, result["enhanced"])
+    result["seconds"] = round(time.perf_counter() - started, 1)
+    return result
+
+# Function to enhance text paragraph by paragraph; yields (index, total, result) in paragraph order,
+# each as soon as it and every paragraph before it are done
+def enhance_paragraphs(text, enhancement_type, target_tone, api_key, model_name, max_workers=WRITING_ENHANCE_WORKERS, **options):
+    paragraphs = [text.strip()] if enhancement_type in WHOLE_TEXT_ENHANCEMENTS else split_paragraphs(text)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(enhance_paragraph, paragraph, enhancement_type, target_tone, api_key, model_name, **options)
+                   for paragraph in paragraphs]
+        for index, future in enumerate(futures):
+            yield index, len(futures), future.result()
+
+# Function to join enhanced paragraphs back into one text (failed paragraphs keep their original)
+def join_enhanced_paragraphs(results):
+    return "\n\n".join(result["enhanced"] if result["enhanced"] is not None else result["original"] for result in results)
@@ -0,0 +1,24 @@
+# Shared test setup: note_core reads its storage paths at import time, so they point at a scratch
+# directory before anything is imported, and the storage fixture swaps in fresh SQLite stores per test.
+import os
+import sys
+import tempfile
+
+import pytest
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="note_maker_tests_")
+os.environ.setdefault("NOTE_MAKER_STORAGE_PATH", os.path.join(SCRATCH_DIR, "storage.sqlite3"))
+os.environ.setdefault("NOTE_MAKER_QUESTION_BANK", os.path.join(SCRATCH_DIR, "question_bank.sqlite3"))
+os.environ.setdefault("NOTE_MAKER_CASSETTE_DIR", os.path.join(SCRATCH_DIR, "cassettes"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from note_core import storage # noqa: E402
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    path = str(tmp_path / "storage.sqlite3")
+    stores = {"backend": "local", "cache": storage.SQLiteResponseCache(path), "user_data": storage.SQLiteUserDataStore(path),
+              "jobs": storage.SQLiteJobQueue(path), "notes": storage.SQLiteNoteBodyStore(path),
+              "translations": storage.SQLiteTranslationMemory(path), "questions": storage.SQLiteQuestionBank(path)}
+    monkeypatch.setattr(storage, "_storage", stores)
+    return stores
@@ -0,0 +1,76 @@
+import random
+from copy import deepcopy
+from datetime import datetime, timedelta
+
+import pytest
+
+from note_core import analytics
+
+NOW = datetime(2024, 3, 14, 9, 30)
+
+def make_card(rng, topic):
+    return {"topic": topic, "ease_factor": round(rng.uniform(1.3, 3.0), 2),
+            "next_review": NOW + timedelta(days=rng.randint(-3, 20), hours=rng.randint(0, 12))}
+
+def test_incremental_aggregates_match_a_rebuild():
+    rng = random.Random(7)
+    aggregates = analytics.new_analytics()
+    cards, history, quiz_scores = [], [], []
+    for step in range(300):
+        action = rng.choice(["card", "review", "note", "quiz"])
+        if action == "card" or (action == "review" and not cards):
+            cards.append(make_card(rng, rng.choice(["Biology", "History", "Physics"])))
+            analytics.record_card_added(aggregates, cards[-1])
+        elif action == "review":
+            card = rng.choice(cards)
+            before = deepcopy(card)
+            card["ease_factor"] = max(1.3, card["ease_factor"] + rng.choice([-0.2, 0.0, 0.1]))
+            card["next_review"] = NOW + timedelta(days=rng.randint(1, 30))
+            analytics.record_card_reviewed(aggregates, before, card)
+        elif action == "note":
+            moment = NOW - timedelta(days=10) + timedelta(hours=step)
+            history.insert(0, {"tool": rng.choice(["Notes", "Quiz", "Mind Map"]), "timestamp": moment.strftime(analytics.HISTORY_TIMESTAMP_FORMAT)})
+            analytics.record_note(aggregates, history[0]["tool"], moment)
+        else:
+            quiz_scores.append({"score": rng.randint(0, 100)})
+            analytics.record_quiz_score(aggregates, quiz_scores[-1]["score"])
+
+    rebuilt = analytics.build_analytics(cards, history, quiz_scores)
+    assert analytics.cards_due_today(aggregates, NOW) == analytics.cards_due_today(rebuilt, NOW)
+    assert analytics.cards_due_today(rebuilt, NOW) == sum(card["next_review"].date() <= NOW.date() for card in cards)
+    assert analytics.due_forecast(aggregates, now=NOW) == analytics.due_forecast(rebuilt, now=NOW)
+    assert analytics.average_ease(aggregates) == pytest.approx(analytics.average_ease(rebuilt))
+    assert aggregates["topic_counts"] == rebuilt["topic_counts"]
+    assert aggregates["ease_histogram"] == rebuilt["ease_histogram"]
+    assert aggregates["notes_by_tool"] == rebuilt["notes_by_tool"] and aggregates["top_tool"] == rebuilt["top_tool"]
+    assert analytics.notes_last_days(aggregates, NOW) == analytics.notes_last_days(rebuilt, NOW)
+    assert analytics.quiz_averages(aggregates) == analytics.quiz_averages(rebuilt)
+
+def test_past_days_are_folded_into_overdue_once():
+    aggregates = analytics.new_analytics()
+    for days in (-2, 0, 1):
+        analytics.record_card_added(aggregates, {"topic": "T", "ease_factor": 2.5, "next_review": NOW + timedelta(days=days)})
+    assert analytics.cards_due_today(aggregates, NOW) == 2
+    assert analytics.cards_due_today(aggregates, NOW + timedelta(days=1)) == 3
+    assert aggregates["overdue"] == 2
+    overdue_card = {"topic": "T", "ease_factor": 2.5, "next_review": NOW - timedelta(days=2)}
+    analytics.record_card_reviewed(aggregates, overdue_card, dict(overdue_card, next_review=NOW + timedelta(days=5)))
+    assert analytics.cards_due_today(aggregates, NOW + timedelta(days=1)) == 2
+
+def test_quiz_average_uses_a_rolling_window():
+    aggregates = analytics.new_analytics()
+    assert analytics.quiz_averages(aggregates) == (None, None)
+    for score in [0] * 5 + [100] * analytics.QUIZ_WINDOW:
+        analytics.record_quiz_score(aggregates, score)
+    overall, recent = analytics.quiz_averages(aggregates)
+    assert recent == 100 and overall == 100 * analytics.QUIZ_WINDOW / (5 + analytics.QUIZ_WINDOW)
+    assert aggregates["quiz_best"] == 100 and len(aggregates["quiz_recent"]) == analytics.QUIZ_WINDOW
+
+def test_old_note_buckets_are_pruned():
+    aggregates = analytics.new_analytics()
+    for day in range(60):
+        analytics.record_note(aggregates, "Notes", NOW - timedelta(days=60 - day))
+    assert len(aggregates["notes_by_day"]) <= analytics.NOTE_DAYS_KEPT
+    assert len(aggregates["notes_by_week"]) <= analytics.NOTE_WEEKS_KEPT
+    assert analytics.notes_last_days(aggregates, NOW) == analytics.NOTE_DAYS_KEPT - 1 # One note a day, none today
+    assert aggregates["notes_total"] == 60
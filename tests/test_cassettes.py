@@ -0,0 +1,60 @@
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from note_core import cassettes
+
+CONFIG = {"temperature": 0.2, "max_output_tokens": 2048}
+KEY = "AIza" + "x" * 35
+
+@pytest.fixture(autouse=True)
+def cassette_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cassettes, "CASSETTE_DIR", str(tmp_path))
+    return tmp_path
+
+def fake_chunks(texts):
+    for text in texts:
+        yield SimpleNamespace(text=text, usage_metadata=SimpleNamespace(prompt_token_count=5, candidates_token_count=len(text)))
+
+def record(prompt, texts):
+    return "".join(chunk.text for chunk in cassettes.record_cassette(fake_chunks(texts), "gemini-2.0-flash", prompt, CONFIG, secrets=[KEY]))
+
+def test_recorded_call_replays_the_same_chunks():
+    assert record("Notes on cells", ["# Cells\n", "Cells are ", "alive."]) == "# Cells\nCells are alive."
+    assert list(cassettes.replay_cassette("Notes on cells", CONFIG, time_scale=0)) == ["# Cells\n", "Cells are ", "alive."]
+    [summary] = cassettes.list_cassettes()
+    assert summary["chunks"] == 3 and summary["model"] == "gemini-2.0-flash" and summary["response_chars"] == 24
+    assert cassettes.load_cassette(summary["key"])["usage"] == {"prompt_token_count": 5, "candidates_token_count": 6}
+
+def test_secrets_are_scrubbed():
+    record(f"Use key {KEY} with api_key=sk-12345678abcd", [f"echo {KEY}"])
+    cassette = cassettes.load_cassette(cassettes.cassette_key(f"Use key {KEY} with api_key=sk-12345678abcd", CONFIG))
+    assert KEY not in str(cassette) and "sk-12345678abcd" not in str(cassette)
+    assert cassette["prompt"] == "Use key [REDACTED] with api_key=[REDACTED]"
+
+def test_abandoned_stream_is_not_recorded(cassette_dir):
+    stream = cassettes.record_cassette(fake_chunks(["partial", "rest"]), "m", "Notes on atoms", CONFIG)
+    next(stream)
+    stream.close()
+    assert os.listdir(cassette_dir) == []
+    with pytest.raises(LookupError):
+        list(cassettes.replay_cassette("Notes on atoms", CONFIG, time_scale=0))
+
+def test_threads_recording_the_same_request_never_clash(cassette_dir):
+    start, errors = threading.Barrier(8), []
+    def worker(i):
+        start.wait()
+        try:
+            record("Notes on rivers", [f"version {i} "] * 5000)
+        except Exception as error: # An error here is what the unique temp file prevents
+            errors.append(error)
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert os.listdir(cassette_dir) == [cassettes.cassette_key("Notes on rivers", CONFIG) + ".json"] # No temp files left
+    assert len(set(cassettes.replay_cassette("Notes on rivers", CONFIG, time_scale=0))) == 1 # One whole recording won
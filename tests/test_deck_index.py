@@ -0,0 +1,63 @@
+import random
+from copy import deepcopy
+from datetime import datetime, timedelta
+
+import pytest
+
+from note_core import deck_index
+
+NOW = datetime(2024, 3, 14, 9, 30)
+
+@pytest.fixture
+def cards():
+    rng = random.Random(3)
+    return [{"topic": rng.choice(["Biology", "history", "Physics"]), "question": f"Q{i}", "ease_factor": rng.choice([1.3, 2.5, 2.8]),
+             "next_review": NOW + timedelta(days=rng.randint(-5, 5))} for i in range(53)] # Plenty of equal sort keys
+
+def read_all_pages(index, sort_by, **options):
+    pages, cursor = [], None
+    while True:
+        page, cursor = deck_index.deck_page(index, sort_by, cursor=cursor, page_size=10, **options)
+        pages.append(page)
+        if cursor is None:
+            return pages
+
+@pytest.mark.parametrize("sort_by", sorted(deck_index.SORT_KEYS))
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_cover_the_deck_in_order_once(cards, sort_by, descending):
+    index = deck_index.build_deck_index(cards)
+    pages = read_all_pages(index, sort_by, descending=descending)
+    seen = [card["id"] for page in pages for card in page]
+    expected = sorted(cards, key=lambda card: (deck_index.SORT_KEYS[sort_by](card), card["id"]), reverse=descending)
+    assert seen == [card["id"] for card in expected]
+    assert all(len(page) == 10 for page in pages[:-1])
+
+def test_filtered_pages_keep_their_size(cards):
+    index = deck_index.build_deck_index(cards)
+    match = lambda card: card["topic"] == "Physics"
+    pages = read_all_pages(index, "topic", match=match)
+    assert [card["id"] for page in pages for card in page] == [entry[1] for entry in index["indexes"]["topic"] if match(index["cards"][entry[1]])]
+    assert all(len(page) == 10 for page in pages[:-1])
+
+def test_rescheduled_card_moves_in_every_index(cards):
+    index = deck_index.build_deck_index(cards)
+    card = cards[0]
+    before = deepcopy(card)
+    card["next_review"], card["ease_factor"] = NOW + timedelta(days=90), 3.0
+    deck_index.reindex_card(index, before, card)
+    assert all(len(entries) == len(cards) for entries in index["indexes"].values())
+    assert deck_index.card_at(index, "next_review", len(cards) - 1) is card
+    assert deck_index.card_at(index, "ease", len(cards) - 1) is card
+    assert deck_index.card_at(index, "ease", len(cards)) is None
+
+def test_count_due_includes_cards_due_right_now(cards):
+    index = deck_index.build_deck_index(cards)
+    for now in (NOW - timedelta(days=6), NOW, NOW + timedelta(days=6)):
+        assert deck_index.count_due(index, now) == sum(card["next_review"] <= now for card in cards)
+
+def test_unindexing_removes_only_that_card(cards):
+    index = deck_index.build_deck_index(cards)
+    deck_index.unindex_card(index, cards[5])
+    assert cards[5]["id"] not in index["cards"]
+    assert all(cards[5]["id"] not in [card_id for _, card_id in entries] for entries in index["indexes"].values())
+    assert all(len(entries) == len(cards) - 1 for entries in index["indexes"].values())
@@ -0,0 +1,57 @@
+import csv
+import io
+
+from note_core import export
+from note_core.document import get_note_document
+
+NOTE = """# Photosynthesis
+Plants turn **light** into sugar, see [notes](http://example.com/a_b?x=1&y=2).
+
+## Steps
+- Light reactions
+  - Split *water*
+- Calvin cycle
+1. Absorb
+2. Fix carbon
+
+| Input | Output |
+|---|---|
+| CO2, water | "glucose" |
+
+> Life runs on sunlight
+
+```python
+print("<done>")
+```
+"""
+
+def test_csv_has_one_row_per_block():
+    rows = list(csv.reader(io.StringIO(export.export_notes(NOTE, "csv"))))
+    blocks = get_note_document(NOTE)["blocks"]
+    assert rows[0] == ["type", "level", "text"]
+    assert [row[0] for row in rows[1:]] == [block["type"] for block in blocks]
+    assert rows[1] == ["heading", "1", "Photosynthesis"]
+    assert ["list_item", "1", "Split water"] in rows
+    assert ["table", "", 'Input | Output\nCO2, water | "glucose"'] in rows
+    assert ["code", "", 'print("<done>")'] in rows
+
+def test_html_is_rendered_from_the_same_blocks():
+    page = export.export_notes(NOTE, "html")
+    assert "<h1>Photosynthesis</h1>" in page
+    assert '<strong>light</strong>' in page and '<a href="http://example.com/a_b?x=1&amp;y=2">notes</a>' in page
+    assert "<li>Light reactions\n<ul>\n<li>Split <em>water</em>\n</li></ul>\n</li>" in page
+    assert "<ol>\n<li>Absorb\n</li>\n<li>Fix carbon\n</li></ol>" in page
+    assert "<th>Input</th><th>Output</th>" in page and "<td>&quot;glucose&quot;</td>" in page
+    assert "<blockquote><p>Life runs on sunlight</p></blockquote>" in page
+    assert '<pre><code class="language-python">print(&quot;&lt;done&gt;&quot;)\n</code></pre>' in page
+
+def test_exports_are_rendered_once_per_document():
+    document = get_note_document(NOTE)
+    document["derived"].pop("export_csv", None)
+    first = export.export_notes(NOTE, "csv")
+    assert document["derived"]["export_csv"] is first
+    assert export.export_notes(NOTE, "csv") is first
+
+def test_text_and_markdown_exports_are_the_note():
+    assert export.export_notes(NOTE, "txt") == NOTE
+    assert export.export_notes(NOTE, "md") == NOTE
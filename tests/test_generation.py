@@ -0,0 +1,105 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from note_core import generation
+
+@pytest.fixture(autouse=True)
+def fresh_model_stats(monkeypatch):
+    monkeypatch.setitem(generation._model_stats, "hedge", {"calls": 0, "fired": 0, "won": 0})
+    monkeypatch.setitem(generation._model_stats, "first_token_ms", {})
+    monkeypatch.setitem(generation._model_stats, "models", {})
+
+def test_hedge_budget_allows_the_seed_before_any_calls():
+    assert generation.try_reserve_hedge()
+    assert not generation.try_reserve_hedge()
+
+def test_hedge_budget_caps_the_share_of_calls(monkeypatch):
+    monkeypatch.setattr(generation, "HEDGE_BUDGET", 0.1)
+    generation._model_stats["hedge"]["calls"] = 100
+    fired = sum(generation.try_reserve_hedge() for _ in range(50))
+    assert fired == 11 # 10% of 100 calls plus the seed
+    assert generation._model_stats["hedge"]["fired"] == 11
+
+class StalledCall:
+    # Stands in for a gRPC streaming call that never produces a chunk until it is cancelled
+    def __init__(self):
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+def test_hedged_stream_aborts_the_stalled_attempt_when_the_hedge_wins(monkeypatch):
+    monkeypatch.setattr(generation, "hedge_delay_seconds", lambda model_name: 0.05)
+    stalled = StalledCall()
+
+    def stream_fn(model_name, attempt):
+        if model_name == "slow-model":
+            generation.register_attempt_call(attempt, stalled.cancel)
+            if not stalled.cancelled.wait(5):
+                raise AssertionError("The losing attempt was never aborted")
+            raise RuntimeError("Cancelled")
+        yield "fast "
+        yield "answer"
+
+    monkeypatch.setattr(generation, "hedge_model_for", lambda model_name: "fast-model")
+    started = time.perf_counter()
+    assert "".join(generation.hedged_stream("slow-model", stream_fn)) == "fast answer"
+    assert stalled.cancelled.wait(1)
+    assert time.perf_counter() - started < 1
+    assert generation._model_stats["hedge"]["won"] == 1
+
+def test_attempt_cancelled_before_its_call_starts_is_aborted_on_registration():
+    attempt = generation.new_attempt()
+    generation.cancel_attempt(attempt)
+    call = StalledCall()
+    generation.register_attempt_call(attempt, call.cancel)
+    assert call.cancelled.is_set()
+
+class KeyCheckingModel:
+    # Stands in for genai.GenerativeModel; its client is the API key itself (see the fixture below)
+    started = None
+
+    def __init__(self, model_name):
+        self._client = None
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        KeyCheckingModel.started.set()
+        time.sleep(0.2) # Long enough for a second caller to join the flight
+        if self._client == "revoked-key":
+            raise PermissionError("API key not valid")
+        return iter([SimpleNamespace(text="answer for "), SimpleNamespace(text=self._client)])
+
+@pytest.fixture
+def key_checking_model(monkeypatch):
+    KeyCheckingModel.started = threading.Event()
+    monkeypatch.setattr(generation.genai, "GenerativeModel", KeyCheckingModel)
+    monkeypatch.setattr(generation, "get_generative_client", lambda api_key: api_key)
+
+def stream_in_thread(api_key, results):
+    def run():
+        try:
+            results[api_key] = "".join(generation.stream_ai_content("Same prompt", api_key, "model", {"temperature": 0}))
+        except Exception as e:
+            results[api_key] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def test_leader_auth_error_never_reaches_a_caller_with_another_key(key_checking_model):
+    results = {}
+    first = stream_in_thread("revoked-key", results)
+    KeyCheckingModel.started.wait(1)
+    second = stream_in_thread("valid-key", results)
+    first.join(5)
+    second.join(5)
+    assert isinstance(results["revoked-key"], PermissionError)
+    assert results["valid-key"] == "answer for valid-key"
+
+def test_only_calls_on_the_same_key_share_a_flight():
+    assert generation.single_flight_key("m", "p", {}, "key-a") == generation.single_flight_key("m", "p", {}, "key-a")
+    assert generation.single_flight_key("m", "p", {}, "key-a") != generation.single_flight_key("m", "p", {}, "key-b")
+    assert generation.single_flight_key("m", "p", {}, generation.KEY_POOL_SENTINEL) == generation.single_flight_key("m", "p", {})
+    assert "key-a" not in generation.api_key_identity("key-a")
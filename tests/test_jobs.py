@@ -0,0 +1,42 @@
+import pytest
+
+from note_core import jobs, storage
+
+def test_api_key_stays_out_of_the_queue(local_storage, monkeypatch):
+    seen = {}
+    monkeypatch.setitem(jobs.JOB_HANDLERS, "fill_question_bank", lambda content, api_key, model_name: seen.update(api_key=api_key) or "filled")
+    job_id = jobs.enqueue_job("fill_question_bank", "notes", api_key="AIza-user-secret", model_name="gemini-2.0-flash")
+    conn = storage.connect_local_storage(local_storage["jobs"].path)
+    assert "AIza-user-secret" not in conn.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    assert local_storage["jobs"].claim(timeout=0.1, owner="another-process") is None
+
+    job = local_storage["jobs"].claim(timeout=0.1, owner=jobs.JOB_OWNER)
+    args, kwargs = jobs.job_arguments(job)
+    assert jobs.JOB_HANDLERS[job["kind"]](*args, **kwargs) == "filled"
+    assert seen["api_key"] == "AIza-user-secret"
+    assert job_id not in jobs._job_secrets["keys"] # Handed over once, then forgotten
+
+def test_pool_key_jobs_can_run_anywhere(local_storage):
+    jobs.enqueue_job("generate_follow_up_questions", "findings", api_key=jobs.KEY_POOL_SENTINEL, model_name="m")
+    job = local_storage["jobs"].claim(timeout=0.1, owner="another-process")
+    assert jobs.job_arguments(job) == (["findings"], {"model_name": "m", "api_key": jobs.KEY_POOL_SENTINEL})
+
+def test_cancelled_job_forgets_its_key(local_storage):
+    job_id = jobs.enqueue_job("generate_spaced_repetition_text", "notes", api_key="user-key", model_name="m")
+    jobs.cancel_job(job_id)
+    assert job_id not in jobs._job_secrets["keys"]
+    assert local_storage["jobs"].status(job_id)["status"] == "cancelled"
+
+def test_job_whose_key_is_gone_fails():
+    with pytest.raises(RuntimeError):
+        jobs.job_arguments({"id": "unknown", "payload": {"args": [], "kwargs": {}, "api_key": jobs.JOB_SECRET_KEY}})
+
+def test_worker_runs_queued_jobs(local_storage, monkeypatch):
+    monkeypatch.setitem(jobs.JOB_HANDLERS, "generate_follow_up_questions", lambda findings, api_key, model_name: f"{findings} with {api_key}")
+    job_id = jobs.enqueue_job("generate_follow_up_questions", "findings", api_key="user-key", model_name="m")
+    threads, stop_event = jobs.start_job_workers(1)
+    try:
+        assert jobs.wait_for_job(job_id, timeout=5) == "findings with user-key"
+    finally:
+        stop_event.set()
+        threads[0].join(5)
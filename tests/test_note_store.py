@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+from note_core import note_store, storage
+
+@pytest.fixture(params=["local", "redis"])
+def notes(request, local_storage, monkeypatch):
+    if request.param == "redis":
+        monkeypatch.setitem(local_storage, "notes", storage.RedisNoteBodyStore(storage.MemoryRedis()))
+    note_store.load_note.cache_clear() # Digests are shared across stores, so the cache must not outlive one
+    yield local_storage["notes"]
+    note_store.load_note.cache_clear()
+
+def edit(rng, text):
+    lines = text.splitlines(keepends=True)
+    for _ in range(rng.randint(1, 4)):
+        position = rng.randrange(len(lines) + 1)
+        choice = rng.choice(["insert", "delete", "replace"])
+        if choice == "insert" or not lines:
+            lines.insert(position, f"- added point {rng.random():.6f}\n")
+        elif choice == "delete":
+            lines.pop(min(position, len(lines) - 1))
+        else:
+            lines[min(position, len(lines) - 1)] = f"## Rewritten {rng.random():.6f}\r\n"
+    return "".join(lines)
+
+@pytest.mark.parametrize("base, text", [
+    ("a\nb\nc\n", "a\nB\nc\n"),
+    ("a\nb\nc", "a\nb\nc\nd"), # No trailing newline
+    ("", "new note\n"),
+    ("same\n", "same\n"),
+    ("one\r\ntwo\r\n", "zero\r\none\r\ntwo"),
+])
+def test_delta_round_trip(base, text):
+    assert note_store.apply_delta(base, note_store.encode_delta(base, text)) == text
+
+def test_delta_chain_round_trips_every_version(notes):
+    rng = random.Random(11)
+    text = "".join(f"## Section {i}\n" + "Some explanation of the topic that stays the same.\n" * 5 for i in range(40))
+    versions, ref = [], None
+    for _ in range(note_store.NOTE_DELTA_MAX_CHAIN * 2 + 3):
+        text = edit(rng, text)
+        ref = note_store.put_note(text, base_ref=ref)
+        versions.append((ref, text))
+    note_store.load_note.cache_clear()
+    for ref, text in versions:
+        assert note_store.load_note(ref["__note__"]) == text
+        assert notes.get(ref["__note__"])["depth"] <= note_store.NOTE_DELTA_MAX_CHAIN
+    assert note_store.note_store_stats()["deltas"] > 0
+
+def test_identical_bodies_are_stored_once(notes):
+    first = note_store.put_note("# Photosynthesis\n\nLight in, sugar out.\n")
+    second = note_store.put_note("# Photosynthesis\n\nLight in, sugar out.\n", base_ref=first)
+    assert first == second
+    assert note_store.note_store_stats()["notes"] == 1
+
+def test_unrelated_body_is_not_stored_as_a_delta(notes):
+    base = note_store.put_note("# Cells\n" + "Cells are the unit of life.\n" * 20)
+    ref = note_store.put_note("# Rome\n" + "".join(f"Emperor number {i} ruled for a while.\n" for i in range(20)), base_ref=base)
+    assert notes.get(ref["__note__"])["base"] is None
+
+def test_missing_body_raises(notes):
+    with pytest.raises(KeyError):
+        note_store.load_note("0" * 64)
+
+def test_trimmed_history_frees_its_bodies(notes):
+    history = []
+    text = "".join(f"## Section {i}\nSome explanation of the topic.\n" for i in range(30))
+    for i in range(5):
+        text += f"- extra point {i}\n"
+        history.insert(0, note_store.put_note(text, base_ref=history[0] if history else None))
+    assert note_store.note_store_stats()["deltas"] == 4
+    note_store.release_notes(history[1:]) # Older versions are still bases of the newest delta
+    assert note_store.note_store_stats()["notes"] == 5
+    note_store.load_note.cache_clear()
+    assert note_store.load_note(history[0]["__note__"]) == text
+    note_store.release_notes(history[:1])
+    assert note_store.note_store_stats() == {"notes": 0, "deltas": 0, "raw_bytes": 0, "stored_bytes": 0}
+    assert all(notes.get(ref["__note__"]) is None for ref in history)
+
+def test_shared_body_is_kept_until_every_holder_releases_it(notes):
+    first = note_store.put_note("# Cells\nThe unit of life.\n")
+    second = note_store.put_note("# Cells\nThe unit of life.\n")
+    note_store.retain_note(first) # e.g. also a favorite
+    note_store.release_notes([first, second])
+    assert notes.get(first["__note__"]) is not None
+    note_store.release_notes([first, "plain text"])
+    assert notes.get(first["__note__"]) is None
+
+def test_bodies_stored_before_holders_were_counted_are_kept(local_storage):
+    store = local_storage["notes"]
+    ref = note_store.put_note("# Legacy\n")
+    storage.connect_local_storage(store.path).execute("UPDATE note_bodies SET refs = NULL")
+    note_store.retain_note(ref)
+    note_store.release_notes([ref, ref, ref])
+    assert store.get(ref["__note__"]) is not None
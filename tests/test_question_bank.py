@@ -0,0 +1,42 @@
+import pytest
+
+from note_core import question_bank, storage
+
+@pytest.fixture(params=["local", "redis"])
+def bank(request, local_storage, monkeypatch):
+    if request.param == "redis":
+        monkeypatch.setitem(local_storage, "questions", storage.RedisQuestionBank(storage.MemoryRedis()))
+    return local_storage["questions"]
+
+def questions(*texts):
+    return [{"question": text, "options": {"A": "yes", "B": "no", "C": "maybe", "D": "never"}, "correct": "A"} for text in texts]
+
+def test_duplicate_questions_are_banked_once(bank):
+    assert question_bank.add_questions_to_bank("notes-1", "Biology", questions("1. What is ATP?", "Where is DNA stored?")) == 2
+    assert question_bank.add_questions_to_bank("notes-1", "biology", questions("2) what is ATP", "What is RNA?")) == 1
+    assert question_bank.count_bank_questions("notes-1") == 3
+    assert question_bank.count_bank_questions("notes-2") == 0
+
+def test_sampling_serves_least_used_questions_first(bank):
+    question_bank.add_questions_to_bank("notes-1", "Biology", questions("Q one?", "Q two?", "Q three?", "Q four?"))
+    first = {q["question"] for q in question_bank.sample_bank_questions("notes-1", "Biology", 2)}
+    second = {q["question"] for q in question_bank.sample_bank_questions("notes-1", "Biology", 2)}
+    assert len(first) == len(second) == 2
+    assert first.isdisjoint(second)
+    assert question_bank.sample_bank_questions("notes-1", "Biology", 1)[0]["options"]["A"] == "yes"
+
+def test_other_notes_on_the_topic_fill_the_gap(bank):
+    question_bank.add_questions_to_bank("notes-1", "Biology", questions("Q one?"))
+    question_bank.add_questions_to_bank("notes-2", "Biology", questions("Q one?", "Q two?", "Q three?"))
+    question_bank.add_questions_to_bank("notes-3", "Chemistry", questions("Q four?"))
+    sampled = [q["question"] for q in question_bank.sample_bank_questions("notes-1", " BIOLOGY ", 5)]
+    assert sampled[0] == "Q one?"
+    assert sorted(sampled) == ["Q one?", "Q three?", "Q two?"] # No repeat of the shared question, nothing off-topic
+
+def test_banks_are_shared_by_stores_on_one_server(local_storage, monkeypatch):
+    client = storage.MemoryRedis()
+    monkeypatch.setitem(local_storage, "questions", storage.RedisQuestionBank(client))
+    question_bank.add_questions_to_bank("notes-1", "Biology", questions("Q one?", "Q two?"))
+    other_replica = storage.RedisQuestionBank(client)
+    assert other_replica.count("notes-1") == 2
+    assert len(other_replica.sample("notes-1", "biology", 5)) == 2
@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+
+import pytest
+
+from note_core import semantic_cache
+
+SCOPE = {"tool": "Notes", "detail_level": "Standard"}
+
+@pytest.fixture(autouse=True)
+def fresh_index(local_storage, monkeypatch):
+    monkeypatch.setattr(semantic_cache, "_semantic_index", {
+        "scopes": {}, "lock": threading.Lock(),
+        "stats": {"lookups": 0, "hits": 0, "misses": 0, "rejected": 0, "hit_similarity_sum": 0.0, "lowest_hit_similarity": None,
+                  "rejected_similarity_sum": 0.0},
+    })
+
+def lookup(topic, scope=SCOPE):
+    return semantic_cache.lookup_semantic_cache(scope, {"topic": topic})
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Photosynthesis", "What is photosynthesis?"),
+    ("Newton's laws of motion", "newtons laws of motion"),
+    ("The French Revolution", "french revolution"),
+    ("Photosynthesis", "Photosynthesis process"),
+    ("Photosynthesis", "Explain photosynthesis"),
+    ("Photosynthesis", "Give me an overview of the photosynthesis process"),
+])
+def test_rephrased_requests_hit(stored, asked):
+    semantic_cache.store_semantic_response(SCOPE, {"topic": stored}, "notes")
+    hit = lookup(asked)
+    assert hit is not None and hit["text"] == "notes" and hit["matched"] == stored
+
+@pytest.mark.parametrize("stored, asked", [
+    ("World War 1", "World War 2"),
+    ("Python 3 basics", "Python 2 basics"),
+    ("ISO 9001", "ISO 9001 2015"),
+    ("Photosynthesis", "Cellular respiration"),
+    ("Python 3 basics", "Explain Python 2"),
+])
+def test_different_requests_miss(stored, asked):
+    semantic_cache.store_semantic_response(SCOPE, {"topic": stored}, "notes")
+    assert lookup(asked) is None
+
+@pytest.mark.parametrize("stored, asked", [("World War 1", "World War 2"), ("Python 3.11", "Python 3.12"), ("Top 10 rivers", "Top 100 rivers")])
+def test_numbers_must_agree_even_below_the_threshold(stored, asked):
+    semantic_cache.store_semantic_response(SCOPE, {"topic": stored}, "notes")
+    assert semantic_cache.lookup_semantic_cache(SCOPE, {"topic": asked}, threshold=0.1) is None
+    assert semantic_cache.lookup_semantic_cache(SCOPE, {"topic": stored.lower()}, threshold=0.1)["text"] == "notes"
+
+def test_scope_must_match_exactly():
+    semantic_cache.store_semantic_response(SCOPE, {"topic": "Photosynthesis"}, "notes")
+    assert lookup("Photosynthesis", dict(SCOPE, detail_level="Detailed")) is None
+
+def test_error_responses_are_not_stored():
+    semantic_cache.store_semantic_response(SCOPE, {"topic": "Photosynthesis"}, "Error: quota exceeded")
+    assert lookup("Photosynthesis") is None
+
+def test_expired_response_drops_its_entry(local_storage):
+    semantic_cache.store_semantic_response(SCOPE, {"topic": "Photosynthesis"}, "notes")
+    entry_key = next(iter(semantic_cache._semantic_index["scopes"][semantic_cache.semantic_scope_key(SCOPE)]["entries"]))
+    local_storage["cache"].set(entry_key, "gone", ttl=-1)
+    assert lookup("Photosynthesis") is None
+    assert semantic_cache.get_semantic_cache_stats()["entries"] == 0
+
+def test_index_is_bounded_per_scope(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_INDEX_SIZE", 3)
+    for topic in ("Cells", "Atoms", "Planets", "Rivers"):
+        semantic_cache.store_semantic_response(SCOPE, {"topic": topic}, f"notes on {topic}")
+    scope_index = semantic_cache._semantic_index["scopes"][semantic_cache.semantic_scope_key(SCOPE)]
+    assert isinstance(scope_index["entries"], OrderedDict) and len(scope_index["entries"]) == 3
+    assert lookup("Cells") is None and lookup("Rivers")["text"] == "notes on Rivers"
+    assert all(entry_ids <= set(scope_index["entries"]) for entry_ids in scope_index["postings"].values())
+
+def test_stats_track_hits_and_rejections():
+    semantic_cache.store_semantic_response(SCOPE, {"topic": "Photosynthesis"}, "notes")
+    hit = lookup("photosynthesis")
+    lookup("Mitosis")
+    semantic_cache.record_semantic_rejection(hit)
+    stats = semantic_cache.get_semantic_cache_stats()
+    assert (stats["lookups"], stats["hits"], stats["misses"], stats["rejected"]) == (2, 1, 1, 1)
+    assert stats["hit_rate"] == 0.5 and stats["acceptance_rate"] == 0
@@ -0,0 +1,119 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+from note_core import storage
+
+@pytest.fixture(params=["local", "redis"])
+def stores(request, tmp_path):
+    if request.param == "local":
+        path = str(tmp_path / "storage.sqlite3")
+        return {"cache": storage.SQLiteResponseCache(path), "user_data": storage.SQLiteUserDataStore(path), "jobs": storage.SQLiteJobQueue(path)}
+    client = storage.MemoryRedis()
+    return {"cache": storage.RedisResponseCache(client), "user_data": storage.RedisUserDataStore(client), "jobs": storage.RedisJobQueue(client)}
+
+def test_connection_is_reused_per_thread_and_per_path(tmp_path):
+    path = str(tmp_path / "storage.sqlite3")
+    conn = storage.connect_local_storage(path)
+    assert storage.connect_local_storage(path) is conn
+    assert storage.connect_local_storage(str(tmp_path / "other.sqlite3")) is not conn
+    other_thread = []
+    thread = threading.Thread(target=lambda: other_thread.append(storage.connect_local_storage(path)))
+    thread.start()
+    thread.join()
+    assert other_thread[0] is not conn
+
+def test_failed_transaction_leaves_the_connection_usable(tmp_path):
+    path = str(tmp_path / "storage.sqlite3")
+    with pytest.raises(ValueError):
+        with storage.local_transaction(path) as conn:
+            conn.execute("INSERT INTO response_cache (key, value) VALUES ('a', 'b')")
+            raise ValueError("boom")
+    assert storage.SQLiteResponseCache(path).get("a") is None
+    with storage.local_transaction(path) as conn: # Would fail if the rolled-back transaction were still open
+        conn.execute("INSERT INTO response_cache (key, value) VALUES ('a', 'c')")
+    assert storage.SQLiteResponseCache(path).get("a") == "c"
+
+def test_response_cache_expires(stores, monkeypatch):
+    stores["cache"].set("key", "value", ttl=60)
+    assert stores["cache"].get("key") == "value"
+    assert stores["cache"].get("missing") is None
+    now = storage.time.time()
+    monkeypatch.setattr(storage.time, "time", lambda: now + 120)
+    assert stores["cache"].get("key") is None
+
+def test_user_data_round_trips_datetimes(stores):
+    deck = [{"question": "Q", "next_review": datetime(2026, 1, 2, 3, 4, 5)}]
+    stores["user_data"].save("spaced_repetition", "user", deck)
+    assert stores["user_data"].load("spaced_repetition", "user") == deck
+    assert stores["user_data"].load("spaced_repetition", "someone else") is None
+
+def test_job_runs_once_and_its_payload_is_dropped(stores):
+    jobs = stores["jobs"]
+    job_id = jobs.enqueue("generate_follow_up_questions", {"args": [1], "kwargs": {}})
+    assert jobs.status(job_id)["status"] == "queued"
+    claimed = jobs.claim(timeout=0.1)
+    assert claimed == {"id": job_id, "kind": "generate_follow_up_questions", "payload": {"args": [1], "kwargs": {}}}
+    assert jobs.status(job_id)["status"] == "running"
+    assert jobs.claim(timeout=0.1) is None # Claimed jobs aren't handed out twice
+    jobs.finish(job_id, result={"questions": ["why?"]})
+    assert jobs.status(job_id) == {"status": "done", "result": {"questions": ["why?"]}, "error": None}
+
+def test_failed_and_cancelled_jobs(stores):
+    jobs = stores["jobs"]
+    failing = jobs.enqueue("fill_question_bank", {"args": [], "kwargs": {}})
+    jobs.claim(timeout=0.1)
+    jobs.finish(failing, error="quota exceeded")
+    assert jobs.status(failing)["status"] == "failed"
+    assert jobs.status(failing)["error"] == "quota exceeded"
+
+    cancelled = jobs.enqueue("fill_question_bank", {"args": [], "kwargs": {}})
+    jobs.cancel(cancelled)
+    assert jobs.status(cancelled)["status"] == "cancelled"
+    assert jobs.claim(timeout=0.1) is None # A job cancelled while queued is never run
+    jobs.finish(cancelled, result="late") # A late finish doesn't resurrect it
+    assert jobs.status(cancelled)["status"] == "cancelled"
+
+def test_jobs_are_claimed_in_order(stores):
+    jobs = stores["jobs"]
+    first = jobs.enqueue("fill_question_bank", {"args": [1], "kwargs": {}})
+    second = jobs.enqueue("fill_question_bank", {"args": [2], "kwargs": {}})
+    assert [jobs.claim(timeout=0.1)["id"], jobs.claim(timeout=0.1)["id"]] == [first, second]
+
+def test_owned_jobs_are_only_claimed_by_their_owner(stores):
+    jobs = stores["jobs"]
+    owned = jobs.enqueue("fill_question_bank", {"args": [], "kwargs": {}}, owner="replica-a")
+    assert jobs.claim(timeout=0.1, owner="replica-b") is None
+    assert jobs.claim(timeout=0.1) is None
+    assert jobs.claim(timeout=0.1, owner="replica-a")["id"] == owned
+    shared = jobs.enqueue("fill_question_bank", {"args": [], "kwargs": {}})
+    assert jobs.claim(timeout=0.1, owner="replica-b")["id"] == shared
+
+def test_running_job_fails_when_its_lease_runs_out(stores, monkeypatch):
+    jobs = stores["jobs"]
+    job_id = jobs.enqueue("fill_question_bank", {"args": ["notes"], "kwargs": {}})
+    jobs.claim(timeout=0.1)
+    monkeypatch.setattr(storage, "JOB_LEASE_SECONDS", -1) # Every running job is past its lease
+    assert jobs.claim(timeout=0.1) is None # Claims reap stale jobs
+    assert jobs.status(job_id) == {"status": "failed", "result": None, "error": storage.JOB_LEASE_ERROR}
+    jobs.finish(job_id, result="too late")
+    assert jobs.status(job_id)["status"] == "failed"
+
+def test_redis_processing_list_drops_finished_and_cancelled_jobs():
+    client = storage.MemoryRedis()
+    jobs = storage.RedisJobQueue(client)
+    cancelled = jobs.enqueue("fill_question_bank", {"args": [], "kwargs": {}})
+    jobs.claim(timeout=0.1)
+    jobs.cancel(cancelled)
+    jobs.claim(timeout=0.1)
+    assert client.lrange(jobs.processing_key, 0, -1) == []
+
+def test_response_cache_pruning_uses_the_expiry_index(tmp_path):
+    cache = storage.SQLiteResponseCache(str(tmp_path / "storage.sqlite3"))
+    cache.set("old", "value", ttl=-1)
+    cache.set("new", "value", ttl=60) # Prunes "old"
+    conn = storage.connect_local_storage(cache.path)
+    plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN DELETE FROM response_cache WHERE expires < ?", (0,)))
+    assert "idx_response_cache_expires" in plan
+    assert conn.execute("SELECT key FROM response_cache").fetchall() == [("new",)]
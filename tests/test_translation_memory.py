@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from note_core import storage, translation_memory
+
+@pytest.fixture(params=["local", "redis"])
+def memory(request, local_storage, monkeypatch):
+    if request.param == "redis":
+        monkeypatch.setitem(local_storage, "translations", storage.RedisTranslationMemory(storage.MemoryRedis()))
+    return local_storage["translations"]
+
+@pytest.fixture
+def calls(monkeypatch):
+    # Fake model: "translates" each segment by upper-casing it and remembers the prompts it got
+    calls = []
+    def fake_generate_content(prompt, *args, **kwargs):
+        calls.append(prompt)
+        segments = json.loads(prompt.rsplit("Segments: ", 1)[1])
+        return json.dumps({"translations": [segment.upper() for segment in segments]})
+    monkeypatch.setattr(translation_memory, "generate_content", fake_generate_content)
+    return calls
+
+def translate(text):
+    return translation_memory.translate_with_memory(text, "German", "key", "model")
+
+def test_only_new_sentences_are_translated(memory, calls):
+    first = translate("The cell is alive. It needs energy.\nMitochondria make it.")
+    assert first["translation"] == "THE CELL IS ALIVE. IT NEEDS ENERGY.\nMITOCHONDRIA MAKE IT."
+    second = translate("The cell is alive. Plants need light.")
+    assert len(calls) == 2 and "The cell is alive." not in calls[1]
+    assert [segment["match"] for segment in second["segments"]] == ["exact", "new"]
+    assert second["translation"] == "THE CELL IS ALIVE. PLANTS NEED LIGHT."
+    assert translate("The cell is alive.  It needs energy.")["translation"] == "THE CELL IS ALIVE.  IT NEEDS ENERGY." # Whitespace is normalized
+    assert len(calls) == 2
+
+def test_repeated_sentences_and_numbers_cost_nothing_extra(memory, calls):
+    result = translate("Hello there. Hello there. 42.")
+    assert result["translation"] == "HELLO THERE. HELLO THERE. 42."
+    assert len(calls) == 1 and calls[0].count("Hello there.") == 1
+
+def test_close_match_is_sent_as_a_reference(memory, calls):
+    translate("Photosynthesis converts light energy into chemical energy.")
+    result = translate("Photosynthesis converts light energy into chemical energy quickly.")
+    assert result["segments"][0]["match"] == "new" and result["segments"][0]["reference"] >= translation_memory.TM_FUZZY_THRESHOLD
+    assert "Photosynthesis converts light energy into chemical energy. => PHOTOSYNTHESIS" in calls[1]
+
+def test_confirmed_translation_is_never_overwritten(memory, calls):
+    translation_memory.confirm_segment("German", "The cell is alive.", "Die Zelle lebt. ")
+    memory.put("German", translation_memory.segment_digest("The cell is alive."), "The cell is alive.", "MACHINE", ["cell", "alive"])
+    assert translate("The cell is alive.")["translation"] == "Die Zelle lebt."
+    assert calls == []
+    assert translation_memory.translation_memory_stats() == {"segments": 1, "confirmed": 1, "languages": 1}
+
+def test_unreadable_batch_is_an_error_and_stores_nothing(memory, monkeypatch):
+    monkeypatch.setattr(translation_memory, "generate_content", lambda *args, **kwargs: '{"translations": ["only one"]}')
+    result = translate("First sentence here. Second sentence here.")
+    assert result["translation"] is None and result["error"]
+    assert translation_memory.translation_memory_stats()["segments"] == 0
+
+def test_segments_are_kept_per_language(memory, calls):
+    translate("Good morning everyone.")
+    translation_memory.translate_with_memory("Good morning everyone.", "French", "key", "model")
+    assert len(calls) == 2
+    assert translation_memory.translation_memory_stats()["languages"] == 2